@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+设备命令端到端往返延迟基准
+
+在本机启动 fake_mqtt_broker 替身和 mqtt_fleet 设备群（每台设备独立连接、独立状态），
+统计命令从下发到收到设备回复的吞吐量和 p50/p95/p99 延迟:
+- mqtt: 平台侧直接经MQTT下发（FakeMQTTBroker.send_command），只包含MQTT转发和设备处理
+- http: onenet_http_control.control_wiper_http 调用 fake_onenet 的同步命令接口，
+        替身再经MQTT转发给设备，与线上 Node -> Python -> OneNET -> 设备 的链路一致（需要 requests）
+
+每次命令随机发给一台设备，设备的执行耗时默认为0（--reply-delay），只测量链路本身的开销。
+不需要数据库，需要 paho-mqtt。
+
+结果格式与 bench_pipeline.py 相同，可以保存后在不同提交之间对比（在 python 目录下运行）:
+    python benchmarks/bench_mqtt.py --devices 1000 --output benchmarks/results/mqtt_base.json
+    python benchmarks/bench_mqtt.py --devices 1000 --baseline benchmarks/results/mqtt_base.json
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+import traceback
+
+# 基准默认只输出WARNING及以上级别的日志，设备缓存不写磁盘快照，必须在导入业务模块之前设置
+os.environ.setdefault('PYTHON_LOG_LEVEL', 'WARNING')
+os.environ.setdefault('ONENET_DEVICE_CACHE_FILE', 'off')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_util import measure, build_report, write_results, load_results, compare
+
+SUITES = ('mqtt', 'http')
+WIPER_COMMANDS = ('off', 'interval', 'low', 'high', 'smart')
+
+def start_fleet(args, device_key):
+    """启动设备群并等待所有设备连接，返回 (DeviceFleet, 运行线程, 用户名列表)"""
+    from mqtt_fleet import DeviceFleet, build_fleet_devices
+
+    usernames = [f"bench_cmd_{index:04d}" for index in range(1, args.devices + 1)]
+    profile = {"rain": "off", "reply_delay": args.reply_delay, "reply_jitter": 0}
+    fleet = DeviceFleet(build_fleet_devices(usernames, profile, seed=args.seed), connect_rate=args.connect_rate,
+                        device_key=device_key, status_interval=0, stats_interval=0)
+    thread = threading.Thread(target=fleet.run, name='bench-fleet', daemon=True)
+    thread.start()
+
+    deadline = time.monotonic() + args.devices / args.connect_rate + 30
+    while fleet.connected_count() < args.devices:
+        if time.monotonic() > deadline:
+            fleet.stop()
+            raise RuntimeError(f"设备群连接超时: {fleet.connected_count()}/{args.devices}")
+        time.sleep(0.1)
+    return fleet, thread, usernames
+
+def bench_mqtt(args, context, results):
+    broker, usernames = context["broker"], context["usernames"]
+    rng = random.Random(args.seed)
+
+    def call(index):
+        username = rng.choice(usernames)
+        reply = broker.send_command(f"intelligent_wiper_{username}", {"wiper_control": rng.choice(WIPER_COMMANDS)},
+                                    timeout=args.timeout)
+        return {"success": isinstance(reply, dict) and reply.get("errno") == 0}
+
+    results[f"command_round_trip[mqtt,{args.devices}dev]"] = measure(call, args.iterations)
+
+def bench_http(args, context, results):
+    from fake_onenet import FakeOneNET
+    from onenet_http_control import control_wiper_http
+
+    broker, usernames = context["broker"], context["usernames"]
+    rng = random.Random(args.seed)
+
+    with FakeOneNET(seed=args.seed, command_handler=broker.onenet_command_handler) as fake:
+        for username in usernames:
+            fake.add_device(f"intelligent_wiper_{username}")
+
+        def call(index):
+            return control_wiper_http(rng.choice(usernames), rng.choice(WIPER_COMMANDS), timeout=int(args.timeout))
+
+        results[f"command_round_trip[http,{args.devices}dev]"] = measure(call, args.iterations)
+
+BENCHMARKS = {
+    'mqtt': bench_mqtt,
+    'http': bench_http
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='设备命令端到端往返延迟基准')
+    parser.add_argument('--only', default=','.join(SUITES), help=f'运行的基准，逗号分隔，可选: {",".join(SUITES)}')
+    parser.add_argument('--devices', type=int, default=100, help='模拟的设备数量')
+    parser.add_argument('--connect-rate', type=float, default=500, help='设备群每秒新建的连接数')
+    parser.add_argument('--iterations', type=int, default=500, help='每项基准的计时命令数')
+    parser.add_argument('--reply-delay', type=float, default=0, help='设备执行雨刷控制命令的耗时（秒）')
+    parser.add_argument('--latency', type=float, default=0, help='MQTT替身转发每条消息前的延迟（毫秒）')
+    parser.add_argument('--timeout', type=float, default=10, help='等待设备回复的超时（秒）')
+    parser.add_argument('--seed', type=int, default=20240615, help='随机种子')
+    parser.add_argument('--output', help='结果JSON的保存路径')
+    parser.add_argument('--baseline', help='用于对比的基准结果JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='允许变差的比例，超过判定为回归')
+    args = parser.parse_args()
+
+    args.only = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = [name for name in args.only if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准: {','.join(unknown)}")
+
+    from fake_mqtt_broker import FakeMQTTBroker
+
+    results = {}
+    errors = {}
+    device_key = base64.b64encode(random.Random(args.seed).randbytes(32)).decode('ascii')
+    with FakeMQTTBroker(device_key=device_key, latency=args.latency / 1000) as broker:
+        fleet, thread, usernames = start_fleet(args, device_key)
+        context = {"broker": broker, "usernames": usernames}
+        try:
+            for name in args.only:
+                try:
+                    BENCHMARKS[name](args, context, results)
+                except Exception as e:
+                    errors[name] = str(e)
+                    traceback.print_exc(file=sys.stderr)
+        finally:
+            fleet.stop()
+            thread.join()
+        broker_stats = broker.stats()
+
+    report = build_report(results, {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')})
+    report["errors"] = errors
+    report["fleet"] = fleet.summary()
+    report["broker"] = broker_stats
+    if args.output:
+        write_results(report, args.output)
+
+    success = not errors and not any(result["failures"] for result in results.values())
+    if args.baseline:
+        report["comparison"] = compare(load_results(args.baseline), report, args.threshold)
+        success = success and not report["comparison"]["regressions"]
+    report["success"] = success
+
+    print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
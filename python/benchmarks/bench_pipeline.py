@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+雨量数据处理链路基准
+
+统计以下热点路径的吞吐量和 p50/p95/p99 延迟:
+- insert:    rainfall_db.insert_raw_rainfall 逐条写入
+- sync:      onenet_sync.sync_onenet_data，OneNET API 指向本进程内的 fake_onenet 替身（每次返回100个新数据点）
+- aggregate: rainfall_db.aggregate_data 全量重建，按不同的历史数据量（--history-days）和聚合实现（--engines）
+- range:     rainfall_db.get_data_by_timerange 各时间粒度
+- stats:     rainfall_api.get_statistics_data 各视图（关闭统计缓存，包含查询和格式化）
+- format:    rainfall_api 中各视图的格式化函数（合成数据，不需要数据库）
+
+除 format 外都需要本地MySQL（rainfall_db.db_config）。基准使用 bench_ 开头的独立用户，
+运行前清空这些用户的数据并用 rainfall_db.generate_load_data 按固定种子生成历史数据，结束后删除（--keep-data 保留）。
+
+结果以JSON输出，可以保存后在不同提交之间对比（在 python 目录下运行）:
+    python benchmarks/bench_pipeline.py --output benchmarks/results/base.json
+    python benchmarks/bench_pipeline.py --baseline benchmarks/results/base.json --threshold 0.2
+    python benchmarks/bench_pipeline.py --only format,range
+
+与基准结果相比，p50/p95 延迟增加或吞吐量下降超过阈值时判定为回归，退出码为1。
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+import traceback
+from datetime import datetime, timedelta
+
+# 基准默认只输出WARNING及以上级别的日志，设备缓存不写磁盘快照，必须在导入业务模块之前设置
+os.environ.setdefault('PYTHON_LOG_LEVEL', 'WARNING')
+os.environ.setdefault('ONENET_DEVICE_CACHE_FILE', 'off')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_util import measure, build_report, write_results, load_results, compare
+from bench_stats_format import make_10min_rows, make_hourly_rows, make_daily_rows
+
+SUITES = ('insert', 'sync', 'aggregate', 'range', 'stats', 'format')
+RAW_TABLES = ('rainfall_raw', 'rainfall_10min', 'rainfall_hourly', 'rainfall_daily', 'rainfall_monthly',
+              'rainfall_agg_watermark')
+QUERY_PERIODS = ('raw', '10min', 'hourly', 'daily', 'monthly')
+STATS_PERIODS = ('10min', 'hourly', 'daily', 'all')
+
+# 历史数据结束于当前整点，数据按5秒对齐
+def _history_start(days):
+    return (datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+def reset_user(username):
+    """删除基准用户在所有雨量表中的数据"""
+    from rainfall_db import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            for table in RAW_TABLES:
+                try:
+                    cursor.execute(f"DELETE FROM {table} WHERE username = %s", (username,))
+                except Exception:
+                    # 水位线表在第一次聚合前可能还不存在
+                    pass
+        conn.commit()
+    finally:
+        conn.close()
+
+def load_history(username, days, seed, aggregate=False):
+    """清空并重新生成基准用户的历史数据，返回生成的原始数据条数"""
+    from rainfall_db import generate_load_data
+
+    reset_user(username)
+    result = generate_load_data(username, days=days, start=_history_start(days), seed=seed, aggregate=aggregate)
+    if not result.get("success"):
+        raise RuntimeError(f"生成 {username} 的历史数据失败: {result.get('error')}")
+    return result["generated_count"]
+
+# ---------- 各项基准 ----------
+
+def bench_insert(args, results):
+    from rainfall_db import insert_raw_rainfall, get_rainfall_level
+
+    username = 'bench_insert'
+    reset_user(username)
+    base = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+    rng = random.Random(args.seed)
+
+    def call(index):
+        value = round(rng.uniform(0, 8), 1)
+        level, percentage = get_rainfall_level(value)
+        # 预热调用的序号为负数，与计时调用使用不同的时间戳
+        return insert_raw_rainfall(username, base + timedelta(seconds=5 * (index + 10)), value, level, percentage)
+
+    results["insert_raw_rainfall"] = measure(call, args.iterations * 10)
+    return [username]
+
+def bench_sync(args, results):
+    import onenet_sync
+    from fake_onenet import FakeOneNET
+
+    username = 'bench_sync'
+    points = 100
+    rng = random.Random(args.seed)
+    reset_user(username)
+
+    def datapoints(device_name, identifier, start, end, limit):
+        # 每次都返回上次同步时间之后的 points 个新数据点，不受当前时间限制
+        return [(start + timedelta(seconds=5 * index), round(rng.uniform(0, 8), 1)) for index in range(1, points + 1)]
+
+    with FakeOneNET(latency=args.onenet_latency / 1000, seed=args.seed, datapoint_generator=datapoints) as fake:
+        fake.add_device(f"intelligent_wiper_{username}")
+        results["sync_onenet_data"] = measure(lambda index: onenet_sync.sync_onenet_data(username),
+                                              args.iterations, items_per_call=points)
+    return [username]
+
+def bench_aggregate(args, results):
+    from rainfall_db import aggregate_data
+
+    usernames = []
+    for days in args.history_days:
+        username = f'bench_agg_{days}d'
+        usernames.append(username)
+        rows = load_history(username, days, args.seed)
+        for engine in args.engines:
+            results[f"aggregate_data[{engine},{days}d]"] = measure(
+                lambda index: aggregate_data(username, full_rebuild=True, engine=engine),
+                args.aggregate_iterations, warmup=0, items_per_call=rows
+            )
+    return usernames
+
+def bench_range(args, results):
+    from rainfall_db import get_data_by_timerange
+
+    username = 'bench_query'
+    load_history(username, args.query_days, args.seed, aggregate=True)
+    end = datetime.now().replace(minute=0, second=0, microsecond=0)
+    for period in QUERY_PERIODS:
+        # 原始数据只查询最后一天（约17000条），其他粒度查询全部历史
+        start = end - timedelta(days=1 if period == 'raw' else args.query_days)
+        results[f"get_data_by_timerange[{period}]"] = measure(
+            lambda index: get_data_by_timerange(username, period, start.strftime("%Y-%m-%d %H:%M:%S"),
+                                                end.strftime("%Y-%m-%d %H:%M:%S")),
+            args.iterations
+        )
+    return [username]
+
+def bench_stats(args, results):
+    import rainfall_api
+    from stats_cache import stats_cache
+
+    username = 'bench_query'
+    if 'range' not in args.only:
+        load_history(username, args.query_days, args.seed, aggregate=True)
+
+    ttl = stats_cache.ttl
+    stats_cache.ttl = 0
+    try:
+        for period in STATS_PERIODS:
+            results[f"get_statistics_data[{period}]"] = measure(
+                lambda index: rainfall_api.get_statistics_data(username, period), args.iterations
+            )
+    finally:
+        stats_cache.ttl = ttl
+    return [username]
+
+def bench_format(args, results):
+    from rainfall_api import format_hourly_slots, format_daily_slots, format_all_slots
+
+    rng = random.Random(args.seed)
+    now = datetime(2024, 6, 15, 23, 47, 12)
+    cases = {
+        # 与 get_statistics_data 各视图的时间点数量相同
+        "hourly": (make_10min_rows(now - timedelta(hours=1), 7, rng),
+                   lambda rows: format_hourly_slots(rows, now - timedelta(hours=1), now)),
+        "daily": (make_hourly_rows(now.replace(hour=0, minute=0), 24, rng),
+                  lambda rows: format_daily_slots(rows, now)),
+        "all": (make_daily_rows(now - timedelta(days=29), 30, rng),
+                lambda rows: format_all_slots(rows, now - timedelta(days=29), now)),
+        # 大数据量：一年的10分钟时间点
+        "hourly_1y": (make_10min_rows(now - timedelta(days=365), 365 * 144, rng),
+                      lambda rows: format_hourly_slots(rows, now - timedelta(days=365), now))
+    }
+    for name, (rows, formatter) in cases.items():
+        results[f"format_slots[{name}]"] = measure(lambda index: formatter(rows), args.iterations,
+                                                   items_per_call=len(rows))
+    return []
+
+BENCHMARKS = {
+    'insert': bench_insert,
+    'sync': bench_sync,
+    'aggregate': bench_aggregate,
+    'range': bench_range,
+    'stats': bench_stats,
+    'format': bench_format
+}
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description='雨量数据处理链路基准')
+    parser.add_argument('--only', default=','.join(SUITES), help=f'运行的基准，逗号分隔，可选: {",".join(SUITES)}')
+    parser.add_argument('--iterations', type=int, default=50, help='每项基准的计时调用次数（insert为10倍）')
+    parser.add_argument('--aggregate-iterations', type=int, default=3, help='每个历史数据量的聚合次数')
+    parser.add_argument('--history-days', type=_int_list, default=[1, 7, 30], help='聚合基准的历史天数，逗号分隔')
+    parser.add_argument('--engines', default='sql', help='聚合实现，逗号分隔，如 sql,pandas')
+    parser.add_argument('--query-days', type=int, default=30, help='查询和统计基准的历史天数')
+    parser.add_argument('--onenet-latency', type=float, default=0, help='OneNET替身每个请求的额外延迟（毫秒）')
+    parser.add_argument('--seed', type=int, default=20240615, help='随机种子')
+    parser.add_argument('--output', help='结果JSON的保存路径')
+    parser.add_argument('--baseline', help='用于对比的基准结果JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='允许变差的比例，超过判定为回归')
+    parser.add_argument('--keep-data', action='store_true', help='结束后保留基准用户的数据')
+    args = parser.parse_args()
+
+    args.only = [name.strip() for name in args.only.split(',') if name.strip()]
+    args.engines = [name.strip() for name in args.engines.split(',') if name.strip()]
+    unknown = [name for name in args.only if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准: {','.join(unknown)}")
+
+    results = {}
+    errors = {}
+    usernames = set()
+    for name in args.only:
+        try:
+            usernames.update(BENCHMARKS[name](args, results))
+        except Exception as e:
+            errors[name] = str(e)
+            traceback.print_exc(file=sys.stderr)
+
+    if usernames and not args.keep_data:
+        for username in sorted(usernames):
+            try:
+                reset_user(username)
+            except Exception as e:
+                print(f"清理基准用户 {username} 的数据失败: {e}", file=sys.stderr)
+
+    report = build_report(results, {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')})
+    report["errors"] = errors
+    if args.output:
+        write_results(report, args.output)
+
+    success = not errors and not any(result["failures"] for result in results.values())
+    if args.baseline:
+        report["comparison"] = compare(load_results(args.baseline), report, args.threshold)
+        success = success and not report["comparison"]["regressions"]
+    report["success"] = success
+
+    print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+统计视图格式化的回归基准
+
+用合成数据调用 rainfall_api 中的 format_hourly_slots、format_daily_slots、format_all_slots，
+检查两件事:
+1. 输出与原来逐时间点扫描全部数据的实现完全一致
+2. 耗时随数据量线性增长：数据量放大后，每个时间点的平均耗时不应明显增加
+
+不需要连接数据库。运行方式（在 python 目录下）:
+    python benchmarks/bench_stats_format.py
+    python benchmarks/bench_stats_format.py --sizes 1000,10000,100000 --max-ratio 3
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rainfall_api
+from rainfall_api import format_hourly_slots, format_daily_slots, format_all_slots
+
+def make_10min_rows(start, count, rng):
+    """生成从start开始的count个10分钟聚合数据，随机缺失约20%，并混入少量同一时间点的重复数据"""
+    rows = []
+    for i in range(count):
+        if rng.random() < 0.2:
+            continue
+        timestamp = start + timedelta(minutes=10 * i, seconds=rng.randint(0, 59))
+        row = {"timestamp": timestamp, "avg_rainfall": round(rng.uniform(0, 30), 2)}
+        rows.append(row)
+        if rng.random() < 0.05:
+            rows.append(dict(row, avg_rainfall=round(rng.uniform(0, 30), 2)))
+    return rows
+
+def make_hourly_rows(start, count, rng):
+    """生成从start开始的count个小时聚合数据，随机缺失约20%"""
+    return [
+        {"timestamp": start + timedelta(hours=i, minutes=rng.randint(0, 59)), "avg_rainfall": round(rng.uniform(0, 30), 2)}
+        for i in range(count) if rng.random() >= 0.2
+    ]
+
+def make_daily_rows(start, count, rng):
+    """生成从start开始的count个日聚合数据，随机缺失约20%"""
+    return [
+        {"date": (start + timedelta(days=i)).date(), "total_rainfall": round(rng.uniform(0, 100), 2)}
+        for i in range(count) if rng.random() >= 0.2
+    ]
+
+def reference_hourly(rows, start_time, now):
+    """原实现：每个时间点扫描一遍全部数据"""
+    formatted_data = []
+    slot = start_time.replace(minute=start_time.minute // 10 * 10, second=0, microsecond=0)
+    while slot <= now:
+        slot_data = [item for item in rows if item["timestamp"].replace(second=0, microsecond=0) == slot]
+        formatted_data.append(_expected_hourly_entry(slot_data[0] if slot_data else None, slot))
+        slot += timedelta(minutes=10)
+    return formatted_data
+
+def _expected_hourly_entry(item, slot):
+    timestamp = item["timestamp"] if item else slot
+    value = item["avg_rainfall"] if item else 0.0
+    return {
+        "value": [timestamp.strftime("%H:%M"), value],
+        "originalDate": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        "timeKey": {
+            "minute": timestamp.strftime("%H:%M"),
+            "tenMinute": f"{timestamp.hour}:{timestamp.minute // 10 * 10:02d}",
+            "hour": f"{timestamp.hour}:00",
+            "day": f"{timestamp.month}/{timestamp.day}"
+        },
+        "rainfallValue": value,
+        "unit": "mm/h"
+    }
+
+def reference_daily(rows, now):
+    formatted_data = []
+    slot = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    while slot <= now:
+        slot_data = [
+            item for item in rows
+            if item["timestamp"].replace(minute=0, second=0, microsecond=0) == slot and item["timestamp"].date() == now.date()
+        ]
+        item = slot_data[0] if slot_data else None
+        timestamp = item["timestamp"] if item else slot
+        value = item["avg_rainfall"] if item else 0.0
+        formatted_data.append({
+            "value": [timestamp.strftime("%H:00"), value],
+            "originalDate": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "timeKey": {"hour": f"{timestamp.hour}:00", "day": f"{timestamp.month}/{timestamp.day}"},
+            "rainfallValue": value,
+            "unit": "mm/h"
+        })
+        slot += timedelta(hours=1)
+    return formatted_data
+
+def reference_all(rows, start_time, now):
+    formatted_data = []
+    slot = start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    while slot <= now:
+        slot_data = [item for item in rows if item["date"] == slot.date()]
+        item = slot_data[0] if slot_data else None
+        day = item["date"] if item else slot
+        value = item["total_rainfall"] if item else 0.0
+        formatted_data.append({
+            "value": [day.strftime("%m/%d"), value],
+            "originalDate": day.strftime("%Y-%m-%d"),
+            "timeKey": {"day": f"{day.month}/{day.day}"},
+            "rainfallValue": value,
+            "unit": "mm/天"
+        })
+        slot += timedelta(days=1)
+    return formatted_data
+
+def check_equivalence(rng):
+    """用较小的数据量对比新旧实现的输出，返回不一致的视图列表"""
+    now = datetime(2024, 6, 15, 23, 47, 12)
+    mismatches = []
+
+    start_time = now - timedelta(hours=48)
+    rows = make_10min_rows(start_time, 300, rng)
+    if format_hourly_slots(rows, start_time, now) != reference_hourly(rows, start_time, now):
+        mismatches.append("hourly")
+
+    # 包含前一天的数据，确认不会被匹配到当天的时间点
+    rows = make_hourly_rows(now.replace(hour=0, minute=0) - timedelta(hours=24), 48, rng)
+    if format_daily_slots(rows, now) != reference_daily(rows, now):
+        mismatches.append("daily")
+
+    start_time = now - timedelta(days=400)
+    rows = make_daily_rows(start_time, 400, rng)
+    if format_all_slots(rows, start_time, now) != reference_all(rows, start_time, now):
+        mismatches.append("all")
+
+    return mismatches
+
+def time_formatter(func, repeat):
+    """返回多次运行中最短的耗时（秒）"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(sizes, repeat, seed):
+    rng = random.Random(seed)
+    now = datetime(2024, 6, 15, 23, 47, 12)
+    results = {"hourly": [], "all": []}
+
+    for size in sizes:
+        # 10分钟视图：size个时间点
+        start_time = now - timedelta(minutes=10 * (size - 1))
+        rows = make_10min_rows(start_time, size, rng)
+        elapsed = time_formatter(lambda: format_hourly_slots(rows, start_time, now), repeat)
+        results["hourly"].append({"slots": size, "rows": len(rows), "seconds": round(elapsed, 6),
+                                  "us_per_slot": round(elapsed / size * 1e6, 3)})
+
+        # 日视图：size个时间点
+        start_time = now - timedelta(days=size - 1)
+        rows = make_daily_rows(start_time, size, rng)
+        elapsed = time_formatter(lambda: format_all_slots(rows, start_time, now), repeat)
+        results["all"].append({"slots": size, "rows": len(rows), "seconds": round(elapsed, 6),
+                               "us_per_slot": round(elapsed / size * 1e6, 3)})
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='统计视图格式化回归基准')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='时间点数量，逗号分隔，从小到大')
+    parser.add_argument('--repeat', type=int, default=3, help='每个数据量的重复次数，取最短耗时')
+    parser.add_argument('--max-ratio', type=float, default=3.0,
+                        help='最大数据量与最小数据量的单个时间点耗时之比超过该值时判定为回归')
+    parser.add_argument('--seed', type=int, default=20240615, help='随机种子')
+    args = parser.parse_args()
+
+    # 格式化函数的日志输出不计入基准
+    rainfall_api.log = lambda message: None
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    mismatches = check_equivalence(random.Random(args.seed))
+    results = run(sizes, args.repeat, args.seed)
+
+    regressions = []
+    for view, points in results.items():
+        ratio = points[-1]["us_per_slot"] / points[0]["us_per_slot"] if points[0]["us_per_slot"] else 0
+        if ratio > args.max_ratio:
+            regressions.append({"view": view, "ratio": round(ratio, 2)})
+
+    report = {
+        "success": not mismatches and not regressions,
+        "mismatches": mismatches,
+        "regressions": regressions,
+        "max_ratio": args.max_ratio,
+        "results": results
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    sys.exit(0 if report["success"] else 1)
+
+if __name__ == "__main__":
+    main()
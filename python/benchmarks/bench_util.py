@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基准测试公共工具
+
+- measure(): 多次调用被测函数，统计吞吐量和 p50/p95/p99 延迟
+- write_results() / load_results(): 以JSON保存一次运行的全部结果，附带提交号等环境信息，便于在不同提交之间对比
+- compare(): 与基准结果对比，延迟或吞吐量变差超过阈值的项目判定为回归
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import platform
+import subprocess
+from datetime import datetime
+
+# 对比时检查的指标: (指标名, 数值越大越差)
+COMPARED_METRICS = (
+    ("p50_ms", True),
+    ("p95_ms", True),
+    ("throughput", False)
+)
+
+def percentile(sorted_values, q):
+    """线性插值计算百分位数
+
+    参数:
+        sorted_values: 已排序的数值列表
+        q: 百分位（0-100）
+
+    返回:
+        float: 百分位数，列表为空时返回None
+    """
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return sorted_values[lower]
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def measure(func, iterations, warmup=3, items_per_call=1):
+    """多次调用 func 并统计耗时
+
+    参数:
+        func: 被测函数，调用时传入本次的序号（从0开始，预热调用为负数）；
+              返回 dict 且 success 为 False 时视为失败
+        iterations: 计时的调用次数
+        warmup: 不计时的预热调用次数
+        items_per_call: 每次调用处理的条数，用于计算每秒处理条数
+
+    返回:
+        dict: 包含调用次数、失败次数、吞吐量（条/秒）和各百分位延迟（毫秒）的字典
+    """
+    for index in range(-warmup, 0):
+        func(index)
+
+    latencies = []
+    failures = 0
+    started = time.perf_counter()
+    for index in range(iterations):
+        call_started = time.perf_counter()
+        result = func(index)
+        latencies.append((time.perf_counter() - call_started) * 1000)
+        if isinstance(result, dict) and result.get("success") is False:
+            failures += 1
+    total = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "failures": failures,
+        "items_per_call": items_per_call,
+        "total_seconds": round(total, 4),
+        "throughput": round(iterations * items_per_call / total, 2) if total > 0 else None,
+        "p50_ms": _round(percentile(latencies, 50)),
+        "p95_ms": _round(percentile(latencies, 95)),
+        "p99_ms": _round(percentile(latencies, 99)),
+        "min_ms": _round(latencies[0] if latencies else None),
+        "max_ms": _round(latencies[-1] if latencies else None)
+    }
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+def _git_commit():
+    """当前代码的提交号，不在git仓库中时返回None"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+def build_report(results, args=None):
+    """组装一次运行的结果
+
+    参数:
+        results: {基准名称: measure() 的结果}
+        args: 运行参数字典
+
+    返回:
+        dict: 包含环境信息和结果的字典
+    """
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": args or {}
+        },
+        "results": results
+    }
+
+def write_results(report, path):
+    """把结果写入JSON文件，目录不存在时自动创建"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+def load_results(path):
+    """读取 write_results() 写入的JSON文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def compare(baseline, current, threshold=0.2):
+    """对比两次运行的结果
+
+    参数:
+        baseline: 基准运行的报告（build_report 的结果）
+        current: 本次运行的报告
+        threshold: 允许变差的比例，0.2 表示延迟增加或吞吐量下降超过20%判定为回归
+
+    返回:
+        dict: 包含 regressions（回归项目）、improvements（改善超过阈值的项目）和 missing（基准中有、本次没有的项目）的字典
+    """
+    regressions = []
+    improvements = []
+    baseline_results = baseline.get("results", {})
+    current_results = current.get("results", {})
+
+    for name, before in baseline_results.items():
+        after = current_results.get(name)
+        if after is None:
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS:
+            old, new = before.get(metric), after.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            entry = {"name": name, "metric": metric, "baseline": old, "current": new, "change": round(change, 4)}
+            worse = change > threshold if higher_is_worse else change < -threshold
+            better = change < -threshold if higher_is_worse else change > threshold
+            if worse:
+                regressions.append(entry)
+            elif better:
+                improvements.append(entry)
+
+    return {
+        "baseline_commit": baseline.get("meta", {}).get("commit"),
+        "threshold": threshold,
+        "regressions": regressions,
+        "improvements": improvements,
+        "missing": sorted(set(baseline_results) - set(current_results))
+    }
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图表数据降采样
+
+统计页面的曲线在时间范围较长时点数远多于图表能显示的像素，这里在服务端按每个视图的点数预算
+挑选出有代表性的数据点，减少返回的数据量和浏览器的渲染时间。只做挑选、不做插值，
+保留下来的点与原始数据完全相同，返回格式不变。
+
+两种方法:
+- lttb:   Largest-Triangle-Three-Buckets，在每个桶中选与前一个已选点、下一个桶均值构成三角形面积最大的点，
+          曲线的整体形状和转折点都能保留
+- minmax: 每个桶保留最小值和最大值，保证降雨峰值和零值一定出现在结果中
+
+首尾两个点总是保留。有numpy时桶内计算全部向量化，没有numpy时使用结果相同的纯Python实现。
+
+由 rainfall_api.py 和 onenet_stats.py 调用，环境变量:
+    RAINFALL_CHART_DOWNSAMPLE    降采样方法: lttb（默认）、minmax 或 off
+    RAINFALL_CHART_POINTS        各视图的点数预算，如 "daily=144,all=240"，未指定的视图使用 DEFAULT_POINT_BUDGETS
+"""
+
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+# 各视图默认的点数预算，超过预算时才降采样，只为由原始数据点组成、点数可能很多的视图设置:
+# - 10min: 最近10分钟的原始数据，按5秒上报约121个点，不降采样；MQTT按秒上报时约600个点
+# - daily/all: OneNET历史数据点，最多288/720个
+# hourly 没有默认预算（OneNET最多取60个点，数据库中是按小时聚合的7个时段）
+DEFAULT_POINT_BUDGETS = {
+    '10min': 240,
+    'daily': 144,
+    'all': 240
+}
+
+DOWNSAMPLE_METHOD = os.environ.get('RAINFALL_CHART_DOWNSAMPLE', 'lttb').strip().lower()
+
+def _parse_point_budgets(text):
+    budgets = dict(DEFAULT_POINT_BUDGETS)
+    for item in (text or '').split(','):
+        period, _, points = item.partition('=')
+        if period.strip() and points.strip().isdigit():
+            budgets[period.strip()] = int(points)
+    return budgets
+
+POINT_BUDGETS = _parse_point_budgets(os.environ.get('RAINFALL_CHART_POINTS'))
+
+def point_budget(period, points=None):
+    """视图的点数预算，points 不为None时优先使用（0表示不降采样）"""
+    if points is not None:
+        return int(points)
+    return POINT_BUDGETS.get(period, 0)
+
+def _lttb_numpy(x, y, budget):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    # 首尾之间的 n-2 个点均分到 budget-2 个桶，edges[i]:edges[i+1] 为第i个桶
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    counts = np.diff(edges)
+    # 每个桶的均值一次算出，第i个桶用第i+1个桶的均值作为三角形的第三个顶点，最后一个桶用末尾的点
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(budget, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(budget - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        areas = np.abs((ax - next_x[bucket]) * (y[low:high] - ay) - (ax - x[low:high]) * (next_y[bucket] - ay))
+        previous = low + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected.tolist()
+
+def _lttb_python(x, y, budget):
+    n = len(x)
+    step = (n - 2) / (budget - 2)
+    edges = [int(1 + step * bucket) for bucket in range(budget - 2)] + [n - 1]
+    means = []
+    for bucket in range(budget - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        means.append((sum(x[low:high]) / (high - low), sum(y[low:high]) / (high - low)))
+    means = means[1:] + [(x[-1], y[-1])]
+
+    selected = [0]
+    previous = 0
+    for bucket in range(budget - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        ax, ay = x[previous], y[previous]
+        cx, cy = means[bucket]
+        areas = [abs((ax - cx) * (y[index] - ay) - (ax - x[index]) * (cy - ay)) for index in range(low, high)]
+        previous = low + areas.index(max(areas))
+        selected.append(previous)
+    selected.append(n - 1)
+    return selected
+
+def lttb_indices(x, y, budget):
+    """Largest-Triangle-Three-Buckets 降采样
+
+    参数:
+        x: 横坐标（时间，需要升序），与 y 等长
+        y: 纵坐标
+        budget: 保留的点数，至少为3
+
+    返回:
+        list: 保留的点的下标，升序
+    """
+    if budget >= len(y) or budget < 3:
+        return list(range(len(y)))
+    if np is not None:
+        return _lttb_numpy(x, y, budget)
+    return _lttb_python([float(value) for value in x], [float(value) for value in y], budget)
+
+def minmax_indices(y, budget):
+    """每个桶保留最小值和最大值的降采样
+
+    参数:
+        y: 纵坐标
+        budget: 最多保留的点数，至少为4
+
+    返回:
+        list: 保留的点的下标，升序
+    """
+    n = len(y)
+    if budget >= n or budget < 4:
+        return list(range(n))
+    buckets = (budget - 2) // 2
+
+    if np is not None:
+        interior = np.asarray(y, dtype=float)[1:n - 1]
+        bucket_ids = np.arange(n - 2) * buckets // (n - 2)
+        # 先按桶、再按值排序，每个桶的第一个是最小值，最后一个是最大值
+        order = np.lexsort((interior, bucket_ids))
+        starts = np.searchsorted(bucket_ids, np.arange(buckets))
+        ends = np.append(starts[1:], n - 2)
+        selected = np.concatenate(([0], order[starts] + 1, order[ends - 1] + 1, [n - 1]))
+        return np.unique(selected).tolist()
+
+    selected = {0, n - 1}
+    for bucket in range(buckets):
+        low = 1 + -(-bucket * (n - 2) // buckets)
+        high = 1 + -(-(bucket + 1) * (n - 2) // buckets)
+        window = range(low, high)
+        selected.add(min(window, key=lambda index: (float(y[index]), index)))
+        selected.add(max(window, key=lambda index: (float(y[index]), index)))
+    return sorted(selected)
+
+def downsample_series(points, budget, values, times=None, method=None):
+    """按点数预算挑选数据点
+
+    参数:
+        points: 数据点列表（任意格式，原样返回被选中的点）
+        budget: 点数预算，0或不超过预算时不降采样
+        values: 与 points 对应的数值
+        times: 与 points 对应的时间（秒或datetime），None表示按等间隔处理；不要求有序
+        method: lttb 或 minmax，默认 DOWNSAMPLE_METHOD
+
+    返回:
+        tuple: (挑选后的数据点列表, 降采样信息)，没有降采样时信息为None
+    """
+    method = (method or DOWNSAMPLE_METHOD).strip().lower()
+    if method not in DOWNSAMPLE_METHODS or not budget or len(points) <= budget:
+        return points, None
+
+    values = [float(value) for value in values]
+    if times is None:
+        order = list(range(len(points)))
+    else:
+        times = [time.timestamp() if hasattr(time, 'timestamp') else float(time) for time in times]
+        order = sorted(range(len(points)), key=times.__getitem__)
+    sorted_values = [values[index] for index in order]
+
+    if method == 'lttb':
+        sorted_times = list(range(len(points))) if times is None else [times[index] for index in order]
+        kept = lttb_indices(sorted_times, sorted_values, budget)
+    else:
+        kept = minmax_indices(sorted_values, budget)
+
+    # 按原来的顺序返回
+    selected = sorted(order[index] for index in kept)
+    return [points[index] for index in selected], {"method": method, "from": len(points), "to": len(selected)}
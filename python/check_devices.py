@@ -5,8 +5,9 @@
 检查OneNET平台上的设备
 """
 
-from onenet_api import generate_token, ONENET_API_BASE, PRODUCT_ID, get_user_device_config
-import requests
+import onenet_api
+from onenet_api import generate_token, PRODUCT_ID, get_user_device_config
+from onenet_http import http_client
 import json
 
 def check_onenet_devices():
@@ -21,7 +22,7 @@ def check_onenet_devices():
         return
     
     # 查询产品下的所有设备
-    url = f"{ONENET_API_BASE}/device"
+    url = f"{onenet_api.ONENET_API_BASE}/device"
     headers = {
         "authorization": token,
         "Content-Type": "application/json"
@@ -32,7 +33,7 @@ def check_onenet_devices():
     }
     
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = http_client.get(url, headers=headers, params=params)
         if response.status_code == 200:
             data = response.json()
             if data.get('code') == 0:
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MySQL连接池
+
+rainfall_db.py 和 db_service.py 共用同一个连接池，避免每次函数调用都重新建立连接。
+从连接池取出的连接与普通pymysql连接用法相同，调用 close() 时归还到连接池而不是断开，
+因此已有的 try/finally conn.close() 写法不需要修改。也可以使用上下文管理器:
+
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(...)
+        conn.commit()
+
+连接池大小等参数可以通过环境变量调整:
+    DB_POOL_MIN_SIZE              最少保留的空闲连接数，默认1
+    DB_POOL_MAX_SIZE              最大连接数（含借出的连接），默认10
+    DB_POOL_IDLE_TIMEOUT          空闲连接超过该秒数后被关闭（保留最少连接数），默认300
+    DB_POOL_HEALTH_CHECK_INTERVAL 连接空闲超过该秒数后，取出时先ping检查，默认30
+    DB_POOL_CHECKOUT_TIMEOUT      连接池满时等待空闲连接的秒数，默认10
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from log_util import get_logger
+
+logger = get_logger('db_pool')
+log = logger.info
+
+def _env_number(name, default, cast=int):
+    """读取数值型环境变量，格式错误时使用默认值"""
+    try:
+        return cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+class PoolTimeoutError(Exception):
+    """连接池已满，且在等待时间内没有连接被归还"""
+    pass
+
+class PooledConnection:
+    """连接池中的连接代理，close() 时归还连接池，其他属性和方法转发给真实连接"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise AttributeError(f"连接已归还连接池，不能再使用: {name}")
+        return getattr(raw, name)
+
+    def close(self):
+        """归还连接，重复调用无副作用"""
+        raw = self._raw
+        if raw is not None:
+            self._raw = None
+            self._pool._release(raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+class ConnectionPool:
+    """有上限、线程安全的数据库连接池
+
+    参数:
+        factory: 创建新连接的函数，返回pymysql连接
+        min_size: 最少保留的空闲连接数，空闲淘汰时不会低于该值
+        max_size: 最大连接数（含借出的连接）
+        idle_timeout: 空闲连接超过该秒数后被关闭
+        health_check_interval: 连接空闲超过该秒数后，取出时先ping检查，0表示每次都检查
+        checkout_timeout: 连接池满时等待空闲连接的秒数
+    """
+
+    def __init__(self, factory, min_size=1, max_size=10, idle_timeout=300,
+                 health_check_interval=30, checkout_timeout=10):
+        if max_size < 1:
+            raise ValueError("max_size必须大于0")
+        self.factory = factory
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        # 空闲连接队列，元素为 (连接, 归还时间)，右端是最近归还的连接
+        self._idle = deque()
+        # 当前打开的连接总数（空闲 + 借出 + 正在创建）
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        self.stats = {"created": 0, "reused": 0, "discarded": 0, "evicted": 0, "waits": 0}
+
+    def get_connection(self):
+        """取出一个可用连接，使用完后调用 close() 归还"""
+        deadline = time.time() + self.checkout_timeout
+        while True:
+            raw = None
+            with self._cond:
+                self._evict_idle_locked()
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(f"等待数据库连接超时（{self.checkout_timeout}秒），连接池已满: {self.max_size}")
+                    self.stats["waits"] += 1
+                    self._cond.wait(remaining)
+                    self._evict_idle_locked()
+
+                if self._idle:
+                    # 优先复用最近归还的连接，较早的连接留给空闲淘汰
+                    raw, released_at = self._idle.pop()
+                else:
+                    # 先占位再在锁外建立连接，避免建连期间阻塞其他线程
+                    self._size += 1
+
+            if raw is None:
+                try:
+                    raw = self.factory()
+                except Exception:
+                    self._discard()
+                    raise
+                with self._cond:
+                    self.stats["created"] += 1
+                return PooledConnection(self, raw)
+
+            if self._is_healthy(raw, released_at):
+                with self._cond:
+                    self.stats["reused"] += 1
+                return PooledConnection(self, raw)
+
+            # 连接已失效（如MySQL wait_timeout断开），关闭后重新获取
+            log("空闲连接已失效，重新获取连接")
+            self._close_raw(raw)
+            self._discard()
+
+    @contextmanager
+    def connection(self):
+        """上下文管理器形式获取连接，退出时自动归还"""
+        conn = self.get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close_all(self):
+        """关闭所有空闲连接，借出的连接归还时会正常回到连接池"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw, _ in idle:
+            self._close_raw(raw)
+
+    def status(self):
+        """返回连接池当前状态"""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                **self.stats
+            }
+
+    def _is_healthy(self, raw, released_at):
+        """取出时的健康检查：空闲较久的连接先ping一次"""
+        if not getattr(raw, 'open', True):
+            return False
+        if time.time() - released_at < self.health_check_interval:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _release(self, raw):
+        """归还连接，回滚未提交的事务，保证下次取出时状态干净"""
+        try:
+            if not getattr(raw, 'open', True):
+                raise ConnectionError("连接已断开")
+            raw.rollback()
+        except Exception:
+            self._close_raw(raw)
+            self._discard()
+            return
+
+        with self._cond:
+            self._idle.append((raw, time.time()))
+            self._evict_idle_locked()
+            self._cond.notify()
+
+    def _discard(self):
+        """释放一个连接名额（连接已关闭或创建失败）"""
+        with self._cond:
+            self._size -= 1
+            self.stats["discarded"] += 1
+            self._cond.notify()
+
+    def _evict_idle_locked(self):
+        """关闭空闲超时的连接，调用方需持有锁"""
+        if self.idle_timeout is None:
+            return
+        now = time.time()
+        # 左端是最早归还的连接
+        while len(self._idle) > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            raw, _ = self._idle.popleft()
+            self._size -= 1
+            self.stats["evicted"] += 1
+            self._close_raw(raw)
+
+    @staticmethod
+    def _close_raw(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_config, factory):
+    """获取指定数据库配置对应的共享连接池，同一进程内相同配置只创建一个连接池
+
+    参数:
+        db_config: 数据库配置字典，包含host、port、user、database
+        factory: 连接池需要新连接时调用的函数
+
+    返回:
+        ConnectionPool: 共享连接池
+    """
+    key = (db_config['host'], db_config['port'], db_config['user'], db_config['database'])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                factory,
+                min_size=_env_number('DB_POOL_MIN_SIZE', 1),
+                max_size=_env_number('DB_POOL_MAX_SIZE', 10),
+                idle_timeout=_env_number('DB_POOL_IDLE_TIMEOUT', 300, float),
+                health_check_interval=_env_number('DB_POOL_HEALTH_CHECK_INTERVAL', 30, float),
+                checkout_timeout=_env_number('DB_POOL_CHECKOUT_TIMEOUT', 10, float)
+            )
+            _pools[key] = pool
+            log(f"创建连接池: {db_config['host']}:{db_config['port']}/{db_config['database']}, 最大连接数={pool.max_size}")
+        return pool
@@ -1,4 +1,6 @@
 import pymysql
+from db_pool import get_pool
+from log_util import get_logger
 import json
 import argparse
 import sys
@@ -10,26 +12,9 @@ import io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
-# 添加日志记录
-def log(message):
-    try:
-        # 确保消息是字符串
-        if not isinstance(message, str):
-            message = str(message)
-        # 使用 utf-8 编码输出日志
-        print(f"LOG: {message}", file=sys.stderr)
-        sys.stderr.flush()  # 确保日志立即输出
-    except Exception as e:
-        # 如果出现编码错误，尝试使用 ASCII 编码
-        print(f"LOG: [编码错误] {str(e)}", file=sys.stderr)
-        try:
-            # 尝试将消息转换为 ASCII
-            ascii_message = message.encode('ascii', 'replace').decode('ascii')
-            print(f"LOG: {ascii_message}", file=sys.stderr)
-        except:
-            # 如果仍然失败，输出一个通用消息
-            print("LOG: [无法显示日志消息]", file=sys.stderr)
-        sys.stderr.flush()
+# 日志记录（共享的缓冲日志，见 log_util.py）
+logger = get_logger('db_service')
+log = logger.info
 
 # 直接在代码中定义数据库配置
 db_config = {
@@ -40,7 +25,8 @@ db_config = {
     "database": "intelligent_wiper_db"
 }
 
-def get_db_connection():
+def _create_connection():
+    """建立一个新的数据库连接，数据库不存在时自动创建，供连接池调用"""
     try:
         # 测试数据库连接
         log("尝试连接数据库...")
@@ -85,6 +71,13 @@ def get_db_connection():
             log(f"创建数据库失败: {str(create_err)}")
             raise
 
+def get_db_connection():
+    """从共享连接池获取数据库连接，调用 close() 时归还连接池
+
+    也可以作为上下文管理器使用: with get_db_connection() as conn: ...
+    """
+    return get_pool(db_config, _create_connection).get_connection()
+
 def init_db():
     """初始化数据库表结构"""
     conn = get_db_connection()
@@ -724,6 +717,87 @@ def get_user_device_info(username):
     finally:
         conn.close()
 
+def handle_action(action, params):
+    """执行命令行 --action 对应的操作，供命令行和常驻worker进程共用
+
+    参数:
+        action: 操作名称
+        params: 参数字典，键名与命令行参数一致
+
+    返回:
+        dict: 操作结果
+    """
+    if action == 'init':
+        return init_db()
+    elif action == 'register':
+        if not params.get('username') or not params.get('password'):
+            return {"success": False, "error": "注册需要提供用户名和密码"}
+        else:
+            return register_user(params.get('username'), params.get('password'))
+    elif action == 'login':
+        if not params.get('username') or not params.get('password'):
+            return {"success": False, "error": "登录需要提供用户名和密码"}
+        else:
+            log(f"登录参数: 用户名={params.get('username')}, 密码长度={len(params.get('password')) if params.get('password') else 0}")
+            return authenticate_user(params.get('username'), params.get('password'))
+    elif action == 'get_user':
+        if not params.get('user_id'):
+            return {"success": False, "error": "需要提供用户ID"}
+        else:
+            return get_user_by_id(params.get('user_id'))
+    elif action == 'get_all_users':
+        return get_all_users()
+    elif action == 'delete_user':
+        if not params.get('username'):
+            return {"success": False, "error": "删除用户需要提供用户名"}
+        else:
+            return delete_user_and_data(params.get('username'))
+    elif action == 'store_device_binding':
+        if not params.get('username'):
+            return {"success": False, "error": "存储设备绑定需要提供用户名"}
+        else:
+            device_data = {
+                'activation_code': params.get('activation_code'),
+                'onenet_device_id': params.get('onenet_device_id'),
+                'onenet_device_name': params.get('onenet_device_name'),
+                'device_key': params.get('device_key'),
+                'product_id': params.get('product_id') or '66eIb47012',
+                'serial_number': params.get('serial_number'),
+                'device_model': params.get('device_model') or '智能雨刷设备',
+                'firmware_version': params.get('firmware_version') or 'v2.0',
+                'device_status': params.get('device_status') or 'virtual_only',
+                'activated_at': params.get('activated_at')
+            }
+            return store_device_binding(params.get('username'), device_data)
+    elif action == 'get_device_credentials':
+        if params.get('activation_code'):
+            return get_device_credentials_by_activation_code(params.get('activation_code'))
+        elif params.get('hardware_mac') or params.get('hardware_serial'):
+            return get_device_credentials_by_hardware(params.get('hardware_mac'), params.get('hardware_serial'))
+        else:
+            return {"success": False, "error": "需要提供激活码或硬件标识符"}
+    elif action == 'update_hardware_binding':
+        if not params.get('username'):
+            return {"success": False, "error": "更新硬件绑定需要提供用户名"}
+        else:
+            return update_hardware_binding(params.get('username'), params.get('hardware_mac'),
+                                           params.get('hardware_serial'), params.get('hardware_identifier'))
+    elif action == 'get_user_device_info':
+        if not params.get('username'):
+            return {"success": False, "error": "获取用户设备信息需要提供用户名"}
+        else:
+            return get_user_device_info(params.get('username'))
+    elif action == 'log_hardware_access':
+        if not params.get('user_id') or not params.get('username'):
+            return {"success": False, "error": "记录硬件访问日志需要提供用户ID和用户名"}
+        else:
+            return log_hardware_access(params.get('user_id'), params.get('username'), params.get('hardware_identifier'),
+                                       params.get('access_ip'), params.get('request_type') or 'get_credentials',
+                                       params.get('response_status') or 'success',
+                                       params.get('request_details'), params.get('response_details'))
+    else:
+        return {"success": False, "error": "未知操作"}
+
 if __name__ == '__main__':
     try:
         parser = argparse.ArgumentParser(description='数据库服务')
@@ -762,75 +836,7 @@ if __name__ == '__main__':
 
         log(f"执行操作: {args.action}")
 
-        if args.action == 'init':
-            result = init_db()
-        elif args.action == 'register':
-            if not args.username or not args.password:
-                result = {"success": False, "error": "注册需要提供用户名和密码"}
-            else:
-                result = register_user(args.username, args.password)
-        elif args.action == 'login':
-            if not args.username or not args.password:
-                result = {"success": False, "error": "登录需要提供用户名和密码"}
-            else:
-                log(f"登录参数: 用户名={args.username}, 密码长度={len(args.password) if args.password else 0}")
-                result = authenticate_user(args.username, args.password)
-        elif args.action == 'get_user':
-            if not args.user_id:
-                result = {"success": False, "error": "需要提供用户ID"}
-            else:
-                result = get_user_by_id(args.user_id)
-        elif args.action == 'get_all_users':
-            result = get_all_users()
-        elif args.action == 'delete_user':
-            if not args.username:
-                result = {"success": False, "error": "删除用户需要提供用户名"}
-            else:
-                result = delete_user_and_data(args.username)
-        elif args.action == 'store_device_binding':
-            if not args.username:
-                result = {"success": False, "error": "存储设备绑定需要提供用户名"}
-            else:
-                device_data = {
-                    'activation_code': args.activation_code,
-                    'onenet_device_id': args.onenet_device_id,
-                    'onenet_device_name': args.onenet_device_name,
-                    'device_key': args.device_key,
-                    'product_id': args.product_id,
-                    'serial_number': args.serial_number,
-                    'device_model': args.device_model,
-                    'firmware_version': args.firmware_version,
-                    'device_status': args.device_status,
-                    'activated_at': args.activated_at
-                }
-                result = store_device_binding(args.username, device_data)
-        elif args.action == 'get_device_credentials':
-            if args.activation_code:
-                result = get_device_credentials_by_activation_code(args.activation_code)
-            elif args.hardware_mac or args.hardware_serial:
-                result = get_device_credentials_by_hardware(args.hardware_mac, args.hardware_serial)
-            else:
-                result = {"success": False, "error": "需要提供激活码或硬件标识符"}
-        elif args.action == 'update_hardware_binding':
-            if not args.username:
-                result = {"success": False, "error": "更新硬件绑定需要提供用户名"}
-            else:
-                result = update_hardware_binding(args.username, args.hardware_mac,
-                                               args.hardware_serial, args.hardware_identifier)
-        elif args.action == 'get_user_device_info':
-            if not args.username:
-                result = {"success": False, "error": "获取用户设备信息需要提供用户名"}
-            else:
-                result = get_user_device_info(args.username)
-        elif args.action == 'log_hardware_access':
-            if not args.user_id or not args.username:
-                result = {"success": False, "error": "记录硬件访问日志需要提供用户ID和用户名"}
-            else:
-                result = log_hardware_access(args.user_id, args.username, args.hardware_identifier,
-                                           args.access_ip, args.request_type, args.response_status,
-                                           args.request_details, args.response_details)
-        else:
-            result = {"success": False, "error": "未知操作"}
+        result = handle_action(args.action, vars(args))
 
         # 以标准JSON格式输出结果，确保使用 utf-8 编码
         print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OneNET设备元数据缓存
+
+按设备名称缓存设备ID、设备密钥(sec_key)等查询结果，避免每次下发命令都重新查询设备列表。
+- 查询到的值缓存 ONENET_DEVICE_CACHE_TTL 秒（默认3600）
+- 确认不存在的设备同样缓存（负缓存），但只保留 ONENET_DEVICE_CACHE_NEGATIVE_TTL 秒（默认60）
+- 创建、激活设备后应调用 invalidate() 清除对应设备的缓存
+- 缓存同时保存到磁盘快照（默认位于系统临时目录），命令行每次启动新进程时也能共享；
+  设置 ONENET_DEVICE_CACHE_FILE=off 可以关闭快照
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+
+from log_util import get_logger
+
+logger = get_logger('device_cache')
+log = logger.info
+
+def _env_seconds(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(tempfile.gettempdir(), 'intelligent_wiper_device_cache.json')
+
+class DeviceMetadataCache:
+    """按设备名称缓存设备元数据的TTL缓存，线程安全
+
+    参数:
+        ttl: 查询到的值的缓存时间（秒）
+        negative_ttl: 设备或字段不存在（值为None）时的缓存时间（秒）
+        snapshot_path: 磁盘快照文件路径，None表示不使用快照
+    """
+
+    def __init__(self, ttl=3600, negative_ttl=60, snapshot_path=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.snapshot_path = snapshot_path
+        # {设备名称: {字段名: [值, 过期时间]}}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._snapshot_mtime = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, device_name, field):
+        """查询缓存
+
+        返回:
+            tuple: (是否命中, 缓存值)，负缓存命中时返回 (True, None)
+        """
+        with self._lock:
+            self._load_snapshot_locked()
+            entry = self._entries.get(device_name, {}).get(field)
+            if entry is not None and entry[1] > time.time():
+                self.hits += 1
+                return True, entry[0]
+            self.misses += 1
+            return False, None
+
+    def set(self, device_name, field, value):
+        """写入缓存，value为None时按负缓存处理"""
+        self.set_many({device_name: value}, field)
+
+    def set_many(self, values, field):
+        """批量写入同一字段，用于一次设备列表查询得到的所有设备
+
+        参数:
+            values: {设备名称: 值} 字典
+            field: 字段名
+        """
+        if not values:
+            return
+        now = time.time()
+        with self._lock:
+            self._load_snapshot_locked()
+            for device_name, value in values.items():
+                expires_at = now + (self.ttl if value is not None else self.negative_ttl)
+                self._entries.setdefault(device_name, {})[field] = [value, expires_at]
+            self._save_snapshot_locked()
+
+    def invalidate(self, device_name=None):
+        """清除某个设备的缓存，device_name为None时清除全部缓存"""
+        with self._lock:
+            self._load_snapshot_locked()
+            if device_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(device_name, None)
+            self._save_snapshot_locked()
+        log(f"已清除设备缓存: {device_name if device_name is not None else '全部'}")
+
+    def _load_snapshot_locked(self):
+        """快照文件被其他进程更新后重新加载，调用方需持有锁"""
+        if not self.snapshot_path:
+            return
+        try:
+            mtime = os.path.getmtime(self.snapshot_path)
+        except OSError:
+            return
+        if mtime == self._snapshot_mtime:
+            return
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            now = time.time()
+            self._entries = {
+                device_name: {
+                    field: entry for field, entry in fields.items()
+                    if isinstance(entry, list) and len(entry) == 2 and entry[1] > now
+                }
+                for device_name, fields in data.items()
+                if isinstance(fields, dict)
+            }
+            self._snapshot_mtime = mtime
+        except Exception as e:
+            log(f"读取设备缓存快照失败: {str(e)}")
+
+    def _save_snapshot_locked(self):
+        """写入快照文件（先写临时文件再替换，避免其他进程读到半个文件），调用方需持有锁"""
+        if not self.snapshot_path:
+            return
+        try:
+            now = time.time()
+            data = {}
+            for device_name, fields in self._entries.items():
+                live = {field: entry for field, entry in fields.items() if entry[1] > now}
+                if live:
+                    data[device_name] = live
+
+            # 快照中包含设备密钥，只允许当前用户读写
+            temp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.snapshot_path)
+            self._snapshot_mtime = os.path.getmtime(self.snapshot_path)
+        except Exception as e:
+            log(f"保存设备缓存快照失败: {str(e)}")
+
+def _snapshot_path_from_env():
+    path = os.environ.get('ONENET_DEVICE_CACHE_FILE', DEFAULT_SNAPSHOT_PATH)
+    if path.strip().lower() in ('', 'off', 'none', '0'):
+        return None
+    return path
+
+# 进程内共享的设备缓存
+device_cache = DeviceMetadataCache(
+    ttl=_env_seconds('ONENET_DEVICE_CACHE_TTL', 3600),
+    negative_ttl=_env_seconds('ONENET_DEVICE_CACHE_NEGATIVE_TTL', 60),
+    snapshot_path=_snapshot_path_from_env()
+)
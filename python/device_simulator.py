@@ -4,23 +4,25 @@
 设备连接模拟器 - 模拟智能雨刷设备连接到OneNET平台
 """
 
+import os
 import json
 import sys
 import argparse
 import time
 import random
 from datetime import datetime
-import requests
 import hashlib
 import hmac
 import base64
 from urllib.parse import quote
 
+from onenet_http import http_client
+
 class OneNETDeviceSimulator:
     def __init__(self):
         self.product_id = "66eIb47012"
         self.api_key = "=LKJHGFDSAqwertyuiop1234567890MNBVCXZ="
-        self.base_url = "https://iot-api.heclouds.com"
+        self.base_url = os.environ.get('ONENET_API_BASE', "https://iot-api.heclouds.com").rstrip('/')
         
     def generate_token(self, method="GET", url="", body=""):
         """生成OneNET API访问token"""
@@ -115,7 +117,7 @@ class OneNETDeviceSimulator:
                 ]
             }
 
-            response = requests.post(
+            response = http_client.post(
                 f"{self.base_url}{url}",
                 headers=headers,
                 json=payload,
@@ -159,7 +161,7 @@ class OneNETDeviceSimulator:
                 ]
             }
 
-            response = requests.post(
+            response = http_client.post(
                 f"{self.base_url}{url}",
                 headers=headers,
                 json=payload,
@@ -0,0 +1,793 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OneNET MQTT服务器本地替身
+
+在本进程内启动一个轻量的 MQTT 3.1.1 服务器（asyncio，后台线程），供 mqtt_device_simulator、
+mqtt_fleet、mqtt_device_activator 和 mqtt_ingest 在本机连接，不再依赖 mqtts.heclouds.com:
+- 协议: CONNECT/CONNACK、PUBLISH（QoS 0/1，QoS 1 未确认时重发）、SUBSCRIBE（+ 和 # 通配符）、
+  UNSUBSCRIBE、PINGREQ、DISCONNECT，保留消息和遗嘱消息；不保存会话（clean session）
+- 鉴权: 用户名为产品ID，密码为OneNET格式的token（version=...&res=...&et=...&method=...&sign=...），
+  校验签名和有效期，res 支持:
+      products/{pid}/devices/{device}   设备级，客户端ID必须为设备名称，签名密钥为设备密钥或产品AccessKey
+      products/{pid}                    产品级，签名密钥为产品AccessKey
+      userid/{uid}                      用户级，签名密钥为用户AccessKey
+- 主题: 设备级连接只能访问 $sys/{pid}/{device}/...，产品级和用户级连接可以访问 $sys/{pid}/ 下的所有主题
+  （mqtt_ingest 用通配符订阅所有设备）；设备上报 dp/post/json、thing/property/post 后，
+  与OneNET一样回复 dp/post/json/accepted、thing/property/post/reply
+- 命令: send_command() 模拟平台下发命令，发布到 cmd/request/{cmdid} 并等待设备回复 cmd/response/{cmdid}；
+  onenet_command_handler 可以作为 FakeOneNET 的 command_handler，让HTTP同步命令经由MQTT到达模拟设备
+
+设备密钥可以通过 device_keys / device_key 指定，也可以传入 FakeOneNET 实例（onenet），
+使用其中注册设备的 sec_key（与 onenet_api.get_device_key 获取到的相同）。
+
+在测试代码中使用:
+    with FakeOneNET() as fake, FakeMQTTBroker(onenet=fake) as broker:
+        fake.command_handler = broker.onenet_command_handler
+        ...   # 本进程的 MQTT_HOST / MQTT_PORT 被 install() 指向本地替身
+
+单独运行，供其他进程通过环境变量 ONENET_MQTT_HOST / ONENET_MQTT_PORT 使用:
+    python fake_mqtt_broker.py --port 18830 --device-key <base64密钥>
+    python fake_mqtt_broker.py --port 18830 --onenet-port 18080 --users admin,user1
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import hmac
+import struct
+import base64
+import asyncio
+import binascii
+import argparse
+import threading
+from urllib.parse import parse_qsl
+
+from log_util import get_logger
+from onenet_token import token_signature
+
+try:
+    from onenet_api import PRODUCT_ID, ACCESS_KEY, USER_ID, USER_ACCESS_KEY
+    DEFAULT_USER_KEYS = {USER_ID: USER_ACCESS_KEY}
+except ImportError:
+    # onenet_api 的依赖不可用时使用默认配置
+    PRODUCT_ID = "66eIb47012"
+    ACCESS_KEY = "Rk9mVGdrQWE5dzJqWU12bzFsSFFpZWtRZDVWdTFZZlU="
+    DEFAULT_USER_KEYS = {}
+
+logger = get_logger('fake_mqtt')
+log = logger.info
+
+# MQTT控制报文类型
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+# CONNACK返回码
+CONNACK_ACCEPTED = 0
+CONNACK_BAD_PROTOCOL = 1
+CONNACK_BAD_CLIENT_ID = 2
+CONNACK_BAD_CREDENTIALS = 4
+CONNACK_NOT_AUTHORIZED = 5
+
+# SUBACK中表示订阅失败的返回码
+SUBACK_FAILURE = 0x80
+
+# 没有收到客户端报文的最长时间为 keepalive 的倍数（MQTT 3.1.1 规定为1.5倍）
+KEEPALIVE_GRACE = 1.5
+# QoS 1 消息未确认时的重发间隔（秒）
+RETRY_INTERVAL = 5
+
+class MQTTProtocolError(Exception):
+    """客户端发送了不符合协议的报文，服务器关闭连接"""
+
+def _encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+def _packet(packet_type, flags, body=b''):
+    return bytes([(packet_type << 4) | flags]) + _encode_length(len(body)) + body
+
+def _encode_string(value):
+    data = value.encode('utf-8') if isinstance(value, str) else value
+    return struct.pack('!H', len(data)) + data
+
+class _Reader:
+    """按顺序读取报文可变头部和载荷中的字段"""
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def remaining(self):
+        return len(self.data) - self.offset
+
+    def byte(self):
+        if self.remaining() < 1:
+            raise MQTTProtocolError("报文长度不足")
+        value = self.data[self.offset]
+        self.offset += 1
+        return value
+
+    def uint16(self):
+        if self.remaining() < 2:
+            raise MQTTProtocolError("报文长度不足")
+        value = struct.unpack_from('!H', self.data, self.offset)[0]
+        self.offset += 2
+        return value
+
+    def binary(self):
+        length = self.uint16()
+        if self.remaining() < length:
+            raise MQTTProtocolError("报文长度不足")
+        value = self.data[self.offset:self.offset + length]
+        self.offset += length
+        return value
+
+    def string(self):
+        try:
+            return self.binary().decode('utf-8')
+        except UnicodeDecodeError:
+            raise MQTTProtocolError("字符串不是有效的UTF-8")
+
+    def rest(self):
+        value = self.data[self.offset:]
+        self.offset = len(self.data)
+        return value
+
+def topic_matches(topic_filter, topic):
+    """判断主题是否匹配订阅过滤器（+ 匹配一级，# 匹配剩余所有级；以通配符开头的过滤器不匹配 $ 开头的主题）"""
+    if topic.startswith('$') and topic_filter[:1] in ('+', '#'):
+        return False
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for index, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != '+' and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+def valid_topic_filter(topic_filter):
+    if not topic_filter:
+        return False
+    levels = topic_filter.split('/')
+    for index, level in enumerate(levels):
+        if '#' in level and (level != '#' or index != len(levels) - 1):
+            return False
+        if '+' in level and level != '+':
+            return False
+    return True
+
+class _TopicTree:
+    """按主题层级组织的订阅索引，发布时只遍历可能匹配的分支，订阅数量大时不需要逐个比较"""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, topic_filter, session, qos):
+        node = self.root
+        for level in topic_filter.split('/'):
+            node = node.setdefault(level, {})
+        node.setdefault(None, {})[session] = qos
+
+    def remove(self, topic_filter, session):
+        path = [self.root]
+        for level in topic_filter.split('/'):
+            node = path[-1].get(level)
+            if node is None:
+                return
+            path.append(node)
+        subscribers = path[-1].get(None)
+        if subscribers is not None:
+            subscribers.pop(session, None)
+            if not subscribers:
+                del path[-1][None]
+        # 删除没有订阅者的空分支
+        levels = topic_filter.split('/')
+        for index in range(len(levels), 0, -1):
+            if path[index]:
+                break
+            del path[index - 1][levels[index - 1]]
+
+    def match(self, topic):
+        """返回 {session: 最大QoS}"""
+        levels = topic.split('/')
+        matched = {}
+        self._match(self.root, levels, 0, matched, topic.startswith('$'))
+        return matched
+
+    def _match(self, node, levels, index, matched, system_topic):
+        wildcard_allowed = not (system_topic and index == 0)
+        if wildcard_allowed and '#' in node:
+            self._collect(node['#'], matched)
+        if index == len(levels):
+            self._collect(node, matched)
+            return
+        child = node.get(levels[index])
+        if child is not None:
+            self._match(child, levels, index + 1, matched, system_topic)
+        if wildcard_allowed and '+' in node:
+            self._match(node['+'], levels, index + 1, matched, system_topic)
+
+    @staticmethod
+    def _collect(node, matched):
+        for session, qos in node.get(None, {}).items():
+            if qos > matched.get(session, -1):
+                matched[session] = qos
+
+class _Session:
+    """一个客户端连接"""
+
+    def __init__(self, client_id, writer, keepalive, scope, will):
+        self.client_id = client_id
+        self.writer = writer
+        self.keepalive = keepalive
+        # 可访问的主题前缀，None表示不限制（未开启鉴权）
+        self.scope = scope
+        self.will = will
+        self.subscriptions = {}
+        self.next_packet_id = 0
+        # {报文ID: (发送时间, 主题, 载荷)}，未收到PUBACK的 QoS 1 消息
+        self.inflight = {}
+        self.closed = False
+
+    def packet_id(self):
+        while True:
+            self.next_packet_id = self.next_packet_id % 65535 + 1
+            if self.next_packet_id not in self.inflight:
+                return self.next_packet_id
+
+    def allowed(self, topic):
+        return self.scope is None or topic.startswith(self.scope)
+
+class FakeMQTTBroker:
+    """模拟OneNET MQTT服务器的本地服务
+
+    参数:
+        host: 监听地址
+        port: 监听端口，0表示自动分配
+        product_id: 产品ID，连接的用户名和主题中的产品ID必须与之一致
+        auth: 是否校验token；为False时接受任意用户名密码，也不限制可访问的主题
+        device_key: 所有设备共用的设备密钥（base64），如 mqtt_fleet.py 的 --device-key
+        device_keys: {设备名称: 设备密钥}
+        access_key: 产品AccessKey
+        user_keys: {用户ID: 用户AccessKey}
+        onenet: FakeOneNET 实例，使用其中注册设备的 sec_key 校验设备级token
+        latency: 每条消息转发前的延迟（秒）
+        platform_replies: 是否像OneNET一样回复 dp/post/json/accepted 和 thing/property/post/reply
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, product_id=PRODUCT_ID, auth=True, device_key=None,
+                 device_keys=None, access_key=ACCESS_KEY, user_keys=None, onenet=None, latency=0.0,
+                 platform_replies=True):
+        self.host = host
+        self.port = port
+        self.product_id = product_id
+        self.auth = auth
+        self.device_key = device_key
+        self.device_keys = dict(device_keys or {})
+        self.access_key = access_key
+        self.user_keys = dict(DEFAULT_USER_KEYS if user_keys is None else user_keys)
+        self.onenet = onenet
+        self.latency = latency
+        self.platform_replies = platform_replies
+        self.topic_prefix = f"$sys/{product_id}/"
+
+        self.sessions = {}
+        self.retained = {}
+        self._tree = _TopicTree()
+        # {(设备名称, cmdid): Future}，等待设备回复的命令
+        self._pending_commands = {}
+
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._retry_task = None
+        self._ready = threading.Event()
+        self._previous_server = None
+        self.reset_stats()
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        """启动MQTT服务（后台线程），返回 (地址, 端口)"""
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name='fake-mqtt', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._server is None:
+            raise RuntimeError(f"MQTT本地替身启动失败: {self.host}:{self.port}")
+        log(f"MQTT本地替身已启动: {self.host}:{self.port}")
+        return self.host, self.port
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port, backlog=1024))
+            self.port = self._server.sockets[0].getsockname()[1]
+            self._retry_task = self._loop.create_task(self._retry_loop())
+        except Exception as e:
+            logger.error("MQTT本地替身监听失败: %s", e)
+            self._server = None
+        finally:
+            self._ready.set()
+        if self._server is not None:
+            self._loop.run_forever()
+        self._loop.close()
+
+    def stop(self):
+        if self._server is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for session in list(self.sessions.values()):
+                self._close(session, publish_will=False)
+                session.writer.close()
+            self._retry_task.cancel()
+            # 连接关闭后各连接的处理任务读到EOF自行结束
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            if tasks:
+                await asyncio.wait(tasks, timeout=2)
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._server = None
+        log("MQTT本地替身已停止")
+
+    def install(self):
+        """把本进程中 mqtt_device_simulator 等模块的 MQTT_HOST / MQTT_PORT 指向本替身
+
+        同时设置环境变量 ONENET_MQTT_HOST / ONENET_MQTT_PORT，之后才导入的模块和子进程也使用本替身
+        """
+        self._previous_server = {"env": {name: os.environ.get(name) for name in MQTT_SERVER_ENV}, "modules": {}}
+        os.environ.update({"ONENET_MQTT_HOST": self.host, "ONENET_MQTT_PORT": str(self.port)})
+        for name in MQTT_SERVER_IMPORTERS:
+            module = sys.modules.get(name)
+            if module is not None:
+                self._previous_server["modules"][name] = (module.MQTT_HOST, module.MQTT_PORT)
+                module.MQTT_HOST, module.MQTT_PORT = self.host, self.port
+
+    def uninstall(self):
+        """恢复 install() 之前的服务器地址"""
+        if not self._previous_server:
+            return
+        for name, value in self._previous_server["env"].items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        for name, (host, port) in self._previous_server["modules"].items():
+            module = sys.modules.get(name)
+            if module is not None:
+                module.MQTT_HOST, module.MQTT_PORT = host, port
+        self._previous_server = None
+
+    def __enter__(self):
+        self.start()
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.uninstall()
+        self.stop()
+
+    # ---------- 统计 ----------
+
+    def stats(self):
+        """返回连接数、收发消息数和命令往返统计"""
+        stats = dict(self._stats)
+        stats["connections"] = len(self.sessions)
+        stats["retained"] = len(self.retained)
+        return stats
+
+    def reset_stats(self):
+        self._stats = dict.fromkeys(
+            ('connects', 'max_connections', 'auth_failures', 'messages_in', 'messages_out', 'denied',
+             'retransmits', 'commands', 'command_replies', 'command_timeouts'), 0)
+
+    def _incr(self, name, count=1):
+        self._stats[name] += count
+
+    # ---------- 鉴权 ----------
+
+    def _keys_for(self, resource):
+        """返回可以签名该资源的密钥列表和连接可访问的主题前缀"""
+        parts = resource.split('/')
+        if len(parts) == 4 and parts[0] == 'products' and parts[2] == 'devices' and parts[1] == self.product_id:
+            device_name = parts[3]
+            keys = [self.device_keys.get(device_name), self.device_key, self.access_key]
+            if self.onenet is not None:
+                device = self.onenet.devices.get(device_name)
+                keys.insert(0, device and device.get("sec_key"))
+            return [key for key in keys if key], f"{self.topic_prefix}{device_name}/", device_name
+        if len(parts) == 2 and parts[0] == 'products' and parts[1] == self.product_id:
+            return [self.access_key], self.topic_prefix, None
+        if len(parts) == 2 and parts[0] == 'userid':
+            key = self.user_keys.get(parts[1])
+            return [key] if key else [], self.topic_prefix, None
+        return [], None, None
+
+    def authenticate(self, client_id, username, password):
+        """校验连接的用户名和token
+
+        返回:
+            tuple: (CONNACK返回码, 可访问的主题前缀)
+        """
+        if not self.auth:
+            return CONNACK_ACCEPTED, None
+        if username != self.product_id or not password:
+            return CONNACK_BAD_CREDENTIALS, None
+
+        try:
+            params = dict(parse_qsl(password.decode('utf-8'), keep_blank_values=True))
+            resource, sign, method = params["res"], params["sign"], params.get("method", "sha1")
+            et = int(params["et"])
+            version = params.get("version", "2018-10-31")
+        except (KeyError, ValueError, UnicodeDecodeError):
+            return CONNACK_BAD_CREDENTIALS, None
+        if et < time.time() or method not in ('md5', 'sha1', 'sha256'):
+            return CONNACK_BAD_CREDENTIALS, None
+
+        keys, scope, device_name = self._keys_for(resource)
+        if device_name is not None and device_name != client_id:
+            # 设备级token只能用于该设备自己的连接
+            return CONNACK_NOT_AUTHORIZED, None
+
+        for key in keys:
+            try:
+                key_bytes = base64.b64decode(key)
+            except (binascii.Error, ValueError):
+                key_bytes = key.encode('utf-8')
+            if hmac.compare_digest(token_signature(resource, key_bytes, et, method, version), sign):
+                return CONNACK_ACCEPTED, scope
+        return CONNACK_BAD_CREDENTIALS, None
+
+    # ---------- 连接处理 ----------
+
+    async def _read_packet(self, reader, timeout):
+        header = await asyncio.wait_for(reader.readexactly(1), timeout)
+        length = 0
+        for shift in range(0, 28, 7):
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+        else:
+            raise MQTTProtocolError("剩余长度字段超过4个字节")
+        body = await reader.readexactly(length) if length else b''
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    async def _handle_client(self, reader, writer):
+        session = None
+        try:
+            packet_type, _, body = await self._read_packet(reader, 10)
+            if packet_type != CONNECT:
+                raise MQTTProtocolError("第一个报文不是CONNECT")
+            session = self._connect(body, writer)
+            if session is None:
+                await writer.drain()
+                return
+
+            timeout = session.keepalive * KEEPALIVE_GRACE if session.keepalive else None
+            while not session.closed:
+                packet_type, flags, body = await self._read_packet(reader, timeout)
+                if packet_type == DISCONNECT:
+                    session.will = None
+                    break
+                self._dispatch(session, packet_type, flags, body)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        except MQTTProtocolError as e:
+            logger.warning("客户端 %s 协议错误，关闭连接: %s", session.client_id if session else '-', e)
+        finally:
+            if session is not None:
+                self._close(session)
+            writer.close()
+
+    def _connect(self, body, writer):
+        data = _Reader(body)
+        protocol_name = data.string()
+        protocol_level = data.byte()
+        flags = data.byte()
+        keepalive = data.uint16()
+        client_id = data.string()
+
+        will = None
+        if flags & 0x04:
+            will = (data.string(), data.binary(), (flags >> 3) & 0x03, bool(flags & 0x20))
+        username = data.string() if flags & 0x80 else None
+        password = data.binary() if flags & 0x40 else None
+
+        if (protocol_name, protocol_level) not in (('MQTT', 4), ('MQIsdp', 3)):
+            writer.write(_packet(CONNACK, 0, bytes([0, CONNACK_BAD_PROTOCOL])))
+            return None
+        if not client_id:
+            client_id = f"auto-{uuid.uuid4().hex[:12]}"
+
+        rc, scope = self.authenticate(client_id, username, password)
+        if rc != CONNACK_ACCEPTED:
+            self._incr('auth_failures')
+            logger.debug("客户端 %s 鉴权失败，返回码: %s", client_id, rc)
+            writer.write(_packet(CONNACK, 0, bytes([0, rc])))
+            return None
+        if will is not None and not (scope is None or will[0].startswith(scope)):
+            writer.write(_packet(CONNACK, 0, bytes([0, CONNACK_NOT_AUTHORIZED])))
+            return None
+
+        # 相同客户端ID的旧连接被新连接踢下线
+        previous = self.sessions.get(client_id)
+        if previous is not None:
+            self._close(previous)
+            previous.writer.close()
+
+        session = _Session(client_id, writer, keepalive, scope, will)
+        self.sessions[client_id] = session
+        self._incr('connects')
+        self._stats['max_connections'] = max(self._stats['max_connections'], len(self.sessions))
+        writer.write(_packet(CONNACK, 0, bytes([0, CONNACK_ACCEPTED])))
+        return session
+
+    def _close(self, session, publish_will=True):
+        if session.closed:
+            return
+        session.closed = True
+        for topic_filter in session.subscriptions:
+            self._tree.remove(topic_filter, session)
+        session.subscriptions.clear()
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+        if publish_will and session.will is not None:
+            topic, payload, qos, retain = session.will
+            self.publish(topic, payload, min(qos, 1), retain)
+
+    def _dispatch(self, session, packet_type, flags, body):
+        if packet_type == PUBLISH:
+            self._on_publish(session, flags, body)
+        elif packet_type == PUBACK:
+            session.inflight.pop(_Reader(body).uint16(), None)
+        elif packet_type == SUBSCRIBE:
+            self._on_subscribe(session, body)
+        elif packet_type == UNSUBSCRIBE:
+            self._on_unsubscribe(session, body)
+        elif packet_type == PINGREQ:
+            session.writer.write(_packet(PINGRESP, 0))
+        else:
+            raise MQTTProtocolError(f"不支持的报文类型: {packet_type}")
+
+    def _on_publish(self, session, flags, body):
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        if qos > 1:
+            raise MQTTProtocolError("不支持QoS 2")
+
+        data = _Reader(body)
+        topic = data.string()
+        packet_id = data.uint16() if qos else None
+        payload = data.rest()
+        if not topic or '+' in topic or '#' in topic:
+            raise MQTTProtocolError(f"无效的发布主题: {topic!r}")
+
+        self._incr('messages_in')
+        if qos == 1:
+            session.writer.write(_packet(PUBACK, 0, struct.pack('!H', packet_id)))
+        if not session.allowed(topic):
+            # OneNET对越权发布会断开连接，这里只丢弃消息并计数
+            self._incr('denied')
+            return
+
+        self.publish(topic, payload, qos, retain)
+        self._platform_handle(topic, payload)
+
+    def _on_subscribe(self, session, body):
+        data = _Reader(body)
+        packet_id = data.uint16()
+        granted = bytearray()
+        retained = []
+        while data.remaining():
+            topic_filter = data.string()
+            qos = data.byte() & 0x03
+            if not valid_topic_filter(topic_filter) or not session.allowed(topic_filter):
+                self._incr('denied')
+                granted.append(SUBACK_FAILURE)
+                continue
+            qos = min(qos, 1)
+            session.subscriptions[topic_filter] = qos
+            self._tree.add(topic_filter, session, qos)
+            granted.append(qos)
+            retained.extend((topic, payload, min(qos, retained_qos))
+                            for topic, (payload, retained_qos) in self.retained.items()
+                            if topic_matches(topic_filter, topic))
+        session.writer.write(_packet(SUBACK, 0, struct.pack('!H', packet_id) + bytes(granted)))
+        for topic, payload, qos in retained:
+            self._deliver(session, topic, payload, qos, retain=True)
+
+    def _on_unsubscribe(self, session, body):
+        data = _Reader(body)
+        packet_id = data.uint16()
+        while data.remaining():
+            topic_filter = data.string()
+            if session.subscriptions.pop(topic_filter, None) is not None:
+                self._tree.remove(topic_filter, session)
+        session.writer.write(_packet(UNSUBACK, 0, struct.pack('!H', packet_id)))
+
+    # ---------- 消息转发 ----------
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """向订阅者转发消息，必须在服务线程中调用（其他线程使用 publish_threadsafe）"""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        if self.latency > 0:
+            self._loop.call_later(self.latency, self._route, topic, payload, qos)
+        else:
+            self._route(topic, payload, qos)
+
+    def publish_threadsafe(self, topic, payload, qos=0, retain=False):
+        """从其他线程发布消息"""
+        self._loop.call_soon_threadsafe(self.publish, topic, payload, qos, retain)
+
+    def _route(self, topic, payload, qos):
+        for session, granted_qos in self._tree.match(topic).items():
+            self._deliver(session, topic, payload, min(qos, granted_qos))
+
+    def _deliver(self, session, topic, payload, qos, retain=False, dup=False, packet_id=None):
+        if session.closed:
+            return
+        flags = (qos << 1) | (0x01 if retain else 0) | (0x08 if dup else 0)
+        body = _encode_string(topic)
+        if qos:
+            if packet_id is None:
+                packet_id = session.packet_id()
+            session.inflight[packet_id] = (time.monotonic(), topic, payload)
+            body += struct.pack('!H', packet_id)
+        session.writer.write(_packet(PUBLISH, flags, body + payload))
+        self._incr('messages_out')
+
+    async def _retry_loop(self):
+        """重发超时未确认的 QoS 1 消息"""
+        while True:
+            await asyncio.sleep(RETRY_INTERVAL)
+            deadline = time.monotonic() - RETRY_INTERVAL
+            for session in list(self.sessions.values()):
+                for packet_id, (sent, topic, payload) in list(session.inflight.items()):
+                    if sent <= deadline:
+                        self._incr('retransmits')
+                        self._deliver(session, topic, payload, 1, dup=True, packet_id=packet_id)
+
+    # ---------- 平台行为 ----------
+
+    def _platform_handle(self, topic, payload):
+        """设备上报和命令回复的平台侧处理"""
+        if not topic.startswith(self.topic_prefix):
+            return
+        parts = topic[len(self.topic_prefix):].split('/')
+        if len(parts) < 3:
+            return
+        device_name, kind = parts[0], '/'.join(parts[1:])
+
+        if kind.startswith('cmd/response/'):
+            future = self._pending_commands.pop((device_name, parts[-1]), None)
+            if future is not None and not future.done():
+                future.set_result(payload)
+            return
+
+        if not self.platform_replies or kind not in ('dp/post/json', 'thing/property/post'):
+            return
+        try:
+            message_id = json.loads(payload).get("id")
+        except (ValueError, AttributeError):
+            message_id = None
+        if kind == 'dp/post/json':
+            self.publish(f"{topic}/accepted", json.dumps({"id": message_id}))
+        else:
+            self.publish(f"{topic}/reply", json.dumps({"id": message_id, "code": 200, "msg": "success"}))
+
+    async def _command(self, device_name, command, timeout):
+        cmdid = uuid.uuid4().hex
+        future = self._loop.create_future()
+        self._pending_commands[(device_name, cmdid)] = future
+        payload = command if isinstance(command, (bytes, str)) else json.dumps(command, ensure_ascii=False)
+        self._incr('commands')
+        self.publish(f"{self.topic_prefix}{device_name}/cmd/request/{cmdid}", payload)
+        try:
+            reply = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._pending_commands.pop((device_name, cmdid), None)
+            self._incr('command_timeouts')
+            return None
+        self._incr('command_replies')
+        return reply
+
+    def send_command(self, device_name, command, timeout=10):
+        """模拟平台向设备下发命令并等待回复（在调用线程中阻塞）
+
+        参数:
+            device_name: 设备名称
+            command: 命令内容（dict 会编码为JSON）
+            timeout: 等待设备回复的时间（秒）
+
+        返回:
+            设备回复的内容（能解析为JSON时为解析后的对象，否则为bytes），设备不在线或超时返回None
+        """
+        if device_name not in self.sessions:
+            return None
+        reply = asyncio.run_coroutine_threadsafe(self._command(device_name, command, timeout), self._loop).result()
+        if reply is None:
+            return None
+        try:
+            return json.loads(reply)
+        except ValueError:
+            return reply
+
+    def onenet_command_handler(self, device, command):
+        """FakeOneNET 的 command_handler: 把HTTP同步命令转发给通过MQTT连接的设备"""
+        return self.send_command(device["name"], command)
+
+# 使用 MQTT_HOST / MQTT_PORT 的模块和对应的环境变量，install() 时一并修改
+MQTT_SERVER_IMPORTERS = ('mqtt_device_simulator', 'mqtt_fleet', 'mqtt_device_activator', 'mqtt_ingest')
+MQTT_SERVER_ENV = ('ONENET_MQTT_HOST', 'ONENET_MQTT_PORT')
+
+def main():
+    parser = argparse.ArgumentParser(description='OneNET MQTT服务器本地替身')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=18830, help='监听端口')
+    parser.add_argument('--no-auth', action='store_true', help='不校验token，也不限制可访问的主题')
+    parser.add_argument('--device-key', help='所有设备共用的设备密钥（base64）')
+    parser.add_argument('--latency', type=float, default=0, help='每条消息转发前的延迟（毫秒）')
+    parser.add_argument('--onenet-port', type=int, help='同时在该端口启动 fake_onenet 替身，设备密钥和同步命令与之互通')
+    parser.add_argument('--users', default='', help='在 fake_onenet 替身中预先注册设备的用户，逗号分隔')
+    args = parser.parse_args()
+
+    fake = None
+    if args.onenet_port is not None:
+        from fake_onenet import FakeOneNET
+
+        fake = FakeOneNET(args.host, args.onenet_port)
+        for username in filter(None, (name.strip() for name in args.users.split(','))):
+            fake.add_device(f"intelligent_wiper_{username}", sec_key=args.device_key)
+
+    broker = FakeMQTTBroker(args.host, args.port, auth=not args.no_auth, device_key=args.device_key,
+                            onenet=fake, latency=args.latency / 1000)
+    host, port = broker.start()
+    env = {"ONENET_MQTT_HOST": host, "ONENET_MQTT_PORT": str(port)}
+    if fake is not None:
+        fake.command_handler = broker.onenet_command_handler
+        base_url = fake.start()
+        env.update({"ONENET_API_BASE": base_url, "ONENET_API_BASE_OLD": base_url, "ONENET_CONSOLE_API_BASE": base_url})
+    print(json.dumps({"success": True, "host": host, "port": port, "env": env}, ensure_ascii=False))
+    sys.stdout.flush()
+
+    try:
+        while True:
+            time.sleep(60)
+            logger.debug("MQTT本地替身统计: %s", broker.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if fake is not None:
+            fake.stop()
+        broker.stop()
+
+if __name__ == '__main__':
+    main()
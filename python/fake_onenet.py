@@ -0,0 +1,523 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OneNET API本地替身
+
+在本进程内启动一个模拟OneNET平台的HTTP服务，用于离线测试和压测 onenet_api、onenet_sync、
+onenet_stats、onenet_http_control 等模块的并发、缓存和重试行为:
+- 设备: GET /device/list（以及客户端探测的 /device、/devices 等别名）、GET /device/detail
+- 数据点: GET /datapoint/history-datapoints、GET /datapoint/current-datapoints
+- 同步命令: POST /datapoint/synccmds，由 command_handler 模拟设备应答（默认维护每个设备的雨刷状态）
+- 物模型: GET/POST /thingmodel/...、/product/<产品ID>/thingmodel 等查询，
+  以及控制台的 /fuse/http/device/thing/model/get、/fuse/http/device/thing/property/post
+- 故障注入: 每个请求的延迟和抖动、按比例返回错误状态码（error_status 为200时返回 code 非0 的业务错误）、
+  按比例不应答直接断开连接；可以按路径单独设置（set_fault）
+- 统计: 每个路径的请求数、注入的错误和断开次数，以及同时处理中的请求数峰值（stats）
+
+历史数据默认由 synthetic_rainfall 按设备名称和日期生成，同一设备同一时刻的值在多次查询之间保持一致；
+也可以传入 datapoint_generator 自定义。
+
+在测试代码中使用:
+    with FakeOneNET(latency=0.05, error_rate=0.1) as fake:
+        fake.add_device('intelligent_wiper_user1')
+        sync_onenet_data('user1')   # 请求被 install() 指向本地替身
+        print(fake.stats())
+
+单独运行，供其他进程通过环境变量 ONENET_API_BASE / ONENET_CONSOLE_API_BASE 使用:
+    python fake_onenet.py --port 18080 --users admin,user1 --latency 50 --error-rate 0.05
+"""
+
+import sys
+import json
+import time
+import uuid
+import base64
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import synthetic_rainfall
+from log_util import get_logger
+
+logger = get_logger('fake_onenet')
+log = logger.info
+
+# OneNET请求参数中的时间格式
+ONENET_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# 物模型属性定义，与设备端和 onenet_api 使用的标识符一致
+THING_MODEL_PROPERTIES = (
+    {"identifier": "rain_info", "name": "雨量", "dataType": {"type": "float", "specs": {"unit": "mm/h"}}, "accessMode": "r"},
+    {"identifier": "wiper_control", "name": "雨刷控制", "dataType": {"type": "string"}, "accessMode": "rw"},
+    {"identifier": "wiper_status", "name": "雨刷状态", "dataType": {"type": "string"}, "accessMode": "r"}
+)
+
+# 按天生成的历史数据最多缓存的天数（每天17280条）
+_SERIES_CACHE_DAYS = 16
+
+def _format_at(timestamp):
+    """数据点时间戳，格式与OneNET返回的一致"""
+    return timestamp.strftime("%Y-%m-%d %H:%M:%S.") + f"{timestamp.microsecond // 1000:03d}"
+
+def _parse_time(value, default):
+    if not value:
+        return default
+    for fmt in (ONENET_TIME_FORMAT, "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return default
+
+class SyntheticDatapoints:
+    """默认的历史数据生成器: 按 (设备, 日期) 生成一天的5秒序列并缓存，结果与查询窗口无关
+
+    参数:
+        seed: 随机种子
+    """
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        # {(设备名称, 数据流, 日期): [(timestamp, value), ...]}，按插入顺序淘汰
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, device_name, identifier, start, end, limit):
+        points = []
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < end and len(points) < limit:
+            for timestamp, value in self._day_series(device_name, identifier, day):
+                if timestamp < start:
+                    continue
+                if timestamp > end or len(points) >= limit:
+                    break
+                points.append((timestamp, value))
+            day += timedelta(days=1)
+        return points
+
+    def _day_series(self, device_name, identifier, day):
+        key = (device_name, identifier, day.date())
+        with self._lock:
+            series = self._days.get(key)
+        if series is None:
+            seed = synthetic_rainfall.series_seed(self.seed, f"{device_name}/{identifier}/{day.date()}")
+            series = list(synthetic_rainfall.rainfall_series(day, day + timedelta(days=1), seed))
+            with self._lock:
+                self._days[key] = series
+                while len(self._days) > _SERIES_CACHE_DAYS:
+                    self._days.pop(next(iter(self._days)))
+        return series
+
+def wiper_command_handler(device, command):
+    """默认的设备应答: 处理雨刷控制和状态查询命令
+
+    参数:
+        device: 设备记录（可以在其中保存状态）
+        command: 同步命令的请求体
+
+    返回:
+        dict: 设备应答内容，返回None表示设备没有应答（超时）
+    """
+    if "wiper_control" in command:
+        device["wiper_status"] = command["wiper_control"]
+        message = f"雨刷已切换到{device['wiper_status']}模式"
+    else:
+        message = f"当前雨刷状态: {device.get('wiper_status', 'off')}"
+    return {"errno": 0, "data": {"wiper_status": device.get("wiper_status", "off"), "message": message}}
+
+class FakeOneNET:
+    """模拟OneNET平台的本地HTTP服务
+
+    参数:
+        host: 监听地址
+        port: 监听端口，0表示自动分配
+        latency: 每个请求的固定延迟（秒）
+        jitter: 在固定延迟之外再随机增加 0~jitter 秒
+        error_rate: 返回错误的请求比例（0-1）
+        error_status: 错误响应的HTTP状态码；为200时返回HTTP 200、code 非0 的业务错误
+        drop_rate: 不应答直接断开连接的请求比例（0-1）
+        seed: 故障注入和默认数据生成的随机种子
+        datapoint_generator: 历史数据生成函数 (device_name, identifier, start, end, limit) -> [(timestamp, value)]
+        command_handler: 同步命令应答函数 (device, command) -> dict 或 None
+        auto_register: 查询未注册的设备时是否自动注册
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 drop_rate=0.0, seed=0, datapoint_generator=None, command_handler=None, auto_register=True):
+        self.host = host
+        self.port = port
+        self.datapoint_generator = datapoint_generator or SyntheticDatapoints(seed)
+        self.command_handler = command_handler or wiper_command_handler
+        self.auto_register = auto_register
+        self.rng = random.Random(seed)
+        # {路径或None: 故障参数}，None为所有路径的默认值
+        self._faults = {None: {"latency": latency, "jitter": jitter, "error_rate": error_rate,
+                               "error_status": error_status, "drop_rate": drop_rate}}
+        # {设备名称: 设备记录}
+        self.devices = {}
+        self._next_device_id = 2000000001
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._previous_api_base = None
+        self.reset_stats()
+
+    # ---------- 生命周期 ----------
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """启动HTTP服务（后台线程），返回基地址"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 响应头和响应体分两次写出，不关闭Nagle算法时与客户端的延迟确认叠加，每个请求多出约40ms
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                fake._handle(self, 'GET')
+
+            def do_POST(self):
+                fake._handle(self, 'POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-onenet', daemon=True)
+        self._thread.start()
+        log(f"OneNET本地替身已启动: {self.base_url}")
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            log("OneNET本地替身已停止")
+
+    def install(self):
+        """把本进程中 onenet_api 等模块的API基地址指向本替身，并清除设备元数据缓存"""
+        import onenet_api
+        from device_cache import device_cache
+
+        self._previous_api_base = onenet_api.set_api_base(self.base_url, self.base_url, self.base_url)
+        device_cache.invalidate()
+
+    def uninstall(self):
+        """恢复 install() 之前的API基地址"""
+        if self._previous_api_base:
+            import onenet_api
+            from device_cache import device_cache
+
+            onenet_api.set_api_base(**self._previous_api_base)
+            device_cache.invalidate()
+            self._previous_api_base = None
+
+    def __enter__(self):
+        self.start()
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.uninstall()
+        self.stop()
+
+    # ---------- 配置 ----------
+
+    def set_fault(self, path=None, **fault):
+        """设置故障注入参数
+
+        参数:
+            path: 请求路径（如 '/datapoint/history-datapoints'），None表示所有路径的默认值
+            fault: latency、jitter、error_rate、error_status、drop_rate 中的任意几项
+        """
+        unknown = set(fault) - set(self._faults[None])
+        if unknown:
+            raise ValueError(f"未知的故障参数: {', '.join(sorted(unknown))}")
+        with self._lock:
+            self._faults.setdefault(path, {}).update(fault)
+
+    def clear_faults(self):
+        """清除按路径设置的故障参数，默认值恢复为无故障"""
+        with self._lock:
+            self._faults = {None: {"latency": 0.0, "jitter": 0.0, "error_rate": 0.0, "error_status": 503, "drop_rate": 0.0}}
+
+    def add_device(self, name, device_id=None, sec_key=None, online=True):
+        """注册设备
+
+        参数:
+            name: 设备名称
+            device_id: 设备ID，默认自动分配
+            sec_key: 设备密钥，默认随机生成
+            online: 是否在线，离线设备不应答同步命令
+
+        返回:
+            dict: 设备记录
+        """
+        with self._lock:
+            if device_id is None:
+                device_id = str(self._next_device_id)
+                self._next_device_id += 1
+            device = {
+                "did": str(device_id),
+                "id": str(device_id),
+                "name": name,
+                "title": name,
+                "sec_key": sec_key or base64.b64encode(self.rng.randbytes(32)).decode('ascii'),
+                "status": 1 if online else 0,
+                "create_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "wiper_status": "off",
+                "properties": {}
+            }
+            self.devices[name] = device
+        return device
+
+    def stats(self):
+        """返回各路径的请求统计和并发峰值"""
+        with self._lock:
+            return {
+                "requests": sum(stat["count"] for stat in self._stats.values()),
+                "in_flight": self._in_flight,
+                "max_in_flight": self._max_in_flight,
+                "paths": {path: dict(stat) for path, stat in self._stats.items()}
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            # {路径: {"count", "errors", "drops"}}
+            self._stats = {}
+            self._in_flight = 0
+            self._max_in_flight = 0
+
+    # ---------- 请求处理 ----------
+
+    def _fault_for(self, path):
+        with self._lock:
+            fault = dict(self._faults[None])
+            fault.update(self._faults.get(path, {}))
+        return fault
+
+    def _handle(self, handler, method):
+        url = urlsplit(handler.path)
+        path = url.path.rstrip('/') or '/'
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(handler.headers.get('Content-Length') or 0)
+        raw_body = handler.rfile.read(length) if length else b''
+
+        with self._lock:
+            stat = self._stats.setdefault(path, {"count": 0, "errors": 0, "drops": 0})
+            stat["count"] += 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+        try:
+            fault = self._fault_for(path)
+            delay = fault["latency"] + (self.rng.uniform(0, fault["jitter"]) if fault["jitter"] else 0)
+            if delay > 0:
+                time.sleep(delay)
+
+            if fault["drop_rate"] and self.rng.random() < fault["drop_rate"]:
+                with self._lock:
+                    stat["drops"] += 1
+                handler.close_connection = True
+                return
+
+            if fault["error_rate"] and self.rng.random() < fault["error_rate"]:
+                with self._lock:
+                    stat["errors"] += 1
+                status = fault["error_status"]
+                self._reply(handler, status, {"code": 10500 if status == 200 else status, "msg": "injected error",
+                                              "request_id": uuid.uuid4().hex})
+                return
+
+            try:
+                body = json.loads(raw_body) if raw_body else {}
+            except ValueError:
+                body = {}
+            status, payload = self._route(method, path, params, body)
+            payload.setdefault("request_id", uuid.uuid4().hex)
+            self._reply(handler, status, payload)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    @staticmethod
+    def _reply(handler, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _route(self, method, path, params, body):
+        """按路径分发请求，返回 (HTTP状态码, 响应体)"""
+        if path in ('/device/list', '/device', '/devices', '/devices/list') or (
+                path.startswith('/product/') and path.rsplit('/', 1)[-1] in ('device', 'devices')):
+            return 200, self._device_list(params)
+        if path == '/device/detail':
+            return 200, self._device_detail(params)
+        if path == '/datapoint/history-datapoints':
+            return 200, self._history_datapoints(params)
+        if path == '/datapoint/current-datapoints':
+            return 200, self._current_datapoints(params)
+        if path == '/datapoint/synccmds' and method == 'POST':
+            return 200, self._sync_command(params, body)
+        if path == '/fuse/http/device/thing/model/get':
+            return 200, {"errno": 0, "error": "succ", "data": {"properties": list(THING_MODEL_PROPERTIES)}}
+        if path == '/fuse/http/device/thing/property/post':
+            return 200, self._property_post(params, body)
+        if path == '/thingmodel/query-device-property':
+            return 200, self._device_properties(params)
+        if path.startswith('/thingmodel/') or (path.startswith('/product/') and
+                                               path.rsplit('/', 1)[-1] in ('thingmodel', 'model', 'properties')):
+            return 200, {"code": 0, "msg": "succ", "data": {"properties": list(THING_MODEL_PROPERTIES)}}
+        return 404, {"code": 404, "msg": f"not found: {method} {path}"}
+
+    def _device(self, name):
+        """按名称查找设备，未注册且允许自动注册时自动注册"""
+        device = self.devices.get(name)
+        if device is None and name and self.auto_register:
+            device = self.add_device(name)
+        return device
+
+    @staticmethod
+    def _public(device):
+        """设备记录中对外返回的字段"""
+        return {key: value for key, value in device.items() if key not in ("wiper_status", "properties")}
+
+    def _device_list(self, params):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        with self._lock:
+            devices = [self._public(device) for device in self.devices.values()]
+        page = devices[offset:offset + limit]
+        return {"code": 0, "msg": "succ", "data": {
+            "list": page, "devices": page, "meta": {"total": len(devices), "offset": offset, "limit": limit}
+        }}
+
+    def _device_detail(self, params):
+        device = self._device(params.get("device_name"))
+        if device is None:
+            return {"code": 10406, "msg": "device not exist"}
+        return {"code": 0, "msg": "succ", "data": self._public(device)}
+
+    def _history_datapoints(self, params):
+        device = self._device(params.get("device_name"))
+        if device is None:
+            return {"code": 10406, "msg": "device not exist"}
+        now = datetime.now()
+        start = _parse_time(params.get("start_time"), now - timedelta(hours=1))
+        end = min(_parse_time(params.get("end_time"), now), now)
+        limit = int(params.get("limit") or 100)
+        identifier = params.get("identifier") or "rain_info"
+
+        points = self.datapoint_generator(device["name"], identifier, start, end, limit)
+        if (params.get("sort") or "").upper() == "DESC":
+            points = points[::-1]
+        # 与客户端解析方式1一致: data.datapoints 为数据点列表
+        return {"code": 0, "msg": "succ", "data": {
+            "count": len(points),
+            "datapoints": [{"at": _format_at(timestamp), "value": value} for timestamp, value in points]
+        }}
+
+    def _current_datapoints(self, params):
+        device = self._device(params.get("device_name"))
+        if device is None:
+            return {"code": 10406, "msg": "device not exist"}
+        identifier = params.get("identifier") or "rain_info"
+        now = datetime.now()
+        points = self.datapoint_generator(device["name"], identifier, now - timedelta(minutes=5), now, 100000)
+        datastreams = []
+        if points:
+            timestamp, value = points[-1]
+            datastreams.append({"id": identifier, "at": _format_at(timestamp), "value": value})
+        return {"code": 0, "msg": "succ", "data": {"devices": [
+            {"id": device["did"], "title": device["name"], "datastreams": datastreams}
+        ]}}
+
+    def _sync_command(self, params, body):
+        device = self._device(params.get("device_name"))
+        if device is None:
+            return {"code": 10406, "msg": "device not exist"}
+        if not device["status"]:
+            return {"code": 10421, "msg": "device not online"}
+        reply = self.command_handler(device, body)
+        if reply is None:
+            return {"code": 10422, "msg": "device response timeout"}
+        cmd_resp = base64.b64encode(json.dumps(reply, ensure_ascii=False).encode('utf-8')).decode('ascii')
+        return {"code": 0, "msg": "succ", "data": {"cmd_uuid": uuid.uuid4().hex, "cmd_resp": cmd_resp}}
+
+    def _property_post(self, params, body):
+        # topic 格式: $sys/<产品ID>/<设备名称>/thing/property/post
+        parts = (params.get("topic") or "").split('/')
+        device = self._device(parts[2] if len(parts) > 2 else None)
+        if device is None:
+            return {"errno": 10406, "error": "device not exist"}
+        now_ms = int(time.time() * 1000)
+        for identifier, item in (body.get("params") or {}).items():
+            value = item.get("value") if isinstance(item, dict) else item
+            device["properties"][identifier] = {"value": value, "time": now_ms}
+        device["status"] = 1
+        return {"errno": 0, "error": "succ", "data": {"id": body.get("id")}}
+
+    def _device_properties(self, params):
+        device = self._device(params.get("device_name"))
+        if device is None:
+            return {"code": 10406, "msg": "device not exist"}
+        properties = []
+        for definition in THING_MODEL_PROPERTIES:
+            reported = device["properties"].get(definition["identifier"], {})
+            properties.append({
+                "identifier": definition["identifier"],
+                "name": definition["name"],
+                "value": reported.get("value"),
+                "time": reported.get("time")
+            })
+        return {"code": 0, "msg": "succ", "data": properties}
+
+def main():
+    parser = argparse.ArgumentParser(description='OneNET API本地替身')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=18080, help='监听端口')
+    parser.add_argument('--users', default='', help='预先注册设备的用户，逗号分隔（设备名为 intelligent_wiper_<用户名>）')
+    parser.add_argument('--latency', type=float, default=0, help='每个请求的固定延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='随机增加的延迟上限（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='返回错误的请求比例（0-1）')
+    parser.add_argument('--error-status', type=int, default=503, help='错误响应的HTTP状态码，200表示业务错误')
+    parser.add_argument('--drop-rate', type=float, default=0, help='直接断开连接的请求比例（0-1）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    args = parser.parse_args()
+
+    fake = FakeOneNET(args.host, args.port, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                      error_rate=args.error_rate, error_status=args.error_status, drop_rate=args.drop_rate,
+                      seed=args.seed)
+    for username in filter(None, (name.strip() for name in args.users.split(','))):
+        fake.add_device(f"intelligent_wiper_{username}")
+    base_url = fake.start()
+    print(json.dumps({"success": True, "base_url": base_url,
+                      "env": {"ONENET_API_BASE": base_url, "ONENET_API_BASE_OLD": base_url,
+                              "ONENET_CONSOLE_API_BASE": base_url}}, ensure_ascii=False))
+    sys.stdout.flush()
+
+    try:
+        while True:
+            time.sleep(60)
+            logger.debug("OneNET本地替身统计: %s", fake.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
+
+if __name__ == '__main__':
+    main()
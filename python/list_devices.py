@@ -5,9 +5,13 @@
 查看OneNET平台上的设备列表
 """
 
-import requests
-from onenet_api import generate_token, ONENET_API_BASE, PRODUCT_ID
-from rainfall_db import log
+from onenet_http import http_client
+import onenet_api
+from onenet_api import generate_token, PRODUCT_ID
+from log_util import get_logger
+
+logger = get_logger('list_devices')
+log = logger.info
 
 def list_all_devices():
     """列出所有设备"""
@@ -19,7 +23,7 @@ def list_all_devices():
             return
 
         # API端点
-        url = f"{ONENET_API_BASE}/devices"
+        url = f"{onenet_api.ONENET_API_BASE}/devices"
         
         headers = {
             "authorization": token,
@@ -34,7 +38,7 @@ def list_all_devices():
         print(f"API端点: {url}")
         print(f"产品ID: {PRODUCT_ID}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = http_client.get(url, headers=headers, params=params)
         print(f"响应状态码: {response.status_code}")
         
         if response.status_code == 200:
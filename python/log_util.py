@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+统一日志
+
+所有Python脚本共用的日志模块，基于标准库 logging，取代以前各脚本各自实现的 log() 函数:
+- 日志级别：环境变量 PYTHON_LOG_LEVEL（DEBUG/INFO/WARNING/ERROR，默认INFO），低于该级别的日志直接丢弃
+- 延迟格式化：logger.debug("OneNET API响应: %s", response_data) 只有在输出时才会格式化参数，
+  因此大对象、完整响应体应使用 %s 参数而不是 f-string
+- 按调用位置限流：同一行代码在 PYTHON_LOG_RATE_WINDOW 秒（默认10）内最多输出 PYTHON_LOG_RATE_LIMIT 条
+  （默认20，0表示不限流），超出部分丢弃并在下一个时间窗口的第一条日志中注明省略条数；WARNING及以上级别不限流
+- 缓冲输出：所有日志进入同一个缓冲区，攒够 PYTHON_LOG_BUFFER_SIZE 条（默认100）、距上次写出超过
+  PYTHON_LOG_FLUSH_INTERVAL 秒（默认1）、出现WARNING及以上级别日志或进程退出时，一次性写入stderr
+
+每行日志仍以 "LOG:" 开头，Node服务据此区分日志和脚本输出。
+
+用法:
+    from log_util import get_logger
+    logger = get_logger('onenet_sync')
+    log = logger.info
+
+    log(f"同步完成: {count} 条")
+    logger.debug("OneNET API响应: %s", response_data)
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+
+def _env_number(name, default, cast=float):
+    try:
+        return cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def _env_level(name, default=logging.INFO):
+    value = os.environ.get(name, '').strip().upper()
+    level = logging.getLevelName(value) if value else default
+    return level if isinstance(level, int) else default
+
+LOG_LEVEL = _env_level('PYTHON_LOG_LEVEL')
+
+class CallSiteRateLimiter(logging.Filter):
+    """按调用位置（文件和行号）限制日志条数
+
+    参数:
+        limit: 每个时间窗口内同一调用位置最多输出的条数，0表示不限流
+        window: 时间窗口长度（秒）
+        exempt_level: 不限流的最低级别
+    """
+
+    def __init__(self, limit=20, window=10.0, exempt_level=logging.WARNING):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.exempt_level = exempt_level
+        # {(文件, 行号): [窗口开始时间, 已输出条数, 已丢弃条数]}
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno >= self.exempt_level:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                if site is not None and site[2]:
+                    record.suppressed = site[2]
+                self._sites[key] = [now, 1, 0]
+                return True
+            if site[1] < self.limit:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+class LogFormatter(logging.Formatter):
+    """在被限流后的第一条日志后注明此前丢弃的条数"""
+
+    def format(self, record):
+        line = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            line += f" (此处省略了 {suppressed} 条重复位置的日志)"
+        return line
+
+class BufferedStderrHandler(logging.Handler):
+    """把日志缓存起来批量写入stderr的Handler
+
+    参数:
+        capacity: 缓冲区达到该条数时写出
+        flush_interval: 距上次写出超过该时间（秒）时写出，后台线程也按该间隔定期写出
+        flush_level: 达到该级别的日志立即写出
+    """
+
+    def __init__(self, capacity=100, flush_interval=1.0, flush_level=logging.WARNING):
+        super().__init__()
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._flusher = None
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        # handle() 调用 emit 时已经持有 self.lock
+        self._buffer.append(line)
+        if (len(self._buffer) >= self.capacity or record.levelno >= self.flush_level
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+        elif self._flusher is None:
+            self._start_flusher()
+
+    def flush(self):
+        self.acquire()
+        try:
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+            text = '\n'.join(self._buffer) + '\n'
+            self._buffer.clear()
+            # 每次写出时才取 sys.stderr，部分脚本会在导入后重新包装stderr的编码
+            stream = sys.stderr
+            try:
+                stream.write(text)
+            except UnicodeEncodeError:
+                stream.write(text.encode('ascii', 'replace').decode('ascii'))
+            stream.flush()
+        except Exception:
+            pass
+        finally:
+            self.release()
+
+    def _start_flusher(self):
+        """启动后台线程，空闲时也按 flush_interval 写出缓冲区中的日志"""
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                if self._buffer:
+                    self.flush()
+
+        self._flusher = threading.Thread(target=run, name='log-flusher', daemon=True)
+        self._flusher.start()
+
+# 进程内所有日志共用的限流器和缓冲写出器；进程退出时 logging.shutdown 会写出剩余日志
+_handler = BufferedStderrHandler(
+    capacity=_env_number('PYTHON_LOG_BUFFER_SIZE', 100, int),
+    flush_interval=_env_number('PYTHON_LOG_FLUSH_INTERVAL', 1.0)
+)
+_handler.setFormatter(LogFormatter('LOG: %(asctime)s %(levelname)s [%(name)s] %(message)s', datefmt='%H:%M:%S'))
+_handler.addFilter(CallSiteRateLimiter(
+    limit=_env_number('PYTHON_LOG_RATE_LIMIT', 20, int),
+    window=_env_number('PYTHON_LOG_RATE_WINDOW', 10.0)
+))
+
+def get_logger(name):
+    """获取写入共享缓冲区的logger
+
+    参数:
+        name: 日志中显示的模块名
+
+    返回:
+        logging.Logger: 已配置级别和Handler的logger
+    """
+    logger = logging.getLogger(name)
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+    return logger
+
+def flush():
+    """立即写出缓冲区中的日志"""
+    _handler.flush()
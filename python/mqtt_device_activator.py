@@ -4,6 +4,7 @@
 OneNET MQTT设备激活器 - 通过MQTT连接真正激活设备
 """
 
+import os
 import json
 import sys
 import argparse
@@ -16,6 +17,10 @@ from datetime import datetime
 import paho.mqtt.client as mqtt
 from urllib.parse import quote
 
+# OneNET MQTT服务器配置，与 mqtt_device_simulator.py 保持一致
+MQTT_HOST = os.environ.get('ONENET_MQTT_HOST', "mqtts.heclouds.com")
+MQTT_PORT = int(os.environ.get('ONENET_MQTT_PORT', 1883))
+
 class OneNETMQTTActivator:
     def __init__(self):
         self.product_id = "66eIb47012"
@@ -23,8 +28,8 @@ class OneNETMQTTActivator:
         self.device_sec_key = None  # 将从设备信息中获取
         
         # OneNET MQTT服务器配置
-        self.mqtt_host = "mqtts.heclouds.com"
-        self.mqtt_port = 1883
+        self.mqtt_host = MQTT_HOST
+        self.mqtt_port = MQTT_PORT
         self.mqtt_port_ssl = 8883
         
         self.client = None
@@ -162,7 +167,8 @@ class OneNETMQTTActivator:
             self.client.on_message = self.on_message
             
             # 设置用户名和密码
-            self.client.username_pw_set(username=device_name, password=password)
+            # OneNET要求用户名为产品ID，客户端ID为设备名称
+            self.client.username_pw_set(username=self.product_id, password=password)
             
             print(f"LOG: 连接到MQTT服务器: {self.mqtt_host}:{self.mqtt_port}")
             
@@ -182,11 +188,14 @@ class OneNETMQTTActivator:
                     break
                 time.sleep(1)
             
+            # 断开连接会触发 on_disconnect 清除连接状态，先记录激活结果
+            activated = self.connected and self.activation_success
+
             # 停止网络循环并断开连接
             self.client.loop_stop()
             self.client.disconnect()
             
-            if self.connected and self.activation_success:
+            if activated:
                 return {
                     "success": True,
                     "device_name": device_name,
@@ -3,8 +3,10 @@
 """
 MQTT设备模拟器 - 模拟真实雨刷设备的MQTT行为
 用于接收CMD命令并回复，模拟设备端的完整行为
+同时模拟大量设备见 mqtt_fleet.py
 """
 
+import os
 import json
 import time
 import argparse
@@ -12,6 +14,7 @@ import paho.mqtt.client as mqtt
 from datetime import datetime
 import random
 import threading
+from log_util import get_logger
 
 # 从配置文件导入OneNET配置
 try:
@@ -22,9 +25,9 @@ except ImportError:
     DEVICE_NAME = "test"
     ACCESS_KEY = "Rk9mVGdrQWE5dzJqWU12bzFsSFFpZWtRZDVWdTFZZlU="
 
-# MQTT服务器配置
-MQTT_HOST = "mqtts.heclouds.com"
-MQTT_PORT = 1883
+# MQTT服务器配置，可以用环境变量指向本地的MQTT服务器（如 fake_mqtt_broker.py）
+MQTT_HOST = os.environ.get('ONENET_MQTT_HOST', "mqtts.heclouds.com")
+MQTT_PORT = int(os.environ.get('ONENET_MQTT_PORT', 1883))
 MQTT_KEEPALIVE = 120
 
 # 全局变量
@@ -34,21 +37,170 @@ current_device_name = DEVICE_NAME  # 保持兼容性
 current_username = "admin"
 current_real_device_name = None     # 真实设备名称
 
-# 设备状态
-device_state = {
-    "wiper_status": "off",  # 雨刷状态：off, interval, low, high, smart
-    "battery_level": 85,    # 电池电量
-    "signal_strength": 92,  # 信号强度
-    "temperature": 25.5,    # 温度
-    "humidity": 60,         # 湿度
-    "last_update": datetime.now().isoformat(),
-    "online": True
-}
-
-def log(message):
-    """输出日志信息"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] DEVICE_SIM: {message}")
+# 雨刷控制命令的模拟执行耗时（秒），执行完成后才发送回复
+COMMAND_EXECUTION_DELAY = 0.5
+# 有效的雨刷状态
+WIPER_COMMANDS = ('off', 'interval', 'low', 'high', 'smart')
+
+class SimulatedWiper:
+    """一台模拟雨刷设备的状态和命令处理，单设备模式和 mqtt_fleet.py 的每台设备各使用一个实例
+
+    参数:
+        wiper_status: 初始雨刷状态
+        battery_level: 初始电池电量 (0-100)
+        signal_strength: 初始信号强度 (0-100)
+        execution_delay: 雨刷控制命令的执行耗时（秒）
+        rng: 随机数生成器，默认使用全局random
+    """
+
+    def __init__(self, wiper_status="off", battery_level=85, signal_strength=92,
+                 execution_delay=COMMAND_EXECUTION_DELAY, rng=None):
+        self.execution_delay = execution_delay
+        self.rng = rng or random
+        self.state = {
+            "wiper_status": wiper_status,  # 雨刷状态：off, interval, low, high, smart
+            "battery_level": battery_level,    # 电池电量
+            "signal_strength": signal_strength,  # 信号强度
+            "temperature": 25.5,    # 温度
+            "humidity": 60,         # 湿度
+            "last_update": datetime.now().isoformat(),
+            "online": True
+        }
+
+    def handle_command(self, cmd_data):
+        """处理一条命令，不等待执行完成
+
+        参数:
+            cmd_data: 命令内容
+
+        返回:
+            tuple: (回复数据, 执行耗时)，调用方应在执行耗时之后再发送回复
+        """
+        state = self.state
+        try:
+            # 更新设备最后更新时间
+            state["last_update"] = datetime.now().isoformat()
+
+            # 处理雨刷控制命令
+            if "wiper_control" in cmd_data:
+                wiper_command = cmd_data["wiper_control"]
+                command_id = cmd_data.get("command_id", "unknown")
+                user = cmd_data.get("user", "unknown")
+
+                logger.debug("执行雨刷控制命令: %s (命令ID: %s, 用户: %s)", wiper_command, command_id, user)
+
+                # 验证命令有效性
+                if wiper_command not in WIPER_COMMANDS:
+                    log(f"❌ 无效的雨刷命令: {wiper_command}")
+                    return {
+                        "errno": 1,
+                        "error": f"无效的雨刷命令: {wiper_command}",
+                        "message": f"命令必须是以下值之一: {', '.join(WIPER_COMMANDS)}",
+                        "command_id": command_id
+                    }, 0
+
+                # 模拟设备执行命令，执行耗时由调用方延迟发送回复来体现
+                old_status = state["wiper_status"]
+                state["wiper_status"] = wiper_command
+
+                logger.debug("雨刷状态已从 %s 切换到 %s", old_status, wiper_command)
+
+                return {
+                    "errno": 0,
+                    "data": {
+                        "wiper_status": wiper_command,  # 使用标准字段名
+                        "previous_status": old_status,
+                        "message": f"雨刷已切换到{get_status_text(wiper_command)}模式",
+                        "timestamp": state["last_update"],
+                        "battery_level": state["battery_level"],
+                        "signal_strength": state["signal_strength"],
+                        "command_id": command_id,
+                        "user": user
+                    }
+                }, self.execution_delay
+
+            # 处理雨刷状态查询命令
+            elif "wiper_status_query" in cmd_data:
+                command_id = cmd_data.get("command_id", "unknown")
+                user = cmd_data.get("user", "unknown")
+
+                logger.debug("处理雨刷状态查询 (命令ID: %s, 用户: %s)", command_id, user)
+
+                current_status = state["wiper_status"]
+
+                return {
+                    "errno": 0,
+                    "data": {
+                        "wiper_status": current_status,
+                        "message": f"当前雨刷状态: {get_status_text(current_status)}",
+                        "timestamp": state["last_update"],
+                        "battery_level": state["battery_level"],
+                        "signal_strength": state["signal_strength"],
+                        "command_id": command_id,
+                        "user": user
+                    }
+                }, 0
+
+            # 处理状态查询命令
+            elif "get_status" in cmd_data and cmd_data["get_status"]:
+                logger.debug("执行状态查询命令")
+
+                # 模拟一些随机变化
+                state["battery_level"] = max(10, min(100, state["battery_level"] + self.rng.randint(-2, 1)))
+                state["signal_strength"] = max(0, min(100, state["signal_strength"] + self.rng.randint(-5, 5)))
+                state["temperature"] = round(state["temperature"] + self.rng.uniform(-1, 1), 1)
+                state["humidity"] = max(0, min(100, state["humidity"] + self.rng.randint(-3, 3)))
+
+                logger.debug("当前设备状态: %s", state)
+
+                return {
+                    "errno": 0,
+                    "data": {
+                        "current_status": state["wiper_status"],
+                        "battery_level": state["battery_level"],
+                        "signal_strength": state["signal_strength"],
+                        "temperature": state["temperature"],
+                        "humidity": state["humidity"],
+                        "online": state["online"],
+                        "last_update": state["last_update"],
+                        "message": "设备状态查询成功"
+                    }
+                }, 0
+
+            # 处理未知命令
+            else:
+                log(f"⚠️ 收到未知命令: {cmd_data}")
+                return {
+                    "errno": 2,
+                    "error": "Unknown command",
+                    "message": "未知的命令类型",
+                    "received_data": cmd_data
+                }, 0
+
+        except Exception as e:
+            log(f"❌ 处理命令时出错: {e}")
+            return {
+                "errno": 3,
+                "error": "Command processing failed",
+                "message": f"命令处理失败: {str(e)}"
+            }, 0
+
+    def status_payload(self):
+        """设备上线/心跳时上报的状态数据"""
+        return {
+            "device_status": "online",
+            "wiper_status": self.state["wiper_status"],
+            "battery_level": self.state["battery_level"],
+            "signal_strength": self.state["signal_strength"],
+            "timestamp": datetime.now().isoformat()
+        }
+
+# 单设备模式下模拟的设备，device_state 保留为其状态字典的别名
+wiper = SimulatedWiper()
+device_state = wiper.state
+
+logger = get_logger('device_sim')
+log = logger.info
 
 def get_user_device_config(username):
     """根据用户名获取设备配置"""
@@ -242,10 +394,13 @@ def handle_cmd_request(topic, payload):
                 log(f"📋 解析命令数据: {cmd_data}")
                 
                 # 处理不同类型的命令
-                response_data = process_command(cmd_data)
-                
-                # 发送回复
-                send_cmd_response(cmdid, response_data)
+                response_data, delay = process_command(cmd_data)
+
+                # 执行耗时之后再发送回复，不阻塞MQTT网络线程
+                if delay > 0:
+                    threading.Timer(delay, send_cmd_response, (cmdid, response_data)).start()
+                else:
+                    send_cmd_response(cmdid, response_data)
                 
             except json.JSONDecodeError as e:
                 log(f"❌ 解析命令JSON失败: {e}")
@@ -262,120 +417,12 @@ def handle_cmd_request(topic, payload):
         log(f"❌ 处理CMD请求时出错: {e}")
 
 def process_command(cmd_data):
-    """处理具体的命令并返回响应数据"""
-    global device_state
-
-    try:
-        # 更新设备最后更新时间
-        device_state["last_update"] = datetime.now().isoformat()
-
-        # 处理雨刷控制命令
-        if "wiper_control" in cmd_data:
-            wiper_command = cmd_data["wiper_control"]
-            command_id = cmd_data.get("command_id", "unknown")
-            user = cmd_data.get("user", "unknown")
-
-            log(f"🎮 执行雨刷控制命令: {wiper_command} (命令ID: {command_id}, 用户: {user})")
+    """处理具体的命令
 
-            # 验证命令有效性
-            valid_commands = ['off', 'interval', 'low', 'high', 'smart']
-            if wiper_command not in valid_commands:
-                log(f"❌ 无效的雨刷命令: {wiper_command}")
-                return {
-                    "errno": 1,
-                    "error": f"无效的雨刷命令: {wiper_command}",
-                    "message": f"命令必须是以下值之一: {', '.join(valid_commands)}",
-                    "command_id": command_id
-                }
-
-            # 模拟设备执行命令
-            old_status = device_state["wiper_status"]
-            device_state["wiper_status"] = wiper_command
-
-            # 模拟执行延迟
-            time.sleep(0.5)
-
-            log(f"✅ 雨刷状态已从 {old_status} 切换到 {wiper_command}")
-
-            return {
-                "errno": 0,
-                "data": {
-                    "wiper_status": wiper_command,  # 使用标准字段名
-                    "previous_status": old_status,
-                    "message": f"雨刷已切换到{get_status_text(wiper_command)}模式",
-                    "timestamp": device_state["last_update"],
-                    "battery_level": device_state["battery_level"],
-                    "signal_strength": device_state["signal_strength"],
-                    "command_id": command_id,
-                    "user": user
-                }
-            }
-
-        # 处理雨刷状态查询命令
-        elif "wiper_status_query" in cmd_data:
-            command_id = cmd_data.get("command_id", "unknown")
-            user = cmd_data.get("user", "unknown")
-
-            log(f"📊 处理雨刷状态查询 (命令ID: {command_id}, 用户: {user})")
-
-            current_status = device_state["wiper_status"]
-
-            return {
-                "errno": 0,
-                "data": {
-                    "wiper_status": current_status,
-                    "message": f"当前雨刷状态: {get_status_text(current_status)}",
-                    "timestamp": device_state["last_update"],
-                    "battery_level": device_state["battery_level"],
-                    "signal_strength": device_state["signal_strength"],
-                    "command_id": command_id,
-                    "user": user
-                }
-            }
-        
-        # 处理状态查询命令
-        elif "get_status" in cmd_data and cmd_data["get_status"]:
-            log(f"📊 执行状态查询命令")
-            
-            # 模拟一些随机变化
-            device_state["battery_level"] = max(10, min(100, device_state["battery_level"] + random.randint(-2, 1)))
-            device_state["signal_strength"] = max(0, min(100, device_state["signal_strength"] + random.randint(-5, 5)))
-            device_state["temperature"] = round(device_state["temperature"] + random.uniform(-1, 1), 1)
-            device_state["humidity"] = max(0, min(100, device_state["humidity"] + random.randint(-3, 3)))
-            
-            log(f"📋 当前设备状态: {device_state}")
-            
-            return {
-                "errno": 0,
-                "data": {
-                    "current_status": device_state["wiper_status"],
-                    "battery_level": device_state["battery_level"],
-                    "signal_strength": device_state["signal_strength"],
-                    "temperature": device_state["temperature"],
-                    "humidity": device_state["humidity"],
-                    "online": device_state["online"],
-                    "last_update": device_state["last_update"],
-                    "message": "设备状态查询成功"
-                }
-            }
-        
-        # 处理未知命令
-        else:
-            log(f"⚠️ 收到未知命令: {cmd_data}")
-            return {
-                "errno": 2,
-                "error": "Unknown command",
-                "message": "未知的命令类型",
-                "received_data": cmd_data
-            }
-            
-    except Exception as e:
-        log(f"❌ 处理命令时出错: {e}")
-        return {
-            "errno": 3,
-            "error": "Command processing failed",
-            "message": f"命令处理失败: {str(e)}"
-        }
+    返回:
+        tuple: (回复数据, 执行耗时)，见 SimulatedWiper.handle_command
+    """
+    return wiper.handle_command(cmd_data)
 
 def send_cmd_response(cmdid, response_data):
     """发送CMD命令回复"""
@@ -408,13 +455,7 @@ def send_device_online_status():
 
     try:
         # 构建设备状态数据
-        status_data = {
-            "device_status": "online",
-            "wiper_status": device_state["wiper_status"],
-            "battery_level": device_state["battery_level"],
-            "signal_strength": device_state["signal_strength"],
-            "timestamp": datetime.now().isoformat()
-        }
+        status_data = wiper.status_payload()
 
         # 🔧 正确架构：发送到真实设备的数据上报主题
         topics = get_mqtt_topics(current_real_device_name)
@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MQTT设备群模拟器 - 在一个进程中模拟成千上万台雨刷设备
+
+每台设备有独立的 SimulatedWiper 状态（见 mqtt_device_simulator.py）、MQTT连接和雨量序列。
+所有连接由一个线程通过 selectors 驱动（不为每台设备启动 paho 的网络线程），
+命令回复、雨量上报、心跳和重连都放在同一个按到期时间排序的定时器堆中：
+收到命令后立即更新设备状态，在模拟的执行耗时之后再发送回复，不阻塞其他设备。
+
+设备名称为 intelligent_wiper_<用户名>（与 mqtt_ingest.py 的映射一致），雨量以
+{"id": n, "dp": {"rain_info": [{"v": 雨量, "t": 毫秒时间戳}]}} 上报到 dp/post/json。
+
+雨量序列（--rain 或配置文件中每台设备的 rain）:
+    synthetic[:种子]   synthetic_rainfall.py 的合成序列，每台设备的种子不同，离线造成的缺失点不上报
+    constant:<值>      固定雨量
+    off               不上报雨量
+
+配置文件（--profiles）为JSON，default 中的字段作用于所有设备，devices 中按用户名覆盖:
+    {"default": {"rain": "synthetic", "report_interval": 5},
+     "devices": {"fleet_0001": {"rain": "constant:8", "wiper_status": "high", "reply_delay": 2}}}
+可用字段: rain, report_interval, wiper_status, battery_level, signal_strength,
+          reply_delay, reply_jitter, reply_drop_rate
+
+运行期间每隔 --stats-interval 秒输出一次收发速率、命令数和回复延迟，结束时在stdout输出JSON汇总。
+
+使用方法:
+    python mqtt_fleet.py --devices 1000 --connect-rate 200 --duration 600
+    python mqtt_fleet.py --users admin,user1 --rain constant:2.5
+    python mqtt_fleet.py --devices 5000 --profiles fleet.json --mqtt-host 127.0.0.1 --device-key <base64密钥>
+
+每台设备占用一个socket，模拟大量设备前需要调大进程的文件描述符上限（ulimit -n）。
+"""
+
+import json
+import time
+import heapq
+import random
+import signal
+import argparse
+import itertools
+import selectors
+from datetime import datetime, timedelta
+import paho.mqtt.client as mqtt
+from log_util import get_logger
+from synthetic_rainfall import rainfall_series, series_seed
+from mqtt_device_simulator import (SimulatedWiper, PRODUCT_ID, MQTT_HOST, MQTT_PORT, MQTT_KEEPALIVE,
+                                   COMMAND_EXECUTION_DELAY)
+
+logger = get_logger('mqtt_fleet')
+log = logger.info
+
+USER_DEVICE_PREFIX = "intelligent_wiper_"
+
+# 设备配置的默认值
+DEFAULT_PROFILE = {
+    "rain": "synthetic",
+    "report_interval": 5,          # 雨量上报间隔（秒）
+    "wiper_status": "off",
+    "battery_level": 85,
+    "signal_strength": 92,
+    "reply_delay": COMMAND_EXECUTION_DELAY,  # 雨刷控制命令的执行耗时（秒）
+    "reply_jitter": 0.2,           # 执行耗时的随机波动比例
+    "reply_drop_rate": 0.0         # 不回复命令的概率，用于模拟命令超时
+}
+
+# 合成雨量序列预先覆盖的时长，超过后从当前时间重新开始
+SYNTHETIC_HORIZON = timedelta(days=30)
+# 断线重连的退避时间（秒）
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+# 保留用于计算百分位的回复延迟样本数
+LATENCY_SAMPLES = 10000
+
+def _new_client(client_id):
+    """创建MQTT客户端，paho 2.x 需要显式使用1.x的回调签名"""
+    if hasattr(mqtt, 'CallbackAPIVersion'):
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id, protocol=mqtt.MQTTv311)
+    return mqtt.Client(client_id=client_id, protocol=mqtt.MQTTv311)
+
+class SyntheticRain:
+    """按需推进的合成雨量序列，value_at() 的时间必须单调递增"""
+
+    def __init__(self, seed, interval):
+        self.seed = seed
+        self.interval = interval
+        self._series = None
+        self._pending = None
+
+    def _restart(self, now):
+        self._series = rainfall_series(now, now + SYNTHETIC_HORIZON, self.seed, self.interval)
+        self._pending = next(self._series, None)
+
+    def value_at(self, now):
+        """返回 now 所在采样间隔内的雨量，该时刻设备离线（序列缺失）时返回None"""
+        if self._series is None or self._pending is None:
+            self._restart(now)
+
+        value = None
+        while self._pending is not None and self._pending[0] <= now:
+            timestamp, point = self._pending
+            if (now - timestamp).total_seconds() < self.interval:
+                value = point
+            self._pending = next(self._series, None)
+        return value
+
+class ConstantRain:
+    def __init__(self, value):
+        self.value = value
+
+    def value_at(self, now):
+        return self.value
+
+def make_rain_source(spec, username, seed, interval):
+    """根据雨量序列描述创建雨量来源
+
+    参数:
+        spec: synthetic[:种子]、constant:<值> 或 off
+        username: 用户名，用于区分各设备的合成序列
+        seed: 全局随机种子
+        interval: 上报间隔（秒）
+
+    返回:
+        带 value_at(now) 方法的对象，spec 为 off 时返回None
+    """
+    kind, _, arg = str(spec).partition(':')
+    if kind == 'off':
+        return None
+    if kind == 'constant':
+        return ConstantRain(round(float(arg or 0), 1))
+    if kind == 'synthetic':
+        return SyntheticRain(series_seed(arg or seed, username), interval)
+    raise ValueError(f"未知的雨量序列: {spec}")
+
+def load_profiles(path):
+    """读取设备配置文件，返回 (默认配置, {用户名: 配置})"""
+    if not path:
+        return {}, {}
+    with open(path, 'r', encoding='utf-8') as f:
+        profiles = json.load(f)
+    return profiles.get("default", {}), profiles.get("devices", {})
+
+class FleetDevice:
+    """设备群中的一台设备"""
+
+    def __init__(self, username, profile, seed):
+        self.username = username
+        self.device_name = f"{USER_DEVICE_PREFIX}{username}"
+        self.profile = profile
+        self.rng = random.Random(series_seed(seed, username))
+        self.wiper = SimulatedWiper(
+            wiper_status=profile["wiper_status"],
+            battery_level=profile["battery_level"],
+            signal_strength=profile["signal_strength"],
+            execution_delay=profile["reply_delay"],
+            rng=self.rng
+        )
+        self.report_interval = float(profile["report_interval"])
+        self.rain = make_rain_source(profile["rain"], username, seed, self.report_interval)
+
+        self.client = None
+        self.sock = None
+        self.connected = False
+        self.reconnect_delay = RECONNECT_MIN_DELAY
+        self.message_id = 0
+        # 断线后作废之前安排的上报定时器
+        self.session = 0
+
+        prefix = f"$sys/{PRODUCT_ID}/{self.device_name}"
+        self.command_topic = f"{prefix}/cmd/request/+"
+        self.response_prefix = f"{prefix}/cmd/response/"
+        self.data_topic = f"{prefix}/dp/post/json"
+
+    def next_message_id(self):
+        self.message_id += 1
+        return self.message_id
+
+class FleetStats:
+    """设备群的累计计数和回复延迟样本"""
+
+    COUNTERS = ('connects', 'connect_failures', 'disconnects', 'msgs_in', 'msgs_out', 'publish_errors',
+                'data_points', 'data_gaps', 'status_msgs', 'commands', 'invalid_commands', 'replies',
+                'replies_dropped')
+
+    def __init__(self):
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.reply_latency = []
+        self._latency_index = 0
+        self.started = time.monotonic()
+        self._last_counts = dict(self.counts)
+        self._last_report = self.started
+
+    def incr(self, name, count=1):
+        self.counts[name] += count
+
+    def add_latency(self, seconds):
+        # 样本满了之后循环覆盖，保留最近的样本
+        if len(self.reply_latency) < LATENCY_SAMPLES:
+            self.reply_latency.append(seconds * 1000)
+        else:
+            self.reply_latency[self._latency_index] = seconds * 1000
+            self._latency_index = (self._latency_index + 1) % LATENCY_SAMPLES
+
+    def latency_summary(self):
+        values = sorted(self.reply_latency)
+        if not values:
+            return {}
+        pick = lambda q: round(values[min(int(len(values) * q / 100), len(values) - 1)], 1)
+        return {"p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99), "max_ms": round(values[-1], 1)}
+
+    def interval_rates(self):
+        """距上次调用以来每秒的收发消息数和命令数"""
+        now = time.monotonic()
+        elapsed = max(now - self._last_report, 1e-6)
+        rates = {
+            name: round((self.counts[name] - self._last_counts[name]) / elapsed, 1)
+            for name in ('msgs_in', 'msgs_out', 'commands', 'data_points')
+        }
+        self._last_counts = dict(self.counts)
+        self._last_report = now
+        return rates
+
+    def summary(self, connected, total):
+        elapsed = time.monotonic() - self.started
+        return {
+            "devices": total,
+            "connected": connected,
+            "elapsed_seconds": round(elapsed, 1),
+            "counts": dict(self.counts),
+            "avg_msgs_in_per_second": round(self.counts['msgs_in'] / elapsed, 1) if elapsed > 0 else 0,
+            "avg_msgs_out_per_second": round(self.counts['msgs_out'] / elapsed, 1) if elapsed > 0 else 0,
+            "reply_latency": self.latency_summary()
+        }
+
+class DeviceFleet:
+    """在一个线程中驱动所有设备的MQTT连接和定时任务
+
+    参数:
+        devices: FleetDevice 列表
+        host: MQTT服务器地址，默认为 MQTT_HOST
+        port: MQTT服务器端口，默认为 MQTT_PORT
+        keepalive: MQTT心跳间隔（秒）
+        connect_rate: 每秒新建的连接数，避免同时连接压垮服务器
+        device_key: 所有设备共用的设备密钥（base64），为空时通过OneNET API逐台获取
+        status_interval: 设备状态心跳间隔（秒），0表示只在上线时发送
+        stats_interval: 输出统计的间隔（秒）
+    """
+
+    def __init__(self, devices, host=None, port=None, keepalive=MQTT_KEEPALIVE, connect_rate=100,
+                 device_key=None, status_interval=30, stats_interval=10):
+        self.devices = devices
+        self.host = host or MQTT_HOST
+        self.port = port or MQTT_PORT
+        self.keepalive = keepalive
+        self.connect_rate = max(connect_rate, 1)
+        self.device_key = device_key
+        self.status_interval = status_interval
+        self.stats_interval = stats_interval
+
+        self.selector = selectors.DefaultSelector()
+        self.stats = FleetStats()
+        self.running = False
+        self._connected_at_stop = None
+        self._timers = []
+        self._sequence = itertools.count()
+
+    # ---------- 定时器 ----------
+
+    def schedule(self, delay, func, *args):
+        """delay 秒后在网络线程中执行 func(*args)"""
+        heapq.heappush(self._timers, (time.monotonic() + max(delay, 0), next(self._sequence), func, args))
+
+    def _run_due_timers(self):
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, func, args = heapq.heappop(self._timers)
+            try:
+                func(*args)
+            except Exception as e:
+                logger.warning("定时任务 %s 执行出错: %s", getattr(func, '__name__', func), e)
+
+    # ---------- 连接管理 ----------
+
+    def _device_token(self, device):
+        if self.device_key:
+            from onenet_token import get_token
+            return get_token(f"products/{PRODUCT_ID}/devices/{device.device_name}", self.device_key,
+                             ttl=100 * 24 * 60 * 60)
+
+        from onenet_api import get_device_key, generate_device_token
+        device_key = get_device_key(device.device_name)
+        if not device_key:
+            raise RuntimeError(f"无法获取设备 {device.device_name} 的密钥")
+        return generate_device_token(device.device_name, device_key)
+
+    def _create_client(self, device):
+        client = _new_client(device.device_name)
+        client.user_data_set(device)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        client.username_pw_set(PRODUCT_ID, self._device_token(device))
+        return client
+
+    def _connect(self, device):
+        if not self.running:
+            return
+        try:
+            if device.client is None:
+                device.client = self._create_client(device)
+                device.client.connect(self.host, self.port, self.keepalive)
+            else:
+                device.client.reconnect()
+        except Exception as e:
+            self.stats.incr('connect_failures')
+            logger.debug("设备 %s 连接失败: %s", device.device_name, e)
+            self._schedule_reconnect(device)
+
+    def _schedule_reconnect(self, device):
+        delay = device.reconnect_delay * device.rng.uniform(0.5, 1.5)
+        device.reconnect_delay = min(device.reconnect_delay * 2, RECONNECT_MAX_DELAY)
+        self.schedule(delay, self._connect, device)
+
+    def _on_connect(self, client, device, flags, rc, *args):
+        if rc != 0:
+            # 认证失败等情况服务器会关闭连接，由 _on_disconnect 安排重连
+            self.stats.incr('connect_failures')
+            logger.warning("设备 %s 连接被拒绝，返回码: %s", device.device_name, rc)
+            return
+
+        device.connected = True
+        device.reconnect_delay = RECONNECT_MIN_DELAY
+        device.session += 1
+        self.stats.incr('connects')
+        client.subscribe(device.command_topic, qos=1)
+        self._send_status(device, device.session)
+
+        # 各设备的首次上报在一个间隔内随机分布，避免同时上报
+        if device.rain is not None:
+            self.schedule(device.rng.uniform(0, device.report_interval), self._report_rain, device, device.session)
+
+    def _on_disconnect(self, client, device, rc, *args):
+        if device.connected:
+            device.connected = False
+            self.stats.incr('disconnects')
+        if self.running:
+            self._schedule_reconnect(device)
+
+    # ---------- 套接字事件（paho外部事件循环接口） ----------
+
+    def _on_socket_open(self, client, device, sock):
+        device.sock = sock
+        self.selector.register(sock, selectors.EVENT_READ, device)
+
+    def _on_socket_close(self, client, device, sock):
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        device.sock = None
+
+    def _on_socket_register_write(self, client, device, sock):
+        try:
+            self.selector.modify(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, device)
+        except (KeyError, ValueError):
+            pass
+
+    def _on_socket_unregister_write(self, client, device, sock):
+        try:
+            self.selector.modify(sock, selectors.EVENT_READ, device)
+        except (KeyError, ValueError):
+            pass
+
+    def _loop_misc(self):
+        """处理所有连接的MQTT心跳和超时检测"""
+        for device in self.devices:
+            if device.sock is not None:
+                device.client.loop_misc()
+        self.schedule(1, self._loop_misc)
+
+    # ---------- 消息 ----------
+
+    def _publish(self, device, topic, payload, qos=0):
+        result = device.client.publish(topic, json.dumps(payload, ensure_ascii=False), qos=qos)
+        if result.rc == mqtt.MQTT_ERR_SUCCESS:
+            self.stats.incr('msgs_out')
+            return True
+        self.stats.incr('publish_errors')
+        return False
+
+    def _on_message(self, client, device, msg):
+        self.stats.incr('msgs_in')
+        if '/cmd/request/' not in msg.topic:
+            return
+
+        received = time.monotonic()
+        cmdid = msg.topic.rsplit('/', 1)[-1]
+        self.stats.incr('commands')
+        try:
+            cmd_data = json.loads(msg.payload.decode('utf-8'))
+            response, delay = device.wiper.handle_command(cmd_data)
+        except (ValueError, UnicodeDecodeError):
+            self.stats.incr('invalid_commands')
+            response, delay = {"errno": 1, "error": "Invalid JSON format", "message": "命令格式错误"}, 0
+
+        if device.rng.random() < device.profile["reply_drop_rate"]:
+            self.stats.incr('replies_dropped')
+            return
+
+        jitter = device.profile["reply_jitter"]
+        if delay > 0 and jitter > 0:
+            delay *= device.rng.uniform(1 - jitter, 1 + jitter)
+        self.schedule(delay, self._send_reply, device, cmdid, response, received, device.session)
+
+    def _send_reply(self, device, cmdid, response, received, session):
+        if not device.connected or device.session != session:
+            # 回复前连接已经断开，OneNET侧会按命令超时处理
+            self.stats.incr('replies_dropped')
+            return
+        if self._publish(device, device.response_prefix + cmdid, response, qos=1):
+            self.stats.incr('replies')
+            self.stats.add_latency(time.monotonic() - received)
+
+    def _send_status(self, device, session):
+        if not device.connected or device.session != session:
+            return
+        if self._publish(device, device.data_topic, device.wiper.status_payload(), qos=1):
+            self.stats.incr('status_msgs')
+        if self.status_interval > 0:
+            self.schedule(self.status_interval, self._send_status, device, session)
+
+    def _report_rain(self, device, session):
+        if not device.connected or device.session != session:
+            return
+        now = datetime.now()
+        value = device.rain.value_at(now)
+        if value is None:
+            self.stats.incr('data_gaps')
+        else:
+            payload = {"id": device.next_message_id(),
+                       "dp": {"rain_info": [{"v": value, "t": int(now.timestamp() * 1000)}]}}
+            if self._publish(device, device.data_topic, payload):
+                self.stats.incr('data_points')
+        self.schedule(device.report_interval, self._report_rain, device, session)
+
+    # ---------- 统计 ----------
+
+    def connected_count(self):
+        return sum(1 for device in self.devices if device.connected)
+
+    def _report_stats(self):
+        rates = self.stats.interval_rates()
+        counts = self.stats.counts
+        log(f"📊 在线 {self.connected_count()}/{len(self.devices)}，"
+            f"收 {rates['msgs_in']}/s，发 {rates['msgs_out']}/s，命令 {rates['commands']}/s，"
+            f"数据点 {rates['data_points']}/s，连接失败 {counts['connect_failures']}，断开 {counts['disconnects']}，"
+            f"回复延迟 {self.stats.latency_summary()}")
+        self.schedule(self.stats_interval, self._report_stats)
+
+    def summary(self):
+        connected = self.connected_count() if self._connected_at_stop is None else self._connected_at_stop
+        return self.stats.summary(connected, len(self.devices))
+
+    # ---------- 主循环 ----------
+
+    def run(self, duration=None):
+        """运行设备群直到 stop() 被调用或达到 duration 秒
+
+        返回:
+            dict: 运行统计汇总
+        """
+        self.running = True
+        deadline = time.monotonic() + duration if duration else None
+
+        # 按连接速率依次建立连接
+        for index, device in enumerate(self.devices):
+            self.schedule(index / self.connect_rate, self._connect, device)
+        self.schedule(1, self._loop_misc)
+        if self.stats_interval > 0:
+            self.schedule(self.stats_interval, self._report_stats)
+
+        log(f"🚀 设备群启动: {len(self.devices)} 台设备，服务器 {self.host}:{self.port}，"
+            f"每秒新建 {self.connect_rate} 个连接")
+
+        try:
+            while self.running:
+                if deadline and time.monotonic() >= deadline:
+                    break
+                self._run_due_timers()
+
+                timeout = 1.0
+                if self._timers:
+                    timeout = min(timeout, max(self._timers[0][0] - time.monotonic(), 0))
+                if not self.selector.get_map():
+                    time.sleep(timeout)
+                    continue
+
+                for key, mask in self.selector.select(timeout):
+                    client = key.data.client
+                    if mask & selectors.EVENT_READ:
+                        client.loop_read()
+                    # 读取时连接可能已经关闭
+                    if mask & selectors.EVENT_WRITE and key.data.sock is not None:
+                        client.loop_write()
+        finally:
+            self._shutdown()
+
+        return self.summary()
+
+    def stop(self):
+        self.running = False
+
+    def _shutdown(self):
+        self.running = False
+        self._connected_at_stop = self.connected_count()
+        for device in self.devices:
+            if device.client is not None and device.sock is not None:
+                try:
+                    device.client.disconnect()
+                    device.client.loop_write()
+                except Exception:
+                    pass
+        self.selector.close()
+        log(f"🛑 设备群已停止，停止前在线 {self._connected_at_stop} 台")
+
+def build_fleet_devices(usernames, default_profile=None, device_profiles=None, seed=0):
+    """为每个用户创建一台模拟设备
+
+    参数:
+        usernames: 用户名列表
+        default_profile: 作用于所有设备的配置，覆盖 DEFAULT_PROFILE
+        device_profiles: {用户名: 配置}，覆盖默认配置
+        seed: 全局随机种子
+
+    返回:
+        list: FleetDevice 列表
+    """
+    device_profiles = device_profiles or {}
+    devices = []
+    for username in usernames:
+        profile = dict(DEFAULT_PROFILE)
+        profile.update(default_profile or {})
+        profile.update(device_profiles.get(username, {}))
+        devices.append(FleetDevice(username, profile, seed))
+    return devices
+
+def _fleet_usernames(args):
+    if args.users:
+        return [name.strip() for name in args.users.split(',') if name.strip()]
+    return [f"{args.user_prefix}{index:04d}" for index in range(1, args.devices + 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description='MQTT设备群模拟器 - 在一个进程中模拟大量雨刷设备')
+    parser.add_argument('--devices', type=int, default=100, help='模拟的设备数量（未指定 --users 时）')
+    parser.add_argument('--user-prefix', default='fleet_', help='设备用户名前缀，设备名为 intelligent_wiper_<前缀><序号>')
+    parser.add_argument('--users', default='', help='指定用户名，逗号分隔，覆盖 --devices')
+    parser.add_argument('--profiles', help='设备配置JSON文件')
+    parser.add_argument('--rain', help='默认雨量序列: synthetic[:种子]、constant:<值> 或 off')
+    parser.add_argument('--report-interval', type=float, help='默认雨量上报间隔（秒）')
+    parser.add_argument('--reply-delay', type=float, help='默认雨刷控制命令执行耗时（秒）')
+    parser.add_argument('--reply-drop-rate', type=float, help='默认不回复命令的概率')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--mqtt-host', default=MQTT_HOST, help='MQTT服务器地址')
+    parser.add_argument('--mqtt-port', type=int, default=MQTT_PORT, help='MQTT服务器端口')
+    parser.add_argument('--keepalive', type=int, default=MQTT_KEEPALIVE, help='MQTT心跳间隔（秒）')
+    parser.add_argument('--device-key', help='所有设备共用的设备密钥（base64），默认通过OneNET API逐台获取')
+    parser.add_argument('--connect-rate', type=float, default=100, help='每秒新建的连接数')
+    parser.add_argument('--status-interval', type=float, default=30, help='设备状态心跳间隔（秒），0表示只在上线时发送')
+    parser.add_argument('--stats-interval', type=float, default=10, help='输出统计的间隔（秒），0表示不输出')
+    parser.add_argument('--duration', type=float, default=0, help='运行时长（秒），0表示一直运行到Ctrl+C')
+    args = parser.parse_args()
+
+    default_profile, device_profiles = load_profiles(args.profiles)
+    overrides = {'rain': args.rain, 'report_interval': args.report_interval,
+                 'reply_delay': args.reply_delay, 'reply_drop_rate': args.reply_drop_rate}
+    default_profile.update({key: value for key, value in overrides.items() if value is not None})
+
+    try:
+        devices = build_fleet_devices(_fleet_usernames(args), default_profile, device_profiles, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    fleet = DeviceFleet(devices, host=args.mqtt_host, port=args.mqtt_port, keepalive=args.keepalive,
+                        connect_rate=args.connect_rate, device_key=args.device_key,
+                        status_interval=args.status_interval, stats_interval=args.stats_interval)
+
+    signal.signal(signal.SIGINT, lambda signum, frame: fleet.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: fleet.stop())
+
+    summary = fleet.run(args.duration or None)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
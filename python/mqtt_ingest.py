@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OneNET MQTT推送数据接入
+
+订阅设备的数据点上报主题和物模型属性上报主题，收到消息后按用户缓冲，
+定期通过 bulk_insert_raw_rainfall 批量写入 rainfall_raw，新数据不再需要等待下一次HTTP轮询。
+
+订阅的主题（device 为设备名称，不指定设备时使用 + 通配符订阅产品下所有设备）:
+    $sys/{PRODUCT_ID}/{device}/dp/post/json          数据点上报
+    $sys/{PRODUCT_ID}/{device}/thing/property/post   物模型属性上报
+
+HTTP轮询只作为补漏：每隔 --reconcile-interval 秒，通过 sync_scheduler 调度器对每个用户
+拉取最近 --reconcile-window 时间范围的历史数据（onenet_sync.backfill_raw_data），
+依赖 (username, timestamp) 唯一键跳过已经通过MQTT写入的数据点。
+不指定 --users 时补漏所有已注册的用户，运行中从上报主题中发现的新用户也会加入补漏。
+
+写入数据库失败的数据点放回缓冲区，下次写入时重试；单个用户缓冲超过 --max-buffer 个数据点时丢弃最早的，
+丢弃的数据由HTTP补漏同步写入。
+
+使用方法:
+    python mqtt_ingest.py --users admin,user1
+    python mqtt_ingest.py --mqtt-host 127.0.0.1 --mqtt-port 1883 --reconcile-interval 300
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import traceback
+from datetime import datetime
+import paho.mqtt.client as mqtt
+from rainfall_db import bulk_insert_raw_rainfall, aggregate_data
+from log_util import get_logger
+from onenet_api import PRODUCT_ID, DEVICE_NAME, generate_user_level_token
+
+logger = get_logger('mqtt_ingest')
+log = logger.info
+
+# OneNET MQTT服务器配置，与 mqtt_device_simulator.py 保持一致
+MQTT_HOST = os.environ.get('ONENET_MQTT_HOST', "mqtts.heclouds.com")
+MQTT_PORT = int(os.environ.get('ONENET_MQTT_PORT', 1883))
+MQTT_KEEPALIVE = 120
+
+# 雨量数据流/属性标识
+RAINFALL_IDENTIFIER = "rain_info"
+
+# 用户专用设备名称前缀，见 onenet_api.get_user_device_config
+USER_DEVICE_PREFIX = "intelligent_wiper_"
+
+def device_topics(device_name, product_id=PRODUCT_ID):
+    """设备的数据上报主题，device_name为'+'时匹配产品下所有设备"""
+    return [
+        f"$sys/{product_id}/{device_name}/dp/post/json",
+        f"$sys/{product_id}/{device_name}/thing/property/post"
+    ]
+
+def device_to_username(device_name):
+    """根据设备名称推断用户名，无法识别的设备返回None"""
+    if device_name.startswith(USER_DEVICE_PREFIX):
+        return device_name[len(USER_DEVICE_PREFIX):] or None
+    if device_name == DEVICE_NAME:
+        # 原始test设备属于admin，见 onenet_api.get_user_device_config
+        return 'admin'
+    return None
+
+def _parse_point_time(value, received_at):
+    """解析数据点时间：毫秒/秒时间戳或时间字符串，缺失或无法解析时使用接收时间"""
+    if value is None:
+        return received_at
+    if isinstance(value, (int, float)):
+        # 大于1e12的视为毫秒时间戳
+        return datetime.fromtimestamp(value / 1000 if value > 1e12 else value)
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ"):
+        try:
+            return datetime.strptime(str(value), fmt)
+        except ValueError:
+            continue
+    return received_at
+
+def parse_datapoint_message(topic, payload, received_at=None, identifier=RAINFALL_IDENTIFIER):
+    """解析数据上报消息
+
+    支持两种格式:
+        dp/post/json:          {"id": 1, "dp": {"rain_info": [{"v": 1.2, "t": 1700000000000}]}}
+        thing/property/post:   {"id": "1", "params": {"rain_info": {"value": 1.2, "time": 1700000000000}}}
+
+    参数:
+        topic: MQTT主题
+        payload: 消息内容（bytes或str）
+        received_at: 接收时间，数据点没有时间时使用
+        identifier: 雨量数据流/属性标识
+
+    返回:
+        tuple: (设备名称, [(timestamp, rainfall_value), ...])，主题不匹配时设备名称为None
+    """
+    # rainfall_raw.timestamp 精确到秒
+    received_at = received_at or datetime.now().replace(microsecond=0)
+    parts = topic.split('/')
+    # $sys/{pid}/{device}/dp/post/json 或 $sys/{pid}/{device}/thing/property/post
+    if len(parts) < 6 or parts[0] != '$sys':
+        return None, []
+    device_name = parts[2]
+
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    message = json.loads(payload)
+
+    points = []
+    if 'dp' in message:
+        values = message['dp'].get(identifier) or []
+        if isinstance(values, dict):
+            values = [values]
+        for item in values:
+            points.append((_parse_point_time(item.get('t'), received_at), float(item['v'])))
+    elif 'params' in message:
+        item = message['params'].get(identifier)
+        if isinstance(item, dict) and 'value' in item:
+            points.append((_parse_point_time(item.get('time'), received_at), float(item['value'])))
+        elif isinstance(item, (int, float)):
+            points.append((received_at, float(item)))
+    return device_name, points
+
+class MqttIngestor:
+    """订阅多个设备的数据上报主题，按用户缓冲后批量写入数据库
+
+    参数:
+        host, port: MQTT服务器地址，默认为 MQTT_HOST / MQTT_PORT
+        username, password: MQTT认证信息
+        devices: 订阅的设备名称列表，None表示用通配符订阅产品下所有设备
+        flush_interval: 缓冲数据写入数据库的间隔（秒）
+        batch_size: 单个用户缓冲的数据点达到该数量时立即写入
+        aggregate_interval: 同一用户两次数据聚合的最小间隔（秒）
+        max_buffer: 写入失败时单个用户最多保留的缓冲数据点数，超过时丢弃最早的
+        on_new_user: 首次收到某个用户的数据时调用的函数，参数为用户名（如加入HTTP补漏）
+    """
+
+    def __init__(self, host=None, port=None, username=PRODUCT_ID, password=None,
+                 devices=None, flush_interval=1.0, batch_size=500, aggregate_interval=10,
+                 max_buffer=50000, on_new_user=None):
+        self.host = host or MQTT_HOST
+        self.port = port or MQTT_PORT
+        self.devices = set(devices) if devices else None
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.aggregate_interval = aggregate_interval
+        self.max_buffer = max_buffer
+        self.on_new_user = on_new_user
+
+        # {用户名: [(timestamp, rainfall_value), ...]}
+        self._buffer = {}
+        self._buffer_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._last_aggregated = {}
+        self._seen_users = set()
+        self._running = False
+        self._flush_thread = None
+
+        self.stats = {"messages": 0, "points": 0, "inserted": 0, "skipped": 0,
+                      "invalid": 0, "unknown_device": 0, "flushes": 0, "failed_writes": 0, "dropped": 0}
+
+        self.client = mqtt.Client(client_id=f"rainfall_ingest_{int(time.time())}", protocol=mqtt.MQTTv311)
+        self.client.username_pw_set(username, password)
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+
+    def start(self):
+        """连接MQTT服务器并启动写入线程"""
+        self._running = True
+        self._flush_thread = threading.Thread(target=self._flush_loop, name='mqtt-ingest-flush', daemon=True)
+        self._flush_thread.start()
+
+        log(f"连接MQTT服务器: {self.host}:{self.port}")
+        self.client.connect(self.host, self.port, MQTT_KEEPALIVE)
+        self.client.loop_start()
+
+    def stop(self):
+        """断开连接，并写入剩余的缓冲数据"""
+        self._running = False
+        self.client.loop_stop()
+        self.client.disconnect()
+        self._flush_event.set()
+        if self._flush_thread:
+            self._flush_thread.join()
+        self.flush()
+        with self._buffer_lock:
+            remaining = sum(len(points) for points in self._buffer.values())
+        if remaining:
+            log(f"退出时仍有 {remaining} 个数据点未能写入，由HTTP补漏同步写入")
+        log(f"MQTT数据接入已停止: {self.stats}")
+
+    def add_device(self, device_name):
+        """运行中增加订阅的设备"""
+        if self.devices is None:
+            return
+        self.devices.add(device_name)
+        for topic in device_topics(device_name):
+            self.client.subscribe(topic, qos=1)
+        log(f"已订阅设备 {device_name} 的数据上报主题")
+
+    def remove_device(self, device_name):
+        """运行中取消订阅设备"""
+        if self.devices is None or device_name not in self.devices:
+            return
+        self.devices.discard(device_name)
+        for topic in device_topics(device_name):
+            self.client.unsubscribe(topic)
+        log(f"已取消订阅设备 {device_name} 的数据上报主题")
+
+    def on_connect(self, client, userdata, flags, rc, *args):
+        if rc != 0:
+            log(f"连接MQTT服务器失败，返回码: {rc}")
+            return
+        # 重连后需要重新订阅
+        names = sorted(self.devices) if self.devices is not None else ['+']
+        topics = [(topic, 1) for name in names for topic in device_topics(name)]
+        if topics:
+            client.subscribe(topics)
+        log(f"已连接MQTT服务器，订阅 {len(topics)} 个主题")
+
+    def on_disconnect(self, client, userdata, rc, *args):
+        if rc != 0:
+            log(f"与MQTT服务器意外断开，返回码: {rc}，将自动重连；断开期间的数据由HTTP补漏同步写入")
+
+    def on_message(self, client, userdata, msg):
+        """收到数据上报消息，解析后放入对应用户的缓冲区"""
+        self.stats["messages"] += 1
+        try:
+            device_name, points = parse_datapoint_message(msg.topic, msg.payload)
+        except Exception as e:
+            self.stats["invalid"] += 1
+            log(f"解析MQTT消息失败，主题: {msg.topic}，错误: {str(e)}")
+            return
+
+        if not points:
+            return
+        username = device_to_username(device_name) if device_name else None
+        if username is None:
+            self.stats["unknown_device"] += 1
+            log(f"无法识别设备 {device_name} 对应的用户，忽略数据")
+            return
+
+        with self._buffer_lock:
+            buffered = self._buffer.setdefault(username, [])
+            buffered.extend(points)
+            self.stats["points"] += len(points)
+            # 只在刚达到批量大小时触发写入；写入失败放回的数据由定时写入重试，避免每条消息都重试
+            if len(buffered) - len(points) < self.batch_size <= len(buffered):
+                self._flush_event.set()
+            new_user = username not in self._seen_users
+            self._seen_users.add(username)
+
+        if new_user and self.on_new_user:
+            try:
+                self.on_new_user(username)
+            except Exception as e:
+                log(f"处理新用户 {username} 失败: {str(e)}")
+
+    def _requeue(self, username, points):
+        """写入失败的数据点放回缓冲区（排在新收到的数据之前），超过 max_buffer 时丢弃最早的"""
+        with self._buffer_lock:
+            buffered = points + self._buffer.get(username, [])
+            dropped = max(len(buffered) - self.max_buffer, 0)
+            self._buffer[username] = buffered[dropped:]
+            self.stats["dropped"] += dropped
+        return dropped
+
+    def flush(self):
+        """把所有用户的缓冲数据批量写入数据库，并按间隔触发数据聚合"""
+        with self._buffer_lock:
+            buffer, self._buffer = self._buffer, {}
+        if not buffer:
+            return
+
+        self.stats["flushes"] += 1
+        now = time.time()
+        items = list(buffer.items())
+        # 已处理（写入成功或已放回缓冲区）的用户数，出现意外异常时其余用户的数据在 finally 中放回缓冲区
+        handled = 0
+        try:
+            for username, points in items:
+                try:
+                    result = bulk_insert_raw_rainfall(username, points)
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
+                handled += 1
+                if not result['success']:
+                    self.stats["failed_writes"] += 1
+                    dropped = self._requeue(username, points)
+                    log(f"写入用户 {username} 的 {len(points)} 个MQTT数据点失败: {result.get('error')}，已放回缓冲区等待重试"
+                        + (f"，缓冲区已满，丢弃最早的 {dropped} 个数据点，由HTTP补漏同步写入" if dropped else ""))
+                    continue
+                self.stats["inserted"] += result['inserted_count']
+                self.stats["skipped"] += result['skipped_count']
+
+                if result['inserted_count'] and now - self._last_aggregated.get(username, 0) >= self.aggregate_interval:
+                    self._last_aggregated[username] = now
+                    aggregate_data(username)
+        finally:
+            for username, points in items[handled:]:
+                self._requeue(username, points)
+
+    def _flush_loop(self):
+        while self._running:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log(f"写入MQTT缓冲数据出错: {str(e)}")
+                log(traceback.format_exc())
+
+def main():
+    parser = argparse.ArgumentParser(description='OneNET MQTT推送数据接入（HTTP轮询仅用于补漏）')
+    parser.add_argument('--users', default='', help='要接入的用户名，多个用户用逗号分隔；为空时订阅产品下所有设备')
+    parser.add_argument('--mqtt-host', default=MQTT_HOST, help='MQTT服务器地址')
+    parser.add_argument('--mqtt-port', type=int, default=MQTT_PORT, help='MQTT服务器端口')
+    parser.add_argument('--mqtt-username', default=PRODUCT_ID, help='MQTT用户名，默认为产品ID')
+    parser.add_argument('--mqtt-password', default=None, help='MQTT密码，默认使用用户级token')
+    parser.add_argument('--flush-interval', type=float, default=1.0, help='批量写入间隔（秒）')
+    parser.add_argument('--reconcile-interval', type=float, default=300, help='HTTP补漏同步间隔（秒），0表示不补漏')
+    parser.add_argument('--reconcile-window', default='10m', help='每次补漏拉取的时间范围，如10m、1h')
+    parser.add_argument('--max-buffer', type=int, default=50000,
+                        help='写入失败时单个用户最多保留的缓冲数据点数，超过时丢弃最早的（由HTTP补漏同步写入）')
+
+    args = parser.parse_args()
+
+    usernames = [u.strip() for u in args.users.split(',') if u.strip()]
+    devices = None
+    if usernames:
+        from onenet_api import get_user_device_config
+        devices = [get_user_device_config(username)['device_name'] for username in usernames]
+
+    scheduler = None
+    if args.reconcile_interval > 0:
+        from sync_scheduler import SyncScheduler
+        from onenet_sync import backfill_raw_data
+        scheduler = SyncScheduler(lambda username: backfill_raw_data(username, args.reconcile_window),
+                                  default_interval=args.reconcile_interval)
+        scheduler.start()
+        reconcile_users = usernames
+        if not reconcile_users:
+            # 通配符订阅时补漏所有已注册的用户，之后从上报主题中发现的用户由 on_new_user 加入
+            from db_service import get_all_users
+            result = get_all_users()
+            if result.get("success"):
+                reconcile_users = [user['username'] for user in result["users"]]
+            else:
+                log(f"获取用户列表失败: {result.get('error')}，只补漏收到过MQTT数据的用户")
+        for username in reconcile_users:
+            scheduler.add_user(username)
+        log(f"HTTP补漏同步已启动，间隔: {args.reconcile_interval}秒，范围: {args.reconcile_window}，"
+            f"用户数: {len(reconcile_users)}")
+
+    password = args.mqtt_password or generate_user_level_token()
+    ingestor = MqttIngestor(args.mqtt_host, args.mqtt_port, args.mqtt_username, password,
+                            devices=devices, flush_interval=args.flush_interval, max_buffer=args.max_buffer,
+                            on_new_user=scheduler.add_user if scheduler else None)
+    ingestor.start()
+
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(ingestor.stats, ensure_ascii=False))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        log("收到中断信号，停止MQTT数据接入")
+    finally:
+        ingestor.stop()
+        if scheduler:
+            scheduler.stop()
+
+if __name__ == "__main__":
+    main()
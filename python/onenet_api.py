@@ -1,24 +1,29 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
 import sys
 import json
 import traceback
 import io
 import requests
-import base64
-import hmac
+from onenet_http import http_client
 import time
 from datetime import datetime, timedelta
 import argparse
 import random
-from urllib.parse import quote
-from rainfall_db import log, get_rainfall_level
+from rainfall_db import get_rainfall_level
+from log_util import get_logger
+from device_cache import device_cache
+from onenet_token import get_token
 
-# OneNET平台API配置
-ONENET_API_BASE = "https://iot-api.heclouds.com"  # 新版API基地址（用于获取数据）
-ONENET_API_BASE_OLD = "http://api.heclouds.com"   # 旧版API基地址（用于创建数据流）
-ONENET_CONSOLE_API_BASE = "https://open.iot.10086.cn"  # 控制台API基地址（用于管理操作）
+logger = get_logger('onenet_api')
+log = logger.info
+
+# OneNET平台API配置，可以用同名环境变量指向其他地址（如 fake_onenet.py 启动的本地替身）
+ONENET_API_BASE = os.environ.get('ONENET_API_BASE', "https://iot-api.heclouds.com").rstrip('/')  # 新版API基地址（用于获取数据）
+ONENET_API_BASE_OLD = os.environ.get('ONENET_API_BASE_OLD', "http://api.heclouds.com").rstrip('/')   # 旧版API基地址（用于创建数据流）
+ONENET_CONSOLE_API_BASE = os.environ.get('ONENET_CONSOLE_API_BASE', "https://open.iot.10086.cn").rstrip('/')  # 控制台API基地址（用于管理操作）
 
 # TODO: 【必填】替换为实际的产品ID，在OneNET平台的产品详情页获取
 PRODUCT_ID = "66eIb47012"
@@ -33,6 +38,36 @@ USER_ID = "364732"
 # TODO: 【必填】用户级AccessKey，用于HTTP同步命令API的用户级鉴权
 USER_ACCESS_KEY = "jzp3gWxwCon3TJaNg7en+/npRN9At0/a1qx16BnnJW8RjJwjgCX87qljUfJnQXB5"
 
+def set_api_base(api_base=None, old_api_base=None, console_api_base=None):
+    """在运行中切换OneNET API基地址，用于把本进程的请求指向本地替身
+
+    其他模块需要在请求时通过 onenet_api.ONENET_API_BASE 读取基地址，
+    用 from onenet_api import ONENET_API_BASE 保存的副本不会随本函数更新
+
+    参数:
+        api_base: 新版API基地址，None表示不修改
+        old_api_base: 旧版API基地址，None表示不修改
+        console_api_base: 控制台API基地址，None表示不修改
+
+    返回:
+        dict: 切换前的三个基地址，可以原样传回本函数恢复
+    """
+    global ONENET_API_BASE, ONENET_API_BASE_OLD, ONENET_CONSOLE_API_BASE
+    previous = {
+        "api_base": ONENET_API_BASE,
+        "old_api_base": ONENET_API_BASE_OLD,
+        "console_api_base": ONENET_CONSOLE_API_BASE
+    }
+    if api_base:
+        ONENET_API_BASE = api_base.rstrip('/')
+    if old_api_base:
+        ONENET_API_BASE_OLD = old_api_base.rstrip('/')
+    if console_api_base:
+        ONENET_CONSOLE_API_BASE = console_api_base.rstrip('/')
+
+    log(f"OneNET API基地址: {ONENET_API_BASE}, 旧版: {ONENET_API_BASE_OLD}, 控制台: {ONENET_CONSOLE_API_BASE}")
+    return previous
+
 def get_user_datastream_id(username):
     """根据用户名生成数据流ID
 
@@ -50,7 +85,7 @@ def get_user_datastream_id(username):
     return f"rain_info_{username}"
 
 def get_device_id_by_name(device_name):
-    """根据设备名称查询设备ID
+    """根据设备名称查询设备ID，结果按设备名称缓存（见 device_cache.py）
 
     参数:
         device_name: 设备名称
@@ -58,12 +93,36 @@ def get_device_id_by_name(device_name):
     返回:
         str: 设备ID，如果未找到返回None
     """
+    hit, device_id = device_cache.get(device_name, 'device_id')
+    if hit:
+        log(f"使用缓存的设备ID: {device_name} -> {device_id}")
+        return device_id
+
+    device_ids, listed = _query_device_ids(device_name)
+    device_id = device_ids.get(device_name)
+    # 只有成功获取过设备列表时才缓存，网络错误等情况不做负缓存
+    if listed:
+        device_cache.set_many(device_ids, 'device_id')
+        device_cache.set(device_name, 'device_id', device_id)
+    return device_id
+
+def _query_device_ids(device_name):
+    """查询设备列表，直到找到指定设备
+
+    参数:
+        device_name: 目标设备名称
+
+    返回:
+        tuple: ({设备名称: 设备ID}, 是否成功获取过设备列表)
+    """
+    device_ids = {}
+    listed = False
     try:
         # 生成token
         token = generate_token()
         if not token:
             log(f"无法生成token，无法查询设备 {device_name}")
-            return None
+            return device_ids, listed
 
         # 查询产品下的所有设备 - 尝试多个可能的API端点
         api_endpoints = [
@@ -86,7 +145,7 @@ def get_device_id_by_name(device_name):
         for url in api_endpoints:
             log(f"尝试查询设备API端点: {url}")
             try:
-                response = requests.get(url, headers=headers, params=params)
+                response = http_client.get(url, headers=headers, params=params)
                 log(f"响应状态码: {response.status_code}")
 
                 if response.status_code == 200:
@@ -95,13 +154,17 @@ def get_device_id_by_name(device_name):
                     if data.get('code') == 0 or data.get('errno') == 0:
                         devices = data.get('data', {}).get('devices', [])
                         log(f"找到 {len(devices)} 个设备")
+                        listed = True
                         for device in devices:
                             # 检查不同的设备名称字段
                             device_title = device.get('title', device.get('name', ''))
-                            if device_title == device_name:
-                                device_id = device.get('id')
-                                log(f"找到设备 {device_name}，ID: {device_id}")
-                                return str(device_id) if device_id else None
+                            device_id = device.get('id')
+                            if device_title:
+                                device_ids[device_title] = str(device_id) if device_id else None
+
+                        if device_ids.get(device_name):
+                            log(f"找到设备 {device_name}，ID: {device_ids[device_name]}")
+                            return device_ids, listed
 
                         # 如果在这个端点找到了设备列表但没有目标设备，继续尝试其他端点
                         log(f"在端点 {url} 中未找到设备: {device_name}")
@@ -119,11 +182,11 @@ def get_device_id_by_name(device_name):
 
         # 所有端点都尝试过了，仍未找到设备
         log(f"所有API端点都尝试过了，未找到设备: {device_name}")
-        return None
+        return device_ids, listed
 
     except Exception as e:
         log(f"查询设备ID时出错: {str(e)}")
-        return None
+        return device_ids, False
 
 def get_user_device_config(username):
     """获取用户的设备配置
@@ -210,12 +273,15 @@ def create_device_for_user(username):
         log("尝试使用旧版API创建设备")
         result1 = create_device_old_api(device_name, username)
         if result1["success"]:
+            # 清除该设备"不存在"的负缓存，下次查询重新获取设备ID和密钥
+            device_cache.invalidate(device_name)
             return result1
 
         # 方法2：尝试使用新版API创建设备
         log("旧版API失败，尝试使用新版API创建设备")
         result2 = create_device_new_api(device_name, username)
         if result2["success"]:
+            device_cache.invalidate(device_name)
             return result2
 
         # 所有方法都失败，返回详细的手动操作指导
@@ -283,10 +349,10 @@ def create_device_old_api(device_name, username):
         log(f"旧版API设备创建请求数据: {device_data}")
 
         # 发送POST请求创建设备
-        response = requests.post(url, json=device_data, headers=headers)
+        response = http_client.post(url, json=device_data, headers=headers)
 
         log(f"旧版API设备创建响应状态码: {response.status_code}")
-        log(f"旧版API设备创建响应内容: {response.text}")
+        logger.debug("旧版API设备创建响应内容: %s", response.text)
 
         # 检查响应状态码
         if response.status_code == 200 or response.status_code == 201:
@@ -402,20 +468,20 @@ def create_device_new_api(device_name, username):
 
             try:
                 # 对于控制台API，尝试不同的认证方式
-                if "open.iot.10086.cn" in url:
+                if url.startswith(ONENET_CONSOLE_API_BASE):
                     # 控制台API可能需要不同的认证
                     console_headers = {
                         "Content-Type": "application/json",
                         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
                     }
 
-                    response = requests.post(url, json=device_definition, headers=console_headers)
+                    response = http_client.post(url, json=device_definition, headers=console_headers)
                 else:
                     # 对于iot-api.heclouds.com，使用JWT认证
-                    response = requests.post(url, json=device_definition, headers=headers)
+                    response = http_client.post(url, json=device_definition, headers=headers)
 
                 log(f"设备创建响应状态码: {response.status_code}")
-                log(f"设备创建响应内容: {response.text}")
+                logger.debug("设备创建响应内容: %s", response.text)
 
                 if response.status_code in [200, 201, 202]:
                     try:
@@ -551,7 +617,7 @@ def add_property_to_existing_thingmodel(datastream_id, username):
 
             try:
                 # 对于控制台API，尝试不同的认证方式
-                if "open.iot.10086.cn" in url:
+                if url.startswith(ONENET_CONSOLE_API_BASE):
                     # 控制台API可能需要不同的认证
                     console_headers = {
                         "Content-Type": "application/json",
@@ -565,11 +631,11 @@ def add_property_to_existing_thingmodel(datastream_id, username):
                         log(f"尝试 {method} 方法: {url}")
 
                         if method == "POST":
-                            response = requests.post(url, json=property_definition, headers=console_headers)
+                            response = http_client.post(url, json=property_definition, headers=console_headers)
                         elif method == "PUT":
-                            response = requests.put(url, json=property_definition, headers=console_headers)
+                            response = http_client.put(url, json=property_definition, headers=console_headers)
                         elif method == "PATCH":
-                            response = requests.patch(url, json=property_definition, headers=console_headers)
+                            response = http_client.patch(url, json=property_definition, headers=console_headers)
 
                         log(f"{method} 响应状态码: {response.status_code}")
                         log(f"{method} 响应内容: {response.text}")
@@ -604,9 +670,9 @@ def add_property_to_existing_thingmodel(datastream_id, username):
                             break
                 else:
                     # 对于iot-api.heclouds.com，使用JWT认证
-                    response = requests.post(url, json=property_definition, headers=headers)
+                    response = http_client.post(url, json=property_definition, headers=headers)
                     log(f"响应状态码: {response.status_code}")
-                    log(f"响应内容: {response.text}")
+                    logger.debug("响应内容: %s", response.text)
 
                     if response.status_code == 200:
                         try:
@@ -708,10 +774,10 @@ def create_datastream_old_api(datastream_id, username):
         log(f"旧版API请求数据: {datastream_data}")
 
         # 发送POST请求创建数据流
-        response = requests.post(url, json=datastream_data, headers=headers)
+        response = http_client.post(url, json=datastream_data, headers=headers)
 
         log(f"旧版API响应状态码: {response.status_code}")
-        log(f"旧版API响应内容: {response.text}")
+        logger.debug("旧版API响应内容: %s", response.text)
 
         # 检查响应状态码
         if response.status_code == 200 or response.status_code == 201:
@@ -849,10 +915,10 @@ def create_thingmodel_property(datastream_id, username, token):
         log(f"物模型API请求数据: {property_data}")
 
         # 发送POST请求
-        response = requests.post(url, json=property_data, headers=headers)
+        response = http_client.post(url, json=property_data, headers=headers)
 
         log(f"物模型API响应状态码: {response.status_code}")
-        log(f"物模型API响应内容: {response.text}")
+        logger.debug("物模型API响应内容: %s", response.text)
 
         # 检查响应状态码和内容
         if response.status_code == 200:
@@ -944,10 +1010,10 @@ def try_create_property_via_mqtt_topic(datastream_id, username, token):
         log(f"MQTT主题上报URL: {url}")
         log(f"MQTT主题上报数据: {mqtt_data}")
 
-        response = requests.post(url, json=mqtt_data, headers=headers)
+        response = http_client.post(url, json=mqtt_data, headers=headers)
 
         log(f"MQTT主题上报响应状态码: {response.status_code}")
-        log(f"MQTT主题上报响应内容: {response.text}")
+        logger.debug("MQTT主题上报响应内容: %s", response.text)
 
         if response.status_code == 200:
             try:
@@ -995,10 +1061,10 @@ def try_dynamic_property_creation(datastream_id, username, token):
         log(f"动态创建属性URL: {url}")
         log(f"动态创建属性数据: {property_definition}")
 
-        response = requests.post(url, json=property_definition, headers=headers)
+        response = http_client.post(url, json=property_definition, headers=headers)
 
         log(f"动态创建属性响应状态码: {response.status_code}")
-        log(f"动态创建属性响应内容: {response.text}")
+        logger.debug("动态创建属性响应内容: %s", response.text)
 
         if response.status_code == 200:
             try:
@@ -1038,12 +1104,12 @@ def check_thingmodel_property_exists(datastream_id, token):
             "identifier": datastream_id
         }
 
-        log(f"检查属性存在性: {url}, 参数: {params}")
+        logger.debug("检查属性存在性: %s, 参数: %s", url, params)
 
-        response = requests.get(url, params=params, headers=headers)
+        response = http_client.get(url, params=params, headers=headers)
 
         log(f"属性检查响应状态码: {response.status_code}")
-        log(f"属性检查响应内容: {response.text}")
+        logger.debug("属性检查响应内容: %s", response.text)
 
         if response.status_code == 200:
             try:
@@ -1094,10 +1160,10 @@ def create_datastream_by_datapoint(datastream_id, username, token):
         log(f"数据点API请求数据: {datapoint_data}")
 
         # 发送POST请求
-        response = requests.post(url, json=datapoint_data, headers=headers)
+        response = http_client.post(url, json=datapoint_data, headers=headers)
 
         log(f"数据点API响应状态码: {response.status_code}")
-        log(f"数据点API响应内容: {response.text}")
+        logger.debug("数据点API响应内容: %s", response.text)
 
         # 检查响应状态码
         if response.status_code == 200 or response.status_code == 201:
@@ -1134,7 +1200,7 @@ def create_datastream_by_datapoint(datastream_id, username, token):
 
 
 def generate_token(device_name=None):
-    """生成OneNET平台的JWT token
+    """生成OneNET平台的JWT token，有效期10小时，通过 onenet_token 缓存复用
 
     参数:
         device_name: 设备名称，如果为None则使用默认的DEVICE_NAME
@@ -1146,28 +1212,8 @@ def generate_token(device_name=None):
         # 使用传入的设备名称，如果没有则使用默认的
         target_device_name = device_name if device_name is not None else DEVICE_NAME
 
-        # 设置token参数
-        version = '2018-10-31'
         res = f"products/{PRODUCT_ID}/devices/{target_device_name}"
-        # 设置token过期时间，这里设置为10小时后过期
-        et = str(int(time.time()) + 36000)
-        # 签名方法，支持md5、sha1、sha256
-        method = 'sha1'
-
-        # 对access_key进行decode
-        key = base64.b64decode(ACCESS_KEY)
-
-        # 计算sign
-        org = et + '\n' + method + '\n' + res + '\n' + version
-        sign_b = hmac.new(key=key, msg=org.encode(), digestmod=method)
-        sign = base64.b64encode(sign_b.digest()).decode()
-
-        # value部分进行url编码
-        sign = quote(sign, safe='')
-        res = quote(res, safe='')
-
-        # token参数拼接
-        token = f'version={version}&res={res}&et={et}&method={method}&sign={sign}'
+        token = get_token(res, ACCESS_KEY, ttl=36000)
 
         log(f"生成的OneNET token for device {target_device_name}: {token[:30]}...")
         return token
@@ -1178,34 +1224,14 @@ def generate_token(device_name=None):
         return None
 
 def generate_product_token():
-    """生成OneNET平台的产品级JWT token（用于HTTP同步命令API）
+    """生成OneNET平台的产品级JWT token（用于HTTP同步命令API），有效期10小时
 
     返回:
         str: 产品级JWT token字符串
     """
     try:
-        # 设置token参数 - 产品级token使用产品资源路径
-        version = '2018-10-31'
-        res = f"products/{PRODUCT_ID}"  # 产品级资源路径，不包含设备
-        # 设置token过期时间，这里设置为10小时后过期
-        et = str(int(time.time()) + 36000)
-        # 签名方法，支持md5、sha1、sha256
-        method = 'sha1'
-
-        # 对access_key进行decode
-        key = base64.b64decode(ACCESS_KEY)
-
-        # 计算sign
-        org = et + '\n' + method + '\n' + res + '\n' + version
-        sign_b = hmac.new(key=key, msg=org.encode(), digestmod=method)
-        sign = base64.b64encode(sign_b.digest()).decode()
-
-        # value部分进行url编码
-        sign = quote(sign, safe='')
-        res = quote(res, safe='')
-
-        # token参数拼接
-        token = f'version={version}&res={res}&et={et}&method={method}&sign={sign}'
+        # 产品级token使用产品资源路径，不包含设备
+        token = get_token(f"products/{PRODUCT_ID}", ACCESS_KEY, ttl=36000)
 
         log(f"生成的OneNET产品级token: {token[:30]}...")
         return token
@@ -1257,14 +1283,14 @@ def find_user_device(username):
         # 尝试每个API端点
         for i, url in enumerate(api_endpoints, 1):
             log(f"尝试设备查找API端点 {i}/{len(api_endpoints)}: {url}")
-            log(f"查找参数: {params}")
+            logger.debug("查找参数: %s", params)
 
             try:
                 # 发送GET请求
-                response = requests.get(url, params=params, headers=headers)
+                response = http_client.get(url, params=params, headers=headers)
 
                 log(f"设备查找响应状态码: {response.status_code}")
-                log(f"设备查找响应内容: {response.text}")
+                logger.debug("设备查找响应内容: %s", response.text)
 
                 if response.status_code == 200:
                     try:
@@ -1398,19 +1424,19 @@ def get_onenet_data(username='admin'):
         log(f"请求OneNET API: {url}, 设备: {device_name}, 数据流: {datastream_id}")
 
         # 发送GET请求
-        response = requests.get(url, params=params, headers=headers)
+        response = http_client.get(url, params=params, headers=headers)
 
         # 检查响应状态码
         if response.status_code == 200:
             # 解析响应数据
             response_data = response.json()
 
-            log(f"OneNET API响应: {response_data}")
+            logger.debug("OneNET API响应: %s", response_data)
 
             # 打印更详细的响应结构信息，帮助调试
             if "data" in response_data:
                 data_keys = response_data["data"].keys() if isinstance(response_data["data"], dict) else "不是字典类型"
-                log(f"响应中的data字段包含以下键: {data_keys}")
+                logger.debug("响应中的data字段包含以下键: %s", data_keys)
 
             # 检查是否成功获取数据
             if response_data.get("code") == 0 and "data" in response_data:
@@ -1551,6 +1577,8 @@ def activate_device_for_user(username):
                 activation_result = http_property_post_activation(device_name, device_token, datastream_id, device_model_info)
 
         if activation_result.get("success"):
+            # 激活后设备状态和密钥可能变化，清除缓存
+            device_cache.invalidate(device_name)
             return {
                 "success": True,
                 "device_name": device_name,
@@ -1573,99 +1601,113 @@ def activate_device_for_user(username):
         return {"success": False, "error": error_msg}
 
 def get_device_key(device_name):
-    """获取设备密钥"""
+    """获取设备密钥，结果按设备名称缓存（见 device_cache.py）"""
     try:
         log(f"获取设备 {device_name} 的密钥")
 
+        hit, sec_key = device_cache.get(device_name, 'sec_key')
+        if hit:
+            log(f"使用缓存的设备密钥: {device_name}")
+            return sec_key
+
         # 生成平台级token
         token = generate_token()
         if not token:
             log("生成平台token失败")
             return None
 
-        # 使用设备列表API查询设备信息
-        url = f"{ONENET_API_BASE}/device/list"
+        sec_key = _lookup_device_sec_key(device_name, token)
+        if sec_key:
+            log(f"找到设备密钥: {sec_key[:20]}...")
+        return sec_key
 
-        headers = {
-            "authorization": token,
-            "Content-Type": "application/json"
-        }
+    except Exception as e:
+        log(f"获取设备密钥出错: {str(e)}")
+        return None
+
+def _lookup_device_sec_key(device_name, token):
+    """通过设备列表API查询设备密钥，并缓存列表中所有设备的密钥
+
+    参数:
+        device_name: 设备名称
+        token: 平台级token
 
+    返回:
+        str: 设备密钥，设备不存在或没有密钥时返回None
+    """
+    # 使用设备列表API查询设备信息
+    url = f"{ONENET_API_BASE}/device/list"
+
+    headers = {
+        "authorization": token,
+        "Content-Type": "application/json"
+    }
+
+    limit = 100
+    # 最多读取的页数，服务端忽略 offset 等异常情况下不会无限翻页
+    max_pages = 100
+    sec_keys = {}
+    previous_names = None
+    # 设备超过一页时逐页查询，直到找到该设备、读完 meta.total 个设备或服务端返回了重复的页
+    for page in range(max_pages):
+        offset = page * limit
         params = {
             "product_id": PRODUCT_ID,
-            "limit": 100
+            "offset": offset,
+            "limit": limit
         }
 
-        response = requests.get(url, params=params, headers=headers)
+        response = http_client.get(url, params=params, headers=headers)
 
-        if response.status_code == 200:
-            try:
-                response_data = response.json()
-                if response_data.get("code") == 0:
-                    devices = response_data.get("data", {}).get("list", [])
-
-                    # 查找目标设备
-                    for device in devices:
-                        if device.get("name") == device_name:
-                            sec_key = device.get("sec_key")
-                            if sec_key:
-                                log(f"找到设备密钥: {sec_key[:20]}...")
-                                return sec_key
-                            else:
-                                log(f"设备 {device_name} 没有密钥")
-                                return None
-
-                    log(f"未找到设备 {device_name}")
-                    return None
-                else:
-                    log(f"查询设备信息失败: {response_data.get('msg', '未知错误')}")
-                    return None
-            except:
-                log(f"解析设备信息响应失败")
-                return None
-        else:
+        if response.status_code != 200:
             log(f"查询设备信息API失败，状态码: {response.status_code}")
             return None
 
-    except Exception as e:
-        log(f"获取设备密钥出错: {str(e)}")
+        try:
+            response_data = response.json()
+        except ValueError:
+            log(f"解析设备信息响应失败")
+            return None
+
+        if response_data.get("code") != 0:
+            log(f"查询设备信息失败: {response_data.get('msg', '未知错误')}")
+            return None
+
+        data = response_data.get("data") or {}
+        devices = data.get("list", [])
+
+        # 一次查询得到的所有设备密钥都写入缓存，未找到的设备做负缓存
+        page_keys = {device.get("name"): device.get("sec_key") or None for device in devices if device.get("name")}
+        device_cache.set_many(page_keys, 'sec_key')
+        sec_keys.update(page_keys)
+
+        names = [device.get("name") for device in devices]
+        try:
+            total = int((data.get("meta") or {}).get("total") or 0)
+        except (TypeError, ValueError):
+            total = 0
+        if (device_name in sec_keys or len(devices) < limit or names == previous_names
+                or (total and offset + len(devices) >= total)):
+            break
+        previous_names = names
+    else:
+        log(f"设备列表超过 {max_pages} 页，停止查询")
+
+    if device_name not in sec_keys:
+        device_cache.set(device_name, 'sec_key', None)
+        log(f"未找到设备 {device_name}")
         return None
 
+    if not sec_keys[device_name]:
+        log(f"设备 {device_name} 没有密钥")
+    return sec_keys[device_name]
+
 def generate_device_token(device_name, device_key):
-    """生成设备级token"""
+    """生成设备级token（使用设备密钥签名，有效期100天）"""
     try:
-        import hmac
-        import hashlib
-        import base64
-        import urllib.parse
-        import time
-
         log(f"生成设备 {device_name} 的token")
 
-        # OneNET新版API设备级token参数
-        version = "2018-10-31"
-        resource_name = f"products/{PRODUCT_ID}/devices/{device_name}"
-        expiration_time = str(int(time.time()) + 100 * 24 * 60 * 60)  # 100天后过期
-        signature_method = "sha1"
-
-        # 构建签名字符串
-        string_to_sign = f"{expiration_time}\n{signature_method}\n{resource_name}\n{version}"
-
-        # 使用设备密钥进行HMAC-SHA1签名
-        key_bytes = base64.b64decode(device_key)
-        signature = hmac.new(key_bytes, string_to_sign.encode('utf-8'), hashlib.sha1).digest()
-        signature_b64 = base64.b64encode(signature).decode('utf-8')
-
-        # 构建token
-        token_parts = [
-            f"version={version}",
-            f"res={urllib.parse.quote(resource_name, safe='')}",
-            f"et={expiration_time}",
-            f"method={signature_method}",
-            f"sign={urllib.parse.quote(signature_b64, safe='')}"
-        ]
-
-        token = "&".join(token_parts)
+        token = get_token(f"products/{PRODUCT_ID}/devices/{device_name}", device_key, ttl=100 * 24 * 60 * 60)
         log(f"设备token生成成功: {token[:50]}...")
         return token
 
@@ -1674,40 +1716,11 @@ def generate_device_token(device_name, device_key):
         return None
 
 def generate_http_sync_token(device_name, device_key):
-    """生成HTTP同步命令API专用token（使用产品级资源路径）"""
+    """生成HTTP同步命令API专用token（设备下发命令资源路径，产品级ACCESS_KEY签名，有效期1小时）"""
     try:
-        import hmac
-        import hashlib
-        import base64
-        import urllib.parse
-        import time
-
         log(f"生成HTTP同步命令API专用token for device {device_name}")
 
-        # HTTP同步命令API token参数 - 设备下发命令使用 products/{pid}/devices/{device} 格式
-        version = "2018-10-31"
-        resource_name = f"products/{PRODUCT_ID}/devices/{device_name}"  # 设备下发命令格式
-        expiration_time = str(int(time.time()) + 3600)  # 1小时后过期
-        signature_method = "sha1"
-
-        # 构建签名字符串：et \n method \n res \n version
-        string_to_sign = f"{expiration_time}\n{signature_method}\n{resource_name}\n{version}"
-
-        # 使用产品级ACCESS_KEY进行HMAC-SHA1签名
-        key_bytes = base64.b64decode(ACCESS_KEY)
-        signature = hmac.new(key_bytes, string_to_sign.encode('utf-8'), hashlib.sha1).digest()
-        signature_b64 = base64.b64encode(signature).decode('utf-8')
-
-        # 构建token
-        token_parts = [
-            f"version={version}",
-            f"res={urllib.parse.quote(resource_name, safe='')}",
-            f"et={expiration_time}",
-            f"method={signature_method}",
-            f"sign={urllib.parse.quote(signature_b64, safe='')}"
-        ]
-
-        token = "&".join(token_parts)
+        token = get_token(f"products/{PRODUCT_ID}/devices/{device_name}", ACCESS_KEY, ttl=3600)
         log(f"HTTP同步命令API token生成成功: {token[:50]}...")
         return token
 
@@ -1716,43 +1729,15 @@ def generate_http_sync_token(device_name, device_key):
         return None
 
 def generate_http_sync_token_with_id(device_id, device_key):
-    """生成HTTP同步命令API专用token（在资源路径中使用设备ID）"""
+    """生成HTTP同步命令API专用token（在资源路径中使用设备ID，有效期1小时）"""
     try:
-        import hmac
-        import hashlib
-        import base64
-        import urllib.parse
-        import time
-
         log(f"生成HTTP同步命令API专用token for device ID {device_id}")
 
-        # HTTP同步命令API token参数 - 在资源路径中使用设备ID
-        version = "2018-10-31"
-        resource_name = f"products/{PRODUCT_ID}/devices/{device_id}"  # 使用设备ID而不是设备名称
-        expiration_time = str(int(time.time()) + 3600)  # 1小时后过期
-        signature_method = "sha1"
-
-        # 构建签名字符串：et \n method \n res \n version
-        string_to_sign = f"{expiration_time}\n{signature_method}\n{resource_name}\n{version}"
-
-        # 使用产品级ACCESS_KEY进行HMAC-SHA1签名
-        key_bytes = base64.b64decode(ACCESS_KEY)
-        signature = hmac.new(key_bytes, string_to_sign.encode('utf-8'), hashlib.sha1).digest()
-        signature_b64 = base64.b64encode(signature).decode('utf-8')
-
-        # 构建token
-        token_parts = [
-            f"version={version}",
-            f"res={urllib.parse.quote(resource_name, safe='')}",
-            f"et={expiration_time}",
-            f"method={signature_method}",
-            f"sign={urllib.parse.quote(signature_b64, safe='')}"
-        ]
-
-        token = "&".join(token_parts)
+        # 使用设备ID而不是设备名称
+        resource_name = f"products/{PRODUCT_ID}/devices/{device_id}"
+        token = get_token(resource_name, ACCESS_KEY, ttl=3600)
         log(f"HTTP同步命令API token生成成功: {token[:50]}...")
         log(f"资源路径: {resource_name}")
-        log(f"签名字符串: {string_to_sign}")
         return token
 
     except Exception as e:
@@ -1760,31 +1745,15 @@ def generate_http_sync_token_with_id(device_id, device_key):
         return None
 
 def generate_http_sync_token_reference_format(device_name, device_key):
-    """完全按照参考代码格式生成HTTP同步命令API token"""
+    """完全按照参考代码格式生成HTTP同步命令API token（设备级AccessKey签名，有效期1小时）"""
     try:
-        import requests, time, hmac, hashlib, base64, urllib.parse, json
-
-        # 🔧 尝试使用设备级AccessKey进行签名
-        PID = PRODUCT_ID
-        AK = device_key  # 🔧 修正：使用设备级AccessKey而不是产品级
-        ttl = 3600
-        et = str(int(time.time()) + ttl)
-        res = f"products/{PID}/devices/{device_name}"  # 🔧 修正：使用设备级资源路径
-        ver, meth = "2018-10-31", "sha1"  # 🔧 修正：回到2018-10-31版本
-
-        # 签名字符串：et→method→res→version
-        sts = "\n".join([et, meth, res, ver])
-        sign = base64.b64encode(
-            hmac.new(base64.b64decode(AK), sts.encode(), hashlib.sha1).digest()
-        ).decode()
-
-        # 🔧 修正：res需要URL-encode，sign也需要URL-encode
-        token = f"version={ver}&res={urllib.parse.quote(res, safe='')}&et={et}&method={meth}&sign={urllib.parse.quote(sign)}"
+        res = f"products/{PRODUCT_ID}/devices/{device_name}"
+        # 参考代码对sign做URL编码时保留'/'
+        token = get_token(res, device_key, ttl=3600, sign_safe='/')
 
         log(f"参考格式修正版HTTP同步命令API token生成成功: {token[:50]}...")
-        log(f"PID: {PID}")
+        log(f"PID: {PRODUCT_ID}")
         log(f"资源路径: {res} (userid格式)")
-        log(f"签名字符串: {sts}")
         return token
 
     except Exception as e:
@@ -1808,63 +1777,12 @@ def generate_user_level_token():
     20220501
     """
     try:
-        import requests, time, hmac, hashlib, base64, urllib.parse, json
-
-        # 🔐 按照图片中的官方文档设置参数
-        USER_ID_VAL = USER_ID  # 用户编号：364732
-        AK = USER_ACCESS_KEY  # 用户级 AccessKey
-
-        # 设置过期时间（1小时后）
-        et = str(int(time.time()) + 3600)
-
-        # 设置签名算法（按照网络搜索结果，大多数示例使用sha1）
-        method = "sha1"
-
-        # 设置资源信息（用户级资源路径）
-        res = f"userid/{USER_ID_VAL}"
+        # 用户级资源路径，新版OneNET使用2022-05-01签名版本，有效期1小时
+        res = f"userid/{USER_ID}"
+        token = get_token(res, USER_ACCESS_KEY, ttl=3600, version="2022-05-01", raw_key_fallback=True)
 
-        # 设置签名版本（按照网络搜索结果：新版使用2022-05-01）
-        version = "2022-05-01"  # 新版OneNET使用2022-05-01格式
-
-        # 🔧 按照官方文档要求构建签名字符串：et + "\n" + method + "\n" + res + "\n" + version
-        StringForSignature = et + "\n" + method + "\n" + res + "\n" + version
-
-        log(f"🔐 生成用户级token（按照官方鉴权方法）")
-        log(f"用户ID: {USER_ID_VAL}")
-        log(f"过期时间: {et}")
-        log(f"签名算法: {method}")
-        log(f"资源路径: {res}")
-        log(f"签名版本: {version}")
-        log(f"签名字符串: {StringForSignature}")
-
-        # 🔧 按照文档要求：以资源访问密钥进行base64_decode得到字节作为密钥
-        try:
-            # 对用户AccessKey进行base64解码得到字节作为密钥
-            key_bytes = base64.b64decode(AK)
-            log(f"✅ AccessKey成功进行base64解码，密钥长度: {len(key_bytes)} 字节")
-        except Exception as decode_error:
-            # 如果解码失败，直接使用原始字符串的字节
-            key_bytes = AK.encode('utf-8')
-            log(f"⚠️ AccessKey无法base64解码，使用原始字符串: {decode_error}")
-
-        # 🔧 按照文档要求：对StringForSignature进行hmac算法计算
-        signature = hmac.new(key_bytes, StringForSignature.encode('utf-8'), hashlib.sha1).digest()
-
-        # 🔧 将计算得到的签名字符串进行base64编码
-        sign = base64.b64encode(signature).decode('utf-8')
-
-        # 🔧 对资源路径和签名进行URL编码
-        res_encoded = urllib.parse.quote(res, safe='')
-        sign_encoded = urllib.parse.quote(sign, safe='')
-
-        # 🔧 按照官方格式拼接token
-        token = f"version={version}&res={res_encoded}&et={et}&method={method}&sign={sign_encoded}"
-
-        log(f"✅ 用户级token生成成功")
+        log(f"✅ 用户级token生成成功（资源路径: {res}）")
         log(f"Token前50字符: {token[:50]}...")
-        log(f"完整token长度: {len(token)}")
-        log(f"使用的AccessKey前20字符: {AK[:20]}...")
-
         return token
 
     except Exception as e:
@@ -2042,7 +1960,7 @@ def simple_device_activation(device_name, device_token):
         activation_methods = [
             # 方法1: 设备上线通知
             {
-                "url": "https://open.iot.10086.cn/fuse/http/device/thing/event/post",
+                "url": f"{ONENET_CONSOLE_API_BASE}/fuse/http/device/thing/event/post",
                 "params": {
                     "topic": f"$sys/{PRODUCT_ID}/{device_name}/thing/event/post",
                     "protocol": "mqtt"
@@ -2063,7 +1981,7 @@ def simple_device_activation(device_name, device_token):
             },
             # 方法2: 设备状态上报
             {
-                "url": "https://open.iot.10086.cn/fuse/http/device/thing/property/post",
+                "url": f"{ONENET_CONSOLE_API_BASE}/fuse/http/device/thing/property/post",
                 "params": {
                     "topic": f"$sys/{PRODUCT_ID}/{device_name}/thing/property/post",
                     "protocol": "mqtt"
@@ -2076,7 +1994,7 @@ def simple_device_activation(device_name, device_token):
             },
             # 方法3: 设备心跳
             {
-                "url": "https://open.iot.10086.cn/fuse/http/device/thing/event/post",
+                "url": f"{ONENET_CONSOLE_API_BASE}/fuse/http/device/thing/event/post",
                 "params": {
                     "topic": f"$sys/{PRODUCT_ID}/{device_name}/thing/event/heartbeat",
                     "protocol": "mqtt"
@@ -2104,10 +2022,10 @@ def simple_device_activation(device_name, device_token):
         for i, method in enumerate(activation_methods, 1):
             log(f"尝试简单激活方法 {i}/{len(activation_methods)}")
             log(f"URL: {method['url']}")
-            log(f"参数: {method['params']}")
+            logger.debug("参数: %s", method['params'])
 
             try:
-                response = requests.post(
+                response = http_client.post(
                     method["url"],
                     params=method["params"],
                     headers=headers,
@@ -2153,7 +2071,7 @@ def query_device_thing_model(device_name, device_token):
         log(f"查询设备 {device_name} 的物模型信息")
 
         # 尝试查询设备的物模型
-        url = f"https://open.iot.10086.cn/fuse/http/device/thing/model/get"
+        url = f"{ONENET_CONSOLE_API_BASE}/fuse/http/device/thing/model/get"
 
         params = {
             "topic": f"$sys/{PRODUCT_ID}/{device_name}/thing/model/get",
@@ -2171,10 +2089,10 @@ def query_device_thing_model(device_name, device_token):
             "params": {}
         }
 
-        response = requests.post(url, params=params, headers=headers, json=body, timeout=30)
+        response = http_client.post(url, params=params, headers=headers, json=body, timeout=30)
 
         log(f"物模型查询响应状态码: {response.status_code}")
-        log(f"物模型查询响应内容: {response.text}")
+        logger.debug("物模型查询响应内容: %s", response.text)
 
         if response.status_code == 200:
             try:
@@ -2214,7 +2132,7 @@ def http_property_post_activation(device_name, device_token, datastream_id, devi
         # OneNET新版API HTTP属性上报端点
         topic = f"$sys/{PRODUCT_ID}/{device_name}/thing/property/post"
 
-        url = f"https://open.iot.10086.cn/fuse/http/device/thing/property/post"
+        url = f"{ONENET_CONSOLE_API_BASE}/fuse/http/device/thing/property/post"
 
         # 请求参数 - 根据官方文档，protocol应该是http
         params = {
@@ -2263,14 +2181,14 @@ def http_property_post_activation(device_name, device_token, datastream_id, devi
         }
 
         log(f"HTTP属性上报URL: {url}")
-        log(f"请求参数: {params}")
+        logger.debug("请求参数: %s", params)
         log(f"请求体: {body}")
 
         # 发送POST请求
-        response = requests.post(url, params=params, headers=headers, json=body, timeout=30)
+        response = http_client.post(url, params=params, headers=headers, json=body, timeout=30)
 
         log(f"HTTP属性上报响应状态码: {response.status_code}")
-        log(f"HTTP属性上报响应内容: {response.text}")
+        logger.debug("HTTP属性上报响应内容: %s", response.text)
 
         if response.status_code == 200:
             try:
@@ -2323,21 +2241,21 @@ def try_mqtt_style_activation(device_name, device_token, datastream_id, device_m
         # 尝试不同的URL和参数组合
         activation_attempts = [
             {
-                "url": "https://open.iot.10086.cn/fuse/http/device/thing/property/post",
+                "url": f"{ONENET_CONSOLE_API_BASE}/fuse/http/device/thing/property/post",
                 "params": {
                     "topic": f"$sys/{PRODUCT_ID}/{device_name}/thing/property/post",
                     "protocol": "mqtt"
                 }
             },
             {
-                "url": "https://open.iot.10086.cn/fuse/http/device/thing/property/post",
+                "url": f"{ONENET_CONSOLE_API_BASE}/fuse/http/device/thing/property/post",
                 "params": {
                     "topic": f"$sys/{PRODUCT_ID}/{device_name}/thing/property/post"
                     # 不包含protocol参数
                 }
             },
             {
-                "url": "https://open.iot.10086.cn/fuse/http/device/thing/property/post",
+                "url": f"{ONENET_CONSOLE_API_BASE}/fuse/http/device/thing/property/post",
                 "params": {
                     "topic": f"{PRODUCT_ID}/{device_name}/thing/property/post",
                     "protocol": "http"
@@ -2392,10 +2310,10 @@ def try_mqtt_style_activation(device_name, device_token, datastream_id, device_m
         for i, attempt in enumerate(activation_attempts, 1):
             log(f"尝试激活方式 {i}/{len(activation_attempts)}")
             log(f"URL: {attempt['url']}")
-            log(f"参数: {attempt['params']}")
+            logger.debug("参数: %s", attempt['params'])
 
             try:
-                response = requests.post(
+                response = http_client.post(
                     attempt["url"],
                     params=attempt["params"],
                     headers=headers,
@@ -2404,7 +2322,7 @@ def try_mqtt_style_activation(device_name, device_token, datastream_id, device_m
                 )
 
                 log(f"响应状态码: {response.status_code}")
-                log(f"响应内容: {response.text}")
+                logger.debug("响应内容: %s", response.text)
 
                 if response.status_code == 200:
                     try:
@@ -2436,53 +2354,19 @@ def try_mqtt_style_activation(device_name, device_token, datastream_id, device_m
         return {"success": False, "error": error_msg}
 
 def get_device_sec_key(device_name, token):
-    """获取设备的安全密钥"""
+    """获取设备的安全密钥，与 get_device_key 共用设备密钥缓存"""
     try:
         log(f"获取设备 {device_name} 的安全密钥")
 
-        # 使用设备列表API查询设备信息
-        url = f"{ONENET_API_BASE}/device/list"
-
-        headers = {
-            "authorization": token,
-            "Content-Type": "application/json"
-        }
+        hit, sec_key = device_cache.get(device_name, 'sec_key')
+        if hit:
+            log(f"使用缓存的设备安全密钥: {device_name}")
+            return sec_key
 
-        params = {
-            "product_id": PRODUCT_ID,
-            "limit": 100
-        }
-
-        response = requests.get(url, params=params, headers=headers)
-
-        if response.status_code == 200:
-            try:
-                response_data = response.json()
-                if response_data.get("code") == 0:
-                    devices = response_data.get("data", {}).get("list", [])
-
-                    # 查找目标设备
-                    for device in devices:
-                        if device.get("name") == device_name:
-                            sec_key = device.get("sec_key")
-                            if sec_key:
-                                log(f"找到设备安全密钥: {sec_key[:20]}...")
-                                return sec_key
-                            else:
-                                log(f"设备 {device_name} 没有安全密钥")
-                                return None
-
-                    log(f"未找到设备 {device_name}")
-                    return None
-                else:
-                    log(f"查询设备信息失败: {response_data.get('msg', '未知错误')}")
-                    return None
-            except:
-                log(f"解析设备信息响应失败")
-                return None
-        else:
-            log(f"查询设备信息API失败，状态码: {response.status_code}")
-            return None
+        sec_key = _lookup_device_sec_key(device_name, token)
+        if sec_key:
+            log(f"找到设备安全密钥: {sec_key[:20]}...")
+        return sec_key
 
     except Exception as e:
         log(f"获取设备安全密钥出错: {str(e)}")
@@ -2541,7 +2425,7 @@ def send_sync_command(device_name, command_data, timeout=30):
             }
 
         # OneNET HTTP同步命令API端点（🔧 修正：使用正确的API路径）
-        url = f"https://iot-api.heclouds.com/datapoint/synccmds"
+        url = f"{ONENET_API_BASE}/datapoint/synccmds"
 
         # 🔧 修正：根据OneNET HTTP同步命令API文档，使用query参数和命令数据作为请求体
         query_params = {
@@ -2561,12 +2445,12 @@ def send_sync_command(device_name, command_data, timeout=30):
         }
 
         log(f"HTTP同步命令API URL: {url}")
-        log(f"Query参数: {query_params}")
+        logger.debug("Query参数: %s", query_params)
         log(f"请求头: {headers}")
         log(f"请求体: {request_body}")
 
         # 发送POST请求（根据JSON示例格式）
-        response = requests.post(
+        response = http_client.post(
             url,
             params=query_params,
             headers=headers,
@@ -2575,12 +2459,12 @@ def send_sync_command(device_name, command_data, timeout=30):
         )
 
         log(f"HTTP响应状态码: {response.status_code}")
-        log(f"HTTP响应头: {response.headers}")
+        logger.debug("HTTP响应头: %s", response.headers)
 
         if response.status_code == 200:
             try:
                 response_data = response.json()
-                log(f"HTTP同步命令API响应: {response_data}")
+                logger.debug("HTTP同步命令API响应: %s", response_data)
 
                 # 检查不同的成功标识（OneNET API可能返回code或errno）
                 if (response_data.get("code") == 0 or
@@ -2597,7 +2481,7 @@ def send_sync_command(device_name, command_data, timeout=30):
                         try:
                             import base64
                             decoded_resp = base64.b64decode(cmd_resp).decode('utf-8')
-                            log(f"解码后的设备响应: {decoded_resp}")
+                            logger.debug("解码后的设备响应: %s", decoded_resp)
                         except Exception as e:
                             log(f"解码设备响应失败: {e}")
                             decoded_resp = cmd_resp
@@ -2739,9 +2623,9 @@ def http_activate_device(device_name, device_id, token):
                 log(f"  尝试数据格式 {j}/{len(activation_data_variants)}")
 
                 try:
-                    response = requests.post(url, json=data, headers=headers, timeout=30)
+                    response = http_client.post(url, json=data, headers=headers, timeout=30)
                     log(f"  HTTP激活响应状态码: {response.status_code}")
-                    log(f"  HTTP激活响应内容: {response.text}")
+                    logger.debug("  HTTP激活响应内容: %s", response.text)
 
                     if response.status_code in [200, 201, 204]:
                         try:
@@ -3027,9 +2911,9 @@ def update_device_activation_status(device_name, token):
 
                 try:
                     # 尝试PUT方法
-                    response = requests.put(url, json=activation_data, headers=headers, timeout=30)
+                    response = http_client.put(url, json=activation_data, headers=headers, timeout=30)
                     log(f"  PUT请求响应状态码: {response.status_code}")
-                    log(f"  PUT请求响应内容: {response.text}")
+                    logger.debug("  PUT请求响应内容: %s", response.text)
 
                     if response.status_code in [200, 201, 204]:
                         try:
@@ -3055,9 +2939,9 @@ def update_device_activation_status(device_name, token):
                             }
 
                     # 如果PUT失败，尝试POST方法
-                    response = requests.post(url, json=activation_data, headers=headers, timeout=30)
+                    response = http_client.post(url, json=activation_data, headers=headers, timeout=30)
                     log(f"  POST请求响应状态码: {response.status_code}")
-                    log(f"  POST请求响应内容: {response.text}")
+                    logger.debug("  POST请求响应内容: %s", response.text)
 
                     if response.status_code in [200, 201, 204]:
                         try:
@@ -3124,10 +3008,10 @@ def send_device_status_data(device_name, token):
         log(f"发送设备状态数据: {url}")
         log(f"状态数据: {status_data}")
 
-        response = requests.post(url, json=status_data, headers=headers)
+        response = http_client.post(url, json=status_data, headers=headers)
 
         log(f"设备状态上传响应状态码: {response.status_code}")
-        log(f"设备状态上传响应内容: {response.text}")
+        logger.debug("设备状态上传响应内容: %s", response.text)
 
         if response.status_code in [200, 201]:
             try:
@@ -3187,10 +3071,10 @@ def send_initial_rainfall_data(device_name, datastream_id, token):
         log(f"发送初始雨量数据: {url}")
         log(f"雨量数据: {rainfall_data}")
 
-        response = requests.post(url, json=rainfall_data, headers=headers)
+        response = http_client.post(url, json=rainfall_data, headers=headers)
 
         log(f"雨量数据上传响应状态码: {response.status_code}")
-        log(f"雨量数据上传响应内容: {response.text}")
+        logger.debug("雨量数据上传响应内容: %s", response.text)
 
         if response.status_code in [200, 201]:
             try:
@@ -3241,12 +3125,12 @@ def check_device_activation_status(device_name, token):
         }
 
         log(f"检查设备激活状态: {url}")
-        log(f"查询参数: {params}")
+        logger.debug("查询参数: %s", params)
 
-        response = requests.get(url, params=params, headers=headers)
+        response = http_client.get(url, params=params, headers=headers)
 
         log(f"设备状态查询响应状态码: {response.status_code}")
-        log(f"设备状态查询响应内容: {response.text}")
+        logger.debug("设备状态查询响应内容: %s", response.text)
 
         if response.status_code == 200:
             try:
@@ -3391,6 +3275,22 @@ def check_device_status_for_user(username):
         log(traceback.format_exc())
         return {"success": False, "error": error_msg}
 
+def handle_action(action, params):
+    """执行命令行 --action 对应的操作，供命令行和常驻worker进程共用"""
+    username = params.get('username') or 'admin'
+    if action == 'create_device':
+        return create_device_for_user(username)
+    elif action == 'create_datastream':
+        # 保留旧的数据流创建功能以便兼容
+        return create_datastream_for_user(username)
+    elif action == 'activate_device':
+        return activate_device_for_user(username)
+    elif action == 'check_device_status':
+        return check_device_status_for_user(username)
+    else:
+        # 默认操作：获取数据
+        return get_onenet_data(username)
+
 def main():
     """主函数，处理命令行参数并执行相应操作"""
     parser = argparse.ArgumentParser(description='OneNET API工具')
@@ -3404,28 +3304,8 @@ def main():
     # 优先使用位置参数，如果没有则使用选项参数
     action = args.action_pos if args.action_pos else args.action
 
-    if action == 'get':
-        result = get_onenet_data(args.username)
-        print(json.dumps(result, ensure_ascii=False))
-    elif action == 'create_device':
-        result = create_device_for_user(args.username)
-        print(json.dumps(result, ensure_ascii=False))
-    elif action == 'create_datastream':
-        # 保留旧的数据流创建功能以便兼容
-        result = create_datastream_for_user(args.username)
-        print(json.dumps(result, ensure_ascii=False))
-    elif action == 'activate_device':
-        # 新增：激活设备功能
-        result = activate_device_for_user(args.username)
-        print(json.dumps(result, ensure_ascii=False))
-    elif action == 'check_device_status':
-        # 新增：检查设备状态功能
-        result = check_device_status_for_user(args.username)
-        print(json.dumps(result, ensure_ascii=False))
-    else:
-        # 默认操作：获取数据
-        result = get_onenet_data(args.username)
-        print(json.dumps(result, ensure_ascii=False))
+    result = handle_action(action, vars(args))
+    print(json.dumps(result, ensure_ascii=False))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OneNET HTTP客户端
+
+所有访问OneNET平台的HTTP请求都通过共享的 http_client 发出:
+- 使用同一个 requests.Session 复用TCP/TLS连接（keep-alive），每个主机的连接数有上限
+- 未指定 timeout 时使用默认的连接/读取超时
+- 连接失败和5xx响应按带随机抖动的指数退避重试；POST请求默认只在连接未建立时重试，
+  避免重复下发命令或重复创建资源
+- 按 "方法 主机/路径" 统计请求次数、失败次数和耗时
+
+用法与 requests 相同:
+    from onenet_http import http_client
+    response = http_client.get(url, params=params, headers=headers)
+
+参数可以通过环境变量调整:
+    ONENET_HTTP_CONNECT_TIMEOUT  连接超时（秒），默认5
+    ONENET_HTTP_READ_TIMEOUT     读取超时（秒），默认30
+    ONENET_HTTP_RETRIES          最大重试次数，默认2
+    ONENET_HTTP_POOL_MAXSIZE     每个主机的最大连接数，默认10
+"""
+
+import os
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+
+from log_util import get_logger
+
+logger = get_logger('onenet_http')
+log = logger.info
+
+def _env_number(name, default, cast=float):
+    try:
+        return cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+# 重试时认为可以安全重复执行的HTTP方法
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+class OneNETHttpClient:
+    """基于 requests.Session 的共享HTTP客户端
+
+    参数:
+        connect_timeout: 默认连接超时（秒）
+        read_timeout: 默认读取超时（秒）
+        max_retries: 最大重试次数（不含第一次请求）
+        backoff_base: 退避基数（秒），第n次重试前最多等待 backoff_base * 2^n 秒
+        backoff_max: 单次退避的最长等待时间（秒）
+        pool_connections: 缓存连接池的主机数
+        pool_maxsize: 每个主机的最大连接数，连接用尽时请求等待空闲连接
+    """
+
+    def __init__(self, connect_timeout=5, read_timeout=30, max_retries=2, backoff_base=0.5,
+                 backoff_max=8, pool_connections=4, pool_maxsize=10):
+        self.default_timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        # 重试由本客户端负责，适配器本身不重试；pool_block=True 使每个主机的连接数不超过上限
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              max_retries=0, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # {"方法 主机/路径": {"count", "errors", "retries", "total_ms", "max_ms"}}
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def request(self, method, url, retry=None, **kwargs):
+        """发送HTTP请求，参数与 requests.request 相同
+
+        参数:
+            method: HTTP方法
+            url: 请求地址
+            retry: 是否在5xx响应和读取超时时重试，默认只对幂等方法重试；
+                   连接未建立的失败对所有方法都会重试
+            其余参数原样传给 requests
+
+        返回:
+            requests.Response: 最后一次请求的响应（5xx重试用尽时返回最后的5xx响应）
+        """
+        method = method.upper()
+        kwargs.setdefault('timeout', self.default_timeout)
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        endpoint = self._endpoint_name(method, url)
+
+        attempt = 0
+        while True:
+            started = time.time()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self._record(endpoint, started, error=True)
+                retryable = self._is_connect_failure(e) or (
+                    retry and isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                )
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                log(f"{endpoint} 请求失败，准备重试 ({attempt + 1}/{self.max_retries}): {str(e)}")
+            else:
+                error = response.status_code >= 500
+                self._record(endpoint, started, error=error)
+                if not (error and retry) or attempt >= self.max_retries:
+                    return response
+                log(f"{endpoint} 返回 {response.status_code}，准备重试 ({attempt + 1}/{self.max_retries})")
+                response.close()
+
+            self._backoff(attempt)
+            with self._stats_lock:
+                self._stats[endpoint]['retries'] += 1
+            attempt += 1
+
+    def get_latency_stats(self):
+        """返回每个端点的请求统计，耗时单位为毫秒"""
+        with self._stats_lock:
+            result = {}
+            for endpoint, stat in self._stats.items():
+                result[endpoint] = {
+                    "count": stat["count"],
+                    "errors": stat["errors"],
+                    "retries": stat["retries"],
+                    "avg_ms": round(stat["total_ms"] / stat["count"], 1) if stat["count"] else 0,
+                    "max_ms": round(stat["max_ms"], 1)
+                }
+            return result
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    def close(self):
+        self.session.close()
+
+    def _backoff(self, attempt):
+        """指数退避加完全随机抖动，避免多个进程同时重试"""
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt))))
+
+    def _record(self, endpoint, started, error=False):
+        elapsed_ms = (time.time() - started) * 1000
+        with self._stats_lock:
+            stat = self._stats.get(endpoint)
+            if stat is None:
+                stat = self._stats[endpoint] = {"count": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0}
+            stat["count"] += 1
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+            if error:
+                stat["errors"] += 1
+
+    @staticmethod
+    def _endpoint_name(method, url):
+        parts = urlsplit(url)
+        return f"{method} {parts.netloc}{parts.path}"
+
+    @staticmethod
+    def _is_connect_failure(error):
+        """判断请求是否在建立连接阶段失败（请求尚未发出，任何方法重试都是安全的）"""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+            reason = getattr(error.args[0], 'reason', None)
+            return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+        return False
+
+# 进程内共享的OneNET HTTP客户端
+http_client = OneNETHttpClient(
+    connect_timeout=_env_number('ONENET_HTTP_CONNECT_TIMEOUT', 5),
+    read_timeout=_env_number('ONENET_HTTP_READ_TIMEOUT', 30),
+    max_retries=_env_number('ONENET_HTTP_RETRIES', 2, int),
+    pool_maxsize=_env_number('ONENET_HTTP_POOL_MAXSIZE', 10, int)
+)
@@ -12,10 +12,11 @@ OneNET HTTP同步命令控制脚本
 - 基于用户级鉴权实现多用户隔离
 """
 
-import sys
 import json
 import argparse
+import logging
 import traceback
+from log_util import get_logger
 from onenet_api import (
     send_sync_command,
     get_user_device_config,
@@ -24,9 +25,12 @@ from onenet_api import (
     PRODUCT_ID
 )
 
+logger = get_logger('onenet_http_control')
+
 def log_output(message, level="INFO"):
     """输出日志到stderr，以便Node.js区分日志和结果"""
-    print(f"LOG: [{level}] {message}", file=sys.stderr)
+    level_no = logging.getLevelName(str(level).upper())
+    logger.log(level_no if isinstance(level_no, int) else logging.INFO, message, stacklevel=2)
 
 def control_wiper_http(username, status, timeout=10):
     """
@@ -265,6 +269,34 @@ def get_wiper_status_http(username, timeout=10):
             "error": f"获取雨刷状态出错: {str(e)}"
         }
 
+def handle_action(action, params):
+    """执行命令行 --action 对应的操作，供命令行和常驻worker进程共用"""
+    username = params.get('username')
+    timeout = int(params.get('timeout') or 10)
+
+    if not username:
+        return {
+            "success": False,
+            "error": "需要指定--username参数"
+        }
+
+    if action == 'control':
+        if not params.get('status'):
+            return {
+                "success": False,
+                "error": "control操作需要指定--status参数"
+            }
+        return control_wiper_http(username, params.get('status'), timeout)
+
+    elif action in ['status', 'get-status']:
+        return get_wiper_status_http(username, timeout)
+
+    else:
+        return {
+            "success": False,
+            "error": f"不支持的操作: {action}"
+        }
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description='OneNET HTTP同步命令雨刷控制')
@@ -282,23 +314,7 @@ def main():
         log_output(f"用户: {args.username}")
         log_output(f"超时: {args.timeout}秒")
         
-        if args.action == 'control':
-            if not args.status:
-                result = {
-                    "success": False,
-                    "error": "control操作需要指定--status参数"
-                }
-            else:
-                result = control_wiper_http(args.username, args.status, args.timeout)
-        
-        elif args.action in ['status', 'get-status']:
-            result = get_wiper_status_http(args.username, args.timeout)
-        
-        else:
-            result = {
-                "success": False,
-                "error": f"不支持的操作: {args.action}"
-            }
+        result = handle_action(args.action, vars(args))
         
         # 输出结果到stdout供Node.js读取
         print(json.dumps(result, ensure_ascii=False))
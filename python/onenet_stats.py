@@ -5,7 +5,7 @@ import sys
 import json
 import traceback
 import io
-import requests
+from onenet_http import http_client
 import base64
 import hmac
 import time
@@ -13,11 +13,13 @@ from datetime import datetime, timedelta
 import argparse
 from urllib.parse import quote
 
-from rainfall_db import log, get_rainfall_level
+from rainfall_db import get_rainfall_levels, RAINFALL_LEVELS
+from chart_downsample import downsample_series, point_budget
+from log_util import get_logger
 
-# 导入OneNET API配置
+# 导入OneNET API配置；基地址在请求时通过 onenet_api.ONENET_API_BASE 读取，以便 set_api_base() 切换后立即生效
+import onenet_api
 from onenet_api import (
-    ONENET_API_BASE,
     PRODUCT_ID,
     DEVICE_NAME,
     ACCESS_KEY,
@@ -25,14 +27,18 @@ from onenet_api import (
     get_user_device_config
 )
 
+logger = get_logger('onenet_stats')
+log = logger.info
 
 
-def get_onenet_stats(username='admin', period='10min'):
+
+def get_onenet_stats(username='admin', period='10min', points=None):
     """从OneNET平台获取雨量统计数据
 
     参数:
         username: 用户名，用于确定数据流
         period: 时间粒度，可选值：10min, hourly, daily, all
+        points: 图表的点数预算，超过时降采样，None使用 chart_downsample.POINT_BUDGETS，0表示不降采样
 
     返回:
         dict: 包含统计数据的字典
@@ -53,7 +59,7 @@ def get_onenet_stats(username='admin', period='10min'):
             return {"success": False, "error": "生成token失败"}
 
         # 构建API URL
-        url = f"{ONENET_API_BASE}/datapoint/history-datapoints"
+        url = f"{onenet_api.ONENET_API_BASE}/datapoint/history-datapoints"
 
         # 设置请求头，包含JWT token
         headers = {
@@ -100,10 +106,10 @@ def get_onenet_stats(username='admin', period='10min'):
         elif period == 'all':
             params["limit"] = 720  # 最多获取720个数据点 (30天 * 24个点/天)
 
-        log(f"请求OneNET API: {url}, 参数: {params}")
+        logger.debug("请求OneNET API: %s, 参数: %s", url, params)
 
         # 发送GET请求
-        response = requests.get(url, params=params, headers=headers)
+        response = http_client.get(url, params=params, headers=headers)
 
         # 检查响应状态码
         if response.status_code == 200:
@@ -111,7 +117,7 @@ def get_onenet_stats(username='admin', period='10min'):
             response_data = response.json()
 
             log(f"OneNET API响应状态码: {response.status_code}")
-            log(f"OneNET API响应内容: {response_data}")
+            logger.debug("OneNET API响应内容: %s", response_data)
 
             # 检查是否成功获取数据
             if response_data.get("code") == 0 and "data" in response_data:
@@ -145,8 +151,9 @@ def get_onenet_stats(username='admin', period='10min'):
 
                 # 如果找到了数据点
                 if datapoints:
-                    # 处理数据点
-                    processed_data = []
+                    # 处理数据点：先解析所有时间戳和雨量值，再一次性计算雨量级别
+                    timestamps = []
+                    rainfall_values = []
 
                     for point in datapoints:
                         # 获取时间戳和值
@@ -166,11 +173,17 @@ def get_onenet_stats(username='admin', period='10min'):
                                 except ValueError:
                                     timestamp = datetime.now()  # 如果无法解析，使用当前时间
 
+                        timestamps.append(timestamp)
                         # 确保雨量值保留一位小数
-                        rainfall_value = round(rainfall_value, 1)
+                        rainfall_values.append(round(rainfall_value, 1))
+
+                    # 获取雨量级别和百分比
+                    level_codes, percentages = get_rainfall_levels(rainfall_values)
 
-                        # 获取雨量级别和百分比
-                        level, percentage = get_rainfall_level(rainfall_value)
+                    processed_data = []
+                    for timestamp, rainfall_value, level_code, percentage in zip(timestamps, rainfall_values, level_codes, percentages):
+                        level = RAINFALL_LEVELS[level_code]
+                        percentage = int(percentage)
 
                         # 添加处理后的数据点
                         if period == 'all':
@@ -217,6 +230,10 @@ def get_onenet_stats(username='admin', period='10min'):
                                 'minutes_passed': round(minutes_passed, 1)
                             }
 
+                    # 当前小时数据按完整数据计算之后，再按点数预算降采样
+                    processed_data, downsample_info = downsample_series(
+                        processed_data, point_budget(period, points), rainfall_values, times=timestamps)
+
                     # 返回结果
                     result = {
                         'success': True,
@@ -224,6 +241,9 @@ def get_onenet_stats(username='admin', period='10min'):
                         'unit': 'mm/天' if period == 'all' else 'mm/h'
                     }
 
+                    if downsample_info:
+                        result['downsample'] = downsample_info
+
                     if current_hour_data:
                         result['currentHour'] = current_hour_data
 
@@ -254,6 +274,7 @@ def main():
     parser.add_argument('action_pos', nargs='?', choices=['stats'], help='要执行的操作（位置参数）')
     parser.add_argument('--username', default='admin', help='用户名')
     parser.add_argument('--period', default='10min', choices=['10min', 'hourly', 'daily', 'all'], help='时间粒度')
+    parser.add_argument('--points', type=int, help='图表的点数预算，超过时降采样，0表示不降采样')
 
     args = parser.parse_args()
 
@@ -261,7 +282,7 @@ def main():
     action = args.action_pos if args.action_pos else args.action
 
     if action == 'stats':
-        result = get_onenet_stats(args.username, args.period)
+        result = get_onenet_stats(args.username, args.period, args.points)
         print(json.dumps(result, ensure_ascii=False))
     else:
         print(json.dumps({"success": False, "error": "不支持的操作"}, ensure_ascii=False))
@@ -4,7 +4,7 @@
 import sys
 import json
 import traceback
-import requests
+from onenet_http import http_client
 import base64
 import hmac
 import time
@@ -12,11 +12,12 @@ import argparse
 import threading
 from datetime import datetime, timedelta
 from urllib.parse import quote
-from rainfall_db import log, get_rainfall_level, insert_raw_rainfall, get_db_connection
+from rainfall_db import bulk_insert_raw_rainfall, get_db_connection
+from log_util import get_logger
 
-# 导入OneNET API配置
+# 导入OneNET API配置；基地址在请求时通过 onenet_api.ONENET_API_BASE 读取，以便 set_api_base() 切换后立即生效
+import onenet_api
 from onenet_api import (
-    ONENET_API_BASE,
     PRODUCT_ID,
     DEVICE_NAME,
     ACCESS_KEY,
@@ -29,6 +30,9 @@ from onenet_api import (
 # 导入数据聚合函数
 from rainfall_db import aggregate_data
 
+logger = get_logger('onenet_sync')
+log = logger.info
+
 # 全局变量
 running = True
 last_sync_time = datetime.now()
@@ -77,7 +81,7 @@ def fetch_latest_onenet_data(username='admin', last_timestamp=None):
             return {"success": False, "error": "生成token失败"}
 
         # 构建API URL
-        url = f"{ONENET_API_BASE}/datapoint/history-datapoints"
+        url = f"{onenet_api.ONENET_API_BASE}/datapoint/history-datapoints"
 
         # 设置请求头，包含JWT token
         headers = {
@@ -105,17 +109,17 @@ def fetch_latest_onenet_data(username='admin', last_timestamp=None):
             "limit": 100  # 最多获取100个数据点
         }
 
-        log(f"请求OneNET API: {url}, 参数: {params}")
+        logger.debug("请求OneNET API: %s, 参数: %s", url, params)
 
         # 发送GET请求
-        response = requests.get(url, params=params, headers=headers)
+        response = http_client.get(url, params=params, headers=headers)
 
         # 检查响应状态码
         if response.status_code == 200:
             # 解析响应数据
             response_data = response.json()
 
-            log(f"OneNET API响应: {response_data}")
+            logger.debug("OneNET API响应: %s", response_data)
 
             # 检查是否成功获取数据
             if response_data.get("code") == 0 and "data" in response_data:
@@ -195,44 +199,84 @@ def get_last_sync_timestamp(username='admin'):
     finally:
         conn.close()
 
-def check_data_exists(username, timestamp, rainfall_value):
-    """检查特定时间戳和雨量值的数据点是否已存在
+# OneNET返回的时间戳可能的格式
+ONENET_TIMESTAMP_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ"
+)
+
+def parse_onenet_timestamp(timestamp_str):
+    """解析OneNET数据点的时间戳，无法解析时返回None"""
+    for fmt in ONENET_TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(timestamp_str, fmt)
+        except (ValueError, TypeError):
+            continue
+    return None
+
+def ingest_onenet_datapoints(username, datapoints):
+    """把一批OneNET数据点批量写入本地数据库
 
     参数:
         username: 用户名
-        timestamp: 时间戳
-        rainfall_value: 雨量值
+        datapoints: 数据点列表，每个数据点包含时间戳（at 或 timestamp）和 value
 
     返回:
-        bool: 如果数据点已存在则返回True，否则返回False
+        dict: 包含 inserted_count、skipped_count（已存在的重复数据点）和 invalid_count（无法解析的数据点）的字典
     """
-    try:
-        conn = get_db_connection()
-        with conn.cursor() as cursor:
-            # 查询是否存在相同时间戳和雨量值的数据点
-            # 使用时间戳的精确匹配和雨量值的近似匹配（考虑浮点数精度问题）
-            sql = '''
-                SELECT COUNT(*) as count FROM rainfall_raw
-                WHERE username = %s
-                AND timestamp = %s
-                AND ABS(rainfall_value - %s) < 0.01
-            '''
-            cursor.execute(sql, (username, timestamp, rainfall_value))
-            result = cursor.fetchone()
+    records = []
+    invalid_count = 0
+    for point in datapoints:
+        timestamp_str = point.get("at") or point.get("timestamp")
+        timestamp = parse_onenet_timestamp(timestamp_str)
+        if timestamp is None:
+            log(f"无法解析时间戳: {timestamp_str}")
+            invalid_count += 1
+            continue  # 跳过无法解析的时间戳
 
-            # 如果count大于0，说明数据点已存在
-            exists = result and result['count'] > 0
+        try:
+            rainfall_value = float(point.get("value", 0))
+        except (ValueError, TypeError):
+            log(f"无法将值转换为浮点数: {point.get('value')}")
+            invalid_count += 1
+            continue
 
-            if exists:
-                log(f"数据点已存在: 用户名={username}, 时间戳={timestamp}, 雨量值={rainfall_value}")
+        records.append((timestamp, rainfall_value))
 
-            return exists
-    except Exception as e:
-        log(f"检查数据点是否存在失败: {str(e)}")
-        # 如果查询失败，为安全起见，假设数据点不存在
-        return False
-    finally:
-        conn.close()
+    result = bulk_insert_raw_rainfall(username, records)
+    if result['success']:
+        result['invalid_count'] = invalid_count
+    return result
+
+def backfill_raw_data(username='admin', time_range='1h'):
+    """从OneNET平台获取一段时间的原始数据并批量补录到本地数据库，然后进行数据聚合
+
+    参数:
+        username: 用户名，默认为'admin'
+        time_range: 时间范围，格式同 get_raw_data
+
+    返回:
+        dict: 包含补录结果的字典
+    """
+    raw_result = get_raw_data(username, time_range)
+    if not raw_result['success']:
+        return raw_result
+
+    ingest_result = ingest_onenet_datapoints(username, raw_result['datapoints'])
+    if not ingest_result['success']:
+        return ingest_result
+
+    aggregate_result = aggregate_data(username)
+    return {
+        "success": True,
+        "message": f"补录 {ingest_result['inserted_count']} 条数据，跳过 {ingest_result['skipped_count']} 条重复数据",
+        "inserted_count": ingest_result['inserted_count'],
+        "skipped_count": ingest_result['skipped_count'],
+        "invalid_count": ingest_result['invalid_count'],
+        "aggregated": aggregate_result['success']
+    }
 
 def sync_onenet_data(username='admin'):
     """同步OneNET数据到本地数据库
@@ -259,53 +303,12 @@ def sync_onenet_data(username='admin'):
         if not datapoints:
             return {"success": True, "message": "没有新数据需要同步", "synced_count": 0}
 
-        # 同步数据到本地数据库
-        synced_count = 0
-        skipped_count = 0
-        for point in datapoints:
-            # 获取时间戳和值
-            timestamp_str = point.get("at")
-            rainfall_value = float(point.get("value", 0))
-
-            # 解析时间戳
-            try:
-                timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                try:
-                    timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S.%f")
-                except ValueError:
-                    try:
-                        timestamp = datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%S.%fZ")
-                    except ValueError:
-                        try:
-                            timestamp = datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%SZ")
-                        except ValueError:
-                            log(f"无法解析时间戳: {timestamp_str}")
-                            continue  # 跳过无法解析的时间戳
-
-            # 检查数据点是否已存在
-            if check_data_exists(username, timestamp, rainfall_value):
-                log(f"跳过已存在的数据点: 时间戳={timestamp}, 雨量值={rainfall_value}")
-                skipped_count += 1
-                continue
-
-            # 获取雨量级别和百分比
-            rainfall_level, rainfall_percentage = get_rainfall_level(rainfall_value)
-
-            # 插入数据库
-            insert_result = insert_raw_rainfall(
-                username,
-                timestamp,
-                rainfall_value,
-                rainfall_level,
-                rainfall_percentage
-            )
-
-            if insert_result['success']:
-                synced_count += 1
-                log(f"成功插入新数据点: 时间戳={timestamp}, 雨量值={rainfall_value}")
-            else:
-                log(f"插入数据失败: {insert_result['error']}")
+        # 同步数据到本地数据库，所有数据点在一个事务中批量写入
+        ingest_result = ingest_onenet_datapoints(username, datapoints)
+        if not ingest_result['success']:
+            return ingest_result
+        synced_count = ingest_result['inserted_count']
+        skipped_count = ingest_result['skipped_count']
 
         # 无论是否有新数据，都进行数据聚合
         log(f"开始进行数据聚合，用户名: {username}")
@@ -462,7 +465,7 @@ def get_raw_data(username='admin', time_range='1h'):
             return {"success": False, "error": "生成token失败"}
 
         # 构建API URL
-        url = f"{ONENET_API_BASE}/datapoint/history-datapoints"
+        url = f"{onenet_api.ONENET_API_BASE}/datapoint/history-datapoints"
 
         # 设置请求头，包含JWT token
         headers = {
@@ -506,10 +509,10 @@ def get_raw_data(username='admin', time_range='1h'):
             "limit": 1000  # 最多获取1000个数据点
         }
 
-        log(f"请求OneNET API: {url}, 参数: {params}")
+        logger.debug("请求OneNET API: %s, 参数: %s", url, params)
 
         # 发送GET请求
-        response = requests.get(url, params=params, headers=headers)
+        response = http_client.get(url, params=params, headers=headers)
 
         # 检查响应状态码
         if response.status_code == 200:
@@ -588,9 +591,24 @@ def get_raw_data(username='admin', time_range='1h'):
         log(traceback.format_exc())
         return {"success": False, "error": error_msg}
 
+def handle_action(action, params):
+    """执行一次性的 --action 操作（sync_once、get_raw_data、backfill），供命令行和常驻worker进程共用
+
+    start/stop 会阻塞或只作用于当前进程，不通过这里调用。
+    """
+    username = params.get('username') or 'admin'
+    if action == 'sync_once':
+        return sync_onenet_data(username)
+    elif action == 'get_raw_data':
+        return get_raw_data(username, params.get('timeRange') or '1h')
+    elif action == 'backfill':
+        return backfill_raw_data(username, params.get('timeRange') or '1h')
+    else:
+        return {"success": False, "error": f"不支持的操作: {action}"}
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='OneNET数据同步工具')
-    parser.add_argument('--action', choices=['start', 'stop', 'sync_once', 'get_raw_data'],
+    parser.add_argument('--action', choices=['start', 'stop', 'sync_once', 'get_raw_data', 'backfill'],
                         default='sync_once', help='执行的操作')
     parser.add_argument('--username', default='admin', help='用户名')
     parser.add_argument('--interval', type=int, default=5, help='同步间隔（秒）')
@@ -602,9 +620,6 @@ if __name__ == "__main__":
         start_sync(args.username, args.interval)
     elif args.action == 'stop':
         stop_sync()
-    elif args.action == 'sync_once':
-        result = sync_onenet_data(args.username)
-        print(json.dumps(result, ensure_ascii=False))
-    elif args.action == 'get_raw_data':
-        result = get_raw_data(args.username, args.timeRange)
+    else:
+        result = handle_action(args.action, vars(args))
         print(json.dumps(result, ensure_ascii=False))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OneNET鉴权token缓存
+
+OneNET的token格式为 version=...&res=...&et=...&method=...&sign=...，
+签名内容为 et\\nmethod\\nres\\nversion，使用base64解码后的AccessKey做HMAC。
+token在 et 之前一直有效（1小时到100天不等），因此按 (资源, 签名方法, 版本, 密钥) 缓存，
+在剩余有效期不足时重新生成，避免每次请求都重新解码密钥、计算签名。
+
+onenet_api.py 中的 generate_token、generate_product_token、generate_device_token、
+generate_http_sync_token*、generate_user_level_token 都通过这里获取token。
+"""
+
+import time
+import base64
+import hmac
+import hashlib
+import binascii
+import threading
+from urllib.parse import quote
+
+# 剩余有效期少于总有效期的这个比例时提前刷新token
+REFRESH_RATIO = 0.1
+
+class TokenProvider:
+    """线程安全的token缓存"""
+
+    def __init__(self, refresh_ratio=REFRESH_RATIO):
+        self.refresh_ratio = refresh_ratio
+        # {(res, method, version, access_key, sign_safe): (token, et, ttl)}
+        self._tokens = {}
+        # {(access_key, raw_key_fallback): 解码后的密钥字节}
+        self._keys = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_token(self, res, access_key, ttl=3600, method='sha1', version='2018-10-31',
+                  sign_safe='', raw_key_fallback=False):
+        """获取token，缓存中的token剩余有效期充足时直接复用
+
+        参数:
+            res: 资源路径，如 products/{pid}/devices/{device_name}
+            access_key: base64编码的AccessKey（产品级、设备级或用户级）
+            ttl: 新生成token的有效期（秒）
+            method: 签名方法，支持md5、sha1、sha256
+            version: 签名版本
+            sign_safe: 对sign做URL编码时不编码的字符，与原有各token格式保持一致
+            raw_key_fallback: AccessKey无法base64解码时是否直接使用原始字符串的字节
+
+        返回:
+            str: token字符串
+        """
+        cache_key = (res, method, version, access_key, sign_safe)
+        now = int(time.time())
+
+        with self._lock:
+            cached = self._tokens.get(cache_key)
+            # 只在新token的有效期不长于缓存token时复用，调用方要求更长有效期时重新生成
+            if cached is not None:
+                token, et, cached_ttl = cached
+                if cached_ttl >= ttl and et - now > cached_ttl * self.refresh_ratio:
+                    self.hits += 1
+                    return token
+            self.misses += 1
+
+            key_bytes = self._decode_key(access_key, raw_key_fallback)
+            et = now + int(ttl)
+            token = build_token(res, key_bytes, et, method, version, sign_safe)
+            self._tokens[cache_key] = (token, et, int(ttl))
+            return token
+
+    def clear(self):
+        """清除所有缓存的token（如AccessKey变更后）"""
+        with self._lock:
+            self._tokens.clear()
+            self._keys.clear()
+
+    def _decode_key(self, access_key, raw_key_fallback):
+        """解码AccessKey并缓存结果，调用方需持有锁"""
+        cache_key = (access_key, raw_key_fallback)
+        key_bytes = self._keys.get(cache_key)
+        if key_bytes is None:
+            try:
+                key_bytes = base64.b64decode(access_key)
+            except (binascii.Error, ValueError):
+                if not raw_key_fallback:
+                    raise
+                key_bytes = access_key.encode('utf-8')
+            self._keys[cache_key] = key_bytes
+        return key_bytes
+
+def build_token(res, key_bytes, et, method='sha1', version='2018-10-31', sign_safe=''):
+    """计算签名并拼接token，不使用缓存
+
+    参数:
+        res: 资源路径
+        key_bytes: base64解码后的AccessKey
+        et: 过期时间戳（秒）
+        method: 签名方法
+        version: 签名版本
+        sign_safe: 对sign做URL编码时不编码的字符
+
+    返回:
+        str: token字符串
+    """
+    sign = token_signature(res, key_bytes, et, method, version)
+    return f"version={version}&res={quote(res, safe='')}&et={et}&method={method}&sign={quote(sign, safe=sign_safe)}"
+
+def token_signature(res, key_bytes, et, method='sha1', version='2018-10-31'):
+    """计算token的签名（base64编码，未做URL编码），也用于校验收到的token（见 fake_mqtt_broker.py）"""
+    string_for_signature = f"{et}\n{method}\n{res}\n{version}"
+    signature = hmac.new(key_bytes, string_for_signature.encode('utf-8'), getattr(hashlib, method)).digest()
+    return base64.b64encode(signature).decode('utf-8')
+
+# 进程内共享的token缓存
+token_provider = TokenProvider()
+
+def get_token(res, access_key, **kwargs):
+    """从共享token缓存获取token，参数同 TokenProvider.get_token"""
+    return token_provider.get_token(res, access_key, **kwargs)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+常驻Python worker进程
+
+通过标准输入/输出上按行分隔的 JSON-RPC 2.0 协议，对外提供各脚本已有的 --action 操作。
+Node服务只需启动一次该进程，之后每次调用不再需要重新启动解释器、导入依赖、
+建立MySQL连接和TLS握手。
+
+请求（一行一个）:
+    {"jsonrpc": "2.0", "id": 1, "method": "rainfall_api.stats", "params": {"username": "admin", "period": "10min"}}
+响应（一行一个，顺序与请求不一定一致，用id对应）:
+    {"jsonrpc": "2.0", "id": 1, "result": {"success": true, ...}}
+
+方法名格式为 "<脚本名>.<action>"，参数与命令行参数同名，例如:
+    rainfall_db.aggregate     {"username": "admin", "full": false, "engine": "sql"}
+    db_service.login          {"username": "admin", "password": "..."}
+    onenet_http_control.control {"username": "admin", "status": "low", "timeout": 15}
+
+另外提供 worker.ping、worker.methods、worker.shutdown 三个内置方法。
+日志仍然输出到stderr（LOG: 前缀），stdout只用于协议响应。
+
+使用方法:
+    python python_worker.py --workers 8
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import importlib
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from log_util import get_logger
+
+# 每个脚本对外提供的 --action 操作，脚本需要实现 handle_action(action, params)
+WORKER_ACTIONS = {
+    'rainfall_db': ('init', 'mock', 'aggregate', 'get_recent', 'get_range', 'get_hour'),
+    'rainfall_api': ('stats', 'home', 'cache_stats'),
+    'db_service': (
+        'init', 'register', 'login', 'get_user', 'get_all_users', 'delete_user',
+        'store_device_binding', 'get_device_credentials', 'update_hardware_binding',
+        'get_user_device_info', 'log_hardware_access'
+    ),
+    'onenet_http_control': ('control', 'status', 'get-status'),
+    'onenet_sync': ('sync_once', 'get_raw_data', 'backfill'),
+    'onenet_api': ('get', 'create_device', 'create_datastream', 'activate_device', 'check_device_status'),
+    'sync_scheduler': ('add', 'remove', 'status'),
+}
+
+# JSON-RPC 2.0 错误码
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+logger = get_logger('worker')
+log = logger.info
+
+class PythonWorker:
+    """JSON-RPC worker，按行读取请求并在线程池中并发执行"""
+
+    def __init__(self, max_workers=8, preload=True):
+        self.max_workers = max_workers
+        self.started_at = time.time()
+        self.running = True
+        self.modules = {}
+        self.modules_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        # 请求在线程池中并发执行，计数需要加锁
+        self.stats_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='rpc')
+        self.handled = 0
+        self.failed = 0
+
+        if preload:
+            for module_name in WORKER_ACTIONS:
+                try:
+                    self.get_module(module_name)
+                except Exception as e:
+                    # 某个脚本的依赖缺失时不影响其他脚本
+                    log(f"预加载模块 {module_name} 失败: {str(e)}")
+
+        # 各脚本导入时可能会替换sys.stdout，这里在导入完成后再确定协议输出流，
+        # 并把sys.stdout指向stderr，防止脚本中的print污染协议输出
+        self.out = sys.stdout
+        sys.stdout = sys.stderr
+
+    def get_module(self, module_name):
+        """导入并缓存脚本模块"""
+        with self.modules_lock:
+            module = self.modules.get(module_name)
+            if module is None:
+                module = importlib.import_module(module_name)
+                self.modules[module_name] = module
+                log(f"已加载模块: {module_name}")
+            return module
+
+    def write(self, message):
+        """输出一行协议响应"""
+        line = json.dumps(message, ensure_ascii=False, default=str)
+        with self.write_lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def respond(self, request_id, result=None, error=None):
+        # 没有id的请求是通知，不需要响应
+        if request_id is None and error is None:
+            return
+        message = {"jsonrpc": "2.0", "id": request_id}
+        if error is not None:
+            message["error"] = error
+        else:
+            message["result"] = result
+        self.write(message)
+
+    def builtin(self, action, params):
+        """内置方法"""
+        if action == 'ping':
+            with self.stats_lock:
+                handled, failed = self.handled, self.failed
+            return {
+                "success": True,
+                "pid": os.getpid(),
+                "uptime": round(time.time() - self.started_at, 1),
+                "workers": self.max_workers,
+                "handled": handled,
+                "failed": failed,
+                "modules": sorted(self.modules)
+            }
+        elif action == 'methods':
+            methods = [f"{module}.{action}" for module, actions in WORKER_ACTIONS.items() for action in actions]
+            return {"success": True, "methods": methods}
+        elif action == 'shutdown':
+            self.running = False
+            return {"success": True, "message": "worker正在退出"}
+        return None
+
+    def execute(self, request_id, method, params):
+        """在线程池中执行一个请求"""
+        started = time.time()
+        try:
+            module_name, _, action = method.partition('.')
+
+            if module_name == 'worker':
+                result = self.builtin(action, params)
+                if result is None:
+                    self.respond(request_id, error={"code": METHOD_NOT_FOUND, "message": f"未知方法: {method}"})
+                else:
+                    self.respond(request_id, result=result)
+                return
+
+            if action not in WORKER_ACTIONS.get(module_name, ()):
+                self.respond(request_id, error={"code": METHOD_NOT_FOUND, "message": f"未知方法: {method}"})
+                return
+
+            module = self.get_module(module_name)
+            result = module.handle_action(action, params)
+            with self.stats_lock:
+                self.handled += 1
+            self.respond(request_id, result=result)
+            logger.debug("%s 完成，耗时 %.1fms", method, (time.time() - started) * 1000)
+        except Exception as e:
+            with self.stats_lock:
+                self.failed += 1
+            log(f"{method} 执行出错: {str(e)}")
+            log(traceback.format_exc())
+            self.respond(request_id, error={
+                "code": INTERNAL_ERROR,
+                "message": f"脚本执行错误: {str(e)}"
+            })
+
+    def handle_line(self, line):
+        """解析一行请求并提交到线程池"""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            self.respond(None, error={"code": PARSE_ERROR, "message": f"JSON解析失败: {str(e)}"})
+            return
+
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            request_id = request.get('id') if isinstance(request, dict) else None
+            self.respond(request_id, error={"code": INVALID_REQUEST, "message": "无效的请求"})
+            return
+
+        request_id = request.get('id')
+        params = request.get('params') or {}
+        if not isinstance(params, dict):
+            self.respond(request_id, error={"code": INVALID_PARAMS, "message": "params必须是对象"})
+            return
+
+        if request['method'].startswith('worker.'):
+            # 内置方法直接在读取线程中执行，worker.shutdown 可以立即结束读取循环
+            self.execute(request_id, request['method'], params)
+        else:
+            self.executor.submit(self.execute, request_id, request['method'], params)
+
+    def serve(self):
+        """主循环：从stdin读取请求，直到EOF或收到worker.shutdown"""
+        log(f"worker已启动，pid={os.getpid()}, 并发数={self.max_workers}")
+        self.write({"jsonrpc": "2.0", "method": "worker.ready", "params": {"pid": os.getpid()}})
+
+        for line in sys.stdin:
+            line = line.strip()
+            if line:
+                self.handle_line(line)
+            if not self.running:
+                break
+
+        # 等待正在执行的请求完成后再退出
+        self.executor.shutdown(wait=True)
+
+        # 脚本模块可以提供 shutdown() 释放后台线程等资源（如同步调度器）
+        for module_name, module in list(self.modules.items()):
+            shutdown = getattr(module, 'shutdown', None)
+            if callable(shutdown):
+                try:
+                    shutdown()
+                except Exception as e:
+                    log(f"模块 {module_name} 退出清理失败: {str(e)}")
+        log("worker已退出")
+
+def main():
+    parser = argparse.ArgumentParser(description='常驻Python worker（JSON-RPC over stdio）')
+    parser.add_argument('--workers', type=int, default=8, help='并发执行请求的线程数')
+    parser.add_argument('--no-preload', action='store_true', help='不在启动时预加载所有脚本模块')
+
+    args = parser.parse_args()
+
+    # 确保可以导入同目录下的脚本模块
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    worker = PythonWorker(max_workers=args.workers, preload=not args.no_preload)
+    worker.serve()
+
+if __name__ == "__main__":
+    main()
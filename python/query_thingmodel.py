@@ -9,12 +9,16 @@
 import sys
 import json
 import requests
+from onenet_http import http_client
+import onenet_api
 from onenet_api import (
-    ONENET_API_BASE,
     PRODUCT_ID,
     generate_token
 )
-from rainfall_db import log
+from log_util import get_logger
+
+logger = get_logger('query_thingmodel')
+log = logger.info
 
 def query_product_thingmodel():
     """查询产品的物模型信息"""
@@ -28,15 +32,15 @@ def query_product_thingmodel():
         
         # 尝试多种可能的物模型查询API端点
         api_endpoints = [
-            f"{ONENET_API_BASE}/thingmodel/product/{PRODUCT_ID}",
-            f"{ONENET_API_BASE}/thingmodel/product/{PRODUCT_ID}/model",
-            f"{ONENET_API_BASE}/thingmodel/product/{PRODUCT_ID}/properties",
-            f"{ONENET_API_BASE}/product/{PRODUCT_ID}/thingmodel",
-            f"{ONENET_API_BASE}/product/{PRODUCT_ID}/model",
-            f"{ONENET_API_BASE}/product/{PRODUCT_ID}/properties",
-            f"{ONENET_API_BASE}/thingmodel/query",
-            f"{ONENET_API_BASE}/thingmodel/model",
-            f"{ONENET_API_BASE}/thingmodel/properties"
+            f"{onenet_api.ONENET_API_BASE}/thingmodel/product/{PRODUCT_ID}",
+            f"{onenet_api.ONENET_API_BASE}/thingmodel/product/{PRODUCT_ID}/model",
+            f"{onenet_api.ONENET_API_BASE}/thingmodel/product/{PRODUCT_ID}/properties",
+            f"{onenet_api.ONENET_API_BASE}/product/{PRODUCT_ID}/thingmodel",
+            f"{onenet_api.ONENET_API_BASE}/product/{PRODUCT_ID}/model",
+            f"{onenet_api.ONENET_API_BASE}/product/{PRODUCT_ID}/properties",
+            f"{onenet_api.ONENET_API_BASE}/thingmodel/query",
+            f"{onenet_api.ONENET_API_BASE}/thingmodel/model",
+            f"{onenet_api.ONENET_API_BASE}/thingmodel/properties"
         ]
         
         headers = {
@@ -50,10 +54,10 @@ def query_product_thingmodel():
             
             try:
                 # 尝试GET请求
-                response = requests.get(url, headers=headers, timeout=10)
+                response = http_client.get(url, headers=headers, timeout=10)
                 
                 log(f"GET响应状态码: {response.status_code}")
-                log(f"GET响应内容: {response.text}")
+                logger.debug("GET响应内容: %s", response.text)
                 
                 if response.status_code == 200:
                     try:
@@ -71,10 +75,10 @@ def query_product_thingmodel():
                 
                 # 如果GET失败，尝试POST请求
                 post_body = {"product_id": PRODUCT_ID}
-                response = requests.post(url, json=post_body, headers=headers, timeout=10)
+                response = http_client.post(url, json=post_body, headers=headers, timeout=10)
                 
                 log(f"POST响应状态码: {response.status_code}")
-                log(f"POST响应内容: {response.text}")
+                logger.debug("POST响应内容: %s", response.text)
                 
                 if response.status_code == 200:
                     try:
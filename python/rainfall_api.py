@@ -10,37 +10,279 @@ import argparse
 from rainfall_db import (
     get_recent_data,
     get_data_by_timerange,
-    get_current_hour_data,
-    log
+    get_current_hour_data
 )
+from log_util import get_logger
+from stats_cache import stats_cache
+from chart_downsample import downsample_series, point_budget
 # 不再需要从rainfall_collector导入，因为我们已经删除了这个文件
 
-# 重新定义log函数，确保使用ASCII编码
-def log(message):
-    # 使用ASCII字符集输出日志，避免中文编码问题
-    try:
-        # 尝试将中文替换为英文描述
-        message = message.encode('ascii', 'replace').decode('ascii')
-    except:
-        # 如果失败，使用原始消息
-        pass
-
-    print(f"LOG: {message}", file=sys.stderr)
-    sys.stderr.flush()  # 确保日志立即输出
+# 日志记录（共享的缓冲日志，stderr编码不支持中文时自动替换为ASCII）
+logger = get_logger('rainfall_api')
+log = logger.info
 
 # 不设置 stdout 编码，使用系统默认编码
 # Windows环境下通常是cp936或gbk
 
-def get_statistics_data(username='admin', period='10min'):
-    """获取统计页面所需的数据
+def _index_rows(rows, slot_key):
+    """按时间点建立索引，同一时间点有多条数据时保留第一条
+
+    参数:
+        rows: 查询结果列表
+        slot_key: 从数据行计算所属时间点的函数
+
+    返回:
+        dict: {时间点: 数据行}
+    """
+    index = {}
+    for item in rows:
+        index.setdefault(slot_key(item), item)
+    return index
+
+def format_hourly_slots(rows, start_time, now):
+    """把10分钟聚合数据格式化为一小时视图，每10分钟一个时间点，没有数据的时间点显示为0
+
+    参数:
+        rows: 10分钟聚合数据（get_data_by_timerange 的 data）
+        start_time: 视图开始时间
+        now: 视图结束时间
+
+    返回:
+        list: 前端所需格式的数据
+    """
+    # 先按时间点建立索引，每个时间点只需一次查找，总耗时与数据量和时间点数之和成正比
+    index = _index_rows(rows, lambda item: item["timestamp"].replace(second=0, microsecond=0))
+
+    slot = start_time.replace(minute=start_time.minute // 10 * 10, second=0, microsecond=0)
+    log(f"一小时视图: 开始时间 = {slot.strftime('%H:%M')}, 结束时间 = {now.strftime('%H:%M')}")
+
+    formatted_data = []
+    matched = 0
+    while slot <= now:
+        item = index.get(slot)
+        if item is not None:  # 如果有数据，使用实际数据
+            matched += 1
+            timestamp = item["timestamp"]
+            formatted_data.append({
+                "value": [
+                    timestamp.strftime("%H:%M"),
+                    item["avg_rainfall"]
+                ],
+                "originalDate": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                "timeKey": {
+                    "minute": timestamp.strftime("%H:%M"),
+                    "tenMinute": f"{timestamp.hour}:{timestamp.minute // 10 * 10:02d}",
+                    "hour": f"{timestamp.hour}:00",
+                    "day": f"{timestamp.month}/{timestamp.day}"
+                },
+                "rainfallValue": item["avg_rainfall"],
+                "unit": "mm/h"
+            })
+        else:  # 如果没有数据，显示为0
+            formatted_data.append({
+                "value": [
+                    slot.strftime("%H:%M"),
+                    0.0
+                ],
+                "originalDate": slot.strftime("%Y-%m-%d %H:%M:%S"),
+                "timeKey": {
+                    "minute": slot.strftime("%H:%M"),
+                    "tenMinute": f"{slot.hour}:{slot.minute // 10 * 10:02d}",
+                    "hour": f"{slot.hour}:00",
+                    "day": f"{slot.month}/{slot.day}"
+                },
+                "rainfallValue": 0.0,
+                "unit": "mm/h"
+            })
+        slot += timedelta(minutes=10)
+
+    log(f"一小时视图: 生成了 {len(formatted_data)} 个时间点，其中 {matched} 个有数据")
+    return formatted_data
+
+def format_daily_slots(rows, now):
+    """把小时聚合数据格式化为一天视图，当天每小时一个时间点，没有数据的时间点显示为0
+
+    参数:
+        rows: 小时聚合数据
+        now: 视图结束时间，只生成这一天的时间点
+
+    返回:
+        list: 前端所需格式的数据
+    """
+    # 时间点都是当天的整点，按整点建立索引后其他日期的数据自然不会匹配
+    index = _index_rows(rows, lambda item: item["timestamp"].replace(minute=0, second=0, microsecond=0))
+
+    slot = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    log(f"一天视图: 开始时间 = {slot.strftime('%Y-%m-%d %H:%M')}, 结束时间 = {now.strftime('%Y-%m-%d %H:%M')}")
+
+    formatted_data = []
+    matched = 0
+    while slot <= now and slot.date() == now.date():
+        item = index.get(slot)
+        if item is not None:  # 如果有数据，使用实际数据
+            matched += 1
+            timestamp = item["timestamp"]
+            formatted_data.append({
+                "value": [
+                    timestamp.strftime("%H:00"),
+                    item["avg_rainfall"]
+                ],
+                "originalDate": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                "timeKey": {
+                    "hour": f"{timestamp.hour}:00",
+                    "day": f"{timestamp.month}/{timestamp.day}"
+                },
+                "rainfallValue": item["avg_rainfall"],
+                "unit": "mm/h"
+            })
+        else:  # 如果没有数据，显示为0
+            formatted_data.append({
+                "value": [
+                    slot.strftime("%H:00"),
+                    0.0
+                ],
+                "originalDate": slot.strftime("%Y-%m-%d %H:%M:%S"),
+                "timeKey": {
+                    "hour": f"{slot.hour}:00",
+                    "day": f"{slot.month}/{slot.day}"
+                },
+                "rainfallValue": 0.0,
+                "unit": "mm/h"
+            })
+        slot += timedelta(hours=1)
+
+    log(f"一天视图: 生成了 {len(formatted_data)} 个当天的时间点，其中 {matched} 个有数据")
+    return formatted_data
+
+def format_all_slots(rows, start_time, now):
+    """把日聚合数据格式化为全部视图，每天一个时间点，没有数据的日期显示为0
+
+    参数:
+        rows: 日聚合数据（item["date"] 为date类型）
+        start_time: 视图开始时间
+        now: 视图结束时间
+
+    返回:
+        list: 前端所需格式的数据
+    """
+    index = _index_rows(rows, lambda item: item["date"])
+
+    slot = start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    log(f"全部视图: 开始时间 = {slot.strftime('%Y-%m-%d')}, 结束时间 = {now.strftime('%Y-%m-%d')}")
+
+    formatted_data = []
+    matched = 0
+    while slot <= now:
+        item = index.get(slot.date())
+        if item is not None:  # 如果有数据，使用实际数据
+            matched += 1
+            formatted_data.append({
+                "value": [
+                    item["date"].strftime("%m/%d"),
+                    item["total_rainfall"]
+                ],
+                "originalDate": item["date"].strftime("%Y-%m-%d"),
+                "timeKey": {
+                    "day": f"{item['date'].month}/{item['date'].day}"
+                },
+                "rainfallValue": item["total_rainfall"],
+                "unit": "mm/天"
+            })
+        else:  # 如果没有数据，显示为0
+            formatted_data.append({
+                "value": [
+                    slot.strftime("%m/%d"),
+                    0.0
+                ],
+                "originalDate": slot.strftime("%Y-%m-%d"),
+                "timeKey": {
+                    "day": f"{slot.month}/{slot.day}"
+                },
+                "rainfallValue": 0.0,
+                "unit": "mm/天"
+            })
+        slot += timedelta(days=1)
+
+    log(f"全部视图: 生成了 {len(formatted_data)} 个时间点，其中 {matched} 个有数据")
+    return formatted_data
+
+# 各视图缓存的时间段长度（秒）：10分钟视图和当前小时数据随原始数据每5秒变化，
+# 其余视图的时间点分别按10分钟、小时、天推进
+STATS_CACHE_SLOT_SECONDS = {
+    '10min': 5,
+    'hourly': 600,
+    'daily': 3600,
+    'all': 86400,
+    'current_hour': 5
+}
+
+def _slot_boundary(now, seconds):
+    """把时间向下取整到当天零点起 seconds 秒的整数倍，作为缓存键中的时间段边界"""
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elapsed = int((now - midnight).total_seconds()) // seconds * seconds
+    return midnight + timedelta(seconds=elapsed)
+
+def _get_current_hour_cached(username, now):
+    """获取当前小时累计雨量，5秒内的重复请求使用缓存"""
+    boundary = _slot_boundary(now, STATS_CACHE_SLOT_SECONDS['current_hour'])
+    return stats_cache.get_or_load(username, 'current_hour', boundary, lambda: get_current_hour_data(username))
+
+def get_statistics_data(username='admin', period='10min', points=None):
+    """获取统计页面所需的数据，结果按 (用户名, 时间粒度, 时间段边界) 缓存，见 stats_cache.py
 
     参数:
         username: 用户名，默认为'admin'
         period: 时间粒度，可选值: '10min', 'hourly', 'daily', 'all'
+        points: 图表的点数预算，超过时降采样，0表示不降采样；None时只有原始数据视图（RAW_PERIODS）
+                按 chart_downsample.POINT_BUDGETS 降采样
     """
-    try:
-        now = datetime.now()
+    now = datetime.now()
+    slot_seconds = STATS_CACHE_SLOT_SECONDS.get(period)
+    if slot_seconds is None or period == 'current_hour':
+        result = _load_statistics_data(username, period, now)
+    else:
+        boundary = _slot_boundary(now, slot_seconds)
+        result = stats_cache.get_or_load(username, period, boundary, lambda: _load_statistics_data(username, period, now))
+    return _downsample_statistics(_attach_current_hour(result, username, period, now), period, points)
+
+# 附带当前小时累计雨量的视图
+CURRENT_HOUR_PERIODS = ('10min', 'hourly')
+
+def _attach_current_hour(result, username, period, now):
+    """在读取视图缓存之后附加当前小时累计雨量
+
+    当前小时数据随每次写入原始数据变化，单独按5秒缓存；不放进按10分钟缓存的一小时视图中，
+    否则聚合被跳过或在其他进程（如 mqtt_ingest.py）中写入原始数据时会返回过时的值。返回浅拷贝，不修改缓存
+    """
+    if period not in CURRENT_HOUR_PERIODS or not result.get("success"):
+        return result
+    hour_data = _get_current_hour_cached(username, now)
+    return dict(result, currentHour=hour_data["data"] if hour_data["success"] else None)
+
+# 由原始数据点组成的视图，其他视图是按时段聚合的固定个数（7、24、31个）的时段，只在请求中指定 points 时降采样
+RAW_PERIODS = ('10min',)
+
+def _downsample_statistics(result, period, points):
+    """按点数预算对统计数据降采样，缓存中保存的是完整数据，这里返回浅拷贝不修改缓存"""
+    if not result.get("success") or not result.get("data"):
+        return result
+    if points is None and period not in RAW_PERIODS:
+        return result
+    data, info = downsample_series(result["data"], point_budget(period, points),
+                                   [item["rainfallValue"] or 0 for item in result["data"]])
+    if info is None:
+        return result
+    return dict(result, data=data, downsample=info)
+
+def _load_statistics_data(username, period, now):
+    """从数据库查询并格式化统计页面所需的数据
 
+    参数:
+        username: 用户名
+        period: 时间粒度，可选值: '10min', 'hourly', 'daily', 'all'
+        now: 视图结束时间
+    """
+    try:
         if period == '10min':
             # 获取最近10分钟的数据，使用原始数据
             start_time = now - timedelta(minutes=10)
@@ -82,14 +324,11 @@ def get_statistics_data(username='admin', period='10min'):
                         "unit": "mm/h"
                     })
 
-                # 获取当前小时累计雨量
-                hour_data = get_current_hour_data(username)
-
+                # 当前小时累计雨量在读取缓存之后附加，见 _attach_current_hour
                 return {
                     "success": True,
                     "period": "10min",
                     "data": formatted_data,
-                    "currentHour": hour_data["data"] if hour_data["success"] else None,
                     "unit": "mm/h"
                 }
             else:
@@ -102,66 +341,13 @@ def get_statistics_data(username='admin', period='10min'):
 
             if result["success"]:
                 # 转换为前端所需格式
-                formatted_data = []
-
-                # 生成过去1小时的每10分钟的时间点
-                time_slots = []
-                slot_start = start_time.replace(minute=start_time.minute // 10 * 10, second=0, microsecond=0)
-                log(f"一小时视图: 开始时间 = {slot_start.strftime('%H:%M')}, 结束时间 = {now.strftime('%H:%M')}")
-                while slot_start <= now:
-                    time_slots.append(slot_start)
-                    slot_start += timedelta(minutes=10)
-                log(f"一小时视图: 生成了 {len(time_slots)} 个时间点")
-
-                # 对每个时间点处理
-                for slot in time_slots:
-                    # 查找该时间点的数据
-                    # 将时间戳的秒和微秒设为0进行比较
-                    slot_data = [item for item in result["data"] if item["timestamp"].replace(second=0, microsecond=0) == slot]
-                    log(f"一小时视图: 时间点 {slot.strftime('%H:%M')} 找到 {len(slot_data)} 个数据点")
-
-                    if slot_data:  # 如果有数据，使用实际数据
-                        item = slot_data[0]  # 取第一个数据点
-                        formatted_data.append({
-                            "value": [
-                                item["timestamp"].strftime("%H:%M"),
-                                item["avg_rainfall"]
-                            ],
-                            "originalDate": item["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
-                            "timeKey": {
-                                "minute": item["timestamp"].strftime("%H:%M"),
-                                "tenMinute": f"{item['timestamp'].hour}:{item['timestamp'].minute // 10 * 10:02d}",
-                                "hour": f"{item['timestamp'].hour}:00",
-                                "day": f"{item['timestamp'].month}/{item['timestamp'].day}"
-                            },
-                            "rainfallValue": item["avg_rainfall"],
-                            "unit": "mm/h"
-                        })
-                    else:  # 如果没有数据，显示为0
-                        formatted_data.append({
-                            "value": [
-                                slot.strftime("%H:%M"),
-                                0.0
-                            ],
-                            "originalDate": slot.strftime("%Y-%m-%d %H:%M:%S"),
-                            "timeKey": {
-                                "minute": slot.strftime("%H:%M"),
-                                "tenMinute": f"{slot.hour}:{slot.minute // 10 * 10:02d}",
-                                "hour": f"{slot.hour}:00",
-                                "day": f"{slot.month}/{slot.day}"
-                            },
-                            "rainfallValue": 0.0,
-                            "unit": "mm/h"
-                        })
-
-                # 获取当前小时累计雨量
-                hour_data = get_current_hour_data(username)
+                formatted_data = format_hourly_slots(result["data"], start_time, now)
 
+                # 当前小时累计雨量在读取缓存之后附加，见 _attach_current_hour
                 return {
                     "success": True,
                     "period": "hourly",
                     "data": formatted_data,
-                    "currentHour": hour_data["data"] if hour_data["success"] else None,
                     "unit": "mm/h"
                 }
             else:
@@ -176,65 +362,7 @@ def get_statistics_data(username='admin', period='10min'):
 
             if result["success"]:
                 # 转换为前端所需格式
-                formatted_data = []
-
-                # 生成当天的每小时时间点
-                time_slots = []
-                # 确保开始时间是当天的0点
-                today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-                slot_start = today_start
-                log(f"一天视图: 开始时间 = {slot_start.strftime('%Y-%m-%d %H:%M')}, 结束时间 = {now.strftime('%Y-%m-%d %H:%M')}")
-
-                # 只生成当天的时间点
-                while slot_start <= now:
-                    # 确保时间点是当天的
-                    if slot_start.date() == now.date():
-                        time_slots.append(slot_start)
-                    slot_start += timedelta(hours=1)
-
-                log(f"一天视图: 生成了 {len(time_slots)} 个当天的时间点")
-
-                # 对每个时间点处理
-                for slot in time_slots:
-                    # 查找该时间点的数据
-                    # 将时间戳的分钟、秒和微秒设为0进行比较
-                    # 同时确保数据点是当天的
-                    slot_data = [
-                        item for item in result["data"]
-                        if (item["timestamp"].replace(minute=0, second=0, microsecond=0) == slot and
-                            item["timestamp"].date() == now.date())
-                    ]
-                    log(f"一天视图: 时间点 {slot.strftime('%H:00')} 找到 {len(slot_data)} 个当天的数据点")
-
-                    if slot_data:  # 如果有数据，使用实际数据
-                        item = slot_data[0]  # 取第一个数据点
-                        formatted_data.append({
-                            "value": [
-                                item["timestamp"].strftime("%H:00"),
-                                item["avg_rainfall"]
-                            ],
-                            "originalDate": item["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
-                            "timeKey": {
-                                "hour": f"{item['timestamp'].hour}:00",
-                                "day": f"{item['timestamp'].month}/{item['timestamp'].day}"
-                            },
-                            "rainfallValue": item["avg_rainfall"],
-                            "unit": "mm/h"
-                        })
-                    else:  # 如果没有数据，显示为0
-                        formatted_data.append({
-                            "value": [
-                                slot.strftime("%H:00"),
-                                0.0
-                            ],
-                            "originalDate": slot.strftime("%Y-%m-%d %H:%M:%S"),
-                            "timeKey": {
-                                "hour": f"{slot.hour}:00",
-                                "day": f"{slot.month}/{slot.day}"
-                            },
-                            "rainfallValue": 0.0,
-                            "unit": "mm/h"
-                        })
+                formatted_data = format_daily_slots(result["data"], now)
 
                 return {
                     "success": True,
@@ -252,52 +380,7 @@ def get_statistics_data(username='admin', period='10min'):
 
             if result["success"]:
                 # 转换为前端所需格式
-                formatted_data = []
-
-                # 生成过去30天的每天的时间点
-                time_slots = []
-                slot_start = start_time.replace(hour=0, minute=0, second=0, microsecond=0)
-                log(f"全部视图: 开始时间 = {slot_start.strftime('%Y-%m-%d')}, 结束时间 = {now.strftime('%Y-%m-%d')}")
-                while slot_start <= now:
-                    time_slots.append(slot_start)
-                    slot_start += timedelta(days=1)
-                log(f"全部视图: 生成了 {len(time_slots)} 个时间点")
-
-                # 对每个时间点处理
-                for slot in time_slots:
-                    # 查找该时间点的数据
-                    slot_date = slot.date()
-                    # 注意：item["date"]已经是date类型，不需要再调用date()方法
-                    slot_data = [item for item in result["data"] if item["date"] == slot_date]
-                    log(f"全部视图: 时间点 {slot_date.strftime('%Y-%m-%d')} 找到 {len(slot_data)} 个数据点")
-
-                    if slot_data:  # 如果有数据，使用实际数据
-                        item = slot_data[0]  # 取第一个数据点
-                        formatted_data.append({
-                            "value": [
-                                item["date"].strftime("%m/%d"),
-                                item["total_rainfall"]
-                            ],
-                            "originalDate": item["date"].strftime("%Y-%m-%d"),
-                            "timeKey": {
-                                "day": f"{item['date'].month}/{item['date'].day}"
-                            },
-                            "rainfallValue": item["total_rainfall"],
-                            "unit": "mm/天"
-                        })
-                    else:  # 如果没有数据，显示为0
-                        formatted_data.append({
-                            "value": [
-                                slot.strftime("%m/%d"),
-                                0.0
-                            ],
-                            "originalDate": slot.strftime("%Y-%m-%d"),
-                            "timeKey": {
-                                "day": f"{slot.month}/{slot.day}"
-                            },
-                            "rainfallValue": 0.0,
-                            "unit": "mm/天"
-                        })
+                formatted_data = format_all_slots(result["data"], start_time, now)
 
                 return {
                     "success": True,
@@ -374,24 +457,33 @@ def get_home_data(username='admin'):
         log(traceback.format_exc())
         return {"success": False, "error": str(e)}
 
+def handle_action(action, params):
+    """执行命令行 --action 对应的操作，供命令行和常驻worker进程共用"""
+    username = params.get('username') or 'admin'
+    if action == 'stats':
+        return get_statistics_data(username, params.get('period') or '10min', params.get('points'))
+    elif action == 'home':
+        return get_home_data(username)
+    elif action == 'cache_stats':
+        return stats_cache.stats()
+    else:
+        return {"success": False, "error": "未知操作"}
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='雨量数据API')
-    parser.add_argument('--action', choices=['stats', 'home'],
+    parser.add_argument('--action', choices=['stats', 'home', 'cache_stats'],
                         required=True, help='执行的操作')
     parser.add_argument('--username', type=str, default='admin',
                         help='用户名，默认为admin')
     parser.add_argument('--period', choices=['10min', 'hourly', 'daily', 'all'],
                         default='10min', help='统计数据的时间粒度')
+    parser.add_argument('--points', type=int,
+                        help='图表的点数预算，超过时降采样，0表示不降采样，默认只对10min视图按 RAINFALL_CHART_POINTS 降采样')
 
     args = parser.parse_args()
 
     try:
-        if args.action == 'stats':
-            result = get_statistics_data(args.username, args.period)
-        elif args.action == 'home':
-            result = get_home_data(args.username)
-        else:
-            result = {"success": False, "error": "未知操作"}
+        result = handle_action(args.action, vars(args))
 
         # 以标准JSON格式输出结果
         # 确保使用ASCII编码输出，避免中文编码问题
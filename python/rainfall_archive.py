@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+原始雨量数据的列式冷归档
+
+按保留策略清理出热表的原始数据可以先归档到本地文件，之后仍可用于审计、按时间范围查询和重新聚合。
+每个用户每个月一个文件: <归档目录>/<用户名>/<YYYY-MM>.rfa，文件内按天分块，每块四列分别用zlib压缩:
+- 时间戳: 相对上一条数据的秒数（差分编码，uint32），块内第一条相对块的起始时间
+- 雨量值: 以0.1mm/h为单位的整数（int16，对应 DECIMAL(5,1) 的一位小数）
+- 雨量级别: none/light/medium/heavy 的编号（uint8）
+- 雨量百分比: 0-100（uint8）
+
+5秒间隔的时间差几乎都是5，压缩后一个月的数据只有原表的很小一部分。文件末尾是块索引，
+读取时用 mmap 映射整个文件，只解压与查询范围相交的块。原始数据的 id 和 created_at 不归档。
+
+由 rainfall_db.py 调用，本模块不访问数据库:
+- archive_month(): 把一个用户一个月的数据写入（或合并进）归档文件
+- read_range():    读取一个用户在时间范围内的归档数据，返回与 rainfall_raw 查询结果相同格式的字典
+- iter_range():    read_range 的生成器版本，用于流式输出
+
+环境变量:
+    RAINFALL_ARCHIVE_DIR    归档目录，默认为本目录下的 rainfall_archive
+"""
+
+import os
+import sys
+import mmap
+import zlib
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from decimal import Decimal
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+ARCHIVE_DIR = os.environ.get('RAINFALL_ARCHIVE_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'rainfall_archive')
+
+# 雨量级别编号，与 rainfall_raw.rainfall_level 的ENUM顺序一致
+LEVELS = ('none', 'light', 'medium', 'heavy')
+_LEVEL_CODES = {level: code for code, level in enumerate(LEVELS)}
+
+_MAGIC = b'RFARCH'
+_VERSION = 1
+_HEADER = struct.Struct('<6sH')
+# 块索引: 第一条和最后一条的时间（秒）、行数、偏移量、四列压缩后的长度
+_BLOCK = struct.Struct('<qqIQIIII')
+# 文件尾: 块索引的偏移量、块数、结束标记
+_TRAILER = struct.Struct('<QI6s')
+_END_MAGIC = b'RFAEND'
+
+_EPOCH = datetime(1970, 1, 1)
+_INT16_MAX = 32767
+
+def _to_seconds(value):
+    return int((value - _EPOCH).total_seconds())
+
+def _from_seconds(seconds):
+    return _EPOCH + timedelta(seconds=seconds)
+
+def _pack(typecode, values):
+    data = array(typecode, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+def _unpack(typecode, payload):
+    data = array(typecode)
+    data.frombytes(payload)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+def archive_path(username, year, month, archive_dir=None):
+    """用户某月的归档文件路径，用户名经过URL编码，不会产生子目录"""
+    return os.path.join(archive_dir or ARCHIVE_DIR, quote(username, safe=''), f"{year:04d}-{month:02d}.rfa")
+
+def has_archive(username, archive_dir=None):
+    """用户是否有归档数据"""
+    return os.path.isdir(os.path.join(archive_dir or ARCHIVE_DIR, quote(username, safe='')))
+
+def encode_row(row):
+    """rainfall_raw 查询结果的一行 -> (秒, 雨量值*10, 级别编号, 百分比)"""
+    tenths = int(Decimal(str(row['rainfall_value'])) * 10)
+    if not -_INT16_MAX <= tenths <= _INT16_MAX:
+        raise ValueError(f"雨量值超出归档范围: {row['rainfall_value']} ({row['timestamp']})")
+    percentage = int(row['rainfall_percentage'])
+    if not 0 <= percentage <= 255:
+        raise ValueError(f"雨量百分比超出归档范围: {percentage} ({row['timestamp']})")
+    return _to_seconds(row['timestamp']), tenths, _LEVEL_CODES[row['rainfall_level']], percentage
+
+class ArchiveWriter:
+    """顺序写入一个归档文件，先写临时文件，close() 时原子地替换目标文件
+
+    用法:
+        with ArchiveWriter(path) as writer:
+            writer.add_block(rows)   # rows 为按时间排序的 encode_row() 结果
+    """
+
+    def __init__(self, path, compresslevel=6):
+        self.path = path
+        self.compresslevel = compresslevel
+        self.rows = 0
+        self._index = []
+        self._tmp_path = f"{path}.tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(self._tmp_path, 'wb')
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION))
+
+    def add_block(self, rows):
+        """写入一块数据（通常为一天），rows 必须按时间升序排列"""
+        if not rows:
+            return
+        first = rows[0][0]
+        deltas = []
+        previous = first
+        for seconds, _, _, _ in rows:
+            if seconds < previous:
+                raise ValueError("归档数据必须按时间升序写入")
+            deltas.append(seconds - previous)
+            previous = seconds
+
+        columns = (
+            _pack('I', deltas),
+            _pack('h', (row[1] for row in rows)),
+            _pack('B', (row[2] for row in rows)),
+            _pack('B', (row[3] for row in rows))
+        )
+        payloads = [zlib.compress(column.tobytes(), self.compresslevel) for column in columns]
+        offset = self._file.tell()
+        for payload in payloads:
+            self._file.write(payload)
+        self._index.append((first, previous, len(rows), offset) + tuple(len(payload) for payload in payloads))
+        self.rows += len(rows)
+
+    def close(self):
+        """写入块索引并替换目标文件，返回文件大小"""
+        index_offset = self._file.tell()
+        for entry in self._index:
+            self._file.write(_BLOCK.pack(*entry))
+        self._file.write(_TRAILER.pack(index_offset, len(self._index), _END_MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        size = self._file.tell()
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        return size
+
+    def abort(self):
+        """放弃写入，删除临时文件，目标文件保持不变"""
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        try:
+            # 用户目录为空时一并删除，避免 has_archive 误判
+            os.rmdir(os.path.dirname(self.path))
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class ArchiveReader:
+    """用 mmap 读取归档文件，按块索引只解压与查询范围相交的块"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        # 写入中断或被截断的文件（不足文件头加文件尾、索引与文件长度对不上）都按无效文件处理
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _HEADER.size + _TRAILER.size:
+            self._file.close()
+            raise ValueError(f"不是有效的归档文件: {path}")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        magic, version = _HEADER.unpack_from(self._mmap, 0)
+        index_offset, block_count, end_magic = _TRAILER.unpack_from(self._mmap, size - _TRAILER.size)
+        if (magic != _MAGIC or end_magic != _END_MAGIC or version != _VERSION
+                or index_offset + block_count * _BLOCK.size + _TRAILER.size != size):
+            self.close()
+            raise ValueError(f"不是有效的归档文件: {path}")
+        self.blocks = [_BLOCK.unpack_from(self._mmap, index_offset + i * _BLOCK.size) for i in range(block_count)]
+        self.rows = sum(block[2] for block in self.blocks)
+
+    def _decode_block(self, block):
+        """解压一块数据，返回 (时间列表, 雨量值, 级别, 百分比) 四列"""
+        first, _, _, offset, *lengths = block
+        columns = []
+        for typecode, length in zip('IhBB', lengths):
+            with memoryview(self._mmap)[offset:offset + length] as view:
+                columns.append(_unpack(typecode, zlib.decompress(view)))
+            offset += length
+        deltas = columns[0]
+        deltas[0] += first
+        return [list(accumulate(deltas))] + columns[1:]
+
+    def iter_blocks(self, start=None, end=None):
+        """逐块生成 [start, end] 范围（两端都包含）内的数据，每块为 encode_row() 格式的列表"""
+        low = _to_seconds(start) if start is not None else None
+        high = _to_seconds(end) if end is not None else None
+        for block in self.blocks:
+            if (low is not None and block[1] < low) or (high is not None and block[0] > high):
+                continue
+            seconds, values, levels, percentages = self._decode_block(block)
+            begin = bisect_left(seconds, low) if low is not None else 0
+            stop = bisect_right(seconds, high) if high is not None else len(seconds)
+            yield list(zip(seconds[begin:stop], values[begin:stop], levels[begin:stop], percentages[begin:stop]))
+
+    def read(self, start=None, end=None):
+        """读取 [start, end] 范围（两端都包含）内的数据，返回 encode_row() 格式的列表"""
+        return [row for rows in self.iter_blocks(start, end) for row in rows]
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _month_days(year, month):
+    day = datetime(year, month, 1)
+    while day.month == month:
+        yield day, day + timedelta(days=1)
+        day += timedelta(days=1)
+
+def archive_month(username, year, month, fetch_day, archive_dir=None):
+    """把一个用户一个月的原始数据写入归档文件
+
+    文件已存在时按天与已归档的数据合并（相同时间戳以新数据为准），因此可以重复执行，
+    也可以先归档月初的部分数据、之后再补充同一个月的其余数据。每次最多只在内存中保留一天的数据。
+
+    参数:
+        username: 用户名
+        year, month: 归档的月份
+        fetch_day: 读取原始数据的函数，参数为 (开始时间, 结束时间)，返回 rainfall_raw 查询结果的字典列表
+        archive_dir: 归档目录，默认 ARCHIVE_DIR
+
+    返回:
+        dict: 文件路径、本次从数据库读取的行数、文件中的总行数和文件大小
+    """
+    path = archive_path(username, year, month, archive_dir)
+    existing = ArchiveReader(path) if os.path.exists(path) else None
+    writer = ArchiveWriter(path)
+    fetched = 0
+    try:
+        for day_start, day_end in _month_days(year, month):
+            merged = {}
+            if existing is not None:
+                merged.update((row[0], row) for row in existing.read(day_start, day_end - timedelta(seconds=1)))
+            rows = fetch_day(day_start, day_end)
+            fetched += len(rows)
+            merged.update((encoded[0], encoded) for encoded in map(encode_row, rows))
+            writer.add_block([merged[seconds] for seconds in sorted(merged)])
+    except Exception:
+        writer.abort()
+        raise
+    finally:
+        # 先关闭旧文件的映射再替换文件（Windows不能替换仍被映射的文件）
+        if existing is not None:
+            existing.close()
+
+    if writer.rows == 0:
+        writer.abort()
+        return {"path": None, "fetched_rows": 0, "rows": 0, "bytes": 0}
+    writer.close()
+
+    # 重新打开校验文件完整
+    with ArchiveReader(path) as reader:
+        total = reader.rows
+    return {"path": path, "fetched_rows": fetched, "rows": total, "bytes": os.path.getsize(path)}
+
+def _months(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def iter_range(username, start, end, archive_dir=None):
+    """逐条生成一个用户在 [start, end] 范围内的归档数据，每次只解压一个块
+
+    返回:
+        generator: 按时间排序的字典，字段与 rainfall_raw 相同，id 和 created_at 为None
+    """
+    for year, month in _months(start, end):
+        path = archive_path(username, year, month, archive_dir)
+        if not os.path.exists(path):
+            continue
+        with ArchiveReader(path) as reader:
+            for rows in reader.iter_blocks(start, end):
+                for seconds, tenths, level, percentage in rows:
+                    yield {
+                        "id": None,
+                        "username": username,
+                        "timestamp": _from_seconds(seconds),
+                        "rainfall_value": Decimal(tenths).scaleb(-1),
+                        "rainfall_level": LEVELS[level],
+                        "rainfall_percentage": percentage,
+                        "created_at": None
+                    }
+
+def read_range(username, start, end, archive_dir=None):
+    """读取一个用户在 [start, end] 范围内的归档数据，返回 iter_range 生成的字典列表"""
+    return list(iter_range(username, start, end, archive_dir))
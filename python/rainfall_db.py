@@ -2,6 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import pymysql
+from db_pool import get_pool
+from log_util import get_logger
+import stats_cache
+import rainfall_partition
+import rainfall_archive
 import json
 import sys
 import traceback
@@ -11,6 +16,11 @@ from datetime import datetime, timedelta
 import random
 import os
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # 设置环境变量，确保Python使用UTF-8编码
 os.environ['PYTHONIOENCODING'] = 'utf-8'
 
@@ -29,26 +39,9 @@ try:
 except Exception as e:
     print(f"无法设置标准输出编码: {e}", file=sys.stderr)
 
-# 添加日志记录
-def log(message):
-    try:
-        # 确保消息是字符串
-        if not isinstance(message, str):
-            message = str(message)
-        # 使用 utf-8 编码输出日志
-        print(f"LOG: {message}", file=sys.stderr)
-        sys.stderr.flush()  # 确保日志立即输出
-    except Exception as e:
-        # 如果出现编码错误，尝试使用 ASCII 编码
-        print(f"LOG: [编码错误] {str(e)}", file=sys.stderr)
-        try:
-            # 尝试将消息转换为 ASCII
-            ascii_message = message.encode('ascii', 'replace').decode('ascii')
-            print(f"LOG: {ascii_message}", file=sys.stderr)
-        except:
-            # 如果仍然失败，输出一个通用消息
-            print("LOG: [无法显示日志消息]", file=sys.stderr)
-        sys.stderr.flush()
+# 日志记录（共享的缓冲日志，见 log_util.py）
+logger = get_logger('rainfall_db')
+log = logger.info
 
 # 使用与db_service.py相同的数据库配置
 db_config = {
@@ -59,8 +52,8 @@ db_config = {
     "database": "intelligent_wiper_db"
 }
 
-def get_db_connection():
-    """获取数据库连接"""
+def _create_connection():
+    """建立一个新的数据库连接，数据库不存在时自动创建，供连接池调用"""
     try:
         # 测试数据库连接
         log("Trying to connect to database...")
@@ -105,6 +98,13 @@ def get_db_connection():
             log(f"Failed to create database: {str(create_err)}")
             raise
 
+def get_db_connection():
+    """从共享连接池获取数据库连接，调用 close() 时归还连接池
+
+    也可以作为上下文管理器使用: with get_db_connection() as conn: ...
+    """
+    return get_pool(db_config, _create_connection).get_connection()
+
 def init_rainfall_tables():
     """初始化雨量数据相关的表结构，如果表不存在则创建，保留现有数据"""
     conn = get_db_connection()
@@ -115,6 +115,14 @@ def init_rainfall_tables():
         # 创建新的表
         with conn.cursor() as cursor:
             # 创建原始雨量数据表 (5秒一个数据点)
+            # 开启 RAINFALL_RAW_PARTITION 且表不存在时按时间分区建表，见 rainfall_partition.py
+            partition_scheme = rainfall_partition.configured_scheme()
+            cursor.execute("SHOW TABLES LIKE 'rainfall_raw'")
+            raw_exists = cursor.fetchone() is not None
+            if partition_scheme and not raw_exists:
+                log(f"按{partition_scheme}分区创建rainfall_raw表")
+                cursor.execute(rainfall_partition.raw_table_ddl('rainfall_raw', partition_scheme))
+
             # 使用IF NOT EXISTS确保不会删除现有数据
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS rainfall_raw (
@@ -127,7 +135,7 @@ def init_rainfall_tables():
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     INDEX idx_timestamp (timestamp),
                     INDEX idx_username (username),
-                    INDEX idx_username_timestamp (username, timestamp)
+                    UNIQUE KEY uk_username_timestamp (username, timestamp)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='原始雨量数据 (5秒间隔)';
             ''')
 
@@ -314,6 +322,20 @@ def init_rainfall_tables():
                 ''')
                 log("expected_points列添加成功")
 
+            # 旧版本创建的原始数据表没有唯一键，这里补上
+            _ensure_raw_unique_key(cursor)
+
+            # 分区表预建未来的分区；已有的未分区表需要显式迁移
+            if rainfall_partition.get_partitions(cursor, 'rainfall_raw'):
+                result = rainfall_partition.maintain_partitions(cursor)
+                if result["success"] and result["created"]:
+                    log(f"rainfall_raw预建分区: {result['created']}")
+            elif partition_scheme:
+                log("rainfall_raw是未分区的旧表，执行 --action migrate_partitions 迁移为分区布局")
+
+            # 创建聚合水位线表，记录每个用户每个粒度已聚合到的原始数据ID
+            _ensure_watermark_table(cursor)
+
         conn.commit()
         return {"success": True, "message": "雨量数据表初始化成功"}
     except Exception as e:
@@ -323,8 +345,115 @@ def init_rainfall_tables():
     finally:
         conn.close()
 
+def _ensure_raw_unique_key(cursor):
+    """确保 rainfall_raw 有 (username, timestamp) 唯一键，所有写入都依赖它去重
+
+    旧版本的表只有普通索引 idx_username_timestamp，且可能已有重复数据：
+    先删除重复的数据点（保留ID最小的一条），再把普通索引替换为唯一键。
+    需要全表扫描和重建索引，只在 init 中执行，不在写入路径上执行。
+    """
+    cursor.execute("SHOW INDEX FROM rainfall_raw WHERE Key_name = 'uk_username_timestamp'")
+    if not cursor.fetchone():
+        log("rainfall_raw 缺少 (username, timestamp) 唯一键，开始清理重复数据并添加唯一键")
+        deleted = cursor.execute('''
+            DELETE r1 FROM rainfall_raw r1
+            JOIN rainfall_raw r2
+              ON r1.username = r2.username
+             AND r1.timestamp = r2.timestamp
+             AND r1.id > r2.id
+        ''')
+        log(f"已删除 {deleted} 条重复的原始数据")
+
+        cursor.execute("SHOW INDEX FROM rainfall_raw WHERE Key_name = 'idx_username_timestamp'")
+        if cursor.fetchone():
+            cursor.execute('''
+                ALTER TABLE rainfall_raw
+                DROP INDEX idx_username_timestamp,
+                ADD UNIQUE KEY uk_username_timestamp (username, timestamp)
+            ''')
+        else:
+            cursor.execute("ALTER TABLE rainfall_raw ADD UNIQUE KEY uk_username_timestamp (username, timestamp)")
+        log("rainfall_raw 唯一键添加成功")
+
+# 聚合粒度，按聚合顺序排列
+AGGREGATE_GRANULARITIES = ('10min', 'hourly', 'daily', 'monthly')
+
+# 本进程内水位线表是否已确认存在，避免每次聚合都执行DDL
+_watermark_table_ready = False
+
+def _ensure_watermark_table(cursor):
+    """创建聚合水位线表（如果不存在）
+
+    每个用户、每个聚合粒度一行，last_raw_id 为该粒度已经聚合过的最大原始数据ID。
+    """
+    global _watermark_table_ready
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rainfall_agg_watermark (
+            username VARCHAR(50) NOT NULL COMMENT '用户名',
+            granularity ENUM('10min', 'hourly', 'daily', 'monthly') NOT NULL COMMENT '聚合粒度',
+            last_raw_id BIGINT NOT NULL DEFAULT 0 COMMENT '已聚合的最大原始数据ID',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (username, granularity)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='雨量数据聚合水位线';
+    ''')
+    _watermark_table_ready = True
+
+def _get_watermark(cursor, username, granularity):
+    """获取某个粒度的聚合水位线，没有记录时返回0"""
+    cursor.execute('''
+        SELECT last_raw_id FROM rainfall_agg_watermark
+        WHERE username = %s AND granularity = %s
+    ''', (username, granularity))
+    result = cursor.fetchone()
+    return result['last_raw_id'] if result else 0
+
+def _set_watermark(cursor, username, granularity, last_raw_id):
+    """更新某个粒度的聚合水位线"""
+    cursor.execute('''
+        INSERT INTO rainfall_agg_watermark (username, granularity, last_raw_id)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            last_raw_id = VALUES(last_raw_id),
+            updated_at = CURRENT_TIMESTAMP
+    ''', (username, granularity, last_raw_id))
+
+def _get_dirty_time_range(cursor, username, after_id, upto_id):
+    """获取水位线之后新增原始数据覆盖的时间范围
+
+    按ID而不是时间戳判断新增数据，这样补录的历史数据也会被重新聚合。
+
+    返回:
+        tuple: (最小时间戳, 最大时间戳)，没有新增数据时返回None
+    """
+    cursor.execute('''
+        SELECT MIN(timestamp) as min_ts, MAX(timestamp) as max_ts
+        FROM rainfall_raw
+        WHERE username = %s
+        AND id > %s AND id <= %s
+    ''', (username, after_id, upto_id))
+    result = cursor.fetchone()
+    if not result or result['min_ts'] is None:
+        return None
+    return result['min_ts'], result['max_ts']
+
+def _slot_range(granularity, min_ts, max_ts):
+    """把新增数据的时间范围扩展为该粒度完整时间段的左闭右开区间"""
+    if granularity == '10min':
+        start = min_ts.replace(minute=min_ts.minute // 10 * 10, second=0, microsecond=0)
+        end = max_ts.replace(minute=max_ts.minute // 10 * 10, second=0, microsecond=0) + timedelta(minutes=10)
+    elif granularity == 'hourly':
+        start = min_ts.replace(minute=0, second=0, microsecond=0)
+        end = max_ts.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    elif granularity == 'daily':
+        start = min_ts.date()
+        end = max_ts.date() + timedelta(days=1)
+    else:  # monthly
+        start = min_ts.date().replace(day=1)
+        end = (max_ts.date().replace(day=1) + timedelta(days=32)).replace(day=1)
+    return start, end
+
 def insert_raw_rainfall(username, timestamp, rainfall_value, rainfall_level, rainfall_percentage):
-    """插入原始雨量数据
+    """插入原始雨量数据，同一用户同一时间戳的数据已存在时跳过（依赖 (username, timestamp) 唯一键）
 
     参数:
         username: 用户名
@@ -333,14 +462,8 @@ def insert_raw_rainfall(username, timestamp, rainfall_value, rainfall_level, rai
         rainfall_level: 雨量级别 ('none', 'light', 'medium', 'heavy')
         rainfall_percentage: 雨量百分比 (0-100)
     """
-    # 详细输出用户名信息
-    log(f"插入原始雨量数据，原始用户名: '{username}', 类型: {type(username)}")
-
-    # 检查用户名是否包含特殊字符
-    if username:
-        log(f"用户名长度: {len(username)}")
-        for i, char in enumerate(username):
-            log(f"字符 {i}: '{char}', 编码: {ord(char)}")
+    # 用户名的类型、长度和逐个字符（用于排查不可见字符）只在DEBUG级别输出
+    logger.debug("插入原始雨量数据，原始用户名: %r, 类型: %s, 长度: %d", username, type(username), len(username or ''))
 
     # 强制使用传入的用户名，不再使用默认值
     if not username or username.strip() == '':
@@ -348,31 +471,94 @@ def insert_raw_rainfall(username, timestamp, rainfall_value, rainfall_level, rai
         username = 'admin'
     else:
         username = username.strip()
-        log(f"强制使用传入的用户名: '{username}', 长度: {len(username)}")
+        logger.debug("强制使用传入的用户名: %r", username)
 
     conn = get_db_connection()
     try:
         with conn.cursor() as cursor:
             # 强制使用传入的用户名，确保数据库中存储的是正确的用户名
             sql = '''
-                INSERT INTO rainfall_raw
+                INSERT IGNORE INTO rainfall_raw
                 (username, timestamp, rainfall_value, rainfall_level, rainfall_percentage)
                 VALUES (%s, %s, %s, %s, %s)
             '''
-            log(f"执行SQL，参数: username='{username}', timestamp={timestamp}, rainfall_value={rainfall_value}, rainfall_level={rainfall_level}, rainfall_percentage={rainfall_percentage}")
-
-            # 再次确认用户名
-            log(f"最终插入数据库的用户名: '{username}'")
-            cursor.execute(sql, (username, timestamp, rainfall_value, rainfall_level, rainfall_percentage))
+            logger.debug("执行SQL，参数: username=%r, timestamp=%s, rainfall_value=%s, rainfall_level=%s, rainfall_percentage=%s",
+                         username, timestamp, rainfall_value, rainfall_level, rainfall_percentage)
+            inserted = cursor.execute(sql, (username, timestamp, rainfall_value, rainfall_level, rainfall_percentage))
         conn.commit()
+        if not inserted:
+            log(f"原始雨量数据已存在，跳过，用户名: '{username}', 时间戳: {timestamp}")
+            return {"success": True, "inserted": False, "message": "该时间戳的原始雨量数据已存在"}
+        stats_cache.invalidate(username, stats_cache.RAW_PERIODS)
         log(f"原始雨量数据插入成功，用户名: '{username}'")
-        return {"success": True, "message": "原始雨量数据插入成功"}
+        return {"success": True, "inserted": True, "message": "原始雨量数据插入成功"}
     except Exception as e:
         log(f"原始雨量数据插入失败: {str(e)}, 用户名: '{username}'")
         return {"success": False, "error": str(e)}
     finally:
         conn.close()
 
+def bulk_insert_raw_rainfall(username, records):
+    """批量插入原始雨量数据，在一个事务中用多行 INSERT IGNORE 写入
+
+    依赖 (username, timestamp) 唯一键去重：数据库中已存在的时间戳、以及本批次内重复的时间戳都会被跳过。
+
+    参数:
+        username: 用户名
+        records: (timestamp, rainfall_value) 列表，雨量级别和百分比由 get_rainfall_levels 批量计算
+
+    返回:
+        dict: 包含 inserted_count（新插入条数）和 skipped_count（重复跳过条数）的字典
+    """
+    if not username or username.strip() == '':
+        username = 'admin'
+    else:
+        username = username.strip()
+
+    records = list(records)
+    timestamps = [timestamp for timestamp, _ in records]
+    values = [float(rainfall_value) for _, rainfall_value in records]
+    codes, percentages = get_rainfall_levels(values)
+    rows = [
+        (username, timestamp, rainfall_value, RAINFALL_LEVELS[code], int(percentage))
+        for timestamp, rainfall_value, code, percentage in zip(timestamps, values, codes, percentages)
+    ]
+
+    if not rows:
+        return {"success": True, "inserted_count": 0, "skipped_count": 0}
+
+    conn = None
+    try:
+        # 取连接失败（数据库不可用、连接池等待超时）也返回失败结果，调用方据此重试
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            # pymysql 会把 INSERT ... VALUES 的 executemany 合并为多行INSERT语句，1000条数据只需一次往返
+            inserted_count = cursor.executemany('''
+                INSERT IGNORE INTO rainfall_raw
+                (username, timestamp, rainfall_value, rainfall_level, rainfall_percentage)
+                VALUES (%s, %s, %s, %s, %s)
+            ''', rows)
+        conn.commit()
+        if inserted_count:
+            stats_cache.invalidate(username, stats_cache.RAW_PERIODS)
+
+        skipped_count = len(rows) - inserted_count
+        log(f"批量插入原始雨量数据完成，用户名: '{username}', 新插入: {inserted_count}, 跳过重复: {skipped_count}")
+        return {
+            "success": True,
+            "inserted_count": inserted_count,
+            "skipped_count": skipped_count
+        }
+    except Exception as e:
+        if conn is not None:
+            conn.rollback()
+        log(f"批量插入原始雨量数据失败: {str(e)}, 用户名: '{username}'")
+        log(traceback.format_exc())
+        return {"success": False, "error": str(e)}
+    finally:
+        if conn is not None:
+            conn.close()
+
 def get_rainfall_level(value):
     """根据雨量值获取雨量级别
 
@@ -405,6 +591,49 @@ def get_rainfall_level(value):
         percentage = round(76 + (min(value, 33) - 4.0) * (100 - 76) / (33 - 4.0))
         return 'heavy', percentage
 
+# 雨量级别，下标即 get_rainfall_levels 返回的级别编号
+RAINFALL_LEVELS = ('none', 'light', 'medium', 'heavy')
+
+# 与 get_rainfall_level 各分支对应的分段表: (百分比起点, 百分比跨度, 区间起点, 区间宽度, 雨量上限)
+# 各项保持与标量版本相同的浮点运算顺序，保证两者结果逐个相同
+RAINFALL_LEVEL_TABLE = (
+    (0, 25, 0.0, 0.3, 0.3),
+    (26, 50 - 26, 0.3, 2.2 - 0.3, float('inf')),
+    (51, 75 - 51, 2.2, 4.0 - 2.2, float('inf')),
+    (76, 100 - 76, 4.0, 33 - 4.0, 33)
+)
+
+if np is not None:
+    # 0.3 属于小雨（左闭），2.2 和 4.0 分别属于小雨和中雨（右闭）
+    _LEVEL_LEFT_CLOSED_BREAKS = np.array([0.3])
+    _LEVEL_RIGHT_CLOSED_BREAKS = np.array([2.2, 4.0])
+    _LEVEL_BASE, _LEVEL_SPAN, _LEVEL_LOW, _LEVEL_WIDTH, _LEVEL_CAP = (
+        np.array(column, dtype=float) for column in zip(*RAINFALL_LEVEL_TABLE)
+    )
+
+def get_rainfall_levels(values):
+    """批量计算雨量级别和百分比，结果与逐个调用 get_rainfall_level 完全相同
+
+    参数:
+        values: 雨量值列表或numpy数组 (mm/h)
+
+    返回:
+        tuple: (级别编号数组, 百分比数组)，级别编号为 RAINFALL_LEVELS 中的下标；
+               没有安装numpy时返回两个列表
+    """
+    if np is None:
+        pairs = [get_rainfall_level(float(value)) for value in values]
+        return [RAINFALL_LEVELS.index(level) for level, _ in pairs], [percentage for _, percentage in pairs]
+
+    values = np.asarray(values, dtype=float)
+    codes = (np.searchsorted(_LEVEL_LEFT_CLOSED_BREAKS, values, side='right')
+             + np.searchsorted(_LEVEL_RIGHT_CLOSED_BREAKS, values, side='left'))
+    # np.rint 与 round() 一样按银行家舍入
+    percentages = np.rint(
+        _LEVEL_BASE[codes] + (np.minimum(values, _LEVEL_CAP[codes]) - _LEVEL_LOW[codes]) * _LEVEL_SPAN[codes] / _LEVEL_WIDTH[codes]
+    ).astype(np.int64)
+    return codes, percentages
+
 def generate_mock_data(username='admin', days=7):
     """初始化一个起始数据点，不再清除现有数据
 
@@ -412,14 +641,8 @@ def generate_mock_data(username='admin', days=7):
         username: 用户名，默认为'admin'
         days: 参数保留但不再使用，仅用于兼容现有API
     """
-    # 详细输出用户名信息
-    log(f"初始化模拟数据，原始用户名: '{username}', 类型: {type(username)}")
-
-    # 检查用户名是否包含特殊字符
-    if username:
-        log(f"用户名长度: {len(username)}")
-        for i, char in enumerate(username):
-            log(f"字符 {i}: '{char}', 编码: {ord(char)}")
+    # 用户名的类型、长度和逐个字符（用于排查不可见字符）只在DEBUG级别输出
+    logger.debug("初始化模拟数据，原始用户名: %r, 类型: %s, 长度: %d", username, type(username), len(username or ''))
 
     # 强制使用传入的用户名，不再使用默认值
     if not username or username.strip() == '':
@@ -427,7 +650,7 @@ def generate_mock_data(username='admin', days=7):
         username = 'admin'
     else:
         username = username.strip()
-        log(f"强制使用传入的用户名: '{username}', 长度: {len(username)}")
+        logger.debug("强制使用传入的用户名: %r", username)
 
     conn = get_db_connection()
     try:
@@ -457,7 +680,7 @@ def generate_mock_data(username='admin', days=7):
         # 插入原始数据表
         with conn.cursor() as cursor:
             cursor.execute("""
-                INSERT INTO rainfall_raw (username, timestamp, rainfall_value, rainfall_level, rainfall_percentage)
+                INSERT IGNORE INTO rainfall_raw (username, timestamp, rainfall_value, rainfall_level, rainfall_percentage)
                 VALUES (%s, %s, %s, %s, %s)
             """, (username, now, rainfall_value, level, percentage))
 
@@ -474,20 +697,364 @@ def generate_mock_data(username='admin', days=7):
     finally:
         conn.close()
 
-def aggregate_data(username='admin'):
+def _load_usernames(users, user_prefix):
+    """把 users 参数解析为用户名列表：整数表示生成 N 个 <前缀>0001 形式的用户，否则按逗号分隔的用户名处理"""
+    if isinstance(users, int) or str(users).strip().isdigit():
+        return [f"{user_prefix}{index:04d}" for index in range(1, int(users) + 1)]
+    return [name.strip() for name in str(users).split(',') if name.strip()]
+
+def generate_load_data(users=1, days=30, start=None, seed=0, batch_size=5000,
+                       user_prefix='loadtest_', aggregate=False, engine=None):
+    """为压测生成大批量的合成原始雨量数据
+
+    每个用户的5秒序列由 synthetic_rainfall.rainfall_series 按种子生成（降雨过程、干燥期、设备离线造成的缺失），
+    边生成边按 batch_size 条一批用 INSERT IGNORE 写入并提交，内存占用与总行数无关。
+    相同的种子、用户和起始时间生成的数据完全相同，重复执行时已存在的数据点被唯一键跳过。
+
+    参数:
+        users: 用户数量（生成 <user_prefix>0001 ... 的用户名）或逗号分隔的用户名
+        days: 每个用户生成的天数
+        start: 开始时间，格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS，默认为今天0点往前 days 天
+        seed: 随机种子
+        batch_size: 每批写入的条数
+        user_prefix: 按数量生成用户名时的前缀
+        aggregate: 写入后是否对每个用户全量重建聚合数据
+        engine: 聚合实现，见 aggregate_data
+
+    返回:
+        dict: 包含生成/插入/跳过条数、耗时和写入速度的字典
+    """
+    import synthetic_rainfall
+
+    usernames = _load_usernames(users, user_prefix)
+    if not usernames:
+        return {"success": False, "error": "没有指定用户"}
+
+    if start:
+        start_time = datetime.fromisoformat(str(start))
+    else:
+        start_time = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    end_time = start_time + timedelta(days=days)
+    batch_size = max(int(batch_size), 1)
+
+    log(f"开始生成合成数据: {len(usernames)} 个用户, {start_time} ~ {end_time}, 种子: {seed}, 每批 {batch_size} 条")
+
+    generated_count = 0
+    inserted_count = 0
+    started = time.monotonic()
+    next_report = 1000000
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            def write_batch(username, batch):
+                codes, percentages = get_rainfall_levels([value for _, value in batch])
+                rows = [
+                    (username, timestamp, value, RAINFALL_LEVELS[code], int(percentage))
+                    for (timestamp, value), code, percentage in zip(batch, codes, percentages)
+                ]
+                count = cursor.executemany('''
+                    INSERT IGNORE INTO rainfall_raw
+                    (username, timestamp, rainfall_value, rainfall_level, rainfall_percentage)
+                    VALUES (%s, %s, %s, %s, %s)
+                ''', rows)
+                conn.commit()
+                return count
+
+            for username in usernames:
+                batch = []
+                series = synthetic_rainfall.rainfall_series(
+                    start_time, end_time, synthetic_rainfall.series_seed(seed, username))
+                for point in series:
+                    batch.append(point)
+                    if len(batch) >= batch_size:
+                        inserted_count += write_batch(username, batch)
+                        generated_count += len(batch)
+                        batch = []
+
+                        if generated_count >= next_report:
+                            elapsed = time.monotonic() - started
+                            log(f"已生成 {generated_count} 条, 新插入 {inserted_count} 条, {generated_count / elapsed:.0f} 条/秒")
+                            next_report += 1000000
+                if batch:
+                    inserted_count += write_batch(username, batch)
+                    generated_count += len(batch)
+
+                stats_cache.invalidate(username, stats_cache.RAW_PERIODS)
+    except Exception as e:
+        conn.rollback()
+        log(f"生成合成数据失败: {str(e)}, 已生成: {generated_count} 条")
+        log(traceback.format_exc())
+        return {"success": False, "error": str(e), "generated_count": generated_count, "inserted_count": inserted_count}
+    finally:
+        conn.close()
+
+    elapsed = time.monotonic() - started
+    result = {
+        "success": True,
+        "users": usernames,
+        "start": start_time,
+        "end": end_time,
+        "seed": seed,
+        "generated_count": generated_count,
+        "inserted_count": inserted_count,
+        "skipped_count": generated_count - inserted_count,
+        "elapsed_seconds": round(elapsed, 2),
+        "rows_per_second": round(generated_count / elapsed) if elapsed > 0 else None
+    }
+    log(f"合成数据生成完成: 生成 {generated_count} 条, 新插入 {inserted_count} 条, "
+        f"耗时 {elapsed:.1f} 秒, {result['rows_per_second']} 条/秒")
+
+    if aggregate:
+        result["aggregation"] = {
+            username: aggregate_data(username, full_rebuild=True, engine=engine)
+            for username in usernames
+        }
+    return result
+
+# 根据各级别计数选出主要雨量级别，计数相同时按 none, light, medium, heavy 的顺序取第一个
+_DOMINANT_LEVEL_SQL = '''
+    CASE GREATEST(n_none, n_light, n_medium, n_heavy)
+        WHEN n_none THEN 'none'
+        WHEN n_light THEN 'light'
+        WHEN n_medium THEN 'medium'
+        ELSE 'heavy'
+    END
+'''
+
+def _rollup_10min(cursor, username, range_start, range_end):
+    """原始数据 -> 10分钟聚合，一条 INSERT ... SELECT 完成范围内所有时间段
+
+    平均值使用应有点数(120)作为分母，缺失的5秒点视为0。
+
+    返回:
+        int: 受影响的行数
+    """
+    return cursor.execute('''
+        INSERT INTO rainfall_10min
+        (username, timestamp, avg_rainfall, max_rainfall, min_rainfall, dominant_level, data_points, expected_points)
+        SELECT
+            username, time_slot, ROUND(total_rainfall / 120, 1), max_rainfall, min_rainfall,
+            ''' + _DOMINANT_LEVEL_SQL + ''', actual_points, 120
+        FROM (
+            SELECT
+                username,
+                DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:%%i:00') - INTERVAL MINUTE(timestamp) %% 10 MINUTE as time_slot,
+                SUM(rainfall_value) as total_rainfall,
+                MAX(rainfall_value) as max_rainfall,
+                MIN(rainfall_value) as min_rainfall,
+                COUNT(*) as actual_points,
+                SUM(rainfall_level = 'none') as n_none,
+                SUM(rainfall_level = 'light') as n_light,
+                SUM(rainfall_level = 'medium') as n_medium,
+                SUM(rainfall_level = 'heavy') as n_heavy
+            FROM rainfall_raw
+            WHERE username = %s
+            AND timestamp >= %s AND timestamp < %s
+            GROUP BY username, time_slot
+        ) slots
+        ON DUPLICATE KEY UPDATE
+            rainfall_10min.avg_rainfall = VALUES(avg_rainfall),
+            rainfall_10min.max_rainfall = VALUES(max_rainfall),
+            rainfall_10min.min_rainfall = VALUES(min_rainfall),
+            rainfall_10min.dominant_level = VALUES(dominant_level),
+            rainfall_10min.data_points = VALUES(data_points),
+            rainfall_10min.expected_points = VALUES(expected_points),
+            rainfall_10min.updated_at = CURRENT_TIMESTAMP
+    ''', (username, range_start, range_end))
+
+def _rollup_hourly(cursor, username, range_start, range_end):
+    """10分钟聚合 -> 小时聚合
+
+    平均值为10分钟点之和除以6，缺失的10分钟段视为0；
+    累计雨量为每个10分钟段的平均雨量(mm/h)乘以10/60小时之和。
+    """
+    return cursor.execute('''
+        INSERT INTO rainfall_hourly
+        (username, timestamp, avg_rainfall, max_rainfall, min_rainfall, total_rainfall, dominant_level, data_points, expected_points)
+        SELECT
+            username, hour_slot, ROUND(sum_avg_rainfall / 6, 1), max_rainfall, min_rainfall,
+            ROUND(sum_avg_rainfall * 10 / 60, 1),
+            ''' + _DOMINANT_LEVEL_SQL + ''', actual_points, 6
+        FROM (
+            SELECT
+                username,
+                DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00') as hour_slot,
+                SUM(avg_rainfall) as sum_avg_rainfall,
+                MAX(max_rainfall) as max_rainfall,
+                MIN(min_rainfall) as min_rainfall,
+                COUNT(*) as actual_points,
+                SUM(dominant_level = 'none') as n_none,
+                SUM(dominant_level = 'light') as n_light,
+                SUM(dominant_level = 'medium') as n_medium,
+                SUM(dominant_level = 'heavy') as n_heavy
+            FROM rainfall_10min
+            WHERE username = %s
+            AND timestamp >= %s AND timestamp < %s
+            GROUP BY username, hour_slot
+            HAVING SUM(data_points) > 0
+        ) slots
+        ON DUPLICATE KEY UPDATE
+            rainfall_hourly.avg_rainfall = VALUES(avg_rainfall),
+            rainfall_hourly.max_rainfall = VALUES(max_rainfall),
+            rainfall_hourly.min_rainfall = VALUES(min_rainfall),
+            rainfall_hourly.total_rainfall = VALUES(total_rainfall),
+            rainfall_hourly.dominant_level = VALUES(dominant_level),
+            rainfall_hourly.data_points = VALUES(data_points),
+            rainfall_hourly.expected_points = VALUES(expected_points),
+            rainfall_hourly.updated_at = CURRENT_TIMESTAMP
+    ''', (username, range_start, range_end))
+
+def _rollup_daily(cursor, username, range_start, range_end):
+    """小时聚合 -> 日聚合
+
+    平均值为各小时累计雨量之和除以24，缺失的小时视为0；平均雨量 >= 0.3 的小时计为有雨小时。
+    """
+    return cursor.execute('''
+        INSERT INTO rainfall_daily
+        (username, date, avg_rainfall, max_rainfall, min_rainfall, total_rainfall, rainy_hours, data_points, expected_points)
+        SELECT
+            username,
+            DATE(timestamp) as day_slot,
+            ROUND(SUM(total_rainfall) / 24, 1),
+            MAX(max_rainfall),
+            MIN(min_rainfall),
+            ROUND(SUM(total_rainfall), 1),
+            SUM(avg_rainfall >= 0.3),
+            COUNT(*),
+            24
+        FROM rainfall_hourly
+        WHERE username = %s
+        AND timestamp >= %s AND timestamp < %s
+        GROUP BY username, day_slot
+        ON DUPLICATE KEY UPDATE
+            rainfall_daily.avg_rainfall = VALUES(avg_rainfall),
+            rainfall_daily.max_rainfall = VALUES(max_rainfall),
+            rainfall_daily.min_rainfall = VALUES(min_rainfall),
+            rainfall_daily.total_rainfall = VALUES(total_rainfall),
+            rainfall_daily.rainy_hours = VALUES(rainy_hours),
+            rainfall_daily.data_points = VALUES(data_points),
+            rainfall_daily.expected_points = VALUES(expected_points),
+            rainfall_daily.updated_at = CURRENT_TIMESTAMP
+    ''', (username, range_start, range_end))
+
+def _rollup_monthly(cursor, username, range_start, range_end):
+    """日聚合 -> 月聚合
+
+    应有点数为当月天数；实际天数不足时平均日雨量以当月天数为分母，缺少的天视为0。
+    """
+    return cursor.execute('''
+        INSERT INTO rainfall_monthly
+        (username, year, month, avg_daily_rainfall, max_daily_rainfall, total_rainfall, rainy_days, data_points, expected_points)
+        SELECT
+            username, year_val, month_val,
+            ROUND(CASE WHEN actual_days < days_in_month
+                       THEN month_total_rainfall / days_in_month
+                       ELSE avg_daily_rainfall END, 1),
+            max_daily_rainfall,
+            ROUND(month_total_rainfall, 1),
+            rainy_days, actual_days, days_in_month
+        FROM (
+            SELECT
+                username,
+                YEAR(date) as year_val,
+                MONTH(date) as month_val,
+                DAY(LAST_DAY(MIN(date))) as days_in_month,
+                SUM(total_rainfall) as month_total_rainfall,
+                AVG(total_rainfall) as avg_daily_rainfall,
+                MAX(total_rainfall) as max_daily_rainfall,
+                SUM(total_rainfall >= 0.3) as rainy_days,
+                COUNT(*) as actual_days
+            FROM rainfall_daily
+            WHERE username = %s
+            AND date >= %s AND date < %s
+            GROUP BY username, year_val, month_val
+        ) slots
+        ON DUPLICATE KEY UPDATE
+            rainfall_monthly.avg_daily_rainfall = VALUES(avg_daily_rainfall),
+            rainfall_monthly.max_daily_rainfall = VALUES(max_daily_rainfall),
+            rainfall_monthly.total_rainfall = VALUES(total_rainfall),
+            rainfall_monthly.rainy_days = VALUES(rainy_days),
+            rainfall_monthly.data_points = VALUES(data_points),
+            rainfall_monthly.expected_points = VALUES(expected_points),
+            rainfall_monthly.updated_at = CURRENT_TIMESTAMP
+    ''', (username, range_start, range_end))
+
+# 聚合实现: sql 为逐级 INSERT ... SELECT，pandas 为读出原始数据后用 numpy/pandas 向量化计算再批量写回，
+# 两者结果相同；pandas 适合大范围补录和全量重建。默认值可以用环境变量 RAINFALL_AGG_ENGINE 设置
+AGGREGATE_ENGINES = ('sql', 'pandas')
+DEFAULT_AGGREGATE_ENGINE = os.environ.get('RAINFALL_AGG_ENGINE', 'sql').strip().lower()
+
+# (粒度, 日志名称, SQL聚合函数)，按聚合顺序排列
+_ROLLUP_STEPS = (
+    ('10min', '10分钟', _rollup_10min),
+    ('hourly', '小时', _rollup_hourly),
+    ('daily', '日', _rollup_daily),
+    ('monthly', '月', _rollup_monthly)
+)
+
+def _compute_vectorized_rollups(conn, username, slot_ranges):
+    """用 rainfall_vectorized 计算各粒度的聚合结果，numpy/pandas 不可用时返回None"""
+    try:
+        import rainfall_vectorized
+    except ImportError as e:
+        log(f"无法使用pandas聚合（{str(e)}），改用SQL聚合")
+        return None
+
+    def fetch_raw(start, end):
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT timestamp, rainfall_value, rainfall_level
+                FROM rainfall_raw
+                WHERE username = %s
+                AND timestamp >= %s AND timestamp < %s
+            ''', (username, start, end))
+            return cursor.fetchall()
+
+    started = time.time()
+    rollups = rainfall_vectorized.compute_rollups(fetch_raw, slot_ranges)
+    coverage = {granularity: rainfall_vectorized.coverage(frame, granularity) for granularity, frame in rollups.items()}
+    log(f"pandas聚合计算完成，耗时: {time.time() - started:.2f}秒，数据完整率: {coverage}")
+    return rollups
+
+def _granularities_missing_raw(cursor, username, slot_ranges):
+    """原始数据已按保留策略清理时，返回时间段起点早于最早原始数据所在日的粒度
+
+    pandas 聚合的各级结果都从原始数据计算，这些粒度（通常是原始数据清理边界所在的月）的时间段
+    包含已经清理的原始数据，需要改用SQL从已保留的下一级聚合表计算。
+    """
+    cursor.execute("SELECT MIN(timestamp) AS oldest FROM rainfall_raw WHERE username = %s", (username,))
+    result = cursor.fetchone()
+    if not result or result['oldest'] is None:
+        return set()
+    oldest_day = result['oldest'].replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # 日聚合中有早于最早原始数据的记录，说明原始数据被清理过
+    cursor.execute("SELECT 1 FROM rainfall_daily WHERE username = %s AND date < %s LIMIT 1", (username, oldest_day))
+    if not cursor.fetchone():
+        return set()
+    return {
+        granularity for granularity, (start, _) in slot_ranges.items()
+        if _retention_unit_start('raw', start) < oldest_day
+    }
+
+def _write_vectorized_rollup(cursor, username, granularity, frame):
+    """把 _compute_vectorized_rollups 计算的一个粒度的结果批量写回聚合表"""
+    from rainfall_vectorized import write_rollup
+    return write_rollup(cursor, username, granularity, frame)
+
+def aggregate_data(username='admin', full_rebuild=False, engine=None):
     """聚合数据到各个时间粒度的表中
 
+    默认只重新计算上次聚合之后新增原始数据所在的时间段（按水位线增量聚合）。
+
     参数:
         username: 用户名，默认为'admin'
+        full_rebuild: 是否忽略水位线，重新聚合该用户的全部历史数据（用于修复）
+        engine: 聚合实现，'sql' 或 'pandas'，默认使用 DEFAULT_AGGREGATE_ENGINE
     """
-    # 详细输出用户名信息
-    log(f"聚合数据，原始用户名: '{username}', 类型: {type(username)}")
-
-    # 检查用户名是否包含特殊字符
-    if username:
-        log(f"用户名长度: {len(username)}")
-        for i, char in enumerate(username):
-            log(f"字符 {i}: '{char}', 编码: {ord(char)}")
+    # 用户名的类型、长度和逐个字符（用于排查不可见字符）只在DEBUG级别输出
+    logger.debug("聚合数据，原始用户名: %r, 类型: %s, 长度: %d", username, type(username), len(username or ''))
 
     # 强制使用传入的用户名，不再使用默认值
     if not username or username.strip() == '':
@@ -495,522 +1062,80 @@ def aggregate_data(username='admin'):
         username = 'admin'
     else:
         username = username.strip()
-        log(f"强制使用传入的用户名: '{username}', 长度: {len(username)}")
+        logger.debug("强制使用传入的用户名: %r", username)
+
+    engine = (engine or DEFAULT_AGGREGATE_ENGINE).strip().lower()
+    if engine not in AGGREGATE_ENGINES:
+        return {"success": False, "error": f"不支持的聚合实现: {engine}"}
 
     conn = get_db_connection()
     try:
-        # 检查是否有原始数据
+        # 确定本次需要重新聚合的时间范围
         with conn.cursor() as cursor:
+            if not _watermark_table_ready:
+                _ensure_watermark_table(cursor)
+
+            # 本次聚合处理到的最大原始数据ID，之后插入的数据留给下一次聚合
             cursor.execute('''
-                SELECT COUNT(*) as count FROM rainfall_raw
+                SELECT MAX(id) as max_id FROM rainfall_raw
                 WHERE username = %s
             ''', (username,))
             result = cursor.fetchone()
-            raw_count = result['count'] if result else 0
-            log(f"原始数据点数量: {raw_count}")
+            upto_id = result['max_id'] if result and result['max_id'] else 0
 
-            if raw_count == 0:
+            if upto_id == 0:
                 log(f"没有原始数据点，跳过聚合")
                 return {"success": True, "message": "No raw data points to aggregate"}
 
-        # 1. 聚合到10分钟表 - 修改后的逻辑
-        log(f"开始聚合10分钟数据...")
-        with conn.cursor() as cursor:
-            try:
-                # 先查询可能被聚合的数据
-                cursor.execute('''
-                    SELECT
-                        DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:%%i:00') - INTERVAL MINUTE(timestamp) %% 10 MINUTE as time_slot,
-                        COUNT(*) as count
-                    FROM rainfall_raw
-                    WHERE username = %s
-                    GROUP BY time_slot
-                ''', (username,))
-                time_slots = cursor.fetchall()
-                log(f"找到 {len(time_slots)} 个10分钟时间段需要聚合")
-
-                # 对每个10分钟时间段单独处理
-                for slot in time_slots:
-                    time_slot = slot['time_slot']
-                    actual_count = slot['count']
-
-                    # 计算这10分钟内应该有的所有5秒原始点数量
-                    # 10分钟 = 600秒，每5秒一个点，应该有120个点
-                    expected_points = 120
-
-                    log(f"处理10分钟时间段: {time_slot}, 实际数据点: {actual_count}, 应有数据点: {expected_points}")
-
-                    # 查询该时间段内的实际数据
-                    cursor.execute('''
-                        SELECT
-                            SUM(rainfall_value) as total_rainfall,
-                            MAX(rainfall_value) as max_rainfall,
-                            MIN(rainfall_value) as min_rainfall,
-                            COUNT(*) as actual_points
-                        FROM rainfall_raw
-                        WHERE username = %s
-                        AND timestamp >= %s
-                        AND timestamp < %s + INTERVAL 10 MINUTE
-                    ''', (username, time_slot, time_slot))
-
-                    result = cursor.fetchone()
-
-                    if result and result['actual_points'] > 0:
-                        total_rainfall = result['total_rainfall'] or 0
-                        max_rainfall = result['max_rainfall'] or 0
-                        min_rainfall = result['min_rainfall'] or 0
-                        actual_points = result['actual_points']
-
-                        # 计算平均值，使用应有的点数作为分母
-                        # 确保所有值都是浮点数，避免decimal和float混合计算
-                        total_rainfall_float = float(total_rainfall)
-                        expected_points_float = float(expected_points)
-
-                        # 使用浮点数计算
-                        avg_rainfall = round(total_rainfall_float / expected_points_float, 1)
-
-                        # 记录详细的计算过程，用于调试
-                        log(f"  10分钟聚合 - 强制使用预期点数计算平均值: {total_rainfall} / {expected_points} = {round(float(total_rainfall) / float(expected_points), 3)}")
-                        log(f"  10分钟聚合 - 验证平均值: 原始值=[{total_rainfall}], 平均值={avg_rainfall}")
-                        log(f"  总雨量: {total_rainfall}, 实际点数: {actual_points}, 预期点数: {expected_points}, 平均值: {avg_rainfall}")
-                        log(f"  10分钟聚合 - 原始点值: [{total_rainfall}]")
-                        log(f"  10分钟聚合 - 计算平均值: {total_rainfall} / {expected_points} = {avg_rainfall}")
-
-                        log(f"10分钟段 {time_slot}: 总雨量={total_rainfall}, 平均雨量={avg_rainfall}, 实际点数={actual_points}, 应有点数={expected_points}")
-
-                        # 获取主要雨量级别
-                        cursor.execute('''
-                            SELECT rainfall_level, COUNT(*) as level_count
-                            FROM rainfall_raw
-                            WHERE username = %s
-                            AND timestamp >= %s
-                            AND timestamp < %s + INTERVAL 10 MINUTE
-                            GROUP BY rainfall_level
-                            ORDER BY level_count DESC
-                            LIMIT 1
-                        ''', (username, time_slot, time_slot))
-
-                        level_result = cursor.fetchone()
-                        dominant_level = level_result['rainfall_level'] if level_result else 'none'
-
-                        # 插入或更新10分钟聚合数据
-                        cursor.execute('''
-                            INSERT INTO rainfall_10min
-                            (username, timestamp, avg_rainfall, max_rainfall, min_rainfall, dominant_level, data_points, expected_points)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                            ON DUPLICATE KEY UPDATE
-                                avg_rainfall = VALUES(avg_rainfall),
-                                max_rainfall = VALUES(max_rainfall),
-                                min_rainfall = VALUES(min_rainfall),
-                                dominant_level = VALUES(dominant_level),
-                                data_points = VALUES(data_points),
-                                expected_points = VALUES(expected_points),
-                                updated_at = CURRENT_TIMESTAMP
-                        ''', (
-                            username, time_slot, avg_rainfall, max_rainfall, min_rainfall,
-                            dominant_level, actual_points, expected_points
-                        ))
-
-                        log(f"10分钟数据聚合完成: {time_slot}, 平均雨量={avg_rainfall}")
-
-                log(f"所有10分钟数据聚合完成，处理了 {len(time_slots)} 个时间段")
-            except Exception as e:
-                log(f"10分钟数据聚合错误: {str(e)}")
-                log(traceback.format_exc())
-                raise
-
-        # 2. 聚合到小时表 - 修改后的逻辑
-        log(f"开始聚合小时数据...")
-        with conn.cursor() as cursor:
-            try:
-                # 先检查10分钟表中是否有数据
-                cursor.execute('''
-                    SELECT COUNT(*) as count FROM rainfall_10min
-                    WHERE username = %s
-                ''', (username,))
-                result = cursor.fetchone()
-                ten_min_count = result['count'] if result else 0
-                log(f"10分钟数据点数量: {ten_min_count}")
-
-                if ten_min_count == 0:
-                    log(f"没有10分钟数据点，跳过小时聚合")
-                else:
-                    # 先查询可能被聚合的数据
-                    cursor.execute('''
-                        SELECT
-                            DATE_FORMAT(timestamp, '%%Y-%%m-%%d %%H:00:00') as hour_slot,
-                            COUNT(*) as count
-                        FROM rainfall_10min
-                        WHERE username = %s
-                        GROUP BY hour_slot
-                    ''', (username,))
-                    hour_slots = cursor.fetchall()
-                    log(f"找到 {len(hour_slots)} 个小时时间段需要聚合")
-
-                    # 对每个小时时间段单独处理
-                    for slot in hour_slots:
-                        hour_slot = slot['hour_slot']
-                        actual_count = slot['count']
-
-                        # 计算这1小时内应该有的所有10分钟点数量
-                        # 1小时 = 60分钟，每10分钟一个点，应该有6个点
-                        expected_points = 6
-
-                        log(f"处理小时时间段: {hour_slot}, 实际数据点: {actual_count}, 应有数据点: {expected_points}")
-
-                        # 查询该时间段内的实际数据
-                        cursor.execute('''
-                            SELECT
-                                SUM(avg_rainfall * data_points) as total_rainfall_value,
-                                MAX(max_rainfall) as max_rainfall,
-                                MIN(min_rainfall) as min_rainfall,
-                                SUM(data_points) as total_data_points
-                            FROM rainfall_10min
-                            WHERE username = %s
-                            AND timestamp >= %s
-                            AND timestamp < %s + INTERVAL 1 HOUR
-                        ''', (username, hour_slot, hour_slot))
-
-                        result = cursor.fetchone()
-
-                        if result and result['total_data_points'] > 0:
-                            total_rainfall_value = result['total_rainfall_value'] or 0
-                            max_rainfall = result['max_rainfall'] or 0
-                            min_rainfall = result['min_rainfall'] or 0
-                            # 获取实际数据点数量，但不使用该变量（仅用于日志记录）
-                            actual_data_points = result['total_data_points'] or 0
-
-                            # 计算平均值，使用应有的点数作为分母
-                            # 这里我们需要考虑每个10分钟段内的实际数据点数量
-                            # 计算每个10分钟段的原始数据点总数
-                            total_expected_raw_points = expected_points * 120  # 6个10分钟段 * 每段120个5秒点
-
-                            # 计算平均雨量 (mm/h)
-                            # 这里我们需要考虑10分钟段的原始数据
-                            # 10分钟段的平均雨量已经考虑了缺失的5秒点
-                            # 所以我们只需要考虑缺失的10分钟段
-
-                            # 查询该小时内的10分钟数据点
-                            cursor.execute('''
-                                SELECT avg_rainfall
-                                FROM rainfall_10min
-                                WHERE username = %s
-                                AND timestamp >= %s
-                                AND timestamp < %s + INTERVAL 1 HOUR
-                                ORDER BY timestamp
-                            ''', (username, hour_slot, hour_slot))
-
-                            ten_min_data = cursor.fetchall()
-                            ten_min_values = [float(r['avg_rainfall']) for r in ten_min_data] if ten_min_data else []
-
-                            # 修改计算方式 - 使用10分钟点的总和除以6（一小时有6个10分钟段）
-                            if ten_min_values:
-                                # 计算10分钟点的总和，然后除以6（一小时有6个10分钟段）
-                                # 无论实际有多少个10分钟点，都除以6，缺失的点视为0
-                                avg_rainfall = round(sum(ten_min_values) / 6, 1)
-
-                                # 计算累计雨量 - 每个10分钟段的累计雨量 = 10分钟平均雨量(mm/h) * (10/60)小时
-                                # 小时累计雨量 = 所有10分钟段的累计雨量之和
-                                total_rainfall = round(sum([val * (10/60) for val in ten_min_values]), 1)
-                            else:
-                                avg_rainfall = 0.0
-                                total_rainfall = 0.0
-
-                            # 记录详细的计算过程，用于调试
-                            log(f"  小时聚合 - 10分钟点值: {ten_min_values}")
-                            log(f"  小时聚合 - 平均值: 10分钟点总和 / 6 = {sum(ten_min_values) if ten_min_values else 0} / 6 = {avg_rainfall}")
-                            log(f"  小时聚合 - 累计雨量: 10分钟点的累计雨量总和 = {total_rainfall}")
-                            log(f"  实际点数: {actual_count}, 预期点数: {expected_points}")
-
-                            log(f"小时段 {hour_slot}: 总雨量值={total_rainfall_value}, 平均雨量={avg_rainfall}, 累计雨量={total_rainfall}, 实际10分钟点数={actual_count}, 应有10分钟点数={expected_points}, 实际原始点数={actual_data_points}")
-
-                            # 获取主要雨量级别
-                            cursor.execute('''
-                                SELECT dominant_level, COUNT(*) as level_count
-                                FROM rainfall_10min
-                                WHERE username = %s
-                                AND timestamp >= %s
-                                AND timestamp < %s + INTERVAL 1 HOUR
-                                GROUP BY dominant_level
-                                ORDER BY level_count DESC
-                                LIMIT 1
-                            ''', (username, hour_slot, hour_slot))
-
-                            level_result = cursor.fetchone()
-                            dominant_level = level_result['dominant_level'] if level_result else 'none'
-
-                            # 插入或更新小时聚合数据
-                            cursor.execute('''
-                                INSERT INTO rainfall_hourly
-                                (username, timestamp, avg_rainfall, max_rainfall, min_rainfall, total_rainfall, dominant_level, data_points, expected_points)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                ON DUPLICATE KEY UPDATE
-                                    avg_rainfall = VALUES(avg_rainfall),
-                                    max_rainfall = VALUES(max_rainfall),
-                                    min_rainfall = VALUES(min_rainfall),
-                                    total_rainfall = VALUES(total_rainfall),
-                                    dominant_level = VALUES(dominant_level),
-                                    data_points = VALUES(data_points),
-                                    expected_points = VALUES(expected_points),
-                                    updated_at = CURRENT_TIMESTAMP
-                            ''', (
-                                username, hour_slot, avg_rainfall, max_rainfall, min_rainfall,
-                                total_rainfall, dominant_level, actual_count, expected_points
-                            ))
-
-                            log(f"小时数据聚合完成: {hour_slot}, 平均雨量={avg_rainfall}, 累计雨量={total_rainfall}")
-
-                    log(f"所有小时数据聚合完成，处理了 {len(hour_slots)} 个时间段")
-            except Exception as e:
-                log(f"小时数据聚合错误: {str(e)}")
-                log(traceback.format_exc())
-                # 继续执行其他聚合，不抛出异常
-
-        # 3. 聚合到日表 - 修改后的逻辑
-        log(f"开始聚合日数据...")
-        with conn.cursor() as cursor:
-            try:
-                # 先检查小时表中是否有数据
-                cursor.execute('''
-                    SELECT COUNT(*) as count FROM rainfall_hourly
-                    WHERE username = %s
-                ''', (username,))
-                result = cursor.fetchone()
-                hourly_count = result['count'] if result else 0
-                log(f"小时数据点数量: {hourly_count}")
-
-                if hourly_count == 0:
-                    log(f"没有小时数据点，跳过日聚合")
-                else:
-                    # 先查询可能被聚合的数据
-                    cursor.execute('''
-                        SELECT
-                            DATE(timestamp) as day_slot,
-                            COUNT(*) as count
-                        FROM rainfall_hourly
-                        WHERE username = %s
-                        GROUP BY day_slot
-                    ''', (username,))
-                    day_slots = cursor.fetchall()
-                    log(f"找到 {len(day_slots)} 个日期需要聚合")
-
-                    # 对每个日期单独处理
-                    for slot in day_slots:
-                        day_slot = slot['day_slot']
-                        actual_count = slot['count']
-
-                        # 计算这1天内应该有的所有小时点数量
-                        # 1天 = 24小时，每小时一个点，应该有24个点
-                        expected_points = 24
-
-                        log(f"处理日期: {day_slot}, 实际数据点: {actual_count}, 应有数据点: {expected_points}")
-
-                        # 查询该日期内的实际数据
-                        cursor.execute('''
-                            SELECT
-                                SUM(avg_rainfall * data_points) as total_rainfall_value,
-                                MAX(max_rainfall) as max_rainfall,
-                                MIN(min_rainfall) as min_rainfall,
-                                SUM(data_points) as total_data_points,
-                                SUM(total_rainfall) as day_total_rainfall,
-                                SUM(CASE WHEN avg_rainfall >= 0.3 THEN 1 ELSE 0 END) as rainy_hours
-                            FROM rainfall_hourly
-                            WHERE username = %s
-                            AND DATE(timestamp) = %s
-                        ''', (username, day_slot))
-
-                        result = cursor.fetchone()
-
-                        if result:
-                            total_rainfall_value = result['total_rainfall_value'] or 0
-                            max_rainfall = result['max_rainfall'] or 0
-                            min_rainfall = result['min_rainfall'] or 0
-                            # 获取实际数据点数量，用于日志记录
-                            actual_data_points = result['total_data_points'] or 0
-                            day_total_rainfall = result['day_total_rainfall'] or 0
-                            rainy_hours = result['rainy_hours'] or 0
-
-                            # 计算平均值，使用应有的点数作为分母
-                            # 这里我们需要考虑每个小时内的实际数据点数量
-                            # 计算每个小时的原始数据点总数
-                            total_expected_raw_points = expected_points * 6 * 120  # 24小时 * 每小时6个10分钟段 * 每段120个5秒点
-
-                            # 计算平均雨量 (mm/h)
-                            if total_expected_raw_points > 0:
-                                # 这里我们需要考虑小时段的原始数据
-                                # 小时段的平均雨量已经考虑了缺失的10分钟点和5秒点
-                                # 所以我们只需要考虑缺失的小时段
-                                if actual_count > 0:
-                                    # 使用小时聚合数据的平均雨量，除以24小时
-                                    # 小时聚合数据的平均雨量已经考虑了缺失的10分钟点和5秒点
-                                    # 所以我们需要计算：小时平均雨量 * 实际小时数 / 24小时
-
-                                    # 确保所有值都是浮点数，避免decimal和float混合计算
-                                    day_total_rainfall_float = float(day_total_rainfall)
-                                    expected_points_float = float(expected_points)
-
-                                    # 使用浮点数计算
-                                    avg_rainfall = round(day_total_rainfall_float / expected_points_float, 1)
-
-                                    # 记录详细的计算过程，用于调试
-                                    log(f"  日聚合 - 计算平均值: {day_total_rainfall} / {expected_points} = {avg_rainfall}")
-                                else:
-                                    avg_rainfall = 0.0
-                            else:
-                                avg_rainfall = 0.0
-
-                            # 累计雨量保持不变，是各小时累计雨量的总和
-                            total_rainfall = round(day_total_rainfall, 1)
-
-                            log(f"日期 {day_slot}: 总雨量值={total_rainfall_value}, 平均雨量={avg_rainfall}, 累计雨量={total_rainfall}, 实际小时点数={actual_count}, 应有小时点数={expected_points}, 实际原始点数={actual_data_points}, 有雨小时数={rainy_hours}")
-
-                            # 插入或更新日聚合数据
-                            cursor.execute('''
-                                INSERT INTO rainfall_daily
-                                (username, date, avg_rainfall, max_rainfall, min_rainfall, total_rainfall, rainy_hours, data_points, expected_points)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                ON DUPLICATE KEY UPDATE
-                                    avg_rainfall = VALUES(avg_rainfall),
-                                    max_rainfall = VALUES(max_rainfall),
-                                    min_rainfall = VALUES(min_rainfall),
-                                    total_rainfall = VALUES(total_rainfall),
-                                    rainy_hours = VALUES(rainy_hours),
-                                    data_points = VALUES(data_points),
-                                    expected_points = VALUES(expected_points),
-                                    updated_at = CURRENT_TIMESTAMP
-                            ''', (
-                                username, day_slot, avg_rainfall, max_rainfall, min_rainfall,
-                                total_rainfall, rainy_hours, actual_count, expected_points
-                            ))
-
-                            log(f"日数据聚合完成: {day_slot}, 平均雨量={avg_rainfall}, 累计雨量={total_rainfall}")
-
-                    log(f"所有日数据聚合完成，处理了 {len(day_slots)} 个日期")
-            except Exception as e:
-                log(f"日数据聚合错误: {str(e)}")
-                log(traceback.format_exc())
-                # 继续执行其他聚合，不抛出异常
-
-        # 4. 聚合到月表 - 修改后的逻辑
-        log(f"开始聚合月数据...")
-        with conn.cursor() as cursor:
-            try:
-                # 先检查日表中是否有数据
-                cursor.execute('''
-                    SELECT COUNT(*) as count FROM rainfall_daily
-                    WHERE username = %s
-                ''', (username,))
-                result = cursor.fetchone()
-                daily_count = result['count'] if result else 0
-                log(f"日数据点数量: {daily_count}")
-
-                if daily_count == 0:
-                    log(f"没有日数据点，跳过月聚合")
-                else:
-                    # 先查询可能被聚合的数据
-                    cursor.execute('''
-                        SELECT
-                            YEAR(date) as year_val,
-                            MONTH(date) as month_val,
-                            COUNT(*) as count
-                        FROM rainfall_daily
-                        WHERE username = %s
-                        GROUP BY year_val, month_val
-                    ''', (username,))
-                    month_slots = cursor.fetchall()
-                    log(f"找到 {len(month_slots)} 个月份需要聚合")
-
-                    # 对每个月份单独处理
-                    for slot in month_slots:
-                        year_val = slot['year_val']
-                        month_val = slot['month_val']
-                        actual_count = slot['count']
-
-                        # 计算这个月应该有的天数
-                        # 使用calendar模块获取月份的天数
-                        import calendar
-                        days_in_month = calendar.monthrange(year_val, month_val)[1]
-                        expected_points = days_in_month
-
-                        log(f"处理月份: {year_val}-{month_val}, 实际数据点: {actual_count}, 应有数据点: {expected_points}")
-
-                        # 查询该月份内的实际数据
-                        cursor.execute('''
-                            SELECT
-                                SUM(total_rainfall) as month_total_rainfall,
-                                AVG(total_rainfall) as avg_daily_rainfall,
-                                MAX(total_rainfall) as max_daily_rainfall,
-                                SUM(CASE WHEN total_rainfall >= 0.3 THEN 1 ELSE 0 END) as rainy_days,
-                                SUM(data_points) as total_data_points
-                            FROM rainfall_daily
-                            WHERE username = %s
-                            AND YEAR(date) = %s
-                            AND MONTH(date) = %s
-                        ''', (username, year_val, month_val))
-
-                        result = cursor.fetchone()
-
-                        if result:
-                            month_total_rainfall = result['month_total_rainfall'] or 0
-                            avg_daily_rainfall = result['avg_daily_rainfall'] or 0
-                            max_daily_rainfall = result['max_daily_rainfall'] or 0
-                            rainy_days = result['rainy_days'] or 0
-                            # 获取实际数据点数量，用于日志记录
-                            actual_data_points = result['total_data_points'] or 0
-
-                            # 月聚合保持原有逻辑，使用各天累计雨量的总和
-                            total_rainfall = round(month_total_rainfall, 1)
-
-                            # 平均日雨量，考虑应有的天数
-                            if expected_points > 0:
-                                # 如果实际天数少于应有天数，将缺少的天视为0
-                                if actual_count < expected_points:
-                                    # 调整平均值计算，将缺少的天视为0
-                                    # 确保所有值都是浮点数，避免decimal和float混合计算
-                                    month_total_rainfall_float = float(month_total_rainfall)
-                                    expected_points_float = float(expected_points)
-
-                                    # 使用浮点数计算
-                                    avg_daily_rainfall = round(month_total_rainfall_float / expected_points_float, 1)
-
-                                    # 记录详细的计算过程，用于调试
-                                    log(f"  月聚合 - 计算平均值: {month_total_rainfall} / {expected_points} = {avg_daily_rainfall}")
-                                else:
-                                    # 如果实际天数等于或大于应有天数，使用原有平均值
-                                    avg_daily_rainfall = round(avg_daily_rainfall, 1)
-                            else:
-                                avg_daily_rainfall = 0.0
-
-                            log(f"月份 {year_val}-{month_val}: 总雨量={total_rainfall}, 平均日雨量={avg_daily_rainfall}, 最大日雨量={max_daily_rainfall}, 实际天数={actual_count}, 应有天数={expected_points}, 实际原始点数={actual_data_points}, 有雨天数={rainy_days}")
-
-                            # 插入或更新月聚合数据
-                            cursor.execute('''
-                                INSERT INTO rainfall_monthly
-                                (username, year, month, avg_daily_rainfall, max_daily_rainfall, total_rainfall, rainy_days, data_points, expected_points)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                ON DUPLICATE KEY UPDATE
-                                    avg_daily_rainfall = VALUES(avg_daily_rainfall),
-                                    max_daily_rainfall = VALUES(max_daily_rainfall),
-                                    total_rainfall = VALUES(total_rainfall),
-                                    rainy_days = VALUES(rainy_days),
-                                    data_points = VALUES(data_points),
-                                    expected_points = VALUES(expected_points),
-                                    updated_at = CURRENT_TIMESTAMP
-                            ''', (
-                                username, year_val, month_val, avg_daily_rainfall, max_daily_rainfall,
-                                total_rainfall, rainy_days, actual_count, expected_points
-                            ))
-
-                            log(f"月数据聚合完成: {year_val}-{month_val}, 平均日雨量={avg_daily_rainfall}, 累计雨量={total_rainfall}")
-
-                    log(f"所有月数据聚合完成，处理了 {len(month_slots)} 个月份")
-            except Exception as e:
-                log(f"月数据聚合错误: {str(e)}")
-                log(traceback.format_exc())
-                # 继续执行，不抛出异常
+            # 每个粒度独立维护水位线，某一级聚合失败时下次仍会从它自己的水位线重新计算
+            slot_ranges = {}
+            for granularity in AGGREGATE_GRANULARITIES:
+                after_id = 0 if full_rebuild else _get_watermark(cursor, username, granularity)
+                dirty_range = _get_dirty_time_range(cursor, username, after_id, upto_id)
+                if dirty_range:
+                    slot_ranges[granularity] = _slot_range(granularity, *dirty_range)
+
+            log(f"聚合模式: {'全量重建' if full_rebuild else '增量'}, 原始数据ID上限: {upto_id}, 待聚合范围: {slot_ranges}")
+
+            if not slot_ranges:
+                log(f"水位线之后没有新增原始数据，跳过聚合")
+                return {"success": True, "message": "No new raw data points to aggregate"}
+
+        vectorized = None
+        sql_granularities = set()
+        if engine == 'pandas':
+            with conn.cursor() as cursor:
+                sql_granularities = _granularities_missing_raw(cursor, username, slot_ranges)
+            if sql_granularities:
+                log(f"原始数据已部分清理，{sorted(sql_granularities)} 改用SQL从下一级聚合表计算")
+            vectorized = _compute_vectorized_rollups(conn, username, slot_ranges)
+            if vectorized is None:
+                engine = 'sql'
+
+        # 逐级写入10分钟、小时、日、月表
+        for granularity, label, rollup in _ROLLUP_STEPS:
+            if granularity not in slot_ranges:
+                continue
+            log(f"开始聚合{label}数据...")
+            with conn.cursor() as cursor:
+                try:
+                    if vectorized is not None and granularity not in sql_granularities:
+                        affected = _write_vectorized_rollup(cursor, username, granularity, vectorized[granularity])
+                    else:
+                        affected = rollup(cursor, username, *slot_ranges[granularity])
+                    log(f"所有{label}数据聚合完成，影响行数: {affected}")
+                    _set_watermark(cursor, username, granularity, upto_id)
+                except Exception as e:
+                    log(f"{label}数据聚合错误: {str(e)}")
+                    log(traceback.format_exc())
+                    # 10分钟数据是其他粒度的基础，失败时整体失败；其他粒度失败时继续执行
+                    if granularity == '10min':
+                        raise
 
         conn.commit()
-        return {"success": True, "message": "Data aggregation successful"}
+        # 聚合表已更新，清除该用户依赖聚合数据的统计缓存
+        stats_cache.invalidate(username, stats_cache.AGGREGATED_PERIODS)
+        return {"success": True, "message": "Data aggregation successful", "engine": engine}
     except Exception as e:
         log(f"Data aggregation failed: {str(e)}")
         log(traceback.format_exc())
@@ -1089,13 +1214,8 @@ def get_data_by_timerange(username='admin', period='10min', start_time=None, end
         start_time: 开始时间，格式: 'YYYY-MM-DD HH:MM:SS' 或 'YYYY-MM-DD'
         end_time: 结束时间，格式: 'YYYY-MM-DD HH:MM:SS' 或 'YYYY-MM-DD'
     """
-    if not start_time:
-        # 默认获取最近24小时的数据
-        end_time = datetime.now()
-        start_time = end_time - timedelta(hours=24)
-    elif not end_time:
-        # 如果只提供了开始时间，结束时间默认为当前时间
-        end_time = datetime.now()
+    # 默认获取最近24小时的数据，只提供了开始时间时结束时间默认为当前时间
+    start_time, end_time = _resolve_time_range(start_time, end_time)
 
     conn = get_db_connection()
     try:
@@ -1151,6 +1271,9 @@ def get_data_by_timerange(username='admin', period='10min', start_time=None, end
                 return {"success": False, "error": f"不支持的时间粒度: {period}"}
 
             result = cursor.fetchall()
+            if period == 'raw':
+                # 早于热表保留期限的原始数据从冷归档读取
+                result = _with_archived_raw(cursor, username, start_time, end_time, result)
             return {"success": True, "data": result}
     except Exception as e:
         log(f"获取数据失败: {str(e)}")
@@ -1219,39 +1342,762 @@ def get_current_hour_data(username='admin'):
     finally:
         conn.close()
 
+# 各级数据从细到粗的顺序和对应的表；每一级由下一级聚合覆盖，月数据是最粗的一级
+RETENTION_LEVELS = ('raw', '10min', 'hourly', 'daily', 'monthly')
+_RETENTION_TABLES = {
+    'raw': 'rainfall_raw',
+    '10min': 'rainfall_10min',
+    'hourly': 'rainfall_hourly',
+    'daily': 'rainfall_daily',
+    'monthly': 'rainfall_monthly'
+}
+
+# 各级数据的保留天数，0表示永久保留；原始数据分区也只按这里的设置在核对聚合之后删除
+RETENTION_DAYS = {
+    'raw': int(os.environ.get('RAINFALL_RAW_RETENTION_DAYS') or 0),
+    '10min': int(os.environ.get('RAINFALL_10MIN_RETENTION_DAYS') or 0),
+    'hourly': int(os.environ.get('RAINFALL_HOURLY_RETENTION_DAYS') or 0),
+    'daily': int(os.environ.get('RAINFALL_DAILY_RETENTION_DAYS') or 0),
+    'monthly': int(os.environ.get('RAINFALL_MONTHLY_RETENTION_DAYS') or 0)
+}
+
+def _parse_retention_days(text):
+    """把 'raw=14,10min=365' 形式的参数解析为 {级别: 天数}"""
+    retention_days = {}
+    for item in str(text).split(','):
+        if not item.strip():
+            continue
+        level, _, days = item.partition('=')
+        level = level.strip()
+        if level not in RETENTION_LEVELS or not days.strip().isdigit():
+            raise ValueError(f"无效的保留天数: {item.strip()}，格式: raw=14,10min=365，级别可选: {', '.join(RETENTION_LEVELS)}")
+        retention_days[level] = int(days)
+    return retention_days
+
+def _retention_unit_start(level, value):
+    """原始、10分钟、小时数据按天清理，日、月数据按自然月清理，返回 value 所在清理单位的起点"""
+    start = datetime.combine(value, datetime.min.time()) if not isinstance(value, datetime) else \
+        value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start.replace(day=1) if level in ('daily', 'monthly') else start
+
+def _retention_next_unit(level, start):
+    if level in ('daily', 'monthly'):
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+def _retention_condition(level, start, end):
+    """某一级数据中落在 [start, end) 的行的WHERE条件和参数，start 为None时不限制起点"""
+    if level == 'monthly':
+        condition = "(year < %s OR (year = %s AND month < %s))"
+        params = (end.year, end.year, end.month)
+        if start is not None:
+            condition += " AND (year > %s OR (year = %s AND month >= %s))"
+            params += (start.year, start.year, start.month)
+        return condition, params
+    column = 'date' if level == 'daily' else 'timestamp'
+    if start is None:
+        return f"{column} < %s", (end,)
+    return f"{column} >= %s AND {column} < %s", (start, end)
+
+def _oldest_retention_unit(cursor, level, username, after=None):
+    """某用户某一级数据中最早（不早于 after）的数据所在的清理单位起点，没有数据时返回None"""
+    column = 'date' if level == 'daily' else 'timestamp'
+    sql = f"SELECT MIN({column}) AS oldest FROM {_RETENTION_TABLES[level]} WHERE username = %s"
+    params = (username,)
+    if after is not None:
+        sql += f" AND {column} >= %s"
+        params += (after,)
+    cursor.execute(sql, params)
+    result = cursor.fetchone()
+    if not result or result['oldest'] is None:
+        return None
+    return _retention_unit_start(level, result['oldest'])
+
+def _verify_retention_unit(cursor, level, username, start, end, aggregated_id):
+    """检查 [start, end) 内某一级数据是否已被下一级聚合完整覆盖
+
+    下一级聚合每一行的 data_points 是它汇总的本级行数，两者之和相等说明这段时间的聚合是完整且最新的；
+    原始数据还要求所有粒度的水位线都已经越过这段时间的原始数据。
+
+    返回:
+        str: 不能清理的原因，可以清理时返回None
+    """
+    condition, params = _retention_condition(level, start, end)
+    cursor.execute(f'''
+        SELECT COUNT(*) AS count, MAX({'id' if level == 'raw' else 'NULL'}) AS max_id
+        FROM {_RETENTION_TABLES[level]}
+        WHERE username = %s AND {condition}
+    ''', (username,) + params)
+    result = cursor.fetchone()
+    count = result['count']
+
+    parent = RETENTION_LEVELS[RETENTION_LEVELS.index(level) + 1]
+    parent_condition, parent_params = _retention_condition(parent, start, end)
+    cursor.execute(f'''
+        SELECT COALESCE(SUM(data_points), 0) AS points
+        FROM {_RETENTION_TABLES[parent]}
+        WHERE username = %s AND {parent_condition}
+    ''', (username,) + parent_params)
+    points = int(cursor.fetchone()['points'])
+
+    if points != count:
+        return f"{parent}聚合覆盖 {points} 条，{level}数据有 {count} 条"
+    if level == 'raw' and result['max_id'] and result['max_id'] > aggregated_id:
+        return f"原始数据ID {result['max_id']} 尚未完成全部粒度的聚合（水位线 {aggregated_id}）"
+    return None
+
+def _verified_retention_horizon(cursor, level, username, cutoff):
+    """从最早的数据开始逐个清理单位检查聚合覆盖，返回 (可以清理到的时间, 停止的原因)
+
+    遇到第一个未通过检查的单位就停止，之前的数据可以清理；全部通过时返回 cutoff。
+    """
+    if level == 'monthly':
+        return cutoff, None
+
+    aggregated_id = 0
+    if level == 'raw':
+        aggregated_id = min(_get_watermark(cursor, username, granularity) for granularity in AGGREGATE_GRANULARITIES)
+
+    start = _oldest_retention_unit(cursor, level, username)
+    while start is not None and start < cutoff:
+        end = _retention_next_unit(level, start)
+        reason = _verify_retention_unit(cursor, level, username, start, end, aggregated_id)
+        if reason:
+            return start, f"{start:%Y-%m-%d}: {reason}"
+        start = _oldest_retention_unit(cursor, level, username, end)
+    return cutoff, None
+
+def _table_size(cursor, table):
+    """表的估计行数和数据+索引字节数（来自 information_schema，为统计值）"""
+    cursor.execute('''
+        SELECT TABLE_ROWS AS table_rows, DATA_LENGTH + INDEX_LENGTH AS bytes
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    ''', (table,))
+    result = cursor.fetchone() or {}
+    return int(result.get('table_rows') or 0), int(result.get('bytes') or 0)
+
+def _purge_retention_level(conn, cursor, level, cutoff, batch_size, pause, dry_run, archive=False):
+    """清理一级数据中早于 cutoff 且已被聚合覆盖的部分，返回该级的清理报告"""
+    table = _RETENTION_TABLES[level]
+    table_rows, table_bytes = _table_size(cursor, table)
+    row_bytes = table_bytes / table_rows if table_rows else 0
+
+    cursor.execute(f"SELECT DISTINCT username FROM {table}")
+    usernames = [row['username'] for row in cursor.fetchall()]
+
+    horizons = {}
+    blocked = {}
+    for username in usernames:
+        horizons[username], reason = _verified_retention_horizon(cursor, level, username, cutoff)
+        if reason:
+            blocked[username] = reason
+            log(f"{table} 用户 {username} 只能清理到 {horizons[username]}，{reason}")
+
+    report = {"cutoff": cutoff, "users": len(usernames), "blocked": blocked,
+              "rows": 0, "bytes": 0, "dropped_partitions": [], "purged_users": []}
+
+    # 原始数据在删除之前先写入冷归档
+    if level == 'raw' and archive and not dry_run:
+        report["archived_rows"] = 0
+        for username, horizon in horizons.items():
+            report["archived_rows"] += _archive_user_raw(cursor, username, horizon)["rows"]
+
+    # 分区表先整个删除所有用户都已通过检查的分区，剩余部分再逐行删除
+    if level == 'raw' and not dry_run and rainfall_partition.get_partitions(cursor, table):
+        bound = min(horizons.values(), default=cutoff)
+        dropped = rainfall_partition.drop_partitions_before(cursor, bound, table)
+        conn.commit()
+        report["dropped_partitions"] = [partition["name"] for partition in dropped]
+        report["rows"] += sum(partition["rows"] for partition in dropped)
+        report["bytes"] += sum(partition["bytes"] for partition in dropped)
+
+    deleted_rows = 0
+    for username, horizon in horizons.items():
+        condition, params = _retention_condition(level, None, horizon)
+        if dry_run:
+            cursor.execute(f"SELECT COUNT(*) AS count FROM {table} WHERE username = %s AND {condition}",
+                           (username,) + params)
+            deleted = cursor.fetchone()['count']
+        else:
+            # 每批删除后立即提交，单个事务持有的行锁和undo日志都有上限
+            deleted = 0
+            while True:
+                affected = cursor.execute(f"DELETE FROM {table} WHERE username = %s AND {condition} LIMIT {int(batch_size)}",
+                                          (username,) + params)
+                conn.commit()
+                deleted += affected
+                if affected < batch_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+        if deleted:
+            report["purged_users"].append(username)
+            deleted_rows += deleted
+
+    report["rows"] += deleted_rows
+    report["bytes"] += int(deleted_rows * row_bytes)
+    return report
+
+def apply_retention(retention_days=None, batch_size=10000, pause=0.0, dry_run=False, compact=False, archive=False):
+    """按各级数据的保留天数清理过期数据
+
+    每一级只清理已被下一级聚合完整覆盖的数据（见 _verify_retention_unit），原始、10分钟、小时数据按天，
+    日、月数据按自然月对齐清理边界，保证之后的增量聚合和全量重建不会用残缺的数据覆盖已有的聚合结果。
+    删除按 batch_size 条一批执行并逐批提交，不会长时间持有锁；原始数据表已分区时先整个删除过期分区。
+
+    参数:
+        retention_days: {级别: 天数}，覆盖 RETENTION_DAYS 中的设置，0表示永久保留
+        batch_size: 每批删除的行数
+        pause: 每批删除之间的间隔（秒），降低对在线写入的影响
+        dry_run: 只检查和统计可清理的行数，不删除
+        compact: 清理后执行 OPTIMIZE TABLE 回收表空间
+        archive: 删除原始数据之前先写入冷归档（见 archive_raw_data）
+
+    返回:
+        dict: 各级的清理边界、无法清理的用户及原因、清理的行数和估计字节数
+    """
+    ttl = dict(RETENTION_DAYS)
+    ttl.update(retention_days or {})
+
+    # 细粒度数据的保留时间不能超过粗粒度数据，否则重新聚合时会缺少上一级的数据
+    for finer, coarser in zip(RETENTION_LEVELS, RETENTION_LEVELS[1:]):
+        if ttl[coarser] and (not ttl[finer] or ttl[finer] > ttl[coarser]):
+            return {"success": False,
+                    "error": f"{finer}的保留天数({ttl[finer] or '永久'})不能超过{coarser}的保留天数({ttl[coarser]})"}
+
+    levels = [level for level in RETENTION_LEVELS if ttl[level] > 0]
+    if not levels:
+        return {"success": True, "message": "没有配置保留天数，所有数据永久保留", "levels": {}}
+
+    batch_size = max(int(batch_size), 1)
+    now = datetime.now()
+    started = time.time()
+    log(f"开始清理过期数据: { {level: ttl[level] for level in levels}}，每批 {batch_size} 条{'（只检查不删除）' if dry_run else ''}")
+
+    conn = get_db_connection()
+    try:
+        report = {}
+        with conn.cursor() as cursor:
+            if not _watermark_table_ready:
+                _ensure_watermark_table(cursor)
+
+            for level in levels:
+                cutoff = _retention_unit_start(level, now - timedelta(days=ttl[level]))
+                level_report = _purge_retention_level(conn, cursor, level, cutoff, batch_size, pause, dry_run, archive)
+                report[level] = level_report
+                log(f"{_RETENTION_TABLES[level]} 清理到 {cutoff}: {level_report['rows']} 行, 约 {level_report['bytes']} 字节, "
+                    f"{len(level_report['blocked'])} 个用户未通过聚合检查")
+
+                if dry_run or not level_report['rows']:
+                    continue
+                # 删除的数据可能在统计缓存中
+                if level_report['dropped_partitions']:
+                    stats_cache.invalidate()
+                for username in level_report['purged_users']:
+                    stats_cache.invalidate(username)
+
+                if compact:
+                    table = _RETENTION_TABLES[level]
+                    cursor.execute(f"ANALYZE TABLE {table}")
+                    cursor.fetchall()
+                    _, bytes_before = _table_size(cursor, table)
+                    cursor.execute(f"OPTIMIZE TABLE {table}")
+                    cursor.fetchall()
+                    _, bytes_after = _table_size(cursor, table)
+                    level_report["compacted_bytes"] = bytes_before - bytes_after
+
+        return {
+            "success": True,
+            "dry_run": dry_run,
+            "levels": report,
+            "reclaimed_rows": sum(level_report['rows'] for level_report in report.values()),
+            "reclaimed_bytes": sum(level_report['bytes'] for level_report in report.values()),
+            "elapsed_seconds": round(time.time() - started, 2)
+        }
+    except Exception as e:
+        conn.rollback()
+        log(f"清理过期数据失败: {str(e)}")
+        log(traceback.format_exc())
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
+def _parse_time(value):
+    """命令行和API传入的时间可以是字符串（YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS）或datetime"""
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+def _archive_user_raw(cursor, username, before):
+    """把某用户早于 before 的原始数据写入冷归档，按月合并进已有的归档文件
+
+    返回:
+        dict: 涉及的月份数、从数据库读取的行数和归档文件的总字节数
+    """
+    cursor.execute("SELECT MIN(timestamp) AS oldest FROM rainfall_raw WHERE username = %s AND timestamp < %s",
+                   (username, before))
+    result = cursor.fetchone()
+    report = {"months": 0, "rows": 0, "bytes": 0}
+    if not result or result['oldest'] is None:
+        return report
+
+    def fetch_day(start, end):
+        if start >= before:
+            return []
+        cursor.execute('''
+            SELECT timestamp, rainfall_value, rainfall_level, rainfall_percentage
+            FROM rainfall_raw
+            WHERE username = %s
+            AND timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp
+        ''', (username, start, min(end, before)))
+        return cursor.fetchall()
+
+    last = before - timedelta(seconds=1)
+    year, month = result['oldest'].year, result['oldest'].month
+    while (year, month) <= (last.year, last.month):
+        archived = rainfall_archive.archive_month(username, year, month, fetch_day)
+        report["months"] += 1
+        report["rows"] += archived["fetched_rows"]
+        report["bytes"] += archived["bytes"]
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return report
+
+def archive_raw_data(before=None):
+    """把早于 before 的原始数据写入冷归档（见 rainfall_archive.py），不删除数据库中的数据
+
+    归档可以重复执行，已归档的月份与数据库中的数据合并。清理原始数据时自动归档见 apply_retention(archive=True)。
+
+    参数:
+        before: 归档早于该时间的数据，默认为原始数据保留期限（RAINFALL_RAW_RETENTION_DAYS）的清理边界
+
+    返回:
+        dict: 每个用户归档的月份数、行数和归档文件大小
+    """
+    if before:
+        before = _parse_time(before)
+    elif RETENTION_DAYS['raw'] > 0:
+        before = _retention_unit_start('raw', datetime.now() - timedelta(days=RETENTION_DAYS['raw']))
+    else:
+        return {"success": False, "error": "需要指定归档的截止时间（--before）或设置 RAINFALL_RAW_RETENTION_DAYS"}
+
+    started = time.time()
+    conn = get_db_connection()
+    try:
+        users = {}
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT username FROM rainfall_raw WHERE timestamp < %s", (before,))
+            for row in cursor.fetchall():
+                users[row['username']] = _archive_user_raw(cursor, row['username'], before)
+                log(f"用户 {row['username']} 归档完成: {users[row['username']]}")
+        return {
+            "success": True,
+            "before": before,
+            "archive_dir": rainfall_archive.ARCHIVE_DIR,
+            "users": users,
+            "rows": sum(report["rows"] for report in users.values()),
+            "elapsed_seconds": round(time.time() - started, 2)
+        }
+    except Exception as e:
+        log(f"归档原始数据失败: {str(e)}")
+        log(traceback.format_exc())
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
+def restore_archived_raw(username, start_time, end_time, batch_size=5000):
+    """把冷归档中一段时间的原始数据写回 rainfall_raw，用于重新聚合
+
+    已存在的数据点被唯一键跳过；写回的数据获得新的ID，下一次增量聚合会自动重新计算这段时间。
+
+    参数:
+        username: 用户名
+        start_time: 开始时间
+        end_time: 结束时间（包含）
+        batch_size: 每批写入的条数
+
+    返回:
+        dict: 归档中的行数和实际写回的行数
+    """
+    if not start_time or not end_time:
+        return {"success": False, "error": "需要指定开始时间和结束时间"}
+    rows = rainfall_archive.read_range(username, _parse_time(start_time), _parse_time(end_time))
+    if not rows:
+        return {"success": True, "archived_rows": 0, "restored_rows": 0}
+
+    conn = get_db_connection()
+    try:
+        restored = 0
+        with conn.cursor() as cursor:
+            for offset in range(0, len(rows), batch_size):
+                restored += cursor.executemany('''
+                    INSERT IGNORE INTO rainfall_raw
+                    (username, timestamp, rainfall_value, rainfall_level, rainfall_percentage)
+                    VALUES (%s, %s, %s, %s, %s)
+                ''', [(username, row['timestamp'], row['rainfall_value'], row['rainfall_level'], row['rainfall_percentage'])
+                      for row in rows[offset:offset + batch_size]])
+                conn.commit()
+        stats_cache.invalidate(username)
+        log(f"用户 {username} 从归档写回 {restored}/{len(rows)} 条原始数据")
+        return {"success": True, "archived_rows": len(rows), "restored_rows": restored}
+    except Exception as e:
+        conn.rollback()
+        log(f"写回归档数据失败: {str(e)}")
+        log(traceback.format_exc())
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
+def _archived_raw_range(cursor, username, start_time, end_time):
+    """查询范围中早于热表里该用户最早原始数据的部分，需要从冷归档读取时返回 (开始, 结束)，否则返回None"""
+    if not rainfall_archive.has_archive(username):
+        return None
+    start, end = _parse_time(start_time), _parse_time(end_time)
+    cursor.execute("SELECT MIN(timestamp) AS oldest FROM rainfall_raw WHERE username = %s", (username,))
+    result = cursor.fetchone()
+    oldest = result['oldest'] if result else None
+    if oldest is not None and start >= oldest:
+        return None
+    # 热表中仍然存在的数据以热表为准
+    return start, end if oldest is None else min(end, oldest - timedelta(seconds=1))
+
+def _with_archived_raw(cursor, username, start_time, end_time, rows):
+    """查询范围早于热表中该用户最早的原始数据时，在结果前面补上冷归档中的数据"""
+    archived_range = _archived_raw_range(cursor, username, start_time, end_time)
+    if not archived_range:
+        return rows
+    archived = rainfall_archive.read_range(username, *archived_range)
+    if not archived:
+        return rows
+    logger.debug("从冷归档读取 %d 条原始数据: %s ~ %s", len(archived), *archived_range)
+    return archived + list(rows)
+
+def maintain_raw_partitions(ahead=None):
+    """维护分区布局的原始数据表：预建未来的分区
+
+    这里不删除分区。过期分区由 apply_retention 在核对聚合完整之后删除（同时归档、清除统计缓存）。
+
+    参数:
+        ahead: 当前分区之后需要存在的分区数，默认由 RAINFALL_RAW_PARTITION_AHEAD 决定
+
+    返回:
+        dict: 新建的分区和分区总数
+    """
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            result = rainfall_partition.maintain_partitions(cursor, ahead)
+        conn.commit()
+        if result["success"]:
+            log(f"rainfall_raw分区维护完成: 新建 {result['created']}，共 {result['partitions']} 个分区")
+        return result
+    except Exception as e:
+        conn.rollback()
+        log(f"rainfall_raw分区维护失败: {str(e)}")
+        log(traceback.format_exc())
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
+def migrate_raw_partitions(scheme=None, ahead=None, batch_size=50000, drop_old=False):
+    """把已有的未分区 rainfall_raw 迁移为按时间分区的布局
+
+    迁移期间可以继续写入，最后短暂锁住写入补复制剩余数据并原子地交换表名，数据的 id 保持不变，聚合水位线继续有效。
+    原表默认改名为 rainfall_raw_unpartitioned 保留，确认无误后可手动删除或使用 drop_old。
+
+    参数:
+        scheme: monthly 或 daily，默认由 RAINFALL_RAW_PARTITION 决定，未配置时按月
+        ahead: 当前分区之后预建的分区数
+        batch_size: 每批复制的 id 范围
+        drop_old: 迁移完成后是否删除原表
+
+    返回:
+        dict: 迁移结果
+    """
+    scheme = scheme or rainfall_partition.configured_scheme() or 'monthly'
+    conn = get_db_connection()
+    try:
+        log(f"开始把rainfall_raw迁移为按{scheme}分区，每批 {batch_size} 条")
+        with conn.cursor() as cursor:
+            result = rainfall_partition.migrate_to_partitions(
+                cursor, conn.commit, scheme, ahead=ahead, batch_size=max(int(batch_size), 1),
+                drop_old=drop_old, log=log
+            )
+        conn.commit()
+        log(f"rainfall_raw分区迁移结束: {result}")
+        return result
+    except Exception as e:
+        conn.rollback()
+        log(f"rainfall_raw分区迁移失败: {str(e)}")
+        log(traceback.format_exc())
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
+# 流式读取时各粒度查询的表、排序列和列（不含 username 等调用方已知的列）；排序列与 id 组成 keyset 分页游标
+_STREAM_QUERIES = {
+    'raw': ('rainfall_raw', 'timestamp',
+            'id, timestamp, rainfall_value, rainfall_level, rainfall_percentage'),
+    '10min': ('rainfall_10min', 'timestamp',
+              'id, timestamp, avg_rainfall, max_rainfall, min_rainfall, dominant_level, data_points, expected_points'),
+    'hourly': ('rainfall_hourly', 'timestamp',
+               'id, timestamp, avg_rainfall, max_rainfall, min_rainfall, total_rainfall, dominant_level, '
+               'data_points, expected_points'),
+    'daily': ('rainfall_daily', 'date',
+              'id, date, avg_rainfall, max_rainfall, min_rainfall, total_rainfall, rainy_hours, data_points, expected_points'),
+    'monthly': ('rainfall_monthly', '(year * 100 + month)',
+                'id, year, month, avg_daily_rainfall, max_daily_rainfall, total_rainfall, rainy_days, '
+                'data_points, expected_points')
+}
+
+# 流式读取每页的行数，可以用环境变量 RAINFALL_STREAM_PAGE_SIZE 设置
+STREAM_PAGE_SIZE = int(os.environ.get('RAINFALL_STREAM_PAGE_SIZE') or 5000)
+
+def _stream_key(period, row):
+    """一行数据在 keyset 游标中的排序值"""
+    if period == 'monthly':
+        return row['year'] * 100 + row['month']
+    return row['date'] if period == 'daily' else row['timestamp']
+
+def _iter_keyset(conn, username, period, lower=None, upper=None, descending=False, limit=None, page_size=None):
+    """按 (排序列, id) 的 keyset 分页逐行读取一个用户的数据
+
+    每页是一条独立的短查询，用 SSDictCursor 不缓冲结果逐行读取，不使用 OFFSET，
+    翻页的代价与已读取的行数无关；任何时候内存中最多只有一行数据。
+
+    参数:
+        conn: 数据库连接
+        username: 用户名
+        period: 时间粒度
+        lower, upper: 排序列的范围（两端都包含），None表示不限制
+        descending: 是否按时间倒序
+        limit: 最多读取的行数
+        page_size: 每页的行数
+    """
+    table, key, columns = _STREAM_QUERIES[period]
+    page_size = max(int(page_size or STREAM_PAGE_SIZE), 1)
+    op, order = ('<', 'DESC') if descending else ('>', 'ASC')
+    position = None
+    remaining = limit
+
+    while remaining is None or remaining > 0:
+        conditions = ["username = %s"]
+        params = [username]
+        if lower is not None:
+            conditions.append(f"{key} >= %s")
+            params.append(lower)
+        if upper is not None:
+            conditions.append(f"{key} <= %s")
+            params.append(upper)
+        if position is not None:
+            conditions.append(f"({key} {op} %s OR ({key} = %s AND id {op} %s))")
+            params += [position[0], position[0], position[1]]
+        size = page_size if remaining is None else min(page_size, remaining)
+
+        count = 0
+        last = None
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(f'''
+                SELECT {columns} FROM {table}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {key} {order}, id {order}
+                LIMIT {size}
+            ''', params)
+            for row in cursor:
+                count += 1
+                last = row
+                yield row
+
+        if count < size:
+            return
+        position = (_stream_key(period, last), last['id'])
+        if remaining is not None:
+            remaining -= count
+
+def _resolve_time_range(start_time, end_time):
+    """未指定开始时间时默认最近24小时，只指定开始时间时结束时间为当前时间"""
+    if not start_time:
+        end_time = datetime.now()
+        start_time = end_time - timedelta(hours=24)
+    elif not end_time:
+        end_time = datetime.now()
+    return start_time, end_time
+
+def stream_recent_data(username='admin', period='10min', limit=100, page_size=None):
+    """get_recent_data 的流式版本，按时间倒序逐行生成最近的数据，只包含 _STREAM_QUERIES 中的列
+
+    参数同 get_recent_data，page_size 为每页的行数
+    """
+    if period not in _STREAM_QUERIES:
+        raise ValueError(f"不支持的时间粒度: {period}")
+    conn = get_db_connection()
+    try:
+        yield from _iter_keyset(conn, username, period, descending=True, limit=int(limit), page_size=page_size)
+    finally:
+        conn.close()
+
+def stream_data_by_timerange(username='admin', period='10min', start_time=None, end_time=None, page_size=None):
+    """get_data_by_timerange 的流式版本，按时间顺序逐行生成数据，只包含 _STREAM_QUERIES 中的列
+
+    原始数据同样会先从冷归档补上早于热表的部分。参数同 get_data_by_timerange，page_size 为每页的行数
+    """
+    if period not in _STREAM_QUERIES:
+        raise ValueError(f"不支持的时间粒度: {period}")
+    start_time, end_time = _resolve_time_range(start_time, end_time)
+    lower, upper = start_time, end_time
+    if period == 'monthly':
+        lower, upper = (_parse_time(value) for value in (start_time, end_time))
+        lower, upper = lower.year * 100 + lower.month, upper.year * 100 + upper.month
+
+    conn = get_db_connection()
+    try:
+        if period == 'raw':
+            with conn.cursor() as cursor:
+                archived_range = _archived_raw_range(cursor, username, start_time, end_time)
+            if archived_range:
+                for row in rainfall_archive.iter_range(username, *archived_range):
+                    yield {column: row[column] for column in
+                           ('id', 'timestamp', 'rainfall_value', 'rainfall_level', 'rainfall_percentage')}
+        yield from _iter_keyset(conn, username, period, lower, upper, page_size=page_size)
+    finally:
+        conn.close()
+
+def write_ndjson(rows, out=None, flush_every=None):
+    """把行逐条写为NDJSON（每行一个JSON对象），最后一行为汇总 {"success": true, "count": 行数}
+
+    每 flush_every 行写出并刷新一次；生成数据时出错则以 {"success": false, "error": ...} 结束。
+
+    返回:
+        int: 写出的数据行数
+    """
+    out = out or sys.stdout
+    flush_every = flush_every or STREAM_PAGE_SIZE
+    count = 0
+    lines = []
+    try:
+        for row in rows:
+            lines.append(json.dumps(row, ensure_ascii=False, default=str))
+            count += 1
+            if len(lines) >= flush_every:
+                lines.append('')
+                out.write('\n'.join(lines))
+                out.flush()
+                lines = []
+        summary = {"success": True, "count": count}
+    except Exception as e:
+        log(f"流式读取数据失败: {str(e)}")
+        log(traceback.format_exc())
+        summary = {"success": False, "error": str(e), "count": count}
+    lines.append(json.dumps(summary, ensure_ascii=False))
+    lines.append('')
+    out.write('\n'.join(lines))
+    out.flush()
+    return count
+
+def handle_action(action, params):
+    """执行命令行 --action 对应的操作，供命令行和常驻worker进程共用
+
+    参数:
+        action: 操作名称
+        params: 参数字典，键名与命令行参数一致
+
+    返回:
+        dict: 操作结果
+    """
+    username = params.get('username') or 'admin'
+    if action == 'init':
+        return init_rainfall_tables()
+    elif action == 'mock':
+        return generate_mock_data(username, int(params.get('days') or 7))
+    elif action == 'generate':
+        return generate_load_data(
+            params.get('users') or 1, int(params.get('days') or 30), params.get('start'),
+            params.get('seed') or 0, int(params.get('batch_size') or 5000),
+            params.get('user_prefix') or 'loadtest_', bool(params.get('aggregate')), params.get('engine')
+        )
+    elif action == 'aggregate':
+        return aggregate_data(username, bool(params.get('full')), params.get('engine'))
+    elif action == 'get_recent':
+        return get_recent_data(username, params.get('period') or '10min', int(params.get('limit') or 100))
+    elif action == 'get_range':
+        return get_data_by_timerange(username, params.get('period') or '10min', params.get('start'), params.get('end'))
+    elif action == 'get_hour':
+        return get_current_hour_data(username)
+    elif action == 'partition':
+        ahead = params.get('ahead')
+        return maintain_raw_partitions(int(ahead) if ahead is not None else None)
+    elif action == 'retention':
+        try:
+            retention_days = _parse_retention_days(params.get('ttl') or '')
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+        return apply_retention(
+            retention_days, int(params.get('batch_size') or 10000), float(params.get('pause') or 0),
+            bool(params.get('dry_run')), bool(params.get('compact')), bool(params.get('archive'))
+        )
+    elif action == 'archive':
+        return archive_raw_data(params.get('before'))
+    elif action == 'restore_archive':
+        return restore_archived_raw(username, params.get('start'), params.get('end'), int(params.get('batch_size') or 5000))
+    elif action == 'migrate_partitions':
+        ahead = params.get('ahead')
+        return migrate_raw_partitions(
+            params.get('scheme'), int(ahead) if ahead is not None else None,
+            int(params.get('batch_size') or 50000), bool(params.get('drop_old'))
+        )
+    else:
+        return {"success": False, "error": "Unknown operation"}
+
 if __name__ == '__main__':
     import argparse
 
     parser = argparse.ArgumentParser(description='雨量数据库操作')
-    parser.add_argument('--action', choices=['init', 'mock', 'aggregate', 'get_recent', 'get_range', 'get_hour'],
+    parser.add_argument('--action', choices=['init', 'mock', 'generate', 'aggregate', 'get_recent', 'get_range', 'get_hour',
+                                             'partition', 'migrate_partitions', 'retention', 'archive', 'restore_archive'],
                         required=True, help='执行的操作')
     parser.add_argument('--username', type=str, default='admin', help='用户名，默认为admin')
-    parser.add_argument('--days', type=int, default=7, help='生成模拟数据的天数')
+    parser.add_argument('--days', type=int, help='生成模拟数据的天数（mock默认7，generate默认30）')
     parser.add_argument('--period', choices=['raw', '10min', 'hourly', 'daily', 'monthly'],
                         default='10min', help='数据时间粒度')
     parser.add_argument('--limit', type=int, default=100, help='返回的数据条数')
+    parser.add_argument('--stream', action='store_true',
+                        help='get_recent/get_range: 分页流式读取，逐行输出NDJSON，最后一行为汇总')
+    parser.add_argument('--page-size', type=int, help='--stream: 每页的行数，默认由 RAINFALL_STREAM_PAGE_SIZE 决定（5000）')
     parser.add_argument('--start', help='开始时间，格式: YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD')
     parser.add_argument('--end', help='结束时间，格式: YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD')
+    parser.add_argument('--full', action='store_true', help='聚合时忽略水位线，全量重建所有聚合数据')
+    parser.add_argument('--engine', choices=AGGREGATE_ENGINES, help='聚合实现，默认由环境变量 RAINFALL_AGG_ENGINE 决定（sql）')
+    parser.add_argument('--users', default='1', help='generate: 用户数量或逗号分隔的用户名')
+    parser.add_argument('--user-prefix', default='loadtest_', help='generate: 按数量生成用户名时的前缀')
+    parser.add_argument('--seed', type=int, default=0, help='generate: 随机种子')
+    parser.add_argument('--batch-size', type=int, help='generate: 每批写入的条数（默认5000）；migrate_partitions: 每批复制的id范围（默认50000）；'
+                                                       'retention: 每批删除的行数（默认10000）')
+    parser.add_argument('--aggregate', action='store_true', help='generate: 写入后全量重建聚合数据')
+    parser.add_argument('--scheme', choices=rainfall_partition.PARTITION_SCHEMES,
+                        help='migrate_partitions: 分区方式，默认由环境变量 RAINFALL_RAW_PARTITION 决定，未配置时按月')
+    parser.add_argument('--ahead', type=int, help='partition/migrate_partitions: 当前分区之后预建的分区数')
+    parser.add_argument('--drop-old', action='store_true', help='migrate_partitions: 迁移完成后删除原来的未分区表')
+    parser.add_argument('--ttl', help='retention: 各级数据的保留天数，如 raw=14,10min=365，未指定的级别使用 RAINFALL_*_RETENTION_DAYS')
+    parser.add_argument('--pause', type=float, default=0, help='retention: 每批删除之间的间隔（秒）')
+    parser.add_argument('--dry-run', action='store_true', help='retention: 只检查和统计可清理的行数，不删除')
+    parser.add_argument('--compact', action='store_true', help='retention: 清理后执行 OPTIMIZE TABLE 回收表空间')
+    parser.add_argument('--archive', action='store_true', help='retention: 删除原始数据之前先写入冷归档')
+    parser.add_argument('--before', help='archive: 归档早于该时间的原始数据，默认为 RAINFALL_RAW_RETENTION_DAYS 的清理边界')
 
     args = parser.parse_args()
 
     log(f"执行操作: {args.action}")
 
-    try:
-        if args.action == 'init':
-            result = init_rainfall_tables()
-        elif args.action == 'mock':
-            result = generate_mock_data(args.username, args.days)
-        elif args.action == 'aggregate':
-            result = aggregate_data(args.username)
-        elif args.action == 'get_recent':
-            result = get_recent_data(args.username, args.period, args.limit)
-        elif args.action == 'get_range':
-            result = get_data_by_timerange(args.username, args.period, args.start, args.end)
-        elif args.action == 'get_hour':
-            result = get_current_hour_data(args.username)
+    if args.stream and args.action in ('get_recent', 'get_range'):
+        # 流式输出: 内存占用与数据量无关，结果不经过 handle_action 一次性序列化
+        if args.action == 'get_recent':
+            rows = stream_recent_data(args.username, args.period, args.limit, args.page_size)
         else:
-            result = {"success": False, "error": "Unknown operation"}
+            rows = stream_data_by_timerange(args.username, args.period, args.start, args.end, args.page_size)
+        write_ndjson(rows, flush_every=args.page_size)
+        sys.exit(0)
+
+    try:
+        result = handle_action(args.action, vars(args))
 
         # Output result in standard JSON format with UTF-8 encoding
         try:
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+rainfall_raw 按时间分区
+
+可选的分区布局：rainfall_raw 按 timestamp 做 RANGE 分区（按月或按天），分区名为 p202401 / p20240115，
+最后一个分区 pmax 为 MAXVALUE 兜底，保证超出预建范围的数据也能写入。
+按时间范围查询和聚合时 MySQL 只扫描涉及的分区（分区裁剪），清理过期数据时直接删除整个分区，
+不需要逐行 DELETE。删除分区只由 rainfall_db.apply_retention 在核对聚合完整之后调用 drop_partitions_before。
+
+MySQL要求分区表的每个唯一键都包含分区列，因此分区表的主键为 (id, timestamp)，
+唯一键 (username, timestamp) 不变；id 仍然自增，聚合水位线继续按 id 工作。
+
+由 rainfall_db.py 调用，这里的函数都接收调用方的游标，不自行管理连接:
+- raw_table_ddl():        分区表的建表语句（init 在 RAINFALL_RAW_PARTITION 开启且表不存在时使用）
+- maintain_partitions():  预建未来的分区
+- drop_partitions_before(): 删除整体早于给定时间的分区
+- migrate_to_partitions(): 把已有的未分区表分批复制到新的分区表，再原子地替换表名
+
+环境变量:
+    RAINFALL_RAW_PARTITION            off（默认）、monthly 或 daily
+    RAINFALL_RAW_PARTITION_AHEAD      预建的未来分区数，默认按月3个、按天14个
+"""
+
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+
+PARTITION_SCHEMES = ('monthly', 'daily')
+DEFAULT_AHEAD = {'monthly': 3, 'daily': 14}
+
+RAW_PARTITION_SCHEME = os.environ.get('RAINFALL_RAW_PARTITION', 'off').strip().lower()
+RAW_PARTITION_AHEAD = int(os.environ.get('RAINFALL_RAW_PARTITION_AHEAD') or 0)
+
+# 迁移时旧表改名后的表名
+UNPARTITIONED_TABLE = 'rainfall_raw_unpartitioned'
+# 迁移时新建的分区表，复制完成后改名为 rainfall_raw
+MIGRATION_TABLE = 'rainfall_raw_partitioned'
+
+MAX_PARTITION = 'pmax'
+
+# MySQL TO_DAYS('0001-01-01') 与 date.toordinal() 的差值
+_TO_DAYS_OFFSET = 365
+
+_PARTITION_NAME = {'monthly': re.compile(r'^p\d{6}$'), 'daily': re.compile(r'^p\d{8}$')}
+
+def configured_scheme():
+    """环境变量配置的分区方式，未开启时返回None"""
+    return RAW_PARTITION_SCHEME if RAW_PARTITION_SCHEME in PARTITION_SCHEMES else None
+
+def _check_scheme(scheme):
+    if scheme not in PARTITION_SCHEMES:
+        raise ValueError(f"不支持的分区方式: {scheme}，可选: {', '.join(PARTITION_SCHEMES)}")
+
+def period_start(scheme, value):
+    """value 所在分区的起始日期"""
+    day = value.date() if isinstance(value, datetime) else value
+    return day.replace(day=1) if scheme == 'monthly' else day
+
+def next_period(scheme, start):
+    """下一个分区的起始日期"""
+    if scheme == 'monthly':
+        return (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+def partition_name(scheme, start):
+    return f"p{start.strftime('%Y%m' if scheme == 'monthly' else '%Y%m%d')}"
+
+def _partition_definitions(scheme, first_start, end_start):
+    """[first_start, end_start) 范围内每个分区的定义，分区上界为下一个分区的起始日期"""
+    definitions = []
+    start = first_start
+    while start < end_start:
+        upper = next_period(scheme, start)
+        definitions.append(f"PARTITION {partition_name(scheme, start)} VALUES LESS THAN (TO_DAYS('{upper.isoformat()}'))")
+        start = upper
+    return definitions
+
+def _ahead_end(scheme, now, ahead):
+    """预建到的分区范围终点（不含）：当前分区之后再预建 ahead 个分区"""
+    end = next_period(scheme, period_start(scheme, now))
+    if ahead is None:
+        ahead = RAW_PARTITION_AHEAD or DEFAULT_AHEAD[scheme]
+    for _ in range(ahead):
+        end = next_period(scheme, end)
+    return end
+
+def raw_table_ddl(table, scheme, first_start=None, now=None, ahead=None):
+    """分区布局的原始数据表建表语句，字段和索引与未分区的 rainfall_raw 相同
+
+    参数:
+        table: 表名
+        scheme: monthly 或 daily
+        first_start: 第一个分区的起始日期（更早的数据也落在第一个分区），默认为当前分区
+        now: 当前时间，默认 datetime.now()
+        ahead: 当前分区之后预建的分区数，默认使用 RAINFALL_RAW_PARTITION_AHEAD 或 DEFAULT_AHEAD
+
+    返回:
+        str: CREATE TABLE IF NOT EXISTS 语句
+    """
+    _check_scheme(scheme)
+    now = now or datetime.now()
+    first_start = period_start(scheme, first_start or now)
+    definitions = _partition_definitions(scheme, first_start, _ahead_end(scheme, now, ahead))
+    definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    partitions = ',\n                    '.join(definitions)
+    return f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id BIGINT AUTO_INCREMENT,
+                    username VARCHAR(50) NOT NULL COMMENT '用户名',
+                    timestamp DATETIME NOT NULL,
+                    rainfall_value DECIMAL(5,1) NOT NULL COMMENT '雨量值 (mm/h)',
+                    rainfall_level ENUM('none', 'light', 'medium', 'heavy') NOT NULL COMMENT '雨量级别',
+                    rainfall_percentage INT NOT NULL COMMENT '雨量百分比 (0-100)',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (id, timestamp),
+                    INDEX idx_timestamp (timestamp),
+                    INDEX idx_username (username),
+                    UNIQUE KEY uk_username_timestamp (username, timestamp)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='原始雨量数据 (5秒间隔，按{"月" if scheme == "monthly" else "天"}分区)'
+                PARTITION BY RANGE (TO_DAYS(timestamp)) (
+                    {partitions}
+                );
+            '''
+
+def get_partitions(cursor, table='rainfall_raw'):
+    """查询表的分区
+
+    返回:
+        list: 按顺序排列的分区，每项包含 name、less_than（分区上界日期，MAXVALUE分区为None）、
+              rows（估计行数）、bytes（数据和索引大小）；表未分区时返回空列表
+    """
+    cursor.execute('''
+        SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS description,
+               TABLE_ROWS AS table_rows, DATA_LENGTH + INDEX_LENGTH AS bytes
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    ''', (table,))
+    partitions = []
+    for row in cursor.fetchall():
+        description = str(row['description'])
+        less_than = None
+        if description.upper() != 'MAXVALUE':
+            less_than = date.fromordinal(int(description) - _TO_DAYS_OFFSET)
+        partitions.append({"name": row['name'], "less_than": less_than,
+                           "rows": int(row['table_rows'] or 0), "bytes": int(row['bytes'] or 0)})
+    return partitions
+
+def detect_scheme(partitions):
+    """根据分区名判断分区方式，无法判断时返回None"""
+    names = [partition["name"] for partition in partitions if partition["name"] != MAX_PARTITION]
+    for scheme, pattern in _PARTITION_NAME.items():
+        if names and all(pattern.match(name) for name in names):
+            return scheme
+    return None
+
+def drop_partitions_before(cursor, cutoff, table='rainfall_raw'):
+    """删除上界不晚于 cutoff 的分区（分区中的数据都早于 cutoff），始终保留最后一个有上界的分区
+
+    参数:
+        cursor: 数据库游标
+        cutoff: 日期或时间，只删除整体早于它的分区
+        table: 表名
+
+    返回:
+        list: 删除的分区，格式同 get_partitions
+    """
+    cutoff = cutoff.date() if isinstance(cutoff, datetime) else cutoff
+    bounded = [partition for partition in get_partitions(cursor, table) if partition["less_than"] is not None]
+    dropped = [partition for partition in bounded[:-1] if partition["less_than"] <= cutoff]
+    if dropped:
+        cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(partition['name'] for partition in dropped)}")
+    return dropped
+
+def maintain_partitions(cursor, ahead=None, now=None, table='rainfall_raw'):
+    """预建未来的分区
+
+    新分区从 pmax 中拆分出来（pmax 通常为空，只修改元数据）。这里不删除任何分区，
+    过期分区由 rainfall_db.apply_retention 在核对聚合完整之后删除。
+
+    参数:
+        cursor: 数据库游标
+        ahead: 当前分区之后需要存在的分区数，默认使用 RAINFALL_RAW_PARTITION_AHEAD 或 DEFAULT_AHEAD
+        now: 当前时间，默认 datetime.now()
+        table: 表名
+
+    返回:
+        dict: 包含新建的分区名和分区总数的字典
+    """
+    now = now or datetime.now()
+    partitions = get_partitions(cursor, table)
+    if not partitions:
+        return {"success": False, "error": f"{table} 未分区，请先执行 migrate_partitions"}
+    scheme = detect_scheme(partitions)
+    if scheme is None:
+        return {"success": False, "error": f"无法识别 {table} 的分区方式: {[p['name'] for p in partitions]}"}
+    if partitions[-1]["name"] != MAX_PARTITION:
+        return {"success": False, "error": f"{table} 缺少 {MAX_PARTITION} 分区"}
+
+    # 预建分区
+    bounded = [partition for partition in partitions if partition["less_than"] is not None]
+    last_upper = bounded[-1]["less_than"] if bounded else period_start(scheme, now)
+    definitions = _partition_definitions(scheme, last_upper, _ahead_end(scheme, now, ahead))
+    created = [definition.split()[1] for definition in definitions]
+    if definitions:
+        definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+        cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION {MAX_PARTITION} INTO ({', '.join(definitions)})")
+
+    return {
+        "success": True,
+        "scheme": scheme,
+        "created": created,
+        "partitions": len(partitions) + len(created)
+    }
+
+def _max_id(cursor, table):
+    cursor.execute(f"SELECT MAX(id) AS max_id FROM {table}")
+    row = cursor.fetchone()
+    return row['max_id'] or 0 if row else 0
+
+def _copy_rows(cursor, source, target, after_id, upto_id, batch_size, commit, log):
+    """按 id 范围分批把 source 中的数据复制到 target（保留原 id），返回复制的行数"""
+    copied = 0
+    batches = 0
+    started = time.time()
+    while after_id < upto_id:
+        batch_end = min(after_id + batch_size, upto_id)
+        copied += cursor.execute(f'''
+            INSERT IGNORE INTO {target}
+            (id, username, timestamp, rainfall_value, rainfall_level, rainfall_percentage, created_at)
+            SELECT id, username, timestamp, rainfall_value, rainfall_level, rainfall_percentage, created_at
+            FROM {source}
+            WHERE id > %s AND id <= %s
+        ''', (after_id, batch_end))
+        commit()
+        after_id = batch_end
+        batches += 1
+        if log and batches % 20 == 0:
+            log(f"已复制 {copied} 条原始数据，进度 id {after_id}/{upto_id}，耗时 {time.time() - started:.1f}s")
+    return copied
+
+def migrate_to_partitions(cursor, commit, scheme, ahead=None, batch_size=50000, drop_old=False, log=None,
+                          table='rainfall_raw'):
+    """把已有的未分区原始数据表迁移为分区布局
+
+    迁移过程中原表可以继续写入，只有最后补复制和交换表名时短暂阻塞写入:
+    1. 按原表最早的数据建立分区表 rainfall_raw_partitioned，按 id 分批复制（保留 id，聚合水位线仍然有效）
+    2. 补复制第1步期间新写入的数据
+    3. LOCK TABLES 锁住两张表的写入，补复制第2步之后写入的数据，再用 RENAME TABLE 交换表名，
+       原表改名为 rainfall_raw_unpartitioned。交换时新表已包含原表的全部数据，之后写入的数据从原表最大 id 之后继续编号，
+       不会与补复制的数据重复 id，也不会出现聚合水位线越过尚未复制的数据（需要 MySQL 8.0.13 及以上，支持在 LOCK TABLES 下 RENAME）
+    4. 检查新表的 id 没有重复，有重复时返回失败并保留原表
+    drop_old 为 True 时最后删除原表，否则保留用于核对或回退。
+
+    参数:
+        cursor: 数据库游标
+        commit: 提交当前事务的函数，每批复制后调用
+        scheme: monthly 或 daily
+        ahead: 当前分区之后预建的分区数
+        batch_size: 每批复制的 id 范围
+        drop_old: 迁移完成后是否删除原表
+        log: 输出进度的函数
+        table: 原始数据表名
+
+    返回:
+        dict: 迁移结果
+    """
+    _check_scheme(scheme)
+    if get_partitions(cursor, table):
+        return {"success": True, "message": f"{table} 已经分区，无需迁移", "migrated": False}
+
+    cursor.execute(f"SHOW TABLES LIKE '{UNPARTITIONED_TABLE}'")
+    if cursor.fetchone():
+        return {"success": False, "error": f"{UNPARTITIONED_TABLE} 已存在，请确认上次迁移的结果后删除该表再重试"}
+
+    started = time.time()
+    cursor.execute(f"SELECT MIN(timestamp) AS min_ts FROM {table}")
+    row = cursor.fetchone()
+    first_start = row['min_ts'] if row and row['min_ts'] else datetime.now()
+
+    cursor.execute(f"DROP TABLE IF EXISTS {MIGRATION_TABLE}")
+    cursor.execute(raw_table_ddl(MIGRATION_TABLE, scheme, first_start=first_start, ahead=ahead))
+    commit()
+
+    # 1. 复制已有数据
+    upto_id = _max_id(cursor, table)
+    copied = _copy_rows(cursor, table, MIGRATION_TABLE, 0, upto_id, batch_size, commit, log)
+
+    # 2. 复制期间新写入的数据
+    caught_up_id = _max_id(cursor, table)
+    copied += _copy_rows(cursor, table, MIGRATION_TABLE, upto_id, caught_up_id, batch_size, commit, None)
+
+    # 3. 锁住写入后复制剩余的数据并交换表名
+    cursor.execute(f"LOCK TABLES {table} WRITE, {MIGRATION_TABLE} WRITE")
+    try:
+        final_id = _max_id(cursor, table)
+        copied += _copy_rows(cursor, table, MIGRATION_TABLE, caught_up_id, final_id, batch_size, commit, None)
+        cursor.execute(f"RENAME TABLE {table} TO {UNPARTITIONED_TABLE}, {MIGRATION_TABLE} TO {table}")
+        commit()
+    finally:
+        cursor.execute("UNLOCK TABLES")
+
+    # 4. 检查 id 唯一
+    cursor.execute(f"SELECT id FROM {table} GROUP BY id HAVING COUNT(*) > 1 LIMIT 1")
+    duplicate = cursor.fetchone()
+    if duplicate:
+        return {
+            "success": False,
+            "error": f"迁移后 {table} 存在重复的 id（如 {duplicate['id']}），原表保留为 {UNPARTITIONED_TABLE}",
+            "migrated": True,
+            "copied_rows": copied
+        }
+
+    if drop_old:
+        cursor.execute(f"DROP TABLE {UNPARTITIONED_TABLE}")
+        commit()
+
+    partitions = get_partitions(cursor, table)
+    return {
+        "success": True,
+        "migrated": True,
+        "scheme": scheme,
+        "copied_rows": copied,
+        "partitions": len(partitions),
+        "old_table": None if drop_old else UNPARTITIONED_TABLE,
+        "elapsed_seconds": round(time.time() - started, 2)
+    }
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基于 numpy/pandas 的雨量数据聚合
+
+与 rainfall_db.py 中按 INSERT ... SELECT 逐级聚合的SQL实现计算规则完全相同，区别在于:
+- 每个自然月的原始数据只用一条查询读出，10分钟、小时、日、月四级聚合都在内存中向量化计算
+- 结果按粒度用 executemany 批量 upsert 写回聚合表
+
+雨量值在数据库中是 DECIMAL(x,1)，这里统一换算为以0.1mm为单位的整数计算，
+舍入方式与MySQL对DECIMAL的ROUND一致（四舍五入，远离0），保证写回的结果与SQL实现逐位相同。
+
+由 rainfall_db.aggregate_data(engine='pandas') 调用，适合大范围补录和全量重新聚合。
+注意各级聚合都从原始数据重新计算，因此只适用于原始数据仍然保留的时间范围。
+"""
+
+from decimal import Decimal
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# 雨量级别，顺序同时决定主要级别计数相同时的取舍（与SQL实现一致）
+LEVELS = ('none', 'light', 'medium', 'heavy')
+_LEVEL_CODES = {level: code for code, level in enumerate(LEVELS)}
+
+# 各粒度的应有点数，月粒度为当月天数
+EXPECTED_POINTS = {'10min': 120, 'hourly': 6, 'daily': 24}
+
+_UPSERT_SQL = {
+    '10min': '''
+        INSERT INTO rainfall_10min
+        (username, timestamp, avg_rainfall, max_rainfall, min_rainfall, dominant_level, data_points, expected_points)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            avg_rainfall = VALUES(avg_rainfall),
+            max_rainfall = VALUES(max_rainfall),
+            min_rainfall = VALUES(min_rainfall),
+            dominant_level = VALUES(dominant_level),
+            data_points = VALUES(data_points),
+            expected_points = VALUES(expected_points),
+            updated_at = CURRENT_TIMESTAMP
+    ''',
+    'hourly': '''
+        INSERT INTO rainfall_hourly
+        (username, timestamp, avg_rainfall, max_rainfall, min_rainfall, total_rainfall, dominant_level, data_points, expected_points)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            avg_rainfall = VALUES(avg_rainfall),
+            max_rainfall = VALUES(max_rainfall),
+            min_rainfall = VALUES(min_rainfall),
+            total_rainfall = VALUES(total_rainfall),
+            dominant_level = VALUES(dominant_level),
+            data_points = VALUES(data_points),
+            expected_points = VALUES(expected_points),
+            updated_at = CURRENT_TIMESTAMP
+    ''',
+    'daily': '''
+        INSERT INTO rainfall_daily
+        (username, date, avg_rainfall, max_rainfall, min_rainfall, total_rainfall, rainy_hours, data_points, expected_points)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            avg_rainfall = VALUES(avg_rainfall),
+            max_rainfall = VALUES(max_rainfall),
+            min_rainfall = VALUES(min_rainfall),
+            total_rainfall = VALUES(total_rainfall),
+            rainy_hours = VALUES(rainy_hours),
+            data_points = VALUES(data_points),
+            expected_points = VALUES(expected_points),
+            updated_at = CURRENT_TIMESTAMP
+    ''',
+    'monthly': '''
+        INSERT INTO rainfall_monthly
+        (username, year, month, avg_daily_rainfall, max_daily_rainfall, total_rainfall, rainy_days, data_points, expected_points)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            avg_daily_rainfall = VALUES(avg_daily_rainfall),
+            max_daily_rainfall = VALUES(max_daily_rainfall),
+            total_rainfall = VALUES(total_rainfall),
+            rainy_days = VALUES(rainy_days),
+            data_points = VALUES(data_points),
+            expected_points = VALUES(expected_points),
+            updated_at = CURRENT_TIMESTAMP
+    '''
+}
+
+def _round_div(numerator, denominator):
+    """整数除法并四舍五入（远离0），与MySQL对DECIMAL做ROUND的结果一致"""
+    numerator = np.asarray(numerator, dtype=np.int64)
+    denominator = np.asarray(denominator, dtype=np.int64)
+    return np.sign(numerator) * ((np.abs(numerator) * 2 + denominator) // (denominator * 2))
+
+def _dominant_level(slots, level_codes):
+    """按时间段统计各级别出现次数，返回出现最多的级别编号（计数相同时取编号小的）"""
+    counts = level_codes.groupby(slots).value_counts().unstack(fill_value=0)
+    counts = counts.reindex(columns=range(len(LEVELS)), fill_value=0)
+    return pd.Series(counts.to_numpy().argmax(axis=1), index=counts.index)
+
+def raw_frame(rows):
+    """把原始数据查询结果转换为DataFrame
+
+    参数:
+        rows: 含 timestamp、rainfall_value、rainfall_level 的字典列表
+
+    返回:
+        DataFrame: 列为 timestamp(datetime64)、value(0.1mm整数)、level(级别编号)
+    """
+    frame = pd.DataFrame.from_records(rows, columns=['timestamp', 'rainfall_value', 'rainfall_level'])
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(frame['timestamp']),
+        'value': np.rint(frame['rainfall_value'].astype(float).to_numpy() * 10).astype(np.int64),
+        'level': frame['rainfall_level'].map(_LEVEL_CODES).fillna(0).astype(np.int64)
+    })
+
+def rollup_10min(raw):
+    """原始数据 -> 10分钟聚合，平均值以应有点数(120)为分母，缺失的5秒点视为0"""
+    slots = raw['timestamp'].dt.floor('10min')
+    grouped = raw.groupby(slots)['value']
+    result = grouped.agg(['sum', 'max', 'min', 'count'])
+    return pd.DataFrame({
+        'avg': _round_div(result['sum'], EXPECTED_POINTS['10min']),
+        'max': result['max'].to_numpy(),
+        'min': result['min'].to_numpy(),
+        'level': _dominant_level(slots, raw['level']).reindex(result.index).to_numpy(),
+        'points': result['count'].to_numpy()
+    }, index=result.index)
+
+def rollup_hourly(ten_min):
+    """10分钟聚合 -> 小时聚合，平均值和累计雨量都是10分钟平均值之和除以6"""
+    slots = ten_min.index.floor('h')
+    grouped = ten_min.groupby(slots)
+    total = grouped['avg'].sum()
+    avg = _round_div(total, EXPECTED_POINTS['hourly'])
+    return pd.DataFrame({
+        'avg': avg,
+        'max': grouped['max'].max().to_numpy(),
+        'min': grouped['min'].min().to_numpy(),
+        'total': avg,
+        'level': _dominant_level(slots, ten_min['level']).reindex(total.index).to_numpy(),
+        'points': grouped.size().to_numpy()
+    }, index=total.index)
+
+def rollup_daily(hourly):
+    """小时聚合 -> 日聚合，平均值为累计雨量之和除以24，平均雨量 >= 0.3 的小时计为有雨小时"""
+    days = hourly.index.normalize()
+    grouped = hourly.groupby(days)
+    total = grouped['total'].sum()
+    return pd.DataFrame({
+        'avg': _round_div(total, EXPECTED_POINTS['daily']),
+        'max': grouped['max'].max().to_numpy(),
+        'min': grouped['min'].min().to_numpy(),
+        'total': total.to_numpy(),
+        'rainy': (hourly['avg'] >= 3).groupby(days).sum().to_numpy(),
+        'points': grouped.size().to_numpy()
+    }, index=total.index)
+
+def rollup_monthly(daily):
+    """日聚合 -> 月聚合，平均日雨量以当月天数为分母，累计雨量 >= 0.3 的天计为有雨天"""
+    months = daily.index.to_period('M').to_timestamp()
+    grouped = daily.groupby(months)
+    total = grouped['total'].sum()
+    days_in_month = total.index.days_in_month.to_numpy()
+    return pd.DataFrame({
+        'avg': _round_div(total, days_in_month),
+        'max': grouped['total'].max().to_numpy(),
+        'total': total.to_numpy(),
+        'rainy': (daily['total'] >= 3).groupby(months).sum().to_numpy(),
+        'points': grouped.size().to_numpy(),
+        'expected': days_in_month
+    }, index=total.index)
+
+def _month_windows(start, end):
+    """把 [start, end) 按自然月切分，返回 (窗口开始, 窗口结束) 列表"""
+    windows = []
+    current = start
+    while current < end:
+        next_month = (current.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+                      + pd.DateOffset(months=1))
+        windows.append((current, min(next_month, end)))
+        current = next_month
+    return windows
+
+def _to_timestamp(value):
+    if isinstance(value, datetime):
+        return pd.Timestamp(value)
+    return pd.Timestamp(datetime.combine(value, datetime.min.time()))
+
+def compute_rollups(fetch_raw, slot_ranges):
+    """计算各粒度待写回的聚合结果
+
+    参数:
+        fetch_raw: 读取原始数据的函数，参数为 (开始时间, 结束时间)，返回字典列表
+        slot_ranges: {粒度: (开始, 结束)}，与 rainfall_db._slot_range 的返回值相同
+
+    返回:
+        dict: {粒度: DataFrame}，只包含 slot_ranges 中的粒度，且只保留各自范围内的时间段
+    """
+    bounds = {granularity: (_to_timestamp(start), _to_timestamp(end))
+              for granularity, (start, end) in slot_ranges.items()}
+    window_start = min(start for start, _ in bounds.values())
+    window_end = max(end for _, end in bounds.values())
+
+    parts = {granularity: [] for granularity in slot_ranges}
+    # 每个自然月单独读取和计算，月边界同时也是日、小时、10分钟的边界，各月结果互不影响
+    for month_start, month_end in _month_windows(window_start, window_end):
+        rows = fetch_raw(month_start.to_pydatetime(), month_end.to_pydatetime())
+        if not rows:
+            continue
+        levels = {'10min': rollup_10min(raw_frame(rows))}
+        levels['hourly'] = rollup_hourly(levels['10min'])
+        levels['daily'] = rollup_daily(levels['hourly'])
+        levels['monthly'] = rollup_monthly(levels['daily'])
+
+        for granularity, (start, end) in bounds.items():
+            frame = levels[granularity]
+            parts[granularity].append(frame[(frame.index >= start) & (frame.index < end)])
+
+    return {
+        granularity: pd.concat(frames) if frames else None
+        for granularity, frames in parts.items()
+    }
+
+def coverage(frame, granularity):
+    """计算实际点数占应有点数的比例（各时间段的平均值）"""
+    if frame is None or frame.empty:
+        return None
+    expected = frame['expected'] if granularity == 'monthly' else EXPECTED_POINTS[granularity]
+    return round(float((frame['points'] / expected).mean()), 4)
+
+def _tenths(value):
+    return Decimal(int(value)).scaleb(-1)
+
+def _upsert_params(username, granularity, frame):
+    """把聚合结果转换为 upsert 语句的参数列表"""
+    params = []
+    if granularity == '10min':
+        for slot, row in zip(frame.index, frame.itertuples(index=False)):
+            params.append((username, slot.to_pydatetime(), _tenths(row.avg), _tenths(row.max), _tenths(row.min),
+                           LEVELS[row.level], int(row.points), EXPECTED_POINTS['10min']))
+    elif granularity == 'hourly':
+        for slot, row in zip(frame.index, frame.itertuples(index=False)):
+            params.append((username, slot.to_pydatetime(), _tenths(row.avg), _tenths(row.max), _tenths(row.min),
+                           _tenths(row.total), LEVELS[row.level], int(row.points), EXPECTED_POINTS['hourly']))
+    elif granularity == 'daily':
+        for slot, row in zip(frame.index, frame.itertuples(index=False)):
+            params.append((username, slot.date(), _tenths(row.avg), _tenths(row.max), _tenths(row.min),
+                           _tenths(row.total), int(row.rainy), int(row.points), EXPECTED_POINTS['daily']))
+    else:  # monthly
+        for slot, row in zip(frame.index, frame.itertuples(index=False)):
+            params.append((username, slot.year, slot.month, _tenths(row.avg), _tenths(row.max),
+                           _tenths(row.total), int(row.rainy), int(row.points), int(row.expected)))
+    return params
+
+def write_rollup(cursor, username, granularity, frame):
+    """把一个粒度的聚合结果批量upsert到对应的聚合表
+
+    返回:
+        int: 受影响的行数（与 INSERT ... ON DUPLICATE KEY UPDATE 的计数规则相同）
+    """
+    if frame is None or frame.empty:
+        return 0
+    return cursor.executemany(_UPSERT_SQL[granularity], _upsert_params(username, granularity, frame))
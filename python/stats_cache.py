@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+统计页面数据缓存
+
+rainfall_api.get_statistics_data 的结果按 (用户名, 时间粒度, 时间段边界) 缓存在进程内存中:
+- 时间段边界是当前时间向下取整到该视图最小刷新单位的结果（如一小时视图为当前10分钟段的开始时间），
+  进入下一个时间段时自动使用新的键，同一用户同一视图只保留最新时间段的缓存
+- 聚合数据变化时由 rainfall_db.aggregate_data 调用 invalidate() 清除对应用户的聚合视图缓存；
+  写入原始数据时清除依赖原始数据的视图（10分钟视图、当前小时数据）
+- 其他进程（如 mqtt_ingest.py）执行的聚合无法通知本进程，因此缓存最多保留
+  RAINFALL_STATS_CACHE_TTL 秒（默认300，设置为0关闭缓存）
+- 同一个键的并发请求只有一个会查询数据库，其余等待并直接使用其结果
+
+命中、未命中次数可以通过 stats() 查看（rainfall_api.py --action cache_stats）。
+"""
+
+import os
+import time
+import threading
+
+from log_util import get_logger
+
+logger = get_logger('stats_cache')
+
+def _env_seconds(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+# 依赖聚合表的视图，聚合完成后需要清除
+AGGREGATED_PERIODS = ('hourly', 'daily', 'all')
+# 依赖原始数据的视图，写入原始数据后需要清除
+RAW_PERIODS = ('10min', 'current_hour')
+
+class StatsCache:
+    """按用户和视图缓存统计数据，线程安全
+
+    参数:
+        ttl: 缓存最长保留时间（秒），0表示不缓存
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        # {(用户名, 视图): (时间段边界, 值, 过期时间)}
+        self._entries = {}
+        # {(用户名, 视图, 时间段边界): 加载锁}，用于合并同一个键的并发查询
+        self._loading = {}
+        self._lock = threading.Lock()
+        # {视图: {"hits": n, "misses": n}}
+        self._counters = {}
+        self.invalidations = 0
+        # 每次清除缓存时加1；加载期间发生过清除的结果可能已经过时，不写入缓存
+        self._generation = 0
+
+    def get_or_load(self, username, period, boundary, loader):
+        """读取缓存，未命中时调用 loader() 加载并缓存
+
+        参数:
+            username: 用户名
+            period: 视图名称
+            boundary: 当前时间段边界
+            loader: 加载函数，返回结果字典；success 不为 True 的结果不缓存
+
+        返回:
+            dict: 缓存的或新加载的结果
+        """
+        if self.ttl <= 0:
+            return loader()
+
+        hit, value = self._get(username, period, boundary)
+        if hit:
+            return value
+
+        with self._lock:
+            load_lock = self._loading.setdefault((username, period, boundary), threading.Lock())
+        with load_lock:
+            # 等待期间其他请求可能已经加载完成，这种情况也计为命中
+            hit, value = self._get(username, period, boundary, count_miss=True)
+            if hit:
+                return value
+
+            try:
+                with self._lock:
+                    generation = self._generation
+                value = loader()
+                if isinstance(value, dict) and value.get("success"):
+                    with self._lock:
+                        if generation == self._generation:
+                            self._entries[(username, period)] = (boundary, value, time.monotonic() + self.ttl)
+                return value
+            finally:
+                with self._lock:
+                    self._loading.pop((username, period, boundary), None)
+
+    def invalidate(self, username=None, periods=None):
+        """清除缓存
+
+        参数:
+            username: 用户名，None表示所有用户
+            periods: 视图名称列表，None表示所有视图
+        """
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if (username is None or key[0] == username) and (periods is None or key[1] in periods)
+            ]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += 1
+            self._generation += 1
+        if keys:
+            logger.debug("清除统计缓存: 用户=%s, 视图=%s, 条目数=%d", username, periods, len(keys))
+
+    def stats(self):
+        """返回命中/未命中计数和当前缓存条目数"""
+        with self._lock:
+            hits = sum(counter["hits"] for counter in self._counters.values())
+            misses = sum(counter["misses"] for counter in self._counters.values())
+            return {
+                "success": True,
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+                "invalidations": self.invalidations,
+                "periods": {period: dict(counter) for period, counter in self._counters.items()}
+            }
+
+    def _get(self, username, period, boundary, count_miss=False):
+        """查询缓存，命中时计数；count_miss为True时未命中也计数"""
+        with self._lock:
+            counter = self._counters.setdefault(period, {"hits": 0, "misses": 0})
+            entry = self._entries.get((username, period))
+            if entry is not None and entry[0] == boundary and entry[2] > time.monotonic():
+                counter["hits"] += 1
+                return True, entry[1]
+            if count_miss:
+                counter["misses"] += 1
+            return False, None
+
+# 进程内共享的统计数据缓存
+stats_cache = StatsCache(ttl=_env_seconds('RAINFALL_STATS_CACHE_TTL', 300))
+
+def invalidate(username=None, periods=None):
+    """清除共享缓存，参数同 StatsCache.invalidate"""
+    stats_cache.invalidate(username, periods)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多用户OneNET数据同步调度器
+
+所有用户的同步任务放在同一个进程中：按下次执行时间排序的优先队列，加上固定大小的线程池。
+取代以前每个用户一个 onenet_sync.py --action start 进程、每个进程一个轮询线程的方式。
+
+- 运行中可以随时添加、移除用户
+- 线程池满时，到期的任务按到期先后排队，排队时间计入该用户的延迟（lag）
+- 同一用户的同步不会并发执行；执行时间超过同步间隔时，下一次同步在完成后立即开始，不会累积；
+  用户被移除后在同步完成前又被添加时，沿用正在执行的任务，完成后再继续调度
+
+Node服务通过常驻worker（python_worker.py）调用 add/remove/status 操作；
+也可以单独运行:
+    python sync_scheduler.py --users admin,user1 --interval 5 --workers 4
+"""
+
+import sys
+import json
+import time
+import heapq
+import argparse
+import itertools
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from log_util import get_logger
+
+logger = get_logger('sync_scheduler')
+log = logger.info
+
+# 默认同步间隔（秒）和并发同步数
+DEFAULT_INTERVAL = 5
+DEFAULT_WORKERS = 4
+
+class SyncJob:
+    """一个用户的同步任务状态"""
+
+    def __init__(self, username, interval, next_due):
+        self.username = username
+        self.interval = interval
+        self.next_due = next_due
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.last_started = None
+        self.last_lag = 0.0
+        self.last_duration = None
+        self.last_result = None
+
+class SyncScheduler:
+    """按下次执行时间调度多个用户同步任务的调度器
+
+    参数:
+        sync_func: 同步函数，参数为用户名，返回包含 success 的结果字典
+        max_workers: 同时执行的同步任务数上限
+        default_interval: 添加用户时未指定间隔时使用的同步间隔（秒）
+    """
+
+    def __init__(self, sync_func, max_workers=DEFAULT_WORKERS, default_interval=DEFAULT_INTERVAL):
+        self.sync_func = sync_func
+        self.max_workers = max_workers
+        self.default_interval = default_interval
+
+        self.jobs = {}
+        # 优先队列，元素为 (到期时间, 序号, 任务)；移除用户后队列中残留的元素在出队时丢弃
+        self._queue = []
+        self._seq = itertools.count()
+        # 正在执行的任务 {用户名: 任务}，包括执行期间已被移除的用户
+        self._inflight = {}
+        self._active = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._executor = None
+
+    def start(self):
+        """启动调度线程（已启动时不做任何事）"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sync')
+            self._thread = threading.Thread(target=self._run, name='sync-scheduler', daemon=True)
+            self._thread.start()
+        log(f"同步调度器已启动，并发数: {self.max_workers}")
+
+    def stop(self, wait=True):
+        """停止调度，wait为True时等待正在执行的同步完成"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=wait)
+        log("同步调度器已停止")
+
+    def add_user(self, username, interval=None):
+        """添加用户同步任务，用户已存在时只更新同步间隔
+
+        参数:
+            username: 用户名
+            interval: 同步间隔（秒），默认使用 default_interval
+
+        返回:
+            dict: 操作结果
+        """
+        interval = float(interval) if interval else self.default_interval
+        with self._cond:
+            job = self.jobs.get(username)
+            if job is not None:
+                job.interval = interval
+                return {"success": True, "message": f"用户 {username} 的同步任务已存在，同步间隔更新为 {interval} 秒"}
+
+            job = self._inflight.get(username)
+            if job is not None:
+                # 移除后上一次同步还没有完成：恢复原任务，完成后按新的间隔调度，避免同一用户同时同步两次
+                job.interval = interval
+                self.jobs[username] = job
+                log(f"恢复用户同步任务: {username}，间隔: {interval}秒，当前同步完成后继续")
+                return {"success": True, "message": f"已添加用户 {username} 的同步任务，当前同步完成后开始调度"}
+
+            job = SyncJob(username, interval, time.time())
+            self.jobs[username] = job
+            self._push(job)
+            self._cond.notify()
+
+        log(f"添加用户同步任务: {username}，间隔: {interval}秒，当前用户数: {len(self.jobs)}")
+        return {"success": True, "message": f"已添加用户 {username} 的同步任务"}
+
+    def remove_user(self, username):
+        """移除用户同步任务，正在执行的同步会执行完，但之后不再调度"""
+        with self._cond:
+            job = self.jobs.pop(username, None)
+        if job is None:
+            return {"success": True, "message": f"用户 {username} 没有同步任务"}
+        log(f"移除用户同步任务: {username}，当前用户数: {len(self.jobs)}")
+        return {"success": True, "message": f"已移除用户 {username} 的同步任务"}
+
+    def status(self):
+        """返回调度器和每个用户任务的状态，lag为到期到开始执行之间的延迟（秒）"""
+        now = time.time()
+        with self._cond:
+            users = {}
+            for username, job in self.jobs.items():
+                # 已到期但还在排队的任务，延迟按当前排队时间计算
+                waiting_lag = now - job.next_due if not job.running and now > job.next_due else 0.0
+                users[username] = {
+                    "interval": job.interval,
+                    "running": job.running,
+                    "next_due_in": round(max(job.next_due - now, 0.0), 3),
+                    "lag": round(max(job.last_lag, waiting_lag), 3),
+                    "last_lag": round(job.last_lag, 3),
+                    "last_duration": round(job.last_duration, 3) if job.last_duration is not None else None,
+                    "last_started": job.last_started,
+                    "runs": job.runs,
+                    "failures": job.failures,
+                    "last_result": job.last_result
+                }
+            return {
+                "success": True,
+                "running": self._running,
+                "workers": self.max_workers,
+                "active": self._active,
+                "queued": sum(1 for _, _, job in self._queue if self.jobs.get(job.username) is job),
+                "users": users
+            }
+
+    def _push(self, job):
+        """把任务按下次执行时间放入队列，调用方需持有锁"""
+        heapq.heappush(self._queue, (job.next_due, next(self._seq), job))
+
+    def _run(self):
+        """调度循环：取出最早到期的任务，有空闲线程时提交执行"""
+        with self._cond:
+            while self._running:
+                # 丢弃已移除用户的残留元素
+                while self._queue and self.jobs.get(self._queue[0][2].username) is not self._queue[0][2]:
+                    heapq.heappop(self._queue)
+
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+
+                due = self._queue[0][0]
+                now = time.time()
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+                if self._active >= self.max_workers:
+                    # 等待有同步任务完成
+                    self._cond.wait()
+                    continue
+
+                _, _, job = heapq.heappop(self._queue)
+                job.running = True
+                self._inflight[job.username] = job
+                self._active += 1
+                self._executor.submit(self._execute, job, due)
+
+    def _execute(self, job, due):
+        """在线程池中执行一次同步，完成后安排下一次"""
+        started = time.time()
+        job.last_started = started
+        job.last_lag = started - due
+        try:
+            result = self.sync_func(job.username)
+            success = bool(result and result.get("success"))
+            job.last_result = result.get("message") if success else result.get("error")
+        except Exception as e:
+            success = False
+            job.last_result = str(e)
+            log(f"用户 {job.username} 同步出错: {str(e)}")
+            log(traceback.format_exc())
+
+        finished = time.time()
+        with self._cond:
+            job.runs += 1
+            if not success:
+                job.failures += 1
+            job.last_duration = finished - started
+            job.running = False
+            self._active -= 1
+            if self._inflight.get(job.username) is job:
+                del self._inflight[job.username]
+
+            # 用户在同步期间被移除时不再调度
+            if self.jobs.get(job.username) is job:
+                # 按固定频率调度；执行超时时在完成后立即开始下一次，不补跑错过的次数
+                job.next_due = max(due + job.interval, finished)
+                self._push(job)
+            self._cond.notify()
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """获取进程内共享的调度器，首次调用时创建并启动"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from onenet_sync import sync_onenet_data
+            _scheduler = SyncScheduler(sync_onenet_data)
+            _scheduler.start()
+        return _scheduler
+
+def shutdown():
+    """停止共享调度器，常驻worker退出时调用"""
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.stop()
+
+def handle_action(action, params):
+    """执行调度器操作（add、remove、status），供命令行和常驻worker进程共用"""
+    if action == 'add':
+        username = (params.get('username') or 'admin').strip()
+        return get_scheduler().add_user(username, params.get('interval'))
+    elif action == 'remove':
+        username = (params.get('username') or 'admin').strip()
+        return get_scheduler().remove_user(username)
+    elif action == 'status':
+        return get_scheduler().status()
+    else:
+        return {"success": False, "error": f"不支持的操作: {action}"}
+
+def main():
+    parser = argparse.ArgumentParser(description='多用户OneNET数据同步调度器')
+    parser.add_argument('--users', default='admin', help='要同步的用户名，多个用户用逗号分隔')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help='同步间隔（秒）')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='同时执行的同步任务数')
+    parser.add_argument('--status-interval', type=float, default=60, help='输出调度状态的间隔（秒）')
+
+    args = parser.parse_args()
+
+    from onenet_sync import sync_onenet_data
+    scheduler = SyncScheduler(sync_onenet_data, max_workers=args.workers, default_interval=args.interval)
+    scheduler.start()
+    for username in args.users.split(','):
+        if username.strip():
+            scheduler.add_user(username.strip())
+
+    try:
+        while True:
+            time.sleep(args.status_interval)
+            print(json.dumps(scheduler.status(), ensure_ascii=False, default=str))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        log("收到中断信号，停止同步调度器")
+    finally:
+        scheduler.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+合成雨量数据
+
+按5秒间隔生成接近真实情况的雨量序列，用于在本地构造生产规模的数据表、压测聚合和查询:
+- 干燥期：持续时间服从指数分布（平均 DRY_SPELL_MEAN），少部分干燥期有0.1-0.2mm/h的毛毛雨
+- 降雨过程：持续时间和峰值雨强服从对数正态分布，雨强先增后减，叠加自相关的阵性波动
+- 数据缺失：设备离线造成的成段缺失（平均每 OUTAGE_MEAN_INTERVAL 一次），以及零星丢点
+
+同一个种子生成的序列完全相同。由 rainfall_db.generate_load_data 调用写入数据库。
+"""
+
+import math
+import random
+from datetime import timedelta
+
+# 干燥期平均时长（秒）和最短时长
+DRY_SPELL_MEAN = 36 * 3600
+DRY_SPELL_MIN = 30 * 60
+# 干燥期中出现毛毛雨的概率
+DRIZZLE_PROBABILITY = 0.15
+# 降雨过程时长的中位数（秒）和范围
+STORM_MEDIAN = 3 * 3600
+STORM_MIN = 10 * 60
+STORM_MAX = 18 * 3600
+# 降雨峰值雨强的中位数（mm/h）和上限
+PEAK_MEDIAN = 3.0
+PEAK_MAX = 60.0
+# 设备离线的平均间隔和平均时长（秒），以及零星丢点的概率
+OUTAGE_MEAN_INTERVAL = 5 * 86400
+OUTAGE_MEDIAN = 20 * 60
+DROP_PROBABILITY = 0.002
+
+def series_seed(seed, username):
+    """由全局种子和用户名得到该用户的种子，使各用户的序列互不相同且与生成顺序无关"""
+    return f"{seed}:{username}"
+
+def rainfall_series(start, end, seed, interval=5):
+    """生成 [start, end) 内按 interval 秒间隔的雨量序列
+
+    参数:
+        start: 开始时间
+        end: 结束时间
+        seed: 随机种子（整数或字符串）
+        interval: 采样间隔（秒）
+
+    返回:
+        generator: 依次产生 (timestamp, rainfall_value)，rainfall_value 保留一位小数；缺失的点不产生
+    """
+    rng = random.Random(seed)
+    step = timedelta(seconds=interval)
+    outage_probability = interval / OUTAGE_MEAN_INTERVAL
+    outage_left = 0
+    timestamp = start
+
+    # 从随机的阶段开始，避免所有用户都以干燥期开头
+    raining = rng.random() < 0.3
+
+    while timestamp < end:
+        if raining:
+            duration = min(max(rng.lognormvariate(math.log(STORM_MEDIAN), 0.8), STORM_MIN), STORM_MAX)
+            peak = min(max(rng.lognormvariate(math.log(PEAK_MEDIAN), 0.9), 0.5), PEAK_MAX)
+            # 峰值出现的位置（占降雨过程的比例），雨强在峰值前上升、之后衰减
+            peak_at = rng.uniform(0.2, 0.6)
+        else:
+            duration = max(rng.expovariate(1 / DRY_SPELL_MEAN), DRY_SPELL_MIN)
+            drizzle = rng.random() < DRIZZLE_PROBABILITY
+
+        steps = max(int(duration / interval), 1)
+        gust = 0.0
+        for i in range(steps):
+            if timestamp >= end:
+                return
+
+            # 设备离线：跳过一段连续的点
+            if outage_left > 0:
+                outage_left -= 1
+                timestamp += step
+                continue
+            if rng.random() < outage_probability:
+                outage_left = int(rng.lognormvariate(math.log(OUTAGE_MEDIAN), 1.0) / interval)
+                timestamp += step
+                continue
+
+            if raining:
+                position = i / steps
+                if position < peak_at:
+                    shape = math.sin(math.pi / 2 * position / peak_at)
+                else:
+                    shape = math.cos(math.pi / 2 * (position - peak_at) / (1 - peak_at))
+                # AR(1) 阵性波动，使相邻点的雨强连续变化
+                gust = 0.98 * gust + rng.gauss(0, 0.06)
+                value = peak * shape ** 1.5 * max(1 + gust, 0.1)
+            elif drizzle:
+                value = rng.choice((0.0, 0.1, 0.1, 0.2))
+            else:
+                value = 0.0
+
+            if rng.random() >= DROP_PROBABILITY:
+                yield timestamp, round(min(max(value, 0.0), PEAK_MAX), 1)
+            timestamp += step
+
+        raining = not raining
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""chart_downsample 的单元测试: 下标选择、numpy与纯Python实现结果一致、默认预算"""
+
+import random
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import chart_downsample
+from chart_downsample import downsample_series, lttb_indices, minmax_indices
+
+
+def _pure_python():
+    """临时去掉numpy，走纯Python实现"""
+    return mock.patch.object(chart_downsample, 'np', None)
+
+
+def _series(n, seed):
+    rng = random.Random(seed)
+    # 带重复值的时间和雨量，覆盖argmax/最小最大值取第一个下标的情况
+    x = sorted(rng.choice(range(n * 2)) for _ in range(n))
+    y = [round(rng.choice([0, 0, rng.uniform(0, 50)]), 1) for _ in range(n)]
+    return x, y
+
+
+class LttbIndicesTest(unittest.TestCase):
+
+    def test_keeps_everything_within_budget(self):
+        self.assertEqual(lttb_indices([0, 1, 2], [1, 2, 3], 3), [0, 1, 2])
+        self.assertEqual(lttb_indices([0, 1, 2], [1, 2, 3], 10), [0, 1, 2])
+        # 预算小于3时无法保留首尾和至少一个中间点，不降采样
+        self.assertEqual(lttb_indices(list(range(5)), [0] * 5, 2), list(range(5)))
+
+    def test_budget_first_last_and_order(self):
+        x, y = _series(500, seed=1)
+        for budget in (3, 10, 120, 499):
+            with self.subTest(budget=budget):
+                kept = lttb_indices(x, y, budget)
+                self.assertEqual(len(kept), budget)
+                self.assertEqual(kept[0], 0)
+                self.assertEqual(kept[-1], len(y) - 1)
+                self.assertEqual(kept, sorted(set(kept)))
+
+    def test_keeps_single_peak(self):
+        y = [0.0] * 1000
+        y[437] = 42.0
+        self.assertIn(437, lttb_indices(list(range(1000)), y, 50))
+        with _pure_python():
+            self.assertIn(437, lttb_indices(list(range(1000)), y, 50))
+
+
+class MinmaxIndicesTest(unittest.TestCase):
+
+    def test_keeps_everything_within_budget(self):
+        self.assertEqual(minmax_indices([3, 1, 2], 3), [0, 1, 2])
+        self.assertEqual(minmax_indices(list(range(10)), 3), list(range(10)))
+
+    def test_keeps_bucket_extremes(self):
+        y = [5.0] * 100
+        y[10], y[90] = 0.0, 50.0
+        kept = minmax_indices(y, 10)
+        self.assertLessEqual(len(kept), 10)
+        self.assertEqual((kept[0], kept[-1]), (0, 99))
+        self.assertIn(10, kept)
+        self.assertIn(90, kept)
+
+
+@unittest.skipIf(chart_downsample.np is None, '需要numpy才能比较两种实现')
+class NumpyParityTest(unittest.TestCase):
+    """有numpy和没有numpy时必须选出完全相同的下标"""
+
+    def test_lttb_parity(self):
+        for seed in range(100):
+            x, y = _series(random.Random(seed).randint(4, 800), seed)
+            for budget in (3, 7, 64, len(y) - 1):
+                with self.subTest(seed=seed, budget=budget):
+                    expected = lttb_indices(x, y, budget)
+                    with _pure_python():
+                        self.assertEqual(lttb_indices(x, y, budget), expected)
+
+    def test_minmax_parity(self):
+        for seed in range(100):
+            _, y = _series(random.Random(seed).randint(5, 800), seed)
+            for budget in (4, 9, 64, len(y) - 1):
+                with self.subTest(seed=seed, budget=budget):
+                    expected = minmax_indices(y, budget)
+                    with _pure_python():
+                        self.assertEqual(minmax_indices(y, budget), expected)
+
+
+class DownsampleSeriesTest(unittest.TestCase):
+
+    def test_unsorted_times_keep_original_order(self):
+        start = datetime(2024, 6, 1)
+        times = [start + timedelta(seconds=5 * index) for index in range(300)]
+        values = [float(index % 17) for index in range(300)]
+        points = list(zip(times, values))
+        shuffled = points[:]
+        random.Random(3).shuffle(shuffled)
+
+        data, info = downsample_series(shuffled, 50, [value for _, value in shuffled],
+                                       times=[time for time, _ in shuffled], method='lttb')
+        self.assertEqual(info, {"method": "lttb", "from": 300, "to": 50})
+        # 返回的点保持输入中的相对顺序，且与按时间排序后降采样的结果是同一批点
+        positions = [shuffled.index(point) for point in data]
+        self.assertEqual(positions, sorted(positions))
+        expected, _ = downsample_series(points, 50, values, times=times, method='lttb')
+        self.assertEqual(sorted(data), expected)
+
+    def test_off_and_small_series_untouched(self):
+        points = list(range(200))
+        self.assertEqual(downsample_series(points, 100, points, method='off'), (points, None))
+        self.assertEqual(downsample_series(points, 0, points), (points, None))
+        self.assertEqual(downsample_series(points, 200, points), (points, None))
+
+    def test_default_budgets_leave_regular_views_alone(self):
+        # 按5秒上报的10分钟原始数据约121个点，不应因为超出一两个点被降采样
+        self.assertGreater(chart_downsample.DEFAULT_POINT_BUDGETS['10min'], 121)
+        self.assertNotIn('hourly', chart_downsample.DEFAULT_POINT_BUDGETS)
+        self.assertEqual(chart_downsample.point_budget('daily', 0), 0)
+        self.assertEqual(chart_downsample.point_budget('daily', 50), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
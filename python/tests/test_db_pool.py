@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""db_pool 的单元测试: 取出、归还、健康检查、空闲淘汰和连接池满时等待"""
+
+import threading
+import unittest
+from unittest import mock
+
+import db_pool
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    """记录调用的假连接，代替pymysql连接"""
+
+    def __init__(self, number):
+        self.number = number
+        self.open = True
+        self.rollbacks = 0
+        self.pings = 0
+        self.ping_error = None
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self, reconnect=True):
+        self.pings += 1
+        if self.ping_error:
+            raise self.ping_error
+
+    def close(self):
+        self.open = False
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(db_pool.time, 'time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.created = []
+
+    def factory(self):
+        conn = FakeConnection(len(self.created))
+        self.created.append(conn)
+        return conn
+
+    def make_pool(self, **kwargs):
+        options = dict(min_size=1, max_size=3, idle_timeout=300, health_check_interval=30, checkout_timeout=0)
+        options.update(kwargs)
+        return ConnectionPool(self.factory, **options)
+
+    def test_checkout_and_release_reuse_connection(self):
+        pool = self.make_pool()
+        conn = pool.get_connection()
+        self.assertIs(conn._raw, self.created[0])
+        self.assertEqual(pool.status()["in_use"], 1)
+
+        conn.close()
+        conn.close()  # 重复归还无副作用
+        self.assertEqual(self.created[0].rollbacks, 1)
+        self.assertEqual(pool.status()["idle"], 1)
+        with self.assertRaises(AttributeError):
+            conn.cursor
+
+        with pool.connection() as again:
+            self.assertIs(again._raw, self.created[0])
+        status = pool.status()
+        self.assertEqual((status["created"], status["reused"], status["size"], status["idle"]), (1, 1, 1, 1))
+
+    def test_full_pool_times_out_then_waits_for_release(self):
+        pool = self.make_pool(max_size=2)
+        first, second = pool.get_connection(), pool.get_connection()
+        with self.assertRaises(PoolTimeoutError):
+            pool.get_connection()
+
+        # 等待中的线程在连接归还后取到同一个连接
+        pool.checkout_timeout = 5
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.get_connection()))
+        waiter.start()
+        first.close()
+        waiter.join(5)
+        self.assertEqual(len(got), 1)
+        self.assertIs(got[0]._raw, self.created[0])
+        self.assertEqual(len(self.created), 2)
+        got[0].close()
+        second.close()
+
+    def test_stale_connection_is_pinged_and_replaced(self):
+        pool = self.make_pool()
+        pool.get_connection().close()
+
+        # 空闲时间不到检查间隔时不ping
+        self.now += 10
+        pool.get_connection().close()
+        self.assertEqual(self.created[0].pings, 0)
+
+        self.now += 60
+        self.created[0].ping_error = ConnectionError("gone")
+        conn = pool.get_connection()
+        self.assertIs(conn._raw, self.created[1])
+        self.assertFalse(self.created[0].open)
+        self.assertEqual(pool.status()["discarded"], 1)
+        conn.close()
+
+    def test_closed_connection_is_discarded_on_release(self):
+        pool = self.make_pool()
+        conn = pool.get_connection()
+        conn._raw.open = False
+        conn.close()
+        self.assertEqual((pool.status()["size"], pool.status()["idle"]), (0, 0))
+
+    def test_idle_eviction_keeps_min_size(self):
+        pool = self.make_pool(min_size=1, max_size=3)
+        conns = [pool.get_connection() for _ in range(3)]
+        for conn in conns:
+            conn.close()
+        self.assertEqual(pool.status()["idle"], 3)
+
+        self.now += 301
+        pool.get_connection().close()
+        status = pool.status()
+        self.assertEqual((status["size"], status["idle"], status["evicted"]), (1, 1, 2))
+        # 最早归还的连接先被淘汰，保留最近归还的连接
+        self.assertEqual([conn.open for conn in self.created], [False, False, True])
+
+    def test_factory_error_frees_slot(self):
+        pool = self.make_pool(max_size=1)
+        with mock.patch.object(pool, 'factory', side_effect=ConnectionError("refused")):
+            with self.assertRaises(ConnectionError):
+                pool.get_connection()
+        self.assertEqual(pool.status()["size"], 0)
+        pool.get_connection().close()
+
+    def test_close_all_closes_idle_only(self):
+        pool = self.make_pool()
+        borrowed = pool.get_connection()
+        pool.get_connection().close()
+        pool.close_all()
+        self.assertEqual(pool.status()["size"], 1)
+        self.assertFalse(self.created[1].open)
+        borrowed.close()
+        self.assertEqual(pool.status()["idle"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""mqtt_ingest 的单元测试: 数据库不可用时批量写入失败的数据点放回缓冲区"""
+
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import mqtt_ingest
+import rainfall_db
+from db_pool import PoolTimeoutError
+from mqtt_ingest import MqttIngestor
+
+
+def _points(count, second=0):
+    start = datetime(2024, 6, 1, 8, 0, second)
+    return [(start + timedelta(seconds=5 * index), 1.5) for index in range(count)]
+
+
+class FlushRequeueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ingestor = MqttIngestor(password='token', max_buffer=100)
+        self.ingestor._buffer = {'user1': _points(3), 'user2': _points(2)}
+
+    def test_connection_failure_returns_error_result(self):
+        with mock.patch.object(rainfall_db, 'get_db_connection', side_effect=PoolTimeoutError("pool full")):
+            result = rainfall_db.bulk_insert_raw_rainfall('user1', _points(3))
+        self.assertFalse(result["success"])
+        self.assertIn("pool full", result["error"])
+
+    def test_failing_connection_factory_keeps_every_user(self):
+        with mock.patch.object(rainfall_db, 'get_db_connection', side_effect=ConnectionError("MySQL down")):
+            self.ingestor.flush()
+
+        self.assertEqual(self.ingestor._buffer, {'user1': _points(3), 'user2': _points(2)})
+        self.assertEqual(self.ingestor.stats["failed_writes"], 2)
+        self.assertEqual(self.ingestor.stats["inserted"], 0)
+
+    def test_requeued_points_stay_before_new_points(self):
+        newer = _points(1, second=59)
+
+        def failing_connection():
+            # 写入期间收到的新数据点
+            self.ingestor._buffer.setdefault('user1', []).extend(newer)
+            raise ConnectionError("MySQL down")
+
+        self.ingestor._buffer = {'user1': _points(3)}
+        with mock.patch.object(rainfall_db, 'get_db_connection', side_effect=failing_connection):
+            self.ingestor.flush()
+        self.assertEqual(self.ingestor._buffer['user1'], _points(3) + newer)
+
+    def test_unexpected_error_requeues_users_not_reached(self):
+        written = []
+
+        def bulk_insert(username, points):
+            written.append(username)
+            return {"success": True, "inserted_count": len(points), "skipped_count": 0}
+
+        with mock.patch.object(mqtt_ingest, 'bulk_insert_raw_rainfall', side_effect=bulk_insert), \
+                mock.patch.object(mqtt_ingest, 'aggregate_data', side_effect=RuntimeError("aggregate failed")):
+            with self.assertRaises(RuntimeError):
+                self.ingestor.flush()
+
+        # 第一个用户已写入，第二个用户还没有处理，数据放回缓冲区
+        self.assertEqual(written, ['user1'])
+        self.assertEqual(self.ingestor._buffer, {'user2': _points(2)})
+
+    def test_buffer_cap_drops_oldest(self):
+        self.ingestor.max_buffer = 2
+        with mock.patch.object(rainfall_db, 'get_db_connection', side_effect=ConnectionError("MySQL down")):
+            self.ingestor.flush()
+        self.assertEqual(self.ingestor._buffer['user1'], _points(3)[1:])
+        self.assertEqual(self.ingestor.stats["dropped"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
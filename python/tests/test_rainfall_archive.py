@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""rainfall_archive 的单元测试: 编解码往返、空块、单行、乱序时间戳、截断的文件"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import rainfall_archive
+from rainfall_archive import ArchiveReader, ArchiveWriter, archive_month, encode_row, read_range
+
+
+def _row(timestamp, value, level='light', percentage=10):
+    return {
+        "id": 1,
+        "username": "user1",
+        "timestamp": timestamp,
+        "rainfall_value": Decimal(str(value)),
+        "rainfall_level": level,
+        "rainfall_percentage": percentage,
+        "created_at": timestamp
+    }
+
+
+class ArchiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.archive_dir, 'user1', '2024-06.rfa')
+
+    def tearDown(self):
+        shutil.rmtree(self.archive_dir, ignore_errors=True)
+
+    def _write(self, blocks):
+        with ArchiveWriter(self.path) as writer:
+            for rows in blocks:
+                writer.add_block(rows)
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+
+class CodecTest(ArchiveTestCase):
+
+    def test_round_trip(self):
+        start = datetime(2024, 6, 1)
+        day1 = [encode_row(_row(start + timedelta(seconds=5 * i), (i % 300) / 10, 'none', i % 101))
+                for i in range(1000)]
+        day2 = [encode_row(_row(start + timedelta(days=1, seconds=7 * i), -12.5 if i == 3 else 3276.7, 'heavy', 100))
+                for i in range(10)]
+        self._write([day1, day2])
+
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(reader.rows, 1010)
+            self.assertEqual(len(reader.blocks), 2)
+            self.assertEqual(reader.read(), day1 + day2)
+            # 两端都包含，只解压相交的块
+            low, high = day1[10][0], day1[20][0]
+            self.assertEqual(reader.read(rainfall_archive._from_seconds(low), rainfall_archive._from_seconds(high)),
+                             day1[10:21])
+            self.assertEqual(reader.read(start + timedelta(days=3)), [])
+
+    def test_empty_block_is_skipped(self):
+        rows = [encode_row(_row(datetime(2024, 6, 1, 0, 0, 5), 1.5))]
+        self._write([[], rows, []])
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual(len(reader.blocks), 1)
+            self.assertEqual(reader.read(), rows)
+
+    def test_file_without_blocks(self):
+        self._write([])
+        with ArchiveReader(self.path) as reader:
+            self.assertEqual((reader.rows, reader.blocks, reader.read()), (0, [], []))
+
+    def test_single_row(self):
+        timestamp = datetime(2024, 6, 30, 23, 59, 59)
+        self._write([[encode_row(_row(timestamp, 0.1, 'light', 1))]])
+        rows = read_range('user1', datetime(2024, 6, 30), datetime(2024, 7, 1), self.archive_dir)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["timestamp"], timestamp)
+        self.assertEqual(rows[0]["rainfall_value"], Decimal('0.1'))
+        self.assertEqual((rows[0]["rainfall_level"], rows[0]["rainfall_percentage"]), ('light', 1))
+        self.assertIsNone(rows[0]["id"])
+
+    def test_out_of_order_block_rejected(self):
+        first = encode_row(_row(datetime(2024, 6, 1, 0, 0, 10), 1.0))
+        second = encode_row(_row(datetime(2024, 6, 1, 0, 0, 5), 2.0))
+        with self.assertRaises(ValueError):
+            with ArchiveWriter(self.path) as writer:
+                writer.add_block([first, second])
+        # 写入失败时不留下目标文件、临时文件和空的用户目录
+        self.assertFalse(os.path.exists(os.path.dirname(self.path)))
+
+    def test_values_out_of_range_rejected(self):
+        with self.assertRaises(ValueError):
+            encode_row(_row(datetime(2024, 6, 1), 3276.8))
+        with self.assertRaises(ValueError):
+            encode_row(_row(datetime(2024, 6, 1), 1.0, percentage=256))
+
+    def test_truncated_file_rejected(self):
+        rows = [encode_row(_row(datetime(2024, 6, 1) + timedelta(seconds=5 * i), 1.0)) for i in range(50)]
+        data = self._write([rows])
+        truncated = self.path + '.part'
+        for length in (0, 3, 8, 20, len(data) // 2, len(data) - 1):
+            with self.subTest(length=length):
+                with open(truncated, 'wb') as f:
+                    f.write(data[:length])
+                with self.assertRaises(ValueError):
+                    ArchiveReader(truncated)
+
+
+class ArchiveMonthTest(ArchiveTestCase):
+
+    def test_out_of_order_rows_are_sorted_and_merged(self):
+        day = datetime(2024, 6, 2)
+        batches = {
+            day: [_row(day + timedelta(seconds=s), s / 10) for s in (30, 5, 20, 10)]
+        }
+
+        def fetch_day(start, end):
+            return batches.get(start, [])
+
+        result = archive_month('user1', 2024, 6, fetch_day, self.archive_dir)
+        self.assertEqual((result["fetched_rows"], result["rows"]), (4, 4))
+        rows = read_range('user1', datetime(2024, 6, 1), datetime(2024, 6, 30), self.archive_dir)
+        self.assertEqual([row["timestamp"] for row in rows],
+                         [day + timedelta(seconds=s) for s in (5, 10, 20, 30)])
+
+        # 再次归档时合并，相同时间戳以新数据为准
+        batches[day] = [_row(day + timedelta(seconds=10), 9.9), _row(day + timedelta(seconds=1), 0.5)]
+        result = archive_month('user1', 2024, 6, fetch_day, self.archive_dir)
+        self.assertEqual(result["rows"], 5)
+        rows = read_range('user1', day, day + timedelta(minutes=1), self.archive_dir)
+        self.assertEqual([(row["timestamp"].second, row["rainfall_value"]) for row in rows],
+                         [(1, Decimal('0.5')), (5, Decimal('0.5')), (10, Decimal('9.9')),
+                          (20, Decimal('2.0')), (30, Decimal('3.0'))])
+
+    def test_empty_month_writes_nothing(self):
+        result = archive_month('user1', 2024, 6, lambda start, end: [], self.archive_dir)
+        self.assertIsNone(result["path"])
+        self.assertFalse(rainfall_archive.has_archive('user1', self.archive_dir))
+        self.assertEqual(read_range('user1', datetime(2024, 6, 1), datetime(2024, 7, 1), self.archive_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
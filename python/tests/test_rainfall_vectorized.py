@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""rainfall_vectorized 的单元测试: 向量化聚合与 rainfall_db 中SQL逐级聚合的结果逐位相同
+
+参照实现按SQL语句的写法用 Decimal 逐级计算: 每一级结果先按列类型保留一位小数再参与下一级计算，
+除法结果的小数位数为被除数的位数加4（MySQL的 div_precision_increment），ROUND 四舍五入远离0。
+"""
+
+import calendar
+import random
+import unittest
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from rainfall_db import _slot_range
+
+try:
+    import rainfall_vectorized
+except ImportError:
+    rainfall_vectorized = None
+
+LEVELS = ('none', 'light', 'medium', 'heavy')
+_TENTH = Decimal('0.1')
+
+
+def _div(numerator, denominator):
+    """MySQL DECIMAL 除法: 小数位数为被除数的位数加4"""
+    scale = max(-numerator.as_tuple().exponent, 0) + 4
+    return (numerator / Decimal(denominator)).quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_UP)
+
+
+def _round1(value):
+    return value.quantize(_TENTH, rounding=ROUND_HALF_UP)
+
+
+def _dominant(levels):
+    """CASE GREATEST(n_none, n_light, n_medium, n_heavy)，计数相同时按 none, light, medium, heavy 取第一个"""
+    counts = [levels.count(level) for level in LEVELS]
+    return LEVELS[counts.index(max(counts))]
+
+
+def sql_rollups(rows):
+    """按 rainfall_db._rollup_10min/_rollup_hourly/_rollup_daily/_rollup_monthly 的SQL计算各级聚合"""
+    slots = defaultdict(list)
+    for row in rows:
+        ts = row['timestamp']
+        slots[ts.replace(minute=ts.minute // 10 * 10, second=0)].append(row)
+    ten_min = {}
+    for slot, items in slots.items():
+        values = [row['rainfall_value'] for row in items]
+        ten_min[slot] = {
+            'avg': _round1(_div(sum(values), 120)), 'max': max(values), 'min': min(values),
+            'level': _dominant([row['rainfall_level'] for row in items]), 'points': len(items)
+        }
+
+    hours = defaultdict(list)
+    for slot, item in ten_min.items():
+        hours[slot.replace(minute=0)].append(item)
+    hourly = {}
+    for slot, items in hours.items():
+        sum_avg = sum(item['avg'] for item in items)
+        hourly[slot] = {
+            'avg': _round1(_div(sum_avg, 6)), 'max': max(item['max'] for item in items),
+            'min': min(item['min'] for item in items), 'total': _round1(_div(sum_avg * 10, 60)),
+            'level': _dominant([item['level'] for item in items]), 'points': len(items)
+        }
+
+    days = defaultdict(list)
+    for slot, item in hourly.items():
+        days[slot.replace(hour=0)].append(item)
+    daily = {}
+    for slot, items in days.items():
+        total = sum(item['total'] for item in items)
+        daily[slot] = {
+            'avg': _round1(_div(total, 24)), 'max': max(item['max'] for item in items),
+            'min': min(item['min'] for item in items), 'total': _round1(total),
+            'rainy': sum(item['avg'] >= Decimal('0.3') for item in items), 'points': len(items)
+        }
+
+    months = defaultdict(list)
+    for slot, item in daily.items():
+        months[slot.replace(day=1)].append(item)
+    monthly = {}
+    for slot, items in months.items():
+        days_in_month = calendar.monthrange(slot.year, slot.month)[1]
+        total = sum(item['total'] for item in items)
+        average = _div(total, days_in_month) if len(items) < days_in_month else _div(total, len(items))
+        monthly[slot] = {
+            'avg': _round1(average), 'max': max(item['total'] for item in items), 'total': _round1(total),
+            'rainy': sum(item['total'] >= Decimal('0.3') for item in items), 'points': len(items),
+            'expected': days_in_month
+        }
+    return {'10min': ten_min, 'hourly': hourly, 'daily': daily, 'monthly': monthly}
+
+
+def _tenths(value):
+    return Decimal(int(value)).scaleb(-1)
+
+
+def vectorized_as_dict(frame, granularity):
+    """把 compute_rollups 的结果转换为与 sql_rollups 相同的格式"""
+    result = {}
+    for slot, row in zip(frame.index, frame.to_dict('records')):
+        item = {}
+        for column, value in row.items():
+            if column in ('avg', 'max', 'min', 'total'):
+                item[column] = _tenths(value)
+            elif column == 'level':
+                item[column] = LEVELS[value]
+            else:
+                item[column] = int(value)
+        result[slot.to_pydatetime()] = item
+    return result
+
+
+def _raw(timestamp, value, level):
+    return {'timestamp': timestamp, 'rainfall_value': Decimal(value), 'rainfall_level': level}
+
+
+def fixed_series():
+    """2024年2月27日至3月2日的固定原始数据，2月（29天）只有最后3天的数据"""
+    rng = random.Random(12)
+    rows = []
+    start = datetime(2024, 2, 27, 22, 0)
+    for step in range(0, 4 * 24 * 720, 7):
+        if rng.random() < 0.6:
+            continue
+        value = Decimal(rng.choice([0, 0, 0, 1, 3, 12, 25, 47, 330])).scaleb(-1)
+        rows.append(_raw(start + timedelta(seconds=5 * step), value, rng.choice(LEVELS)))
+
+    crafted = datetime(2024, 3, 1, 12, 0)
+    rows = [row for row in rows if not crafted <= row['timestamp'] < crafted + timedelta(hours=1)]
+    # 10分钟段内 light 和 heavy 各2个点，取 light；4 x 1.5 = 6.0，平均值 0.05 四舍五入为 0.1
+    rows += [_raw(crafted + timedelta(seconds=5 * i), '1.5', level)
+             for i, level in enumerate(('heavy', 'light', 'heavy', 'light'))]
+    # 同一小时内 light（含上面的段）和 medium 的10分钟段各3个，取 light；18.0 / 120 = 0.15 四舍五入为 0.2
+    for index, level in enumerate(('medium', 'light', 'medium', 'light', 'medium'), start=1):
+        rows.append(_raw(crafted + timedelta(minutes=10 * index), '18.0', level))
+    rows.sort(key=lambda row: row['timestamp'])
+    return rows
+
+
+@unittest.skipIf(rainfall_vectorized is None, '需要numpy和pandas')
+class RollupParityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = fixed_series()
+        self.fetches = []
+
+    def fetch_raw(self, start, end):
+        self.fetches.append((start, end))
+        return [row for row in self.rows if start <= row['timestamp'] < end]
+
+    def test_matches_sql_rollups(self):
+        first, last = self.rows[0]['timestamp'], self.rows[-1]['timestamp']
+        slot_ranges = {granularity: _slot_range(granularity, first, last)
+                       for granularity in ('10min', 'hourly', 'daily', 'monthly')}
+        result = rainfall_vectorized.compute_rollups(self.fetch_raw, slot_ranges)
+        expected = sql_rollups(self.rows)
+
+        # 每个自然月读取一次
+        self.assertEqual(self.fetches, [(datetime(2024, 2, 1), datetime(2024, 3, 1)),
+                                        (datetime(2024, 3, 1), datetime(2024, 4, 1))])
+        for granularity in ('10min', 'hourly', 'daily', 'monthly'):
+            with self.subTest(granularity=granularity):
+                self.assertEqual(vectorized_as_dict(result[granularity], granularity), expected[granularity])
+
+    def test_level_tie_and_rounding(self):
+        expected = sql_rollups(self.rows)
+        slot = datetime(2024, 3, 1, 12, 0)
+        self.assertEqual(expected['10min'][slot]['level'], 'light')
+        self.assertEqual(expected['10min'][slot]['avg'], Decimal('0.1'))
+        self.assertEqual(expected['10min'][slot + timedelta(minutes=10)]['avg'], Decimal('0.2'))
+        self.assertEqual(expected['hourly'][slot]['level'], 'light')
+
+        result = rainfall_vectorized.compute_rollups(
+            self.fetch_raw, {'10min': (slot, slot + timedelta(hours=1)), 'hourly': (slot, slot + timedelta(hours=1))})
+        ten_min = vectorized_as_dict(result['10min'], '10min')
+        self.assertEqual((ten_min[slot]['level'], ten_min[slot]['avg']), ('light', Decimal('0.1')))
+        self.assertEqual(vectorized_as_dict(result['hourly'], 'hourly')[slot]['level'], 'light')
+
+    def test_partial_month(self):
+        result = rainfall_vectorized.compute_rollups(
+            self.fetch_raw, {'monthly': (datetime(2024, 2, 1).date(), datetime(2024, 3, 1).date())})
+        february = vectorized_as_dict(result['monthly'], 'monthly')
+        expected = sql_rollups(self.rows)['monthly'][datetime(2024, 2, 1)]
+        self.assertEqual(february, {datetime(2024, 2, 1): expected})
+        # 只有3天数据，平均日雨量仍以当月29天为分母
+        self.assertEqual((expected['points'], expected['expected']), (3, 29))
+
+    def test_range_slicing_within_month(self):
+        start, end = datetime(2024, 2, 28, 6, 0), datetime(2024, 3, 1, 3, 0)
+        result = rainfall_vectorized.compute_rollups(self.fetch_raw, {'10min': (start, end), 'hourly': (start, end)})
+        expected = sql_rollups(self.rows)
+        for granularity in ('10min', 'hourly'):
+            with self.subTest(granularity=granularity):
+                self.assertEqual(vectorized_as_dict(result[granularity], granularity),
+                                 {slot: item for slot, item in expected[granularity].items() if start <= slot < end})
+
+
+if __name__ == '__main__':
+    unittest.main()
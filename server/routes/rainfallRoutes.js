@@ -278,6 +278,23 @@ router.get('/onenet/stats', async (req, res) => {
   }
 });
 
+// 获取统计数据缓存的命中/未命中计数（缓存位于常驻Python worker进程中）
+router.get('/stats/cache', async (_, res) => {
+  try {
+    const rainfallApiScriptPath = path.join(__dirname, '..', config.paths.RAINFALL_API_SCRIPT);
+    const result = await executePythonScript(rainfallApiScriptPath, 'cache_stats', {});
+
+    if (result.success) {
+      res.json(result);
+    } else {
+      res.status(500).json({ error: result.error || '获取缓存统计失败' });
+    }
+  } catch (error) {
+    console.error('获取统计缓存信息错误:', error);
+    res.status(500).json({ error: '服务器内部错误' });
+  }
+});
+
 // 获取当前数据源设置 (始终返回OneNET数据源)
 router.get('/data-source', (_, res) => {
   try {
@@ -630,14 +647,18 @@ router.get('/onenet/sync/status', async (_, res) => {
     }
 
     // 获取服务运行状态
-    const { getCollectorStatus } = require('../services/rainfallCollector');
+    const { getCollectorStatus, getOneNetSyncSchedulerStatus } = require('../services/rainfallCollector');
     const status = getCollectorStatus();
+    const schedulerStatus = await getOneNetSyncSchedulerStatus();
 
     res.json({
       success: true,
       autoSync,
       isRunning: status.isOneNetSyncRunning,
-      shouldRestart: status.shouldRestartOneNetSync
+      shouldRestart: status.shouldRestartOneNetSync,
+      users: status.oneNetSyncUsers,
+      // 同步调度器中每个用户的同步延迟等状态
+      scheduler: schedulerStatus ? schedulerStatus.users : null
     });
   } catch (error) {
     console.error('获取OneNET同步状态错误:', error);
@@ -1,6 +1,7 @@
 const path = require('path');
 const { spawn } = require('child_process');
 const config = require('../config');
+const { callPythonWorker, isPythonWorkerEnabled, shouldFallbackToSpawn } = require('../utils/pythonWorker');
 
 /**
  * 设备绑定服务
@@ -18,6 +19,27 @@ class DeviceBindingService {
    * @returns {Promise<object>} 执行结果
    */
   async executePythonScript(action, params = {}) {
+    if (isPythonWorkerEnabled()) {
+      // worker与命令行一样忽略空参数
+      const workerParams = {};
+      Object.entries(params).forEach(([key, value]) => {
+        if (value !== null && value !== undefined && value !== '') {
+          workerParams[key] = String(value);
+        }
+      });
+
+      try {
+        const result = await callPythonWorker(this.dbScriptPath, action, workerParams);
+        console.log(`[设备绑定服务] Python worker执行成功:`, result);
+        return result;
+      } catch (error) {
+        if (!shouldFallbackToSpawn(error)) {
+          throw error;
+        }
+        console.log(`[设备绑定服务] Python worker不可用，改为启动新进程: ${error.message}`);
+      }
+    }
+
     return new Promise((resolve, reject) => {
       const args = ['--action', action];
       
@@ -1,6 +1,7 @@
 // server/services/oneNetActivationService.js
 const { spawn } = require('child_process');
 const path = require('path');
+const { callPythonWorker, isPythonWorkerEnabled, shouldFallbackToSpawn } = require('../utils/pythonWorker');
 
 /**
  * OneNET设备激活服务
@@ -112,12 +113,41 @@ class OneNetActivationService {
     }
   }
 
+  /**
+   * 通过常驻Python worker执行 onenet_api.py 的操作
+   * @param {string} action - 操作名，如 create_device
+   * @param {string} username - 用户名
+   * @returns {Promise<object|null>} 执行结果，worker未启用或无法执行该操作时返回null，由调用方改为启动新进程
+   */
+  async callWorker(action, username) {
+    if (!isPythonWorkerEnabled()) {
+      return null;
+    }
+
+    try {
+      const result = await callPythonWorker(this.pythonScriptPath, action, { username });
+      console.log(`[OneNET激活服务] Python worker执行 ${action} 完成:`, result);
+      return result;
+    } catch (error) {
+      if (!shouldFallbackToSpawn(error)) {
+        throw error;
+      }
+      console.log(`[OneNET激活服务] Python worker不可用，改为启动新进程: ${error.message}`);
+      return null;
+    }
+  }
+
   /**
    * 调用Python脚本在OneNET平台创建设备
    * @param {string} username - 用户名
    * @returns {Promise<object>} 创建结果
    */
   async createOneNetDevice(username) {
+    const workerResult = await this.callWorker('create_device', username);
+    if (workerResult) {
+      return workerResult;
+    }
+
     return new Promise((resolve, reject) => {
       console.log(`[OneNET激活服务] 调用Python脚本创建设备，用户: ${username}`);
 
@@ -207,6 +237,11 @@ class OneNetActivationService {
    * @returns {Promise<object>} 激活结果
    */
   async activateOneNetDevice(username) {
+    const workerResult = await this.callWorker('activate_device', username);
+    if (workerResult) {
+      return workerResult;
+    }
+
     return new Promise((resolve, reject) => {
       console.log(`[OneNET激活服务] 调用Python脚本激活设备，用户: ${username}`);
 
@@ -319,6 +354,11 @@ class OneNetActivationService {
    * @returns {Promise<object>} 设备状态
    */
   async checkOneNetDeviceStatus(username) {
+    const workerResult = await this.callWorker('check_device_status', username);
+    if (workerResult) {
+      return workerResult;
+    }
+
     return new Promise((resolve, reject) => {
       console.log(`[OneNET激活服务] 调用Python脚本检查设备状态，用户: ${username}`);
 
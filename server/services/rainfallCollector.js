@@ -4,10 +4,13 @@ const { spawn } = require('child_process');
 const fs = require('fs');
 const config = require('../config');
 const { terminateAllPythonProcesses } = require('../utils/processUtils');
+const { getPythonWorker, callPythonWorker, isPythonWorkerEnabled, shouldFallbackToSpawn } = require('../utils/pythonWorker');
 
 // 全局变量
 let collectorProcess = null;
-let oneNetSyncProcesses = new Map(); // OneNET同步进程映射 (username -> process)
+let oneNetSyncProcesses = new Map(); // OneNET同步进程映射 (username -> process)，仅在未使用同步调度器时使用
+let schedulerSyncUsers = new Set(); // 已加入常驻worker中同步调度器（sync_scheduler.py）的用户
+let schedulerExitHandlerAttached = false;
 let shouldRestartCollector = true; // 控制是否应该重启采集器
 let shouldRestartOneNetSync = true; // 控制是否应该重启OneNET同步服务
 
@@ -84,12 +87,78 @@ async function startOneNetSync(username = 'admin') {
   let finalUsername = username ? username.trim() : 'admin';
   console.log(`强制使用当前用户名: '${finalUsername}'`);
 
-  // 检查该用户是否已经有同步进程在运行
-  if (oneNetSyncProcesses.has(finalUsername)) {
+  // 检查该用户是否已经有同步任务在运行
+  if (oneNetSyncProcesses.has(finalUsername) || schedulerSyncUsers.has(finalUsername)) {
     console.log(`用户 ${finalUsername} 的OneNET同步服务已在运行，跳过启动`);
     return;
   }
 
+  // 优先加入常驻worker中的同步调度器，所有用户共用一个进程和线程池
+  if (isPythonWorkerEnabled()) {
+    try {
+      await addUserToSyncScheduler(finalUsername);
+      return;
+    } catch (error) {
+      if (!shouldFallbackToSpawn(error)) {
+        console.error(`将用户 ${finalUsername} 加入同步调度器失败:`, error.message);
+        return;
+      }
+      console.log(`同步调度器不可用，为用户 ${finalUsername} 启动独立同步进程: ${error.message}`);
+    }
+  }
+
+  startOneNetSyncProcess(finalUsername);
+}
+
+/**
+ * 将用户加入同步调度器
+ * @param {string} username - 用户名
+ * @returns {Promise<void>}
+ */
+async function addUserToSyncScheduler(username) {
+  if (!schedulerExitHandlerAttached) {
+    getPythonWorker().on('exit', handleSchedulerExit);
+    schedulerExitHandlerAttached = true;
+  }
+
+  const result = await callPythonWorker('sync_scheduler.py', 'add', { username, interval: 5 });
+  if (!result || !result.success) {
+    throw Object.assign(new Error((result && result.error) || '加入同步调度器失败'), { code: 'SCHEDULER_ERROR' });
+  }
+  schedulerSyncUsers.add(username);
+  console.log(`用户 ${username} 已加入OneNET同步调度器: ${result.message}`);
+}
+
+/**
+ * 常驻worker退出后，调度器中的同步任务随之丢失，需要时重新加入
+ */
+function handleSchedulerExit() {
+  if (schedulerSyncUsers.size === 0) return;
+
+  const usernames = Array.from(schedulerSyncUsers);
+  schedulerSyncUsers.clear();
+
+  if (!shouldRestartOneNetSync) {
+    console.log('重启标志已关闭，不再恢复OneNET同步调度器中的用户');
+    return;
+  }
+
+  console.log(`OneNET同步调度器所在的worker已退出，5秒后恢复 ${usernames.length} 个用户的同步任务`);
+  setTimeout(() => {
+    if (!shouldRestartOneNetSync) return;
+    usernames.forEach((username) => {
+      startOneNetSync(username).catch((error) => {
+        console.error(`恢复用户 ${username} 的OneNET同步任务失败:`, error);
+      });
+    });
+  }, 5000);
+}
+
+/**
+ * 为单个用户启动独立的OneNET同步进程（常驻worker被禁用或不可用时使用）
+ * @param {string} finalUsername - 用户名
+ */
+function startOneNetSyncProcess(finalUsername) {
   const usernameParam = `--username=${finalUsername}`;
   console.log(`最终用户名参数: ${usernameParam}`);
 
@@ -154,6 +223,17 @@ async function stopOneNetSync(username = 'admin') {
   // 确保用户名参数正确
   let finalUsername = username ? username.trim() : 'admin';
 
+  // 从同步调度器中移除该用户
+  if (schedulerSyncUsers.has(finalUsername)) {
+    schedulerSyncUsers.delete(finalUsername);
+    try {
+      const result = await callPythonWorker('sync_scheduler.py', 'remove', { username: finalUsername });
+      console.log(`已从OneNET同步调度器移除用户 ${finalUsername}: ${result.message}`);
+    } catch (error) {
+      console.error(`从OneNET同步调度器移除用户 ${finalUsername} 失败:`, error.message);
+    }
+  }
+
   // 如果有正在运行的同步服务，强制停止
   if (oneNetSyncProcesses.has(finalUsername)) {
     const syncProcess = oneNetSyncProcesses.get(finalUsername);
@@ -231,11 +311,13 @@ async function startOneNetSyncForAllUsers() {
           console.error(`为用户 ${username} 启动OneNET同步服务失败:`, error);
         }
 
-        // 在启动下一个用户的服务前稍等一下，避免同时启动太多进程
-        await new Promise(resolve => setTimeout(resolve, 1000));
+        // 启动独立进程时稍等一下，避免同时启动太多进程；加入调度器不需要等待
+        if (oneNetSyncProcesses.has(username)) {
+          await new Promise(resolve => setTimeout(resolve, 1000));
+        }
       }
 
-      console.log(`所有用户的OneNET同步服务启动完成，共启动 ${oneNetSyncProcesses.size} 个同步进程`);
+      console.log(`所有用户的OneNET同步服务启动完成，同步调度器中 ${schedulerSyncUsers.size} 个用户，独立同步进程 ${oneNetSyncProcesses.size} 个`);
     } else {
       console.log('没有找到用户或获取用户列表失败，只为默认用户admin启动同步服务');
       await startOneNetSync('admin');
@@ -255,12 +337,26 @@ function getCollectorStatus() {
   return {
     isRunning: collectorProcess !== null,
     shouldRestart: shouldRestartCollector,
-    isOneNetSyncRunning: oneNetSyncProcesses.size > 0,
-    oneNetSyncUsers: Array.from(oneNetSyncProcesses.keys()),
+    isOneNetSyncRunning: oneNetSyncProcesses.size > 0 || schedulerSyncUsers.size > 0,
+    oneNetSyncUsers: [...schedulerSyncUsers, ...oneNetSyncProcesses.keys()],
     shouldRestartOneNetSync: shouldRestartOneNetSync
   };
 }
 
+/**
+ * 获取同步调度器状态，包含每个用户的同步延迟（lag，秒）
+ * @returns {Promise<Object|null>} - 调度器状态，未使用调度器时返回null
+ */
+async function getOneNetSyncSchedulerStatus() {
+  if (schedulerSyncUsers.size === 0) return null;
+  try {
+    return await callPythonWorker('sync_scheduler.py', 'status', {}, 5000);
+  } catch (error) {
+    console.error('获取OneNET同步调度器状态失败:', error.message);
+    return null;
+  }
+}
+
 /**
  * 清理资源
  */
@@ -294,5 +390,6 @@ module.exports = {
   setShouldRestartCollector,
   setShouldRestartOneNetSync,
   getCollectorStatus,
+  getOneNetSyncSchedulerStatus,
   cleanup
 };
@@ -3,6 +3,7 @@ const path = require('path');
 const { PythonShell } = require('python-shell');
 const { exec } = require('child_process');
 const { maskSensitiveInfo } = require('./securityUtils');
+const { callPythonWorker, isPythonWorkerEnabled, shouldFallbackToSpawn } = require('./pythonWorker');
 
 /**
  * 处理Python脚本的标准错误输出
@@ -43,12 +44,38 @@ function handlePythonStderr(stderr) {
 
 /**
  * 执行Python脚本
+ * 优先通过常驻Python worker执行，worker不支持该操作或不可用时启动新的Python进程执行
  * @param {string} scriptPath - 脚本路径
  * @param {string} action - 执行的动作
  * @param {Object} params - 参数
  * @returns {Promise<Object>} - 执行结果
  */
-function executePythonScript(scriptPath, action, params = {}) {
+async function executePythonScript(scriptPath, action, params = {}) {
+  if (isPythonWorkerEnabled() && action !== null && action !== undefined) {
+    try {
+      const result = await callPythonWorker(path.basename(scriptPath), action, params);
+      console.log(`Python worker执行完成: ${path.basename(scriptPath)} ${action}`);
+      return result;
+    } catch (error) {
+      if (!shouldFallbackToSpawn(error)) {
+        console.error(`Python worker执行失败: ${error.message}`);
+        return { success: false, error: error.message };
+      }
+      console.log(`Python worker无法执行 ${path.basename(scriptPath)} ${action}，改为启动新进程: ${error.message}`);
+    }
+  }
+
+  return spawnPythonScript(scriptPath, action, params);
+}
+
+/**
+ * 启动新的Python进程执行脚本
+ * @param {string} scriptPath - 脚本路径
+ * @param {string} action - 执行的动作
+ * @param {Object} params - 参数
+ * @returns {Promise<Object>} - 执行结果
+ */
+function spawnPythonScript(scriptPath, action, params = {}) {
   return new Promise((resolve) => {
     let args = [];
 
@@ -0,0 +1,264 @@
+// server/utils/pythonWorker.js
+const path = require('path');
+const { spawn } = require('child_process');
+const EventEmitter = require('events');
+
+// 常驻worker脚本路径
+const WORKER_SCRIPT = path.join(__dirname, '../../python/python_worker.py');
+
+// 单次调用默认超时时间（毫秒），HTTP同步命令最长30秒，这里留出余量
+const DEFAULT_TIMEOUT = 60000;
+
+// JSON-RPC "方法不存在" 错误码，表示该脚本/action没有注册到worker
+const METHOD_NOT_FOUND = -32601;
+
+// worker无法启动或请求没能写入stdin，请求确定没有被执行
+const WORKER_UNAVAILABLE = 'WORKER_UNAVAILABLE';
+
+// 请求已写入stdin后worker退出，请求可能已经执行（如控制命令已下发）
+const WORKER_EXITED = 'WORKER_EXITED';
+
+/**
+ * 创建带错误码的错误
+ * @param {string} message - 错误信息
+ * @param {string|number} code - 错误码
+ * @returns {Error}
+ */
+function workerError(message, code) {
+  const error = new Error(message);
+  error.code = code;
+  return error;
+}
+
+/**
+ * 常驻Python worker客户端
+ * 启动一个 python_worker.py 进程，通过stdin/stdout上按行分隔的JSON-RPC与其通信，
+ * 支持多个请求同时在途，进程退出后下次调用时自动重启。
+ * 进程退出时触发 'exit' 事件，在worker中保存了状态的调用方（如同步调度器）可以据此恢复。
+ */
+class PythonWorkerClient extends EventEmitter {
+  constructor(options = {}) {
+    super();
+    this.pythonPath = options.pythonPath || 'python';
+    this.workers = options.workers || 8;
+    this.process = null;
+    this.nextId = 1;
+    this.pending = new Map();
+    this.buffer = '';
+  }
+
+  /**
+   * 启动worker进程（如果尚未启动）
+   */
+  start() {
+    if (this.process) return;
+
+    console.log(`启动常驻Python worker: ${WORKER_SCRIPT}`);
+    const child = spawn(this.pythonPath, [WORKER_SCRIPT, '--workers', String(this.workers)], {
+      cwd: path.dirname(WORKER_SCRIPT),
+      env: {
+        ...process.env,
+        PYTHONIOENCODING: 'utf-8',
+        PYTHONUNBUFFERED: '1'
+      }
+    });
+    this.process = child;
+    this.buffer = '';
+
+    // 进程启动成功前写入的请求只在stdin缓冲区中，启动失败时确定没有被执行
+    let spawned = false;
+    child.once('spawn', () => {
+      spawned = true;
+    });
+
+    // worker异常退出后继续写入stdin会触发EPIPE，这里只记录日志，由exit事件统一处理在途请求
+    child.stdin.on('error', (error) => {
+      console.error('写入Python worker失败:', error.message);
+    });
+
+    child.stdout.setEncoding('utf8');
+    child.stdout.on('data', (chunk) => this.handleStdout(chunk));
+
+    child.stderr.setEncoding('utf8');
+    child.stderr.on('data', (chunk) => {
+      chunk.split('\n').forEach((line) => {
+        if (!line.trim()) return;
+        if (line.includes('LOG:')) {
+          console.log(`Python worker日志: ${line.trim()}`);
+        } else {
+          console.error(`Python worker错误: ${line.trim()}`);
+        }
+      });
+    });
+
+    const onExit = (reason) => {
+      if (this.process !== child) return;
+      console.error(`Python worker已退出: ${reason}`);
+      this.process = null;
+      // 进程退出时，所有在途请求都以失败结束；已写入worker的请求可能已经执行，用不同的错误码区分
+      for (const { reject, timer, written } of this.pending.values()) {
+        clearTimeout(timer);
+        if (written && spawned) {
+          reject(workerError(`Python worker已退出: ${reason}`, WORKER_EXITED));
+        } else {
+          reject(workerError(`Python worker无法执行请求: ${reason}`, WORKER_UNAVAILABLE));
+        }
+      }
+      this.pending.clear();
+      this.emit('exit', reason);
+    };
+
+    child.on('exit', (code, signal) => onExit(`code=${code}, signal=${signal}`));
+    child.on('error', (error) => onExit(error.message));
+  }
+
+  /**
+   * 处理worker的标准输出，每行一个JSON-RPC消息
+   * @param {string} chunk - 输出片段
+   */
+  handleStdout(chunk) {
+    this.buffer += chunk;
+    let index;
+    while ((index = this.buffer.indexOf('\n')) >= 0) {
+      const line = this.buffer.slice(0, index).trim();
+      this.buffer = this.buffer.slice(index + 1);
+      if (!line) continue;
+
+      let message;
+      try {
+        message = JSON.parse(line);
+      } catch (e) {
+        console.error('解析Python worker输出失败:', line);
+        continue;
+      }
+
+      // 没有id的是worker主动发出的通知（如worker.ready）
+      if (message.id === undefined || message.id === null) {
+        if (message.error) {
+          console.error('Python worker返回错误:', message.error);
+        }
+        continue;
+      }
+
+      const request = this.pending.get(message.id);
+      if (!request) continue;
+      this.pending.delete(message.id);
+      clearTimeout(request.timer);
+
+      if (message.error) {
+        const error = new Error(message.error.message);
+        error.code = message.error.code;
+        request.reject(error);
+      } else {
+        request.resolve(message.result);
+      }
+    }
+  }
+
+  /**
+   * 调用worker方法
+   * @param {string} method - 方法名，格式为 "<脚本名>.<action>"，如 "rainfall_api.stats"
+   * @param {Object} params - 参数，与命令行参数同名
+   * @param {number} timeout - 超时时间（毫秒）
+   * @returns {Promise<Object>} - 执行结果
+   */
+  call(method, params = {}, timeout = DEFAULT_TIMEOUT) {
+    this.start();
+
+    return new Promise((resolve, reject) => {
+      const id = this.nextId++;
+      const timer = setTimeout(() => {
+        if (this.pending.delete(id)) {
+          reject(workerError(`Python worker调用超时: ${method}`, 'TIMEOUT'));
+        }
+      }, timeout);
+
+      const request = { resolve, reject, timer, written: false };
+      this.pending.set(id, request);
+
+      // 写入失败时请求没有到达worker，可以安全地回退
+      const fail = (error) => {
+        if (this.pending.get(id) !== request) return;
+        this.pending.delete(id);
+        clearTimeout(timer);
+        reject(workerError(`写入Python worker失败: ${error.message}`, WORKER_UNAVAILABLE));
+      };
+
+      try {
+        this.process.stdin.write(JSON.stringify({ jsonrpc: '2.0', id, method, params }) + '\n', (error) => {
+          if (error) fail(error);
+        });
+        request.written = true;
+      } catch (error) {
+        fail(error);
+      }
+    });
+  }
+
+  /**
+   * 停止worker进程
+   */
+  stop() {
+    if (!this.process) return;
+    try {
+      this.process.stdin.end();
+    } catch (e) {
+      this.process.kill();
+    }
+  }
+}
+
+let sharedClient = null;
+
+/**
+ * 获取共享的worker客户端
+ * @returns {PythonWorkerClient}
+ */
+function getPythonWorker() {
+  if (!sharedClient) {
+    sharedClient = new PythonWorkerClient();
+  }
+  return sharedClient;
+}
+
+/**
+ * 是否启用常驻worker，设置环境变量 PYTHON_WORKER=off 可以关闭，回退为每次启动新进程
+ * @returns {boolean}
+ */
+function isPythonWorkerEnabled() {
+  return process.env.PYTHON_WORKER !== 'off';
+}
+
+/**
+ * 判断worker调用失败后是否可以安全地改为启动新进程重新执行
+ * 只有请求确定没有被执行（方法未注册、worker无法启动、请求没能写入）时才回退，
+ * 超时、请求写入后worker退出和脚本内部错误都不回退，避免重复下发控制命令或重复写入数据
+ * @param {Error} error - worker调用错误
+ * @returns {boolean}
+ */
+function shouldFallbackToSpawn(error) {
+  return error.code === METHOD_NOT_FOUND || error.code === WORKER_UNAVAILABLE;
+}
+
+/**
+ * 通过共享worker调用Python脚本的action
+ * @param {string} scriptName - 脚本文件名，如 rainfall_api.py
+ * @param {string} action - 执行的动作
+ * @param {Object} params - 参数
+ * @param {number} timeout - 超时时间（毫秒）
+ * @returns {Promise<Object>} - 执行结果
+ */
+function callPythonWorker(scriptName, action, params = {}, timeout = DEFAULT_TIMEOUT) {
+  const moduleName = path.basename(scriptName, '.py');
+  return getPythonWorker().call(`${moduleName}.${action}`, params, timeout);
+}
+
+module.exports = {
+  PythonWorkerClient,
+  WORKER_UNAVAILABLE,
+  WORKER_EXITED,
+  getPythonWorker,
+  isPythonWorkerEnabled,
+  shouldFallbackToSpawn,
+  callPythonWorker
+};
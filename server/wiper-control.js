@@ -21,6 +21,7 @@ const express = require('express');
 const { spawn } = require('child_process');
 const path = require('path');
 const { authMiddleware } = require('./middleware/auth');
+const { callPythonWorker, isPythonWorkerEnabled, shouldFallbackToSpawn } = require('./utils/pythonWorker');
 const router = express.Router();
 
 // Python脚本路径
@@ -29,19 +30,48 @@ const MQTT_SCRIPT = path.join(__dirname, '../python/onenet_mqtt_control.py'); //
 const TEST_SCRIPT = path.join(__dirname, '../python/test_mqtt_control.py');
 
 /**
- * 获取雨刷状态
- * GET /api/wiper/status
+ * 执行 onenet_http_control.py 的操作
+ * 优先通过常驻Python worker执行，worker未启用或无法执行该操作时启动新的Python进程执行
+ * @param {string} action - 操作类型: control、status 或 get-status
+ * @param {Object} params - 参数，与命令行参数同名（username、status、timeout）
+ * @returns {Promise<{status: number, body: Object}>} - HTTP状态码和响应内容
  */
-router.get('/status', authMiddleware, async (req, res) => {
-  try {
-    console.log('获取雨刷状态');
+async function runHttpControl(action, params) {
+  if (isPythonWorkerEnabled()) {
+    try {
+      const result = await callPythonWorker(HTTP_CONTROL_SCRIPT, action, params);
+      return { status: 200, body: result };
+    } catch (error) {
+      // 超时、请求写入后worker退出等错误时命令可能已经下发，不再启动新进程重复执行
+      if (!shouldFallbackToSpawn(error)) {
+        console.error(`Python worker执行失败: ${error.message}`);
+        return {
+          status: 500,
+          body: { success: false, error: 'Python worker执行失败', details: error.message }
+        };
+      }
+      console.log(`Python worker无法执行 onenet_http_control ${action}，改为启动新进程: ${error.message}`);
+    }
+  }
 
-    // 🔧 使用认证中间件获取用户信息
-    const username = req.user?.username;
-    console.log(`🎯 为已登录用户 ${username} 获取雨刷状态`);
+  return spawnHttpControl(action, params);
+}
 
-    // 🔧 更新：使用HTTP同步命令获取状态
-    const python = spawn('python', [HTTP_CONTROL_SCRIPT, '--action', 'status', '--username', username, '--timeout', '10']);
+/**
+ * 启动新的Python进程执行 onenet_http_control.py 的操作
+ * @param {string} action - 操作类型
+ * @param {Object} params - 参数
+ * @returns {Promise<{status: number, body: Object}>} - HTTP状态码和响应内容
+ */
+function spawnHttpControl(action, params) {
+  return new Promise((resolve) => {
+    const args = [HTTP_CONTROL_SCRIPT, '--action', action];
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== null) {
+        args.push(`--${key}`, String(value));
+      }
+    });
+    const python = spawn('python', args);
 
     let dataString = '';
     let errorString = '';
@@ -64,32 +94,62 @@ router.get('/status', authMiddleware, async (req, res) => {
       }
     });
 
+    python.on('error', (error) => {
+      resolve({
+        status: 500,
+        body: { success: false, error: '启动Python脚本失败', details: error.message }
+      });
+    });
+
     // 脚本执行完成
     python.on('close', (code) => {
       console.log(`Python脚本退出，状态码: ${code}`);
 
       if (code !== 0) {
-        return res.status(500).json({
-          success: false,
-          error: `Python脚本执行失败，状态码: ${code}`,
-          details: errorString
+        return resolve({
+          status: 500,
+          body: {
+            success: false,
+            error: `Python脚本执行失败，状态码: ${code}`,
+            details: errorString
+          }
         });
       }
 
       try {
         // 解析Python脚本的输出
-        const result = JSON.parse(dataString);
-        return res.json(result);
+        return resolve({ status: 200, body: JSON.parse(dataString) });
       } catch (error) {
         console.error('解析Python输出失败:', error);
-        return res.status(500).json({
-          success: false,
-          error: '解析Python输出失败',
-          details: error.message,
-          output: dataString
+        return resolve({
+          status: 500,
+          body: {
+            success: false,
+            error: '解析Python输出失败',
+            details: error.message,
+            output: dataString
+          }
         });
       }
     });
+  });
+}
+
+/**
+ * 获取雨刷状态
+ * GET /api/wiper/status
+ */
+router.get('/status', authMiddleware, async (req, res) => {
+  try {
+    console.log('获取雨刷状态');
+
+    // 🔧 使用认证中间件获取用户信息
+    const username = req.user?.username;
+    console.log(`🎯 为已登录用户 ${username} 获取雨刷状态`);
+
+    // 🔧 更新：使用HTTP同步命令获取状态
+    const { status: httpStatus, body } = await runHttpControl('status', { username, timeout: 10 });
+    return res.status(httpStatus).json(body);
   } catch (error) {
     console.error('获取雨刷状态失败:', error);
     return res.status(500).json({
@@ -126,55 +186,8 @@ router.post('/control', authMiddleware, async (req, res) => {
     console.log(`🎯 为已登录用户 ${username} 控制雨刷: ${status}`);
 
     // 🔧 更新：使用HTTP同步命令控制雨刷
-    const python = spawn('python', [HTTP_CONTROL_SCRIPT, '--action', 'control', '--status', status, '--username', username, '--timeout', '15']);
-
-    let dataString = '';
-    let errorString = '';
-
-    // 收集标准输出
-    python.stdout.on('data', (data) => {
-      dataString += data.toString();
-    });
-
-    // 收集标准错误
-    python.stderr.on('data', (data) => {
-      const output = data.toString();
-      errorString += output;
-
-      // 区分日志和真正的错误
-      if (output.trim().startsWith('LOG:')) {
-        console.log(`Python日志: ${output.trim()}`);  // 作为普通日志输出
-      } else {
-        console.error(`Python错误: ${output}`);  // 真正的错误
-      }
-    });
-
-    // 脚本执行完成
-    python.on('close', (code) => {
-      console.log(`Python脚本退出，状态码: ${code}`);
-
-      if (code !== 0) {
-        return res.status(500).json({
-          success: false,
-          error: `Python脚本执行失败，状态码: ${code}`,
-          details: errorString
-        });
-      }
-
-      try {
-        // 解析Python脚本的输出
-        const result = JSON.parse(dataString);
-        return res.json(result);
-      } catch (error) {
-        console.error('解析Python输出失败:', error);
-        return res.status(500).json({
-          success: false,
-          error: '解析Python输出失败',
-          details: error.message,
-          output: dataString
-        });
-      }
-    });
+    const { status: httpStatus, body } = await runHttpControl('control', { status, username, timeout: 15 });
+    return res.status(httpStatus).json(body);
   } catch (error) {
     console.error('控制雨刷失败:', error);
     return res.status(500).json({
@@ -211,55 +224,8 @@ router.post('/api-control', authMiddleware, async (req, res) => {
     console.log(`🎯 通过API为已登录用户 ${username} 控制雨刷: ${command}`);
 
     // 🔧 更新：使用HTTP同步命令API控制雨刷
-    const python = spawn('python', [HTTP_CONTROL_SCRIPT, '--action', 'control', '--status', command, '--username', username, '--timeout', '15']);
-
-    let dataString = '';
-    let errorString = '';
-
-    // 收集标准输出
-    python.stdout.on('data', (data) => {
-      dataString += data.toString();
-    });
-
-    // 收集标准错误
-    python.stderr.on('data', (data) => {
-      const output = data.toString();
-      errorString += output;
-
-      // 区分日志和真正的错误
-      if (output.trim().startsWith('LOG:')) {
-        console.log(`Python日志: ${output.trim()}`);  // 作为普通日志输出
-      } else {
-        console.error(`Python错误: ${output}`);  // 真正的错误
-      }
-    });
-
-    // 脚本执行完成
-    python.on('close', (code) => {
-      console.log(`Python脚本退出，状态码: ${code}`);
-
-      if (code !== 0) {
-        return res.status(500).json({
-          success: false,
-          error: `Python脚本执行失败，状态码: ${code}`,
-          details: errorString
-        });
-      }
-
-      try {
-        // 解析Python脚本的输出
-        const result = JSON.parse(dataString);
-        return res.json(result);
-      } catch (error) {
-        console.error('解析Python输出失败:', error);
-        return res.status(500).json({
-          success: false,
-          error: '解析Python输出失败',
-          details: error.message,
-          output: dataString
-        });
-      }
-    });
+    const { status: httpStatus, body } = await runHttpControl('control', { status: command, username, timeout: 15 });
+    return res.status(httpStatus).json(body);
   } catch (error) {
     console.error('通过API控制雨刷失败:', error);
     return res.status(500).json({
@@ -273,95 +239,34 @@ router.post('/api-control', authMiddleware, async (req, res) => {
 /**
  * 启动MQTT服务
  * POST /api/wiper/start-service
+ *
+ * 雨刷控制已改为HTTP同步命令，每次请求由常驻Python worker直接下发，不再需要后台MQTT控制进程；
+ * 保留该接口只为兼容旧的前端调用，不启动任何进程
  */
 router.post('/start-service', authMiddleware, async (req, res) => {
-  try {
-    // 🔧 使用认证中间件获取用户信息
-    const username = req.user?.username;
-    console.log(`🎯 为已登录用户 ${username} 启动MQTT控制服务`);
-
-    // 调用Python脚本启动MQTT服务，传入用户名
-    const python = spawn('python', [PYTHON_SCRIPT, '--action', 'start', '--username', username], {
-      detached: true, // 使进程在后台运行
-      stdio: ['ignore', 'ignore', 'ignore'] // 忽略标准输入输出
-    });
+  const username = req.user?.username;
+  console.log(`🎯 用户 ${username} 请求启动MQTT控制服务，HTTP同步命令控制无需后台服务`);
 
-    // 分离子进程，使其在后台运行
-    python.unref();
-
-    return res.json({
-      success: true,
-      message: 'MQTT控制服务已在后台启动'
-    });
-  } catch (error) {
-    console.error('启动MQTT控制服务失败:', error);
-    return res.status(500).json({
-      success: false,
-      error: '启动MQTT控制服务失败',
-      details: error.message
-    });
-  }
+  return res.json({
+    success: true,
+    message: '雨刷控制使用HTTP同步命令，无需启动后台服务'
+  });
 });
 
 /**
  * 停止MQTT服务
  * POST /api/wiper/stop-service
+ *
+ * 同 /start-service，没有需要停止的后台进程
  */
 router.post('/stop-service', authMiddleware, async (req, res) => {
-  try {
-    // 🔧 使用认证中间件获取用户信息
-    const username = req.user?.username;
-    console.log(`🎯 为已登录用户 ${username} 停止MQTT控制服务`);
-
-    // 调用Python脚本停止MQTT服务，传入用户名
-    const python = spawn('python', [PYTHON_SCRIPT, '--action', 'stop', '--username', username]);
-
-    let dataString = '';
-    let errorString = '';
-
-    // 收集标准输出
-    python.stdout.on('data', (data) => {
-      dataString += data.toString();
-    });
-
-    // 收集标准错误
-    python.stderr.on('data', (data) => {
-      const output = data.toString();
-      errorString += output;
-
-      // 区分日志和真正的错误
-      if (output.trim().startsWith('LOG:')) {
-        console.log(`Python日志: ${output.trim()}`);  // 作为普通日志输出
-      } else {
-        console.error(`Python错误: ${output}`);  // 真正的错误
-      }
-    });
-
-    // 脚本执行完成
-    python.on('close', (code) => {
-      console.log(`Python脚本退出，状态码: ${code}`);
+  const username = req.user?.username;
+  console.log(`🎯 用户 ${username} 请求停止MQTT控制服务，HTTP同步命令控制无需后台服务`);
 
-      if (code !== 0) {
-        return res.status(500).json({
-          success: false,
-          error: `Python脚本执行失败，状态码: ${code}`,
-          details: errorString
-        });
-      }
-
-      return res.json({
-        success: true,
-        message: 'MQTT控制服务已停止'
-      });
-    });
-  } catch (error) {
-    console.error('停止MQTT控制服务失败:', error);
-    return res.status(500).json({
-      success: false,
-      error: '停止MQTT控制服务失败',
-      details: error.message
-    });
-  }
+  return res.json({
+    success: true,
+    message: '雨刷控制使用HTTP同步命令，没有需要停止的后台服务'
+  });
 });
 
 /**
@@ -379,55 +284,8 @@ router.post('/get-status-cmd', authMiddleware, async (req, res) => {
     console.log(`🎯 为已登录用户 ${username} 通过HTTP同步命令获取雨刷状态`);
 
     // 🔧 更新：使用HTTP同步命令获取状态
-    const python = spawn('python', [HTTP_CONTROL_SCRIPT, '--action', 'get-status', '--username', username, '--timeout', '10']);
-
-    let dataString = '';
-    let errorString = '';
-
-    // 收集标准输出
-    python.stdout.on('data', (data) => {
-      dataString += data.toString();
-    });
-
-    // 收集标准错误
-    python.stderr.on('data', (data) => {
-      const output = data.toString();
-      errorString += output;
-
-      // 区分日志和真正的错误
-      if (output.trim().startsWith('LOG:')) {
-        console.log(`Python日志: ${output.trim()}`);  // 作为普通日志输出
-      } else {
-        console.error(`Python错误: ${output}`);  // 真正的错误
-      }
-    });
-
-    // 脚本执行完成
-    python.on('close', (code) => {
-      console.log(`Python脚本退出，状态码: ${code}`);
-
-      if (code !== 0) {
-        return res.status(500).json({
-          success: false,
-          error: `Python脚本执行失败，状态码: ${code}`,
-          details: errorString
-        });
-      }
-
-      try {
-        // 解析Python脚本的输出
-        const result = JSON.parse(dataString);
-        return res.json(result);
-      } catch (error) {
-        console.error('解析Python输出失败:', error);
-        return res.status(500).json({
-          success: false,
-          error: '解析Python输出失败',
-          details: error.message,
-          output: dataString
-        });
-      }
-    });
+    const { status: httpStatus, body } = await runHttpControl('get-status', { username, timeout: 10 });
+    return res.status(httpStatus).json(body);
   } catch (error) {
     console.error('CMD获取雨刷状态失败:', error);
     return res.status(500).json({